@@ -100,7 +100,9 @@ class ModelRouterPlugin:
             # 如果没有找到路由，返回默认提供商
             return list(self.providers.values())[0] if self.providers else {}
         
-        # 解析路由格式 "provider,model"
+        # 解析路由格式 "provider,model"（备选列表只使用第一个）
+        if not isinstance(route, str):
+            route = route[0]
         parts = route.split(",", 1)
         provider_name = parts[0]
         
@@ -0,0 +1,124 @@
+import bisect
+import threading
+from typing import Dict, Any, Iterable, NamedTuple, Optional
+from core.latency_tracker import LatencyTracker
+
+# 各阶段超时的默认下限和上限（秒）；连接耗时无法从requests观测，connect只按default取值并限制在上下限内
+DEFAULT_LIMITS = {
+    "connect": {"default": 5.0, "floor": 1.0, "ceiling": 10.0},
+    "first_byte": {"floor": 2.0, "ceiling": 120.0},
+    "total": {"floor": 5.0, "ceiling": 600.0}
+}
+
+# 按估算的提示token数划分的区间上界，提示越长首字节和总耗时越长
+DEFAULT_PROMPT_BUCKETS = (512, 2048, 8192, 32768)
+
+def size_bucket(tokens: int, buckets=DEFAULT_PROMPT_BUCKETS) -> str:
+    """token数所在的区间（如 "<=2048"，超过最大区间时为 ">32768"），buckets需已排序"""
+    index = bisect.bisect_left(buckets, tokens)
+    if index == len(buckets):
+        return f">{buckets[-1]}" if buckets else "all"
+    return f"<={buckets[index]}"
+
+class Timeouts(NamedTuple):
+    """一次请求的超时（秒）：连接、首字节（流式请求同时限制片段之间的间隔）和总耗时"""
+    connect: float
+    first_byte: float
+    total: float
+
+class AdaptiveTimeouts:
+    def __init__(self, percentile: float = 99.0, multiplier: float = 2.0, min_samples: int = 20, window: int = 200,
+                 prompt_buckets: Iterable[int] = DEFAULT_PROMPT_BUCKETS,
+                 limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 overrides: Optional[Dict[str, Dict[str, Dict[str, float]]]] = None):
+        """
+        按观测到的延迟百分位推算的自适应超时
+        - 按"提供商,模型"和提示长度区间分别统计首字节耗时和总耗时（各保留最近window个样本）
+        - 超时 = 第percentile百分位 * multiplier，限制在各阶段的floor和ceiling之间：卡住的请求被尽早切断，
+          正常的长时间生成（历史上同样耗时较长）不受影响
+        - 区间样本不足min_samples时使用该模型所有区间的样本，仍不足时返回None（提供商使用自己的默认超时）
+        - 超时触发时按超时值记录一个样本，延迟整体变慢时超时随之放宽，不会持续误杀
+        - overrides可按"提供商"或"提供商,模型"覆盖各阶段的floor和ceiling（后者优先）
+        """
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.prompt_buckets = sorted(prompt_buckets)
+        self.limits = {phase: dict(values, **(limits or {}).get(phase, {})) for phase, values in DEFAULT_LIMITS.items()}
+        self.overrides = overrides or {}
+        self.tracker = LatencyTracker(window)
+        self._fired = {}
+        self._lock = threading.Lock()
+    
+    def bucket(self, prompt_tokens: int) -> str:
+        """提示长度所在的区间（如 "<=2048"，超过最大区间时为 ">32768"）"""
+        return size_bucket(prompt_tokens, self.prompt_buckets)
+    
+    def _limits_for(self, route: str, phase: str) -> Dict[str, float]:
+        """阶段的下限和上限（按提供商、提供商,模型的覆盖合并）"""
+        provider = route.split(",", 1)[0]
+        merged = dict(self.limits[phase])
+        merged.update(self.overrides.get(provider, {}).get(phase, {}))
+        merged.update(self.overrides.get(route, {}).get(phase, {}))
+        return merged
+    
+    def record(self, route: str, prompt_tokens: int, first_byte: Optional[float] = None,
+               total: Optional[float] = None):
+        """记录一次成功请求的首字节耗时（流式）和总耗时"""
+        bucket = self.bucket(prompt_tokens)
+        for phase, seconds in (("first_byte", first_byte), ("total", total)):
+            if seconds is not None:
+                self.tracker.record(f"{route}|{bucket}|{phase}", seconds)
+                self.tracker.record(f"{route}|{phase}", seconds)
+    
+    def record_timeout(self, route: str, prompt_tokens: int, phase: str, seconds: float):
+        """记录一次超时（以超时值作为样本）"""
+        self.record(route, prompt_tokens, **{phase: seconds})
+        with self._lock:
+            key = f"{route}|{phase}"
+            self._fired[key] = self._fired.get(key, 0) + 1
+    
+    def _derive(self, route: str, bucket: str, phase: str) -> Optional[float]:
+        """按百分位推算阶段的超时，样本不足时返回None"""
+        observed = self.tracker.percentile(f"{route}|{bucket}|{phase}", self.percentile, self.min_samples)
+        if observed is None:
+            observed = self.tracker.percentile(f"{route}|{phase}", self.percentile, self.min_samples)
+        if observed is None:
+            return None
+        limits = self._limits_for(route, phase)
+        return min(limits["ceiling"], max(limits["floor"], observed * self.multiplier))
+    
+    def timeouts_for(self, route: str, prompt_tokens: int) -> Optional[Timeouts]:
+        """
+        获取请求的超时，没有足够样本时返回None
+        只有非流式样本时首字节超时按总耗时推算（首字节不会晚于总耗时）；没有总耗时样本时总超时取上限
+        """
+        bucket = self.bucket(prompt_tokens)
+        first_byte = self._derive(route, bucket, "first_byte")
+        total = self._derive(route, bucket, "total")
+        if first_byte is None and total is None:
+            return None
+        if total is None:
+            total = self._limits_for(route, "total")["ceiling"]
+        if first_byte is None or first_byte > total:
+            first_byte = total
+        connect = self._limits_for(route, "connect")
+        return Timeouts(min(connect["ceiling"], max(connect["floor"], connect["default"])), first_byte, total)
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各提供商,模型的首字节和总耗时百分位、当前推算的超时（按最短提示区间）和超时触发次数"""
+        routes = {}
+        latency = self.tracker.stats()
+        with self._lock:
+            fired = dict(self._fired)
+        for key, values in latency.items():
+            parts = key.split("|")
+            if len(parts) != 2:
+                continue
+            route, phase = parts
+            entry = routes.setdefault(route, {})
+            entry[phase] = dict(values, timeouts_fired=fired.get(key, 0))
+        for route, entry in routes.items():
+            timeouts = self.timeouts_for(route, 0)
+            entry["timeouts"] = timeouts._asdict() if timeouts is not None else None
+        return routes
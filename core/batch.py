@@ -0,0 +1,136 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+
+class BatchRunner:
+    def __init__(self, router, max_workers: int = 16, default_provider_concurrency: int = 8,
+                 provider_concurrency: Optional[Dict[str, int]] = None):
+        """
+        批量请求执行器
+        - 在有界线程池中并发执行批量请求（线程池在多个批次之间复用）
+        - 每个提供商单独限制并发数（如本地Ollama只允许少量并发），限制在多个批次之间共享；
+          按请求实际发送到的提供商（自动任务类型、上下文窗口、自适应路由或备选切换之后）占用名额
+        - 同一批次内相同的提示只请求一次，结果复制给所有重复项
+        """
+        self.router = router
+        self.max_workers = max_workers
+        self.default_provider_concurrency = default_provider_concurrency
+        self.provider_concurrency = provider_concurrency or {}
+        self._semaphores = {}
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取批量请求共用的线程池（首次使用时创建）"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ccli-batch")
+            return self._executor
+    
+    def close(self):
+        """关闭线程池（已在执行的请求继续完成）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+    
+    def _semaphore_for(self, provider_name: str) -> threading.BoundedSemaphore:
+        """获取提供商对应的并发信号量（首次使用时创建）"""
+        with self._lock:
+            semaphore = self._semaphores.get(provider_name)
+            if semaphore is None:
+                limit = self.provider_concurrency.get(provider_name, self.default_provider_concurrency)
+                semaphore = threading.BoundedSemaphore(max(1, int(limit)))
+                self._semaphores[provider_name] = semaphore
+            return semaphore
+    
+    def _run_one(self, task_type: str, prompt: str, use_cache: bool, submitted_at: float) -> Dict[str, Any]:
+        """
+        执行单个请求并记录排队时间（线程池和提供商并发名额）和执行时间
+        provider为最后实际发送到的提供商（命中缓存时为None）
+        """
+        started_at = time.perf_counter()
+        result = {
+            "provider": None,
+            "wait": started_at - submitted_at
+        }
+        
+        @contextmanager
+        def provider_slot(provider_name):
+            result["provider"] = provider_name
+            waited_at = time.perf_counter()
+            with self._semaphore_for(provider_name):
+                result["wait"] += time.perf_counter() - waited_at
+                yield
+        
+        try:
+            result["response"] = self.router.send_request(task_type, prompt, use_cache=use_cache,
+                                                          provider_slot=provider_slot)
+        except Exception as e:
+            result["response"] = None
+            result["error"] = str(e)
+        result["elapsed"] = time.perf_counter() - submitted_at - result["wait"]
+        return result
+    
+    def _expand(self, prompt: str, indices: List[int], result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """将去重后的结果展开为每个原始条目的结果"""
+        items = []
+        for position, index in enumerate(indices):
+            item = dict(result, index=index, prompt=prompt, deduplicated=position > 0)
+            if position > 0:
+                item["response"] = copy.deepcopy(result["response"])
+            items.append(item)
+        return items
+    
+    def iterate(self, task_type: str, prompts: Iterable[str], use_cache: bool = True,
+                ordered: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        批量执行请求并逐条产出结果
+        
+        Args:
+            task_type: 任务类型
+            prompts: 提示列表
+            use_cache: 是否使用响应缓存
+            ordered: 为True时按输入顺序产出，否则按完成顺序产出
+        
+        Yields:
+            每个条目的结果：index、prompt、provider、response、wait（排队秒数）、
+            elapsed（执行秒数）、deduplicated（是否复用了批次内相同提示的结果），失败时带error
+        """
+        groups = OrderedDict()
+        for index, prompt in enumerate(prompts):
+            groups.setdefault(prompt, []).append(index)
+        if not groups:
+            return
+        
+        executor = self._get_executor()
+        futures = {}
+        try:
+            submitted_at = time.perf_counter()
+            for prompt in groups:
+                futures[executor.submit(self._run_one, task_type, prompt, use_cache, submitted_at)] = prompt
+            pending = {}
+            next_index = 0
+            for future in as_completed(futures):
+                prompt = futures[future]
+                items = self._expand(prompt, groups[prompt], future.result())
+                if not ordered:
+                    yield from items
+                    continue
+                for item in items:
+                    pending[item["index"]] = item
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+        finally:
+            # 调用方提前停止迭代时取消本批次尚未开始的请求（线程池继续供后续批次使用）
+            for future in futures:
+                future.cancel()
+    
+    def run(self, task_type: str, prompts: Iterable[str], use_cache: bool = True) -> List[Dict[str, Any]]:
+        """批量执行请求，按输入顺序返回全部结果"""
+        return list(self.iterate(task_type, prompts, use_cache=use_cache, ordered=True))
@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import Dict, Any
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30, half_open_max_calls: int = 1):
+        """
+        提供商熔断器
+        - closed：正常放行，连续失败达到failure_threshold次后打开
+        - open：直接拒绝请求（路由立即切换到下一个备选提供商），reset_timeout秒后进入半开
+        - half_open：只放行half_open_max_calls个探测请求，成功则关闭，失败则重新打开
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probes = 0
+        self._lock = threading.Lock()
+    
+    def allow_request(self) -> bool:
+        """判断当前是否允许向该提供商发送请求"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probes = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+    
+    def is_available(self) -> bool:
+        """判断提供商当前是否可用（不占用半开状态的探测名额）"""
+        with self._lock:
+            return self.state != self.OPEN or time.monotonic() - self.opened_at >= self.reset_timeout
+    
+    def record_success(self):
+        """记录一次成功请求"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probes = 0
+    
+    def record_failure(self):
+        """记录一次失败请求"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probes = 0
+    
+    def release(self):
+        """
+        请求结束但结果不反映提供商的健康状况（如无效请求、请求被取消）：不改变状态，
+        只归还半开状态的探测名额，以便下一个请求继续探测
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取熔断器状态"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "rejected": self.rejected
+            }
@@ -0,0 +1,137 @@
+import threading
+import time
+from typing import Dict, Any, Callable, List, Mapping, Optional
+from integrations.api_providers.errors import ProviderError, classify_error
+
+# 提供商的健康状态：尚未探测、正常、降级（偶发失败或探测过慢）、不可用（连续失败或认证失败）
+UNKNOWN = "unknown"
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+UNHEALTHY = "unhealthy"
+
+class HealthProber:
+    def __init__(self, providers: Callable[[], Mapping[str, Any]], interval: float = 30.0, timeout: float = 5.0,
+                 failure_threshold: int = 2, degraded_latency: Optional[float] = None):
+        """
+        后台健康探测器
+        - 后台线程每interval秒对providers()返回的每个提供商实例调用probe（如列出模型，超时timeout秒），
+          记录健康状态、探测延迟和上游可用的模型
+        - 探测成功为healthy（延迟超过degraded_latency时为degraded）；失败为degraded，
+          连续失败failure_threshold次或认证失败（配置错误，再试也不会成功）为unhealthy
+        - 路由和/api/routes只读取已保存的状态，请求路径上不发起任何网络请求
+        """
+        self.providers = providers
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.degraded_latency = degraded_latency
+        self._status = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def probe_provider(self, name: str, provider: Any) -> Dict[str, Any]:
+        """探测单个提供商并更新其状态，返回新的状态"""
+        start = time.perf_counter()
+        models = []
+        error = None
+        try:
+            models = list(provider.probe(self.timeout))
+        except ProviderError as e:
+            error = e
+        except Exception as e:
+            error = classify_error(e, name)
+        latency = time.perf_counter() - start
+        
+        with self._lock:
+            previous = self._status.get(name, {})
+            failures = 0 if error is None else previous.get("consecutive_failures", 0) + 1
+            if error is None:
+                slow = self.degraded_latency is not None and latency > self.degraded_latency
+                status = DEGRADED if slow else HEALTHY
+            elif error.error_type == "auth" or failures >= self.failure_threshold:
+                status = UNHEALTHY
+            else:
+                status = DEGRADED
+            self._status[name] = {
+                "status": status,
+                "latency": round(latency, 4),
+                # 探测失败时保留上一次获取到的模型列表
+                "models": models if error is None else previous.get("models", []),
+                "error": None if error is None else str(error),
+                "error_type": None if error is None else error.error_type,
+                "consecutive_failures": failures,
+                "checked_at": time.time()
+            }
+            return dict(self._status[name])
+    
+    def check(self):
+        """探测所有已配置的提供商一次，并丢弃已从配置中移除的提供商的状态"""
+        try:
+            providers = dict(self.providers())
+        except Exception as e:
+            print(f"获取提供商列表失败: {e}")
+            return
+        for name, provider in providers.items():
+            if self._stop.is_set():
+                return
+            if provider is not None:
+                self.probe_provider(name, provider)
+        with self._lock:
+            for name in [name for name in self._status if name not in providers]:
+                del self._status[name]
+    
+    def status(self, name: str) -> str:
+        """提供商的健康状态（尚未探测时为unknown）"""
+        with self._lock:
+            return self._status.get(name, {}).get("status", UNKNOWN)
+    
+    def is_available(self, name: str, model: Optional[str] = None) -> bool:
+        """
+        提供商（和模型）是否可用：unhealthy时不可用；探测获取到模型列表且其中没有该模型时不可用
+        （Ollama的模型名可能带 ":latest" 标签）；尚未探测的提供商视为可用
+        """
+        with self._lock:
+            entry = self._status.get(name)
+            if entry is None:
+                return True
+            if entry["status"] == UNHEALTHY:
+                return False
+            models: List[str] = entry["models"]
+        return model is None or not models or model in models or f"{model}:latest" in models
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各提供商的健康状态、探测延迟、可用模型、最近的错误和探测时间"""
+        with self._lock:
+            return {name: dict(entry, models=list(entry["models"])) for name, entry in self._status.items()}
+    
+    @property
+    def running(self) -> bool:
+        """后台探测线程是否在运行（已请求停止的线程不计入）"""
+        return self._thread is not None and not self._stop.is_set()
+    
+    def _run(self):
+        """探测循环（启动后立即探测一次）"""
+        while not self._stop.is_set():
+            self.check()
+            if self._stop.wait(self.interval):
+                return
+    
+    def start(self):
+        """启动后台探测（上一个探测线程仍在结束当前探测时先等待其退出，不会有两个探测线程同时运行）"""
+        if self._thread is not None:
+            if not self._stop.is_set():
+                return
+            self._thread.join()
+            self._thread = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ccli-health-prober", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止后台探测（最多等待当前探测结束的timeout+1秒，线程确实退出后才清除）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            if not self._thread.is_alive():
+                self._thread = None
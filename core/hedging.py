@@ -0,0 +1,210 @@
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Dict, Any, Callable, Iterator, Optional
+from core.latency_tracker import LatencyTracker
+from integrations.api_providers.async_support import get_executor
+from integrations.api_providers.cancellation import CancellationToken, RequestCancelledError
+
+_DONE = object()
+
+class HedgingPolicy:
+    def __init__(self, tracker: LatencyTracker, task_types: Optional[Dict[str, Dict[str, Any]]] = None,
+                 min_samples: int = 20):
+        """
+        对冲请求策略（只对task_types中配置的任务类型生效）
+        - 主请求在其历史延迟的指定百分位内没有返回（流式为首个片段）时，向下一个备选提供商发送对冲请求
+        - 先成功返回的一方胜出，另一方的取消令牌被取消（流式请求同时关闭连接）
+        - max_extra_ratio限制对冲请求占该任务类型请求总数的比例，控制额外成本
+        """
+        self.tracker = tracker
+        self.task_types = task_types or {}
+        self.min_samples = min_samples
+        self._counts = {}
+        self._lock = threading.Lock()
+    
+    def enabled_for(self, task_type: str) -> bool:
+        """判断任务类型是否启用对冲"""
+        return task_type in self.task_types
+    
+    def delay_for(self, task_type: str, key: str) -> Optional[float]:
+        """计算发出对冲请求前的等待秒数，历史样本不足时返回None（不对冲）"""
+        options = self.task_types.get(task_type)
+        if options is None:
+            return None
+        delay = self.tracker.percentile(key, options.get("percentile", 95), self.min_samples)
+        if delay is None:
+            return None
+        return max(options.get("min_delay", 0.0), delay)
+    
+    def record_request(self, task_type: str):
+        """记录一次可对冲的请求"""
+        with self._lock:
+            counts = self._counts.setdefault(task_type, {"requests": 0, "hedged": 0, "hedge_wins": 0})
+            counts["requests"] += 1
+    
+    def _try_hedge(self, task_type: str) -> bool:
+        """在额外成本上限内占用一次对冲名额"""
+        ratio = self.task_types.get(task_type, {}).get("max_extra_ratio", 0.1)
+        with self._lock:
+            counts = self._counts.setdefault(task_type, {"requests": 0, "hedged": 0, "hedge_wins": 0})
+            if counts["hedged"] + 1 > ratio * counts["requests"]:
+                return False
+            counts["hedged"] += 1
+            return True
+    
+    def _record_win(self, task_type: str):
+        """记录对冲请求胜出"""
+        with self._lock:
+            self._counts[task_type]["hedge_wins"] += 1
+    
+    @staticmethod
+    def _run_inline(leg: Callable[[CancellationToken], Dict[str, Any]], token: CancellationToken) -> Future:
+        """在当前线程执行一方请求，结果包装为已完成的Future"""
+        future = Future()
+        try:
+            future.set_result(leg(token))
+        except RequestCancelledError as e:
+            future.set_exception(e)
+        return future
+    
+    def call(self, task_type: str, primary: Callable[[CancellationToken], Dict[str, Any]],
+             backup: Callable[[CancellationToken], Dict[str, Any]], delay: float,
+             cancel_token: CancellationToken = None) -> Dict[str, Any]:
+        """
+        执行可对冲的非流式请求，返回第一个成功（不带error字段）的响应
+        - 每一方以cancel_token的子令牌调用，一方胜出后取消另一方，不再占用上游连接和重试
+        - 两方都在共享的阻塞调用线程池中执行；某一方仍在排队（线程池已满）时改在当前线程执行，
+          排队时间不计入对冲等待，也不会因为等待线程池而卡住
+        - 两方都失败时返回最后一个错误响应，都被取消时抛出RequestCancelledError
+        """
+        executor = get_executor()
+        tokens = [CancellationToken(parent=cancel_token), CancellationToken(parent=cancel_token)]
+        legs = [primary, backup]
+        futures = {executor.submit(primary, tokens[0]): 0}
+        try:
+            done, pending = wait(futures, timeout=delay)
+            if not done:
+                future = next(iter(futures))
+                if future.cancel():
+                    # 主请求尚未开始执行，不对冲
+                    futures = {self._run_inline(primary, tokens[0]): 0}
+                elif self._try_hedge(task_type):
+                    futures[executor.submit(backup, tokens[1])] = 1
+            
+            pending = set(futures)
+            response = None
+            error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except RequestCancelledError as e:
+                        error = e
+                        continue
+                    if "error" not in result:
+                        if futures[future] == 1:
+                            self._record_win(task_type)
+                        return result
+                    response = result
+                for future in [future for future in pending if future.cancel()]:
+                    pending.discard(future)
+                    tag = futures.pop(future)
+                    inline = self._run_inline(legs[tag], tokens[tag])
+                    futures[inline] = tag
+                    pending.add(inline)
+            if response is None:
+                raise error
+            return response
+        finally:
+            for token in tokens:
+                token.cancel("对冲请求已由另一方完成")
+    
+    @staticmethod
+    def _pump(factory: Callable[[CancellationToken], Iterator[str]], token: CancellationToken, tag: int,
+              output: queue.Queue, stop: threading.Event):
+        """在线程中读取流并把片段放入队列，收到停止信号后关闭流"""
+        iterator = None
+        try:
+            iterator = factory(token)
+            for chunk in iterator:
+                if stop.is_set():
+                    break
+                output.put((tag, chunk))
+        except Exception as e:
+            output.put((tag, e))
+        finally:
+            if iterator is not None and hasattr(iterator, "close"):
+                iterator.close()
+            output.put((tag, _DONE))
+    
+    def stream(self, task_type: str, primary: Callable[[CancellationToken], Iterator[str]],
+               backup: Callable[[CancellationToken], Iterator[str]], delay: float,
+               cancel_token: CancellationToken = None) -> Iterator[str]:
+        """
+        执行可对冲的流式请求，先产出首个片段的一方胜出，另一方被关闭并取消其子令牌
+        一方在产出任何片段前失败时立即启动另一方（作为备选，不计入对冲比例）；
+        双方都在产出片段前失败时抛出最后一个错误，调用方可以继续尝试其余的备选提供商
+        """
+        output = queue.Queue()
+        stops = [threading.Event(), threading.Event()]
+        tokens = [CancellationToken(parent=cancel_token), CancellationToken(parent=cancel_token)]
+        factories = [primary, backup]
+        running = set()
+        launched = set()
+        errors = {}
+        
+        def start(tag):
+            running.add(tag)
+            launched.add(tag)
+            threading.Thread(target=self._pump, args=(factories[tag], tokens[tag], tag, output, stops[tag]),
+                             name=f"ccli-hedge-stream-{tag}", daemon=True).start()
+        
+        start(0)
+        winner = None
+        try:
+            try:
+                tag, item = output.get(timeout=delay)
+            except queue.Empty:
+                if self._try_hedge(task_type):
+                    start(1)
+                tag, item = output.get()
+            
+            while True:
+                if item is _DONE:
+                    running.discard(tag)
+                    if tag == winner:
+                        return
+                    if winner is None and not running:
+                        if tag in errors:
+                            raise errors[tag]
+                        # 没有产出任何片段的正常结束（空响应）
+                        return
+                elif isinstance(item, Exception):
+                    if tag == winner:
+                        raise item
+                    if winner is None:
+                        errors[tag] = item
+                        if 1 not in launched:
+                            start(1)
+                else:
+                    if winner is None:
+                        winner = tag
+                        stops[1 - tag].set()
+                        tokens[1 - tag].cancel("对冲请求已由另一方完成")
+                        if tag == 1:
+                            self._record_win(task_type)
+                    if tag == winner:
+                        yield item
+                tag, item = output.get()
+        finally:
+            for stop in stops:
+                stop.set()
+            for token in tokens:
+                token.cancel("对冲请求已结束")
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """获取各任务类型的对冲统计"""
+        with self._lock:
+            return {task_type: dict(counts) for task_type, counts in self._counts.items()}
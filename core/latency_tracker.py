@@ -0,0 +1,60 @@
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        """
+        延迟统计
+        - 按键（如 "provider,model"）保存最近window次请求的延迟
+        - 百分位数基于滑动窗口计算，能跟随提供商延迟的变化
+        """
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+    
+    def record(self, key: str, seconds: float):
+        """记录一次请求延迟（秒）"""
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+    
+    def count(self, key: str) -> int:
+        """获取键对应的样本数"""
+        with self._lock:
+            return len(self._samples.get(key, ()))
+    
+    def percentile(self, key: str, percentile: float, min_samples: int = 1) -> Optional[float]:
+        """
+        计算延迟百分位数
+        
+        Args:
+            key: 统计键
+            percentile: 百分位（0-100）
+            min_samples: 最少样本数，不足时返回None
+        
+        Returns:
+            延迟秒数，样本不足时返回None
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(percentile / 100.0 * len(samples))) - 1))
+        return samples[index]
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各键的p50/p95/p99延迟"""
+        with self._lock:
+            keys = list(self._samples)
+        return {
+            key: {
+                "samples": self.count(key),
+                "p50": self.percentile(key, 50),
+                "p95": self.percentile(key, 95),
+                "p99": self.percentile(key, 99)
+            }
+            for key in keys
+        }
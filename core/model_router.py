@@ -1,22 +1,34 @@
 import json
 import os
-from typing import Dict, Any
-from integrations.api_providers import (
-    OpenAIProvider, 
-    AnthropicProvider,
-    OpenRouterProvider,
-    DeepSeekProvider,
-    OllamaProvider,
-    GeminiProvider
-)
-
-# 尝试导入Claude Code集成（如果可用）
-try:
-    from integrations.claude_code import ClaudeCodeAPI, ClaudeCodeIntegration
-    CLAUDE_CODE_AVAILABLE = True
-except ImportError:
-    CLAUDE_CODE_AVAILABLE = False
-    print("Claude Code集成不可用，将使用模拟响应")
+import threading
+import time
+from contextlib import nullcontext
+from types import MappingProxyType
+from typing import Dict, Any, AsyncIterator, Callable, ContextManager, Iterable, Iterator, List, Mapping, Optional, Tuple
+from integrations.api_providers.async_support import iterate_blocking, run_blocking
+from integrations.api_providers.transport import get_shared_transport
+from core.adaptive_timeout import DEFAULT_PROMPT_BUCKETS, AdaptiveTimeouts, Timeouts
+from core.circuit_breaker import CircuitBreaker
+from core.health_prober import HealthProber
+from core.latency_tracker import LatencyTracker
+from core.rate_limiter import RateLimiter, estimate_tokens, response_tokens, text_tokens
+from core.route_policy import RoutePolicy
+from core.route_table import ConfigWatcher, RouteEntry, compile_route_table
+from core.response_cache import ResponseCache
+from core.retry import RetryEngine
+from core.scheduler import PriorityScheduler
+from core.single_flight import SingleFlight
+from core.task_classifier import AUTO_TASK_TYPE
+from core.token_estimator import ContextLengthExceededError, ContextWindows, trim_messages
+from core.usage_tracker import QuotaExceededError, UsageTracker
+from integrations.api_providers.base import BaseAPIProvider
+from integrations.api_providers.cancellation import CancellationToken, RequestCancelledError
+from integrations.api_providers.errors import OverloadedError, ProviderError, ProviderTimeoutError
+from integrations.api_providers.registry import create_provider
+from integrations.api_providers.response import ModelResponse
+
+# 提供商、Claude Code集成、批量执行器和对冲策略均在首次使用时才导入和创建，
+# 一次性的CLI命令不需要为用不到的模块付出启动时间
 
 class ModelRouter:
     def __init__(self, config_path: str = None):
@@ -28,23 +40,86 @@ class ModelRouter:
         self.providers = {}
         self.routes = {}
         self.provider_instances = {}
-        self.claude_code_api = None
-        self.claude_code_integration = None
+        self.config_path = None
+        self.route_table = None
+        self.config_watcher = None
+        self._claude_code = None
+        self._claude_code_route = None
+        self._batch_runner = None
+        self._task_classifier = None
+        self._lazy_lock = threading.RLock()
         self.load_config(config_path)
+        self.response_cache = self._create_response_cache()
+        self.semantic_cache = self._create_semantic_cache()
+        self.single_flight = SingleFlight() if self.config.get("Coalescing", {}).get("enabled", True) else None
+        self.mock_responses = self.config.get("MockResponses", {}).get("enabled", False)
+        self.retry_engine = self._create_retry_engine()
+        self.rate_limiter = self._create_rate_limiter()
+        self.scheduler = self._create_scheduler()
+        self.circuit_breakers = {}
+        self.latency_tracker = LatencyTracker()
+        self.adaptive_timeouts = self._create_adaptive_timeouts()
+        self.hedging = self._create_hedging_policy()
+        self.route_policy = self._create_route_policy()
+        self.usage_tracker = self._create_usage_tracker()
+        self.context_windows = self._create_context_windows()
+        # 后台健康探测由守护进程、网关和Web界面等常驻进程调用start_health_probe启动
+        self.health_prober = self._create_health_prober()
         
-        # 初始化Claude Code集成（如果可用）
-        if CLAUDE_CODE_AVAILABLE:
-            try:
-                self.claude_code_api = ClaudeCodeAPI()
-                self.claude_code_integration = ClaudeCodeIntegration()
-                print("Claude Code集成已初始化")
-            except Exception as e:
-                print(f"Claude Code集成初始化失败: {e}")
+        # 配置文件存在时监视其变化，路由和提供商配置修改后立即生效
+        reload_config = self.config.get("HotReload", {})
+        if reload_config.get("enabled", True) and os.path.exists(self.config_path):
+            self.watch_config(reload_config.get("interval", 1.0))
+    
+    def _get_claude_code(self) -> Tuple[Any, Any]:
+        """
+        获取Claude Code的API和集成实例（首次使用时导入并创建）
+        集成不可用或初始化失败时返回 (None, None)，此后claudeCode任务返回失败响应（启用MockResponses时为模拟响应）
+        """
+        with self._lazy_lock:
+            if self._claude_code is None:
+                self._claude_code = (None, None)
+                try:
+                    from integrations.claude_code import ClaudeCodeAPI, ClaudeCodeIntegration
+                    self._claude_code = (ClaudeCodeAPI(), ClaudeCodeIntegration())
+                    print("Claude Code集成已初始化")
+                except ImportError:
+                    print("Claude Code集成不可用")
+                except Exception as e:
+                    print(f"Claude Code集成初始化失败: {e}")
+            return self._claude_code
+    
+    @property
+    def claude_code_api(self):
+        """Claude Code API实例（首次访问时创建，不可用时为None）"""
+        return self._get_claude_code()[0]
+    
+    @property
+    def claude_code_integration(self):
+        """Claude Code集成实例（首次访问时创建，不可用时为None）"""
+        return self._get_claude_code()[1]
+    
+    @property
+    def batch_runner(self):
+        """批量请求执行器（首次使用时按Batch配置创建）"""
+        with self._lazy_lock:
+            if self._batch_runner is None:
+                self._batch_runner = self._create_batch_runner()
+            return self._batch_runner
+
+    @property
+    def task_classifier(self):
+        """任务类型分类器（首次使用auto任务类型时按TaskClassifier配置创建，enabled为false时为None）"""
+        with self._lazy_lock:
+            if self._task_classifier is None:
+                self._task_classifier = self._create_task_classifier()
+            return self._task_classifier or None
 
     def load_config(self, config_path: str = None):
         """加载配置文件"""
         if config_path is None:
             config_path = os.path.expanduser("~/.ccli/config.json")
+        self.config_path = config_path
         
         if os.path.exists(config_path):
             with open(config_path, 'r', encoding='utf-8') as f:
@@ -57,8 +132,264 @@ class ModelRouter:
             print("未找到配置文件，使用默认配置")
             self._set_default_config()
         
-        # 初始化提供商实例
-        self._initialize_provider_instances()
+        # 配置共享HTTP传输层（连接池大小、超时）
+        transport_config = self.config.get("Transport")
+        if transport_config:
+            BaseAPIProvider.configure_transport(**transport_config)
+        
+        # 编译路由表（提供商实例在首次使用时创建）
+        self._compile_routes()
+
+    def reload_config(self) -> bool:
+        """
+        重新读取配置文件中的Providers和Router，编译新的路由表并原子替换
+        配置无效时保留当前路由表；其他配置节（缓存、限流等）需重启后生效
+        """
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"配置重新加载失败，继续使用当前路由: {e}")
+            return False
+        
+        providers = config.get("Providers", {})
+        routes = config.get("Router", {})
+        with self._lazy_lock:
+            # 配置未变化且已创建的提供商沿用现有实例，其余在首次使用时按新配置创建
+            provider_instances = {
+                provider_name: self.provider_instances[provider_name]
+                for provider_name, provider_config in providers.items()
+                if self.providers.get(provider_name) == provider_config and provider_name in self.provider_instances
+            }
+            route_table = compile_route_table(providers, routes, provider_instances, self.route_table.version + 1)
+            self.config = dict(self.config, Providers=providers, Router=routes)
+            self.providers = providers
+            self.routes = routes
+            self.provider_instances = provider_instances
+            self.route_table = route_table
+        print(f"路由配置已重新加载（版本 {route_table.version}）")
+        return True
+
+    def watch_config(self, interval: float = 1.0):
+        """在后台监视配置文件，变化时自动重新加载路由"""
+        if self.config_watcher is None:
+            self.config_watcher = ConfigWatcher(self.config_path, self.reload_config, interval)
+            self.config_watcher.start()
+
+    def stop_watching_config(self):
+        """停止监视配置文件"""
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+            self.config_watcher = None
+
+    def _create_response_cache(self):
+        """根据Cache配置创建响应缓存（enabled为false时不启用）"""
+        cache_config = self.config.get("Cache", {})
+        if not cache_config.get("enabled", True):
+            return None
+        disk_path = None
+        if cache_config.get("disk", False):
+            disk_path = cache_config.get("disk_path", "~/.ccli/response_cache.db")
+        return ResponseCache(
+            max_entries=cache_config.get("max_entries", 1024),
+            default_ttl=cache_config.get("default_ttl", 3600),
+            ttls=cache_config.get("ttl", {}),
+            disk_path=disk_path
+        )
+
+    def _create_task_classifier(self):
+        """根据TaskClassifier配置创建任务类型分类器（禁用时返回False，避免重复创建）"""
+        classifier_config = self.config.get("TaskClassifier", {})
+        if not classifier_config.get("enabled", True):
+            return False
+        from core.task_classifier import TaskClassifier
+        return TaskClassifier(
+            examples=classifier_config.get("examples", {}),
+            rule_weight=classifier_config.get("rule_weight", 0.6),
+            min_confidence=classifier_config.get("min_confidence", 0.4),
+            max_decisions=classifier_config.get("max_decisions", 500)
+        )
+
+    def _create_batch_runner(self):
+        """根据Batch配置创建批量请求执行器"""
+        from core.batch import BatchRunner
+        batch_config = self.config.get("Batch", {})
+        return BatchRunner(
+            self,
+            max_workers=batch_config.get("max_workers", 16),
+            default_provider_concurrency=batch_config.get("default_provider_concurrency", 8),
+            provider_concurrency=batch_config.get("provider_concurrency", {})
+        )
+
+    def _create_rate_limiter(self):
+        """根据RateLimit配置创建按提供商和模型的自适应限流器（enabled为false时不启用）"""
+        rate_config = self.config.get("RateLimit", {})
+        if not rate_config.get("enabled", True):
+            return None
+        return RateLimiter(
+            default=rate_config.get("default", {}),
+            limits=rate_config.get("limits", {}),
+            # 启用重试引擎时429由重试引擎按重试预算统一重试，限流器不再单独重试
+            max_retries=0 if self.retry_engine is not None else rate_config.get("max_retries", 3),
+            base_backoff=rate_config.get("base_backoff", 1.0),
+            max_backoff=rate_config.get("max_backoff", 30.0)
+        )
+
+    def _create_retry_engine(self):
+        """根据Retry配置创建路由层的重试引擎（enabled为false时不启用）"""
+        retry_config = self.config.get("Retry", {})
+        if not retry_config.get("enabled", True):
+            return None
+        return RetryEngine(
+            max_attempts=retry_config.get("max_attempts", 3),
+            base_backoff=retry_config.get("base_backoff", 0.5),
+            max_backoff=retry_config.get("max_backoff", 20.0),
+            retry_on=retry_config.get("retry_on"),
+            budget=retry_config.get("budget", {})
+        )
+
+    def _create_adaptive_timeouts(self):
+        """根据Timeouts配置创建按延迟百分位推算的自适应超时（enabled为false时不启用，提供商使用固定的默认超时）"""
+        timeout_config = self.config.get("Timeouts", {})
+        if not timeout_config.get("enabled", True):
+            return None
+        return AdaptiveTimeouts(
+            percentile=timeout_config.get("percentile", 99.0),
+            multiplier=timeout_config.get("multiplier", 2.0),
+            min_samples=timeout_config.get("min_samples", 20),
+            window=timeout_config.get("window", 200),
+            prompt_buckets=timeout_config.get("prompt_buckets", DEFAULT_PROMPT_BUCKETS),
+            limits=timeout_config.get("limits", {}),
+            overrides=timeout_config.get("overrides", {})
+        )
+
+    def _create_health_prober(self):
+        """根据HealthProbe配置创建后台健康探测器（enabled为false时不启用）"""
+        probe_config = self.config.get("HealthProbe", {})
+        if not probe_config.get("enabled", True):
+            return None
+        return HealthProber(
+            self._probe_targets,
+            interval=probe_config.get("interval", 30.0),
+            timeout=probe_config.get("timeout", 5.0),
+            failure_threshold=probe_config.get("failure_threshold", 2),
+            degraded_latency=probe_config.get("degraded_latency")
+        )
+
+    def _probe_targets(self) -> Dict[str, Any]:
+        """健康探测的对象：当前配置中的每个提供商的实例（不支持的提供商为None）"""
+        return {
+            provider_config.get("name", provider_name): self.get_provider_instance(provider_name)
+            for provider_name, provider_config in list(self.providers.items())
+        }
+
+    def start_health_probe(self):
+        """在后台定期探测各提供商的健康状态（未启用HealthProbe时不做任何事）"""
+        if self.health_prober is not None:
+            self.health_prober.start()
+
+    def stop_health_probe(self):
+        """停止后台健康探测"""
+        if self.health_prober is not None:
+            self.health_prober.stop()
+
+    def _create_scheduler(self):
+        """根据Scheduler配置创建按优先级类别的请求调度器（enabled为false时不启用）"""
+        scheduler_config = self.config.get("Scheduler", {})
+        if not scheduler_config.get("enabled", True):
+            return None
+        return PriorityScheduler(
+            max_concurrency=scheduler_config.get("max_concurrency", 64),
+            classes=scheduler_config.get("classes", {}),
+            task_classes=scheduler_config.get("task_classes", {}),
+            default_class=scheduler_config.get("default_class", "interactive"),
+            yield_threshold=scheduler_config.get("yield_threshold", 0.75),
+            max_async_waiters=scheduler_config.get("max_async_waiters", 512)
+        )
+
+    def _breaker_for(self, provider_name: str):
+        """获取提供商对应的熔断器（首次使用时按CircuitBreaker配置创建，enabled为false时返回None）"""
+        breaker_config = self.config.get("CircuitBreaker", {})
+        if not breaker_config.get("enabled", True):
+            return None
+        breaker = self.circuit_breakers.get(provider_name)
+        if breaker is None:
+            breaker = self.circuit_breakers.setdefault(provider_name, CircuitBreaker(
+                failure_threshold=breaker_config.get("failure_threshold", 3),
+                reset_timeout=breaker_config.get("reset_timeout", 30),
+                half_open_max_calls=breaker_config.get("half_open_max_calls", 1)
+            ))
+        return breaker
+
+    def _create_hedging_policy(self):
+        """根据Hedging配置创建对冲请求策略（需显式启用，只对配置的任务类型生效）"""
+        hedging_config = self.config.get("Hedging", {})
+        if not hedging_config.get("enabled", False):
+            return None
+        from core.hedging import HedgingPolicy
+        return HedgingPolicy(
+            self.latency_tracker,
+            task_types=hedging_config.get("task_types", {}),
+            min_samples=hedging_config.get("min_samples", 20)
+        )
+
+    def _create_route_policy(self) -> RoutePolicy:
+        """根据RoutePolicy配置创建自适应路由策略（默认static，按配置顺序路由）"""
+        policy_config = self.config.get("RoutePolicy", {})
+        return RoutePolicy(
+            strategy=policy_config.get("strategy", "static"),
+            latency_weight=policy_config.get("latency_weight", 0.5),
+            cost_weight=policy_config.get("cost_weight", 0.2),
+            latency_ceiling=policy_config.get("latency_ceiling", 30.0),
+            cost_ceiling=policy_config.get("cost_ceiling", 0.05),
+            half_life=policy_config.get("half_life", 1800),
+            ucb_c=policy_config.get("ucb_c", 1.0),
+            prices=policy_config.get("prices", {})
+        )
+
+    def _create_usage_tracker(self):
+        """根据Usage配置创建用量统计与预算（enabled为false时不启用）"""
+        usage_config = self.config.get("Usage", {})
+        if not usage_config.get("enabled", True):
+            return None
+        return UsageTracker(
+            store_path=usage_config.get("store_path", "~/.ccli/usage.db"),
+            flush_interval=usage_config.get("flush_interval", 30.0),
+            budgets=usage_config.get("budgets", {})
+        )
+
+    def _create_context_windows(self):
+        """根据ContextWindow配置创建模型上下文窗口表（enabled为false时不检查上下文长度）"""
+        context_config = self.config.get("ContextWindow", {})
+        if not context_config.get("enabled", True):
+            return None
+        return ContextWindows(context_config.get("windows", {}))
+
+    def _create_semantic_cache(self):
+        """根据SemanticCache配置创建语义缓存（需显式启用，依赖numpy）"""
+        semantic_config = self.config.get("SemanticCache", {})
+        if not semantic_config.get("enabled", False):
+            return None
+        try:
+            from core.semantic_cache import SemanticCache, HashingEmbedder, OllamaEmbedder
+            if semantic_config.get("embedder") == "ollama":
+                ollama_config = self.providers.get("ollama", {})
+                embedder = OllamaEmbedder(
+                    base_url=ollama_config.get("api_base_url", "http://localhost:11434/api"),
+                    model=semantic_config.get("embedding_model", "nomic-embed-text")
+                )
+            else:
+                embedder = HashingEmbedder(dim=semantic_config.get("dim", 512))
+            return SemanticCache(
+                embedder=embedder,
+                capacity=semantic_config.get("capacity", 2048),
+                default_threshold=semantic_config.get("threshold", 0.92),
+                thresholds=semantic_config.get("thresholds", {}),
+                ttl=semantic_config.get("ttl", 3600)
+            )
+        except ImportError as e:
+            print(f"语义缓存不可用: {e}")
+            return None
 
     def _set_default_config(self):
         """设置默认配置"""
@@ -109,100 +440,195 @@ class ModelRouter:
             "claudeCode": "anthropic,claude-3-opus-20240229"
         }
 
-    def _initialize_provider_instances(self):
-        """初始化提供商实例"""
-        for provider_name, provider_config in self.providers.items():
-            api_key = provider_config.get("api_key", "")
-            base_url = provider_config.get("api_base_url", "")
-            
-            if provider_name == "openai":
-                self.provider_instances[provider_name] = OpenAIProvider(
-                    api_key=api_key, base_url=base_url
-                )
-            elif provider_name == "anthropic":
-                self.provider_instances[provider_name] = AnthropicProvider(
-                    api_key=api_key, base_url=base_url
-                )
-            elif provider_name == "openrouter":
-                self.provider_instances[provider_name] = OpenRouterProvider(
-                    api_key=api_key, base_url=base_url
-                )
-            elif provider_name == "deepseek":
-                self.provider_instances[provider_name] = DeepSeekProvider(
-                    api_key=api_key, base_url=base_url
-                )
-            elif provider_name == "ollama":
-                self.provider_instances[provider_name] = OllamaProvider(
-                    api_key=api_key, base_url=base_url
-                )
-            elif provider_name == "gemini":
-                self.provider_instances[provider_name] = GeminiProvider(
-                    api_key=api_key, base_url=base_url
-                )
-            # 可以在这里添加更多提供商的初始化逻辑
+    def _create_provider_instance(self, provider_name: str, provider_config: Mapping[str, Any]):
+        """根据提供商配置创建实例（通过提供商注册表），不支持的提供商返回None"""
+        return create_provider(
+            provider_name,
+            api_key=provider_config.get("api_key", ""),
+            base_url=provider_config.get("api_base_url", ""),
+            mock_fallback=provider_config.get("mock_fallback", self.mock_responses)
+        )
+        
+    def get_provider_instance(self, provider_name: str):
+        """
+        获取提供商实例，首次使用时创建并重新编译路由表，之后的请求直接使用路由表中的实例
+        不支持或未配置的提供商返回None
+        """
+        instance = self.provider_instances.get(provider_name)
+        if instance is not None:
+            return instance
+        with self._lazy_lock:
+            instance = self.provider_instances.get(provider_name)
+            if instance is None:
+                provider_config = next((config for name, config in self.providers.items()
+                                        if name == provider_name or config.get("name") == provider_name), None)
+                if provider_config is None:
+                    return None
+                instance = self._create_provider_instance(provider_name, provider_config)
+                if instance is None:
+                    return None
+                self.provider_instances[provider_name] = instance
+                self._compile_routes()
+            return instance
 
-    def get_provider_for_task(self, task_type: str = "default") -> Dict[str, Any]:
+    def set_provider_instance(self, provider_name: str, instance: BaseAPIProvider):
+        """替换提供商实例并重新编译路由表"""
+        with self._lazy_lock:
+            self.provider_instances[provider_name] = instance
+            self._compile_routes()
+
+    def _compile_routes(self):
+        """将当前的Providers和Router配置编译为只读路由表，并原子替换"""
+        version = self.route_table.version + 1 if getattr(self, "route_table", None) else 1
+        self.route_table = compile_route_table(self.providers, self.routes, self.provider_instances, version)
+
+    def get_route_candidates(self, task_type: str = "default") -> Tuple[RouteEntry, ...]:
         """
-        根据任务类型获取对应的提供商配置
+        按优先顺序获取任务类型的候选路由条目（来自编译后的路由表，不分配新对象）
+        路由可以是单个 "provider,model" 字符串，也可以是按顺序排列的备选列表
         """
-        # 特殊处理Claude Code任务类型
-        if task_type == "claudeCode" and CLAUDE_CODE_AVAILABLE and self.claude_code_api:
-            return {
-                "name": "claudeCode",
-                "type": "claudeCode",
-                "api_key": os.getenv("CLAUDE_API_KEY", "sk-xxx")
-            }
-        
-        route = self.routes.get(task_type, self.routes.get("default"))
-        if not route:
-            # 如果没有找到路由，返回默认提供商
-            return list(self.providers.values())[0] if self.providers else {}
-        
-        # 解析路由格式 "provider,model"
-        parts = route.split(",", 1)
-        provider_name = parts[0]
-        
-        # 查找提供商配置
-        for name, provider in self.providers.items():
-            if provider.get("name") == provider_name:
-                provider_config = provider.copy()
-                if len(parts) > 1:
-                    provider_config["model"] = parts[1]
-                return provider_config
-        
-        # 如果没有找到指定的提供商，返回默认提供商
-        return list(self.providers.values())[0] if self.providers else {}
+        # 特殊处理Claude Code任务类型（集成可用时）
+        if task_type == "claudeCode":
+            if self._claude_code_route is None:
+                self._claude_code_route = (RouteEntry("claudeCode", None, MappingProxyType({
+                    "name": "claudeCode",
+                    "type": "claudeCode",
+                    "api_key": os.getenv("CLAUDE_API_KEY", "sk-xxx")
+                }), None),) if self.claude_code_api else ()
+            if self._claude_code_route:
+                return self._claude_code_route
+        return self.route_table.candidates(task_type)
 
-    def route_request(self, task_type: str, prompt: str) -> Dict[str, Any]:
+    def get_provider_for_task(self, task_type: str = "default") -> Mapping[str, Any]:
         """
-        路由请求到合适的模型
+        根据任务类型获取对应的提供商配置（备选列表中的第一个，只读）
         """
-        provider_config = self.get_provider_for_task(task_type)
-        provider_name = provider_config.get("name", "openai")
+        return self.get_route_candidates(task_type)[0].config
+
+    def _build_routed_request(self, entry: RouteEntry, prompt: str, messages: List[Dict[str, Any]] = None,
+                              temperature: float = None, max_tokens: int = None) -> Dict[str, Any]:
+        """为单个候选路由条目构造请求（messages为完整的对话历史，未提供时由prompt构造）"""
+        provider_config = entry.config
+        provider_name = entry.provider_name
+        temperature = 0.7 if temperature is None else temperature
+        max_tokens = 1000 if max_tokens is None else max_tokens
         
         # 特殊处理Claude Code
         if provider_name == "claudeCode":
             request_data = {
                 "prompt": prompt,
                 "model": "claude-3-opus-20240229",
-                "max_tokens": 1000,
-                "temperature": 0.7
+                "max_tokens": max_tokens,
+                "temperature": temperature
             }
         else:
             model = provider_config.get("model", "gpt-3.5-turbo")
             request_data = {
                 "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.7,
-                "max_tokens": 1000
+                "messages": list(messages) if messages else [{"role": "user", "content": prompt}],
+                "temperature": temperature,
+                "max_tokens": max_tokens
             }
         
         return {
             "provider": provider_config,
             "request": request_data,
-            "provider_instance": self.provider_instances.get(provider_name) if provider_name != "claudeCode" else None
+            "provider_instance": entry.instance or self.get_provider_instance(provider_name)
         }
 
+    def select_task_type(self, task_type: str, prompt: str, messages: List[Dict[str, Any]] = None) -> str:
+        """
+        确定请求的任务类型：task_type为auto时由本地分类器按提示（或最后一条用户消息）选择，否则原样返回
+        分类器只在已配置路由的任务类型中选择，并按RoutePolicy.prices记录相对default路由估算节省的成本
+        """
+        if task_type != AUTO_TASK_TYPE:
+            return task_type
+        classifier = self.task_classifier
+        if classifier is None:
+            return "default"
+        text = next((message.get("content", "") for message in reversed(messages or [])
+                     if message.get("role") == "user"), prompt)
+        text = text if isinstance(text, str) else str(text)
+        allowed = [name for name in self.routes if name not in ("claudeCode", AUTO_TASK_TYPE)] + ["default"]
+        chosen, decision = classifier.classify(text, allowed)
+        saved = self._primary_price("default") - self._primary_price(chosen)
+        decision["estimated_savings"] = round(saved * estimate_tokens([{"content": text}]) / 1000.0, 6)
+        return chosen
+
+    def _primary_price(self, task_type: str) -> float:
+        """任务类型主候选每千token的价格（RoutePolicy.prices，未配置时为0）"""
+        candidates = self.get_route_candidates(task_type)
+        if not candidates:
+            return 0.0
+        return self.route_policy.price_for(f"{candidates[0].provider_name},{candidates[0].model}")
+
+    def context_window_for(self, task_type: str) -> int:
+        """获取任务类型主提供商模型的上下文窗口，未知时返回None"""
+        if self.context_windows is None:
+            return None
+        return self.context_windows.window_for(self.get_route_candidates(task_type)[0].model)
+
+    def fit_context(self, task_type: str, prompt: str, messages: List[Dict[str, Any]] = None,
+                    max_tokens: int = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        在发出请求前按本地估算的token数检查上下文长度
+        - 超出任务类型模型的上下文窗口时，改用长上下文路由（ContextWindow.long_context_task_type）
+        - 长上下文路由也放不下时，按overflow配置丢弃最早的对话轮次（trim）或直接拒绝（reject）
+        
+        Returns:
+            (实际使用的任务类型, 实际发送的消息列表，未修改时为原messages)
+        
+        Raises:
+            ContextLengthExceededError: 请求无法放入任何可用路由的上下文窗口
+        """
+        window = self.context_window_for(task_type)
+        if window is None:
+            return task_type, messages
+        context_config = self.config.get("ContextWindow", {})
+        request_messages = messages or [{"role": "user", "content": prompt}]
+        reserved = 1000 if max_tokens is None else max_tokens
+        required = estimate_tokens(request_messages) + reserved
+        if required <= window:
+            return task_type, messages
+        
+        long_task_type = context_config.get("long_context_task_type", "longContext")
+        if task_type != long_task_type and long_task_type in self.routes:
+            long_window = self.context_window_for(long_task_type)
+            if long_window is None or required <= long_window:
+                print(f"请求约 {required} 个token，超出 {task_type} 路由的上下文窗口 {window}，改用 {long_task_type} 路由")
+                return long_task_type, messages
+            if long_window > window:
+                task_type, window = long_task_type, long_window
+        
+        if context_config.get("overflow", "trim") == "trim" and len(request_messages) > 1:
+            trimmed = trim_messages(request_messages, window - reserved)
+            if trimmed is not None:
+                print(f"请求超出上下文窗口 {window}，已丢弃 {len(request_messages) - len(trimmed)} 条最早的消息")
+                return task_type, trimmed
+        raise ContextLengthExceededError(self.get_route_candidates(task_type)[0].model, required, window)
+
+    def route_request(self, task_type: str, prompt: str, messages: List[Dict[str, Any]] = None,
+                      temperature: float = None, max_tokens: int = None, user_id: str = None,
+                      cancel_token: CancellationToken = None) -> Dict[str, Any]:
+        """
+        路由请求到合适的模型
+        fallbacks中按顺序保存备选提供商的请求，主提供商失败或熔断时依次尝试
+        启用自适应路由策略时，主提供商由策略根据观测到的延迟、错误率和成本选出
+        """
+        candidates = [self._build_routed_request(entry, prompt, messages, temperature, max_tokens)
+                      for entry in self.get_route_candidates(task_type)]
+        for candidate in candidates:
+            # 用量按发起请求的用户统计；取消令牌随请求传给每个候选提供商
+            candidate["user_id"] = user_id
+            candidate["cancel_token"] = cancel_token
+        if self.route_policy.enabled and len(candidates) > 1:
+            # 自适应路由：选中的候选作为主提供商，其余候选保持配置顺序作为备选
+            index = self.route_policy.choose(task_type, [self._latency_key(candidate) for candidate in candidates])
+            candidates.insert(0, candidates.pop(index))
+        routed_request = candidates[0]
+        routed_request["fallbacks"] = candidates[1:]
+        return routed_request
+
     def add_provider(self, name: str, api_base_url: str, api_key: str, models: list):
         """添加新的提供商"""
         provider = {
@@ -212,56 +638,809 @@ class ModelRouter:
             "models": models
         }
         self.providers[name] = provider
+        self._compile_routes()
         print(f"已添加提供商: {name}")
 
-    def update_route(self, task_type: str, provider_name: str, model: str):
-        """更新路由配置"""
+    def update_route(self, task_type: str, provider_name: str, model: str, fallbacks: List[str] = None):
+        """
+        更新路由配置
+        fallbacks为按顺序排列的备选 "provider,model" 列表
+        """
         route_key = f"{provider_name},{model}"
-        self.routes[task_type] = route_key
-        print(f"已更新路由: {task_type} -> {route_key}")
+        self.routes[task_type] = [route_key] + list(fallbacks) if fallbacks else route_key
+        self._compile_routes()
+        print(f"已更新路由: {task_type} -> {' -> '.join([route_key] + list(fallbacks or []))}")
+
+    def get_transport_metrics(self) -> Dict[str, Any]:
+        """获取共享HTTP传输层的连接复用指标"""
+        return get_shared_transport().get_metrics()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取响应缓存的命中统计"""
+        if self.response_cache is None:
+            stats = {"enabled": False}
+        else:
+            stats = dict(self.response_cache.stats(), enabled=True)
+        if self.semantic_cache is not None:
+            stats["semantic"] = self.semantic_cache.stats()
+        return stats
+
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """获取在途请求合并统计（coalesced为共享了其他请求结果的调用次数）"""
+        if self.single_flight is None:
+            return {"enabled": False}
+        return dict(self.single_flight.stats(), enabled=True)
 
-    def send_request(self, task_type: str, prompt: str) -> Dict[str, Any]:
+    def get_rate_limit_stats(self) -> Dict[str, Any]:
+        """获取各提供商和模型的限流统计（当前并发上限、429次数、令牌余量等）"""
+        if self.rate_limiter is None:
+            return {"enabled": False}
+        return {"enabled": True, "limits": self.rate_limiter.stats()}
+
+    def get_retry_stats(self) -> Dict[str, Any]:
+        """获取各路由（提供商,模型）的重试统计（重试次数、预算用尽次数、按类别的错误数）"""
+        if self.retry_engine is None:
+            return {"enabled": False}
+        return {"enabled": True, "routes": self.retry_engine.stats()}
+
+    def get_timeout_stats(self) -> Dict[str, Any]:
+        """获取各路由（提供商,模型）的首字节和总耗时百分位、当前的自适应超时和超时触发次数"""
+        if self.adaptive_timeouts is None:
+            return {"enabled": False}
+        return {"enabled": True, "routes": self.adaptive_timeouts.stats()}
+
+    def get_health_stats(self) -> Dict[str, Any]:
+        """获取后台健康探测保存的各提供商状态（不发起网络请求）"""
+        if self.health_prober is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "running": self.health_prober.running,
+            "interval": self.health_prober.interval,
+            "providers": self.health_prober.stats()
+        }
+
+    def get_scheduler_stats(self) -> Dict[str, Any]:
+        """获取优先级调度统计"""
+        if self.scheduler is None:
+            return {"enabled": False}
+        return dict(self.scheduler.stats(), enabled=True)
+
+    def get_circuit_breaker_stats(self) -> Dict[str, Any]:
+        """获取各提供商熔断器的状态"""
+        return {name: breaker.stats() for name, breaker in list(self.circuit_breakers.items())}
+
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """获取各提供商和模型的延迟百分位（带:ttfb后缀的为流式首个片段延迟）"""
+        return self.latency_tracker.stats()
+
+    def get_hedging_stats(self) -> Dict[str, Any]:
+        """获取各任务类型的对冲请求统计"""
+        if self.hedging is None:
+            return {"enabled": False}
+        return {"enabled": True, "task_types": self.hedging.stats()}
+
+    def get_route_decisions(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """获取最近的自适应路由决策（各候选的分数和选中的候选）"""
+        return self.route_policy.decisions(limit)
+
+    def get_route_policy_stats(self) -> Dict[str, Any]:
+        """获取自适应路由策略对各候选的观测统计"""
+        return {"strategy": self.route_policy.strategy, "candidates": self.route_policy.stats()}
+
+    def get_usage_stats(self, period: str = "day", group_by: str = "provider") -> Dict[str, Any]:
         """
-        发送请求到路由选择的模型
+        获取用量报告和各预算的使用情况
+        
+        Args:
+            period: 统计周期（day为今天，month为本月）
+            group_by: 分组字段（provider、model、task_type、user）
+        """
+        if self.usage_tracker is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "period": period,
+            "group_by": group_by,
+            "usage": self.usage_tracker.report(period, group_by),
+            "budgets": self.usage_tracker.budget_status()
+        }
+
+    def get_classifier_stats(self, limit: int = 20) -> Dict[str, Any]:
+        """获取auto任务类型分类器的统计（决策次数、平均耗时、准确率、估算节省的成本）和最近的决策"""
+        if not self._task_classifier:
+            return {"enabled": self.config.get("TaskClassifier", {}).get("enabled", True), "decisions": 0}
+        return dict(self._task_classifier.stats(), enabled=True, recent=self._task_classifier.decisions(limit))
+
+    def _cache_key(self, routed_request: Dict[str, Any]) -> str:
+        """根据路由结果生成响应缓存键"""
+        request_data = routed_request["request"]
+        messages = request_data.get("messages") or [
+            {"role": "user", "content": request_data.get("prompt", "")}
+        ]
+        return ResponseCache.make_key(
+            routed_request["provider"].get("name", ""),
+            request_data["model"],
+            messages,
+            request_data["temperature"],
+            request_data["max_tokens"]
+        )
+
+    def send_request(self, task_type: str, prompt: str, use_cache: bool = True, messages: List[Dict[str, Any]] = None,
+                     temperature: float = None, max_tokens: int = None, user_id: str = None,
+                     cancel_token: CancellationToken = None,
+                     provider_slot: Callable[[str], ContextManager] = None) -> ModelResponse:
+        """
+        发送请求到路由选择的模型，返回归一化的ModelResponse
+        
+        Args:
+            task_type: 任务类型
+            prompt: 提示文本
+            use_cache: 是否使用响应缓存，为False时绕过缓存直接请求模型
+            messages: 完整的对话历史（可选），提供时代替prompt发送给模型
+            temperature: 采样温度（默认0.7）
+            max_tokens: 最大生成token数（默认1000）
+            user_id: 发起请求的用户ID（用于用量统计和用户预算）
+            cancel_token: 取消令牌（可选），取消后排队、退避重试和备选提供商都不再进行，截止时间限制各级超时
+            provider_slot: 按提供商名返回上下文管理器的函数（可选），实际向某个候选提供商发送请求时在其中执行
+                （如批量执行器按实际路由到的提供商限制并发）
+        
+        Raises:
+            QuotaExceededError: 总量、任务类型、用户或所有候选提供商的用量预算已用尽
+            ContextLengthExceededError: 请求超出所有可用路由的上下文窗口
+            AdmissionRejectedError: 请求所属优先级类别的排队已满或排队超时
+            RequestCancelledError: 请求被取消或超过截止时间（DeadlineExceededError）
+        """
+        if cancel_token is not None:
+            cancel_token.check()
+        task_type = self.select_task_type(task_type, prompt, messages)
+        task_type, messages = self.fit_context(task_type, prompt, messages, max_tokens)
+        routed_request = self.route_request(task_type, prompt, messages, temperature, max_tokens, user_id,
+                                            cancel_token)
+        if provider_slot is not None:
+            for candidate in [routed_request] + routed_request["fallbacks"]:
+                candidate["provider_slot"] = provider_slot
+        
+        cache_key = None
+        if use_cache and self.response_cache is not None:
+            cache_key = self._cache_key(routed_request)
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                return ModelResponse.parse(cached_response)
+        
+        # 语义缓存只比较单轮提示，多轮对话只使用精确缓存
+        semantic_scope = semantic_vector = None
+        if use_cache and self.semantic_cache is not None and len(messages or ()) <= 1:
+            request_data = routed_request["request"]
+            semantic_scope = "|".join(str(part) for part in (
+                routed_request["provider"].get("name", ""),
+                request_data["model"],
+                request_data["temperature"],
+                request_data["max_tokens"]
+            ))
+            try:
+                semantic_vector = self.semantic_cache.embed(prompt)
+            except Exception as e:
+                print(f"语义缓存向量化失败: {e}")
+            if semantic_vector is not None:
+                hit = self.semantic_cache.lookup(semantic_scope, semantic_vector, task_type)
+                if hit is not None:
+                    return ModelResponse.parse(hit[0])
+        
+        # 缓存命中不消耗用量；提供商和模型的预算在逐个尝试候选提供商时检查
+        self.check_quota(task_type, user_id)
+        
+        if self.single_flight is not None:
+            # 相同的并发请求只向提供商发起一次调用，其余调用共享结果；
+            # 配置了用户预算时只合并同一用户的请求，用量按用户计入
+            coalescing_key = cache_key or self._cache_key(routed_request)
+            if user_id and self.usage_tracker is not None and self.usage_tracker.per_user:
+                coalescing_key = f"{coalescing_key}|user:{user_id}"
+            try:
+                response = self.single_flight.do(
+                    coalescing_key, self._scheduled_dispatch, task_type, prompt, routed_request
+                )
+            except RequestCancelledError:
+                # 合并的调用按首个调用方的令牌执行，首个调用方取消后其余调用方按自己的令牌重新请求
+                if cancel_token is not None and cancel_token.cancelled:
+                    raise
+                response = self._scheduled_dispatch(task_type, prompt, routed_request)
+        else:
+            response = self._scheduled_dispatch(task_type, prompt, routed_request)
+        # Claude Code集成和测试替身返回普通字典，统一归一化（提供商的响应已是ModelResponse，直接返回）
+        response = ModelResponse.parse(response)
+        
+        # 失败响应（带error字段）不写入缓存
+        if "error" not in response:
+            if cache_key is not None:
+                self.response_cache.set(cache_key, response, task_type)
+            if semantic_vector is not None:
+                self.semantic_cache.store(semantic_scope, semantic_vector, response)
+        return response
+
+    def _scheduled_dispatch(self, task_type: str, prompt: str, routed_request: Dict[str, Any]) -> Dict[str, Any]:
+        """在调度器分配的并发名额内发送请求（未启用调度器时直接发送）"""
+        if self.scheduler is None:
+            return self._dispatch(task_type, prompt, routed_request)
+        with self.scheduler.slot(task_type, routed_request.get("cancel_token")):
+            return self._dispatch(task_type, prompt, routed_request)
+
+    def _dispatch(self, task_type: str, prompt: str, routed_request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将已路由的请求发送给提供商
         """
-        routed_request = self.route_request(task_type, prompt)
         provider_config = routed_request["provider"]
         provider_name = provider_config.get("name", "openai")
         
         # 特殊处理Claude Code
         if provider_name == "claudeCode":
-            if CLAUDE_CODE_AVAILABLE and self.claude_code_api:
+            if self.claude_code_api:
                 # 使用真实的Claude Code API
                 api_key = provider_config.get("api_key", "")
                 if api_key and api_key != "sk-xxx":
                     self.claude_code_api.set_api_key(api_key)
                 
                 request_data = routed_request["request"]
-                response = self.claude_code_api.send_message(
+                timeouts = self._timeouts_for(routed_request)
+                response = self._observe_send(routed_request, lambda: self.claude_code_api.send_message(
                     prompt=request_data["prompt"],
                     model=request_data["model"],
                     max_tokens=request_data["max_tokens"],
-                    temperature=request_data["temperature"]
-                )
-                return response
-            else:
+                    temperature=request_data["temperature"],
+                    cancel_token=routed_request.get("cancel_token"),
+                    timeout=30 if timeouts is None else timeouts.total
+                ))
+                return ModelResponse.parse(response, provider="claudeCode")
+            elif self.mock_responses:
                 # 返回模拟响应
-                return {
+                return ModelResponse.from_text({
                     "model": "claude-3-opus-20240229",
                     "response": f"[Claude Code模拟响应] {prompt}",
                     "type": "claudeCode"
-                }
+                }, "claudeCode")
+            else:
+                return self._error_response(routed_request, ProviderError("Claude Code集成不可用", "claudeCode"))
         
-        # 处理其他提供商
+        # 处理其他提供商：健康探测不可用的候选排在最后；启用对冲的任务类型在主提供商响应过慢时向下一个备选发送对冲请求
+        candidates = self._by_health([routed_request] + routed_request.get("fallbacks", []))
+        if self.hedging is not None and self.hedging.enabled_for(task_type):
+            available = self._available_candidates(candidates)
+            self.hedging.record_request(task_type)
+            if len(available) > 1:
+                delay = self.hedging.delay_for(task_type, self._latency_key(available[0]))
+                if delay is not None:
+                    return self.hedging.call(
+                        task_type,
+                        lambda token: self._try_candidates(task_type, self._with_token(available, token)),
+                        lambda token: self._try_candidates(task_type, self._with_token(available[1:], token)),
+                        delay,
+                        routed_request.get("cancel_token")
+                    )
+        return self._try_candidates(task_type, candidates)
+
+    def check_quota(self, task_type: str, user_id: str = None):
+        """检查总量、任务类型和用户的预算，已用尽时抛出QuotaExceededError（未启用用量统计时不检查）"""
+        if self.usage_tracker is not None:
+            self.usage_tracker.check(self._usage_scopes(task_type, user_id))
+
+    @staticmethod
+    def _usage_scopes(task_type: str, user_id: str = None) -> Tuple[str, ...]:
+        """请求发出前检查的预算范围（总量、任务类型、用户）"""
+        scopes = ("total", f"task_type:{task_type}")
+        return scopes + (f"user:{user_id}",) if user_id else scopes
+
+    def _check_provider_quota(self, routed_request: Dict[str, Any]):
+        """检查候选提供商和模型的预算，已用尽时抛出QuotaExceededError"""
+        if self.usage_tracker is not None:
+            self.usage_tracker.check((
+                f"provider:{routed_request['provider'].get('name', 'openai')}",
+                f"model:{routed_request['request']['model']}"
+            ))
+
+    def _record_usage(self, task_type: str, routed_request: Dict[str, Any], input_tokens: int, output_tokens: int):
+        """记录一次提供商调用的用量"""
+        if self.usage_tracker is not None:
+            self.usage_tracker.record(
+                routed_request["provider"].get("name", "openai"), routed_request["request"]["model"],
+                task_type, routed_request.get("user_id"), input_tokens, output_tokens
+            )
+
+    def _by_health(self, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        按后台健康探测的结果把不可用的候选（提供商unhealthy或上游没有该模型）移到最后
+        只调整顺序而不排除，探测结果有误时这些候选仍会作为最后的选择被尝试
+        """
+        if self.health_prober is None:
+            return candidates
+        available, unavailable = [], []
+        for candidate in candidates:
+            healthy = self.health_prober.is_available(candidate["provider"].get("name", "openai"),
+                                                      candidate["request"]["model"])
+            (available if healthy else unavailable).append(candidate)
+        return available + unavailable
+
+    def _available_candidates(self, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """过滤掉熔断器处于打开状态的候选提供商"""
+        available = []
+        for candidate in candidates:
+            breaker = self._breaker_for(candidate["provider"].get("name", "openai"))
+            if breaker is None or breaker.is_available():
+                available.append(candidate)
+        return available
+
+    def _latency_key(self, routed_request: Dict[str, Any]) -> str:
+        """延迟统计键（"provider,model"）"""
+        return f"{routed_request['provider'].get('name', 'openai')},{routed_request['request']['model']}"
+
+    @staticmethod
+    def _prompt_tokens(routed_request: Dict[str, Any]) -> int:
+        """请求的估算提示token数（用于选择自适应超时的提示长度区间）"""
+        request_data = routed_request["request"]
+        return estimate_tokens(request_data.get("messages") or [{"content": request_data.get("prompt", "")}])
+
+    def _timeouts_for(self, routed_request: Dict[str, Any]) -> Optional[Timeouts]:
+        """候选提供商的自适应超时，未启用或样本不足时返回None（提供商使用默认超时）"""
+        if self.adaptive_timeouts is None:
+            return None
+        return self.adaptive_timeouts.timeouts_for(self._latency_key(routed_request),
+                                                   self._prompt_tokens(routed_request))
+
+    def _observe_send(self, routed_request: Dict[str, Any], send: Callable[[], Any]) -> Any:
+        """执行单次请求（不含重试和限流等待）并把总耗时记入自适应超时，超时的请求按已等待的时间记录"""
+        if self.adaptive_timeouts is None:
+            return send()
+        start = time.perf_counter()
+        try:
+            response = send()
+        except ProviderTimeoutError:
+            self.adaptive_timeouts.record_timeout(self._latency_key(routed_request), self._prompt_tokens(routed_request),
+                                                  "total", time.perf_counter() - start)
+            raise
+        if "error" not in response:
+            self.adaptive_timeouts.record(self._latency_key(routed_request), self._prompt_tokens(routed_request),
+                                          total=time.perf_counter() - start)
+        return response
+
+    def _observe_stream(self, routed_request: Dict[str, Any], timeouts: Optional[Timeouts],
+                        chunks: Iterator[str]) -> Iterator[str]:
+        """
+        转发单次流式请求并把首字节耗时和总耗时记入自适应超时
+        产出首个片段后总耗时超过总超时时断开上游连接并抛出ProviderTimeoutError；
+        首个片段之前和片段之间的停顿由提供商的读取超时（首字节超时）限制
+        """
+        if self.adaptive_timeouts is None:
+            yield from chunks
+            return
+        route = self._latency_key(routed_request)
+        prompt_tokens = self._prompt_tokens(routed_request)
+        start = time.perf_counter()
+        first_byte = None
+        try:
+            for chunk in chunks:
+                elapsed = time.perf_counter() - start
+                if first_byte is None:
+                    first_byte = elapsed
+                elif timeouts is not None and elapsed > timeouts.total:
+                    self.adaptive_timeouts.record_timeout(route, prompt_tokens, "total", elapsed)
+                    raise ProviderTimeoutError(f"流式响应超过总超时 {timeouts.total:.1f} 秒",
+                                               routed_request["provider"].get("name", "openai"))
+                yield chunk
+        except ProviderTimeoutError:
+            if first_byte is None:
+                self.adaptive_timeouts.record_timeout(route, prompt_tokens, "first_byte", time.perf_counter() - start)
+            raise
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+        self.adaptive_timeouts.record(route, prompt_tokens, first_byte=first_byte, total=time.perf_counter() - start)
+
+    @staticmethod
+    def _with_token(candidates: List[Dict[str, Any]], cancel_token: CancellationToken) -> List[Dict[str, Any]]:
+        """复制候选并替换其取消令牌（对冲的每一方使用各自的子令牌）"""
+        return [dict(candidate, cancel_token=cancel_token) for candidate in candidates]
+
+    def _try_candidates(self, task_type: str, candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        按顺序依次尝试候选提供商，跳过熔断器已打开的提供商，返回第一个成功的响应
+        请求被取消或超过截止时间后不再尝试后续候选，抛出RequestCancelledError
+        """
+        response = None
+        quota_error = None
+        for candidate in candidates:
+            cancel_token = candidate.get("cancel_token")
+            if cancel_token is not None:
+                cancel_token.check()
+            try:
+                self._check_provider_quota(candidate)
+            except QuotaExceededError as e:
+                # 预算已用尽的提供商与熔断的提供商一样直接跳过
+                quota_error = e
+                continue
+            provider_name = candidate["provider"].get("name", "openai")
+            breaker = self._breaker_for(provider_name)
+            if breaker is not None and not breaker.allow_request():
+                continue
+            provider_slot = candidate.get("provider_slot")
+            response = None
+            try:
+                # 调用方提供了provider_slot时按实际发送的提供商占用名额，等待名额的时间不计入延迟
+                with nullcontext() if provider_slot is None else provider_slot(provider_name):
+                    start = time.perf_counter()
+                    response = self._send_to_provider(task_type, candidate)
+            finally:
+                # 无论成功、失败、无效请求还是被取消，都要结算熔断器，避免半开状态的探测名额一直被占用
+                if breaker is not None:
+                    self._settle_breaker(breaker, response)
+            if self.route_policy.enabled and "messages" in candidate["request"]:
+                tokens = response_tokens(response)
+                if tokens is None:
+                    tokens = estimate_tokens(candidate["request"]["messages"])
+                self.route_policy.update(task_type, self._latency_key(candidate), "error" not in response,
+                                         time.perf_counter() - start, tokens)
+            if "error" not in response:
+                return response
+        
+        if response is None:
+            if quota_error is not None:
+                raise quota_error
+            # 所有候选提供商均已熔断，立即失败而不等待超时
+            return ModelResponse.from_text({
+                "model": candidates[0]["request"]["model"],
+                "response": f"任务类型 '{task_type}' 的所有提供商暂不可用",
+                "error": "所有候选提供商的熔断器均已打开"
+            })
+        return response
+
+    @staticmethod
+    def _settle_breaker(breaker: CircuitBreaker, response: Optional[Dict[str, Any]]):
+        """
+        按请求结果结算熔断器：成功关闭，失败计入熔断；
+        无效请求（不代表提供商故障）或请求未完成（被取消、超过截止时间，response为None）只归还探测名额
+        """
+        if response is None or response.get("error_type") == "bad_request":
+            breaker.release()
+        elif "error" not in response:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def _error_response(self, routed_request: Dict[str, Any], error: ProviderError) -> ModelResponse:
+        """把提供商错误转换为带error和error_type字段的失败响应（不会写入缓存）"""
+        provider_name = routed_request["provider"].get("name", "openai")
+        descriptions = {
+            "timeout": "响应超时",
+            "rate_limited": "请求过多，请稍后重试",
+            "overloaded": "过载或暂不可用",
+            "auth": "认证失败，请检查API密钥",
+            "bad_request": "拒绝了请求"
+        }
+        return ModelResponse.from_text({
+            "model": routed_request["request"]["model"],
+            "response": f"提供商 {provider_name} {descriptions.get(error.error_type, '请求失败')}",
+            "error": str(error),
+            "error_type": error.error_type,
+            "status_code": error.status_code
+        }, provider_name)
+
+    def _send_to_provider(self, task_type: str, routed_request: Dict[str, Any]) -> ModelResponse:
+        """
+        将请求发送给单个候选提供商，超时、限流和过载按重试引擎的退避和重试预算重试
+        超时按该提供商,模型在同一提示长度区间的延迟百分位推算（样本不足时使用提供商的默认超时）
+        失败时返回带error和error_type字段的响应
+        """
+        provider_name = routed_request["provider"].get("name", "openai")
         provider_instance = routed_request.get("provider_instance")
         if provider_instance:
             model = routed_request["request"]["model"]
             messages = routed_request["request"]["messages"]
-            response = provider_instance.send_request(model, messages)
-            return response
-        else:
-            # 如果没有提供商实例，返回模拟响应
-            return {
+            start = time.perf_counter()
+            try:
+                options = {
+                    "temperature": routed_request["request"]["temperature"],
+                    "max_tokens": routed_request["request"]["max_tokens"]
+                }
+                cancel_token = routed_request.get("cancel_token")
+                if cancel_token is not None:
+                    options["cancel_token"] = cancel_token
+                # 有足够的延迟样本时按百分位设置超时，否则由提供商使用默认超时
+                timeouts = self._timeouts_for(routed_request)
+                if timeouts is not None:
+                    options["timeouts"] = timeouts
+                attempt = lambda: self._observe_send(
+                    routed_request, lambda: provider_instance.send_request(model, messages, **options)
+                )
+                if self.rate_limiter is None:
+                    send = attempt
+                else:
+                    send = lambda: self.rate_limiter.call(
+                        provider_name, model,
+                        attempt,
+                        estimated_tokens=estimate_tokens(messages) + routed_request["request"]["max_tokens"],
+                        cancel_token=cancel_token
+                    )
+                if self.retry_engine is None:
+                    response = send()
+                else:
+                    response = self.retry_engine.call(self._latency_key(routed_request), send, cancel_token)
+                response = ModelResponse.parse(response, provider=provider_name)
+                response.latency = time.perf_counter() - start
+                if "error" not in response:
+                    self.latency_tracker.record(self._latency_key(routed_request), response.latency)
+                    # 上游未返回用量时按估算值记录
+                    self._record_usage(
+                        task_type, routed_request,
+                        estimate_tokens(messages) if response.input_tokens is None else response.input_tokens,
+                        text_tokens(response.text) if response.output_tokens is None else response.output_tokens
+                    )
+                return response
+            except ProviderError as e:
+                # 不可重试的错误，或重试次数、重试预算用尽后仍失败
+                return self._error_response(routed_request, e)
+        elif self.mock_responses:
+            # 没有提供商实例时返回模拟响应
+            return ModelResponse.from_text({
                 "model": routed_request["request"]["model"],
                 "response": f"这是针对任务类型 '{task_type}' 的模拟响应"
-            }
\ No newline at end of file
+            }, provider_name)
+        else:
+            return self._error_response(routed_request, ProviderError(f"不支持的提供商: {provider_name}", provider_name))
+
+    async def asend_request(self, task_type: str, prompt: str, use_cache: bool = True, **options) -> ModelResponse:
+        """
+        异步发送请求到路由选择的模型（options同send_request的messages、temperature、max_tokens、cancel_token等）
+        整个路由流程在共享线程池中执行，不会阻塞调用方的事件循环；调用方的任务被取消时一并取消请求
+        """
+        import asyncio
+        cancel_token = options.setdefault("cancel_token", CancellationToken())
+        try:
+            return await run_blocking(self.send_request, task_type, prompt, use_cache, **options)
+        except asyncio.CancelledError:
+            cancel_token.cancel("调用方已取消")
+            raise
+
+    def send_batch(self, task_type: str, prompts: Iterable[str], use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        批量发送请求，按提供商限制并发，按输入顺序返回每个条目的结果
+        每个结果包含index、prompt、provider、response、wait、elapsed、deduplicated字段
+        """
+        return self.batch_runner.run(task_type, prompts, use_cache=use_cache)
+
+    def iter_batch(self, task_type: str, prompts: Iterable[str], use_cache: bool = True,
+                   ordered: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        批量发送请求并逐条产出结果（默认按完成顺序，ordered为True时按输入顺序）
+        """
+        return self.batch_runner.iterate(task_type, prompts, use_cache=use_cache, ordered=ordered)
+
+    def stream_request(self, task_type: str, prompt: str, messages: List[Dict[str, Any]] = None,
+                       temperature: float = None, max_tokens: int = None, user_id: str = None,
+                       cancel_token: CancellationToken = None) -> Iterator[str]:
+        """
+        流式发送请求到路由选择的模型，逐段产出响应文本
+        用量预算已用尽或超出上下文窗口时在产出首个片段前抛出QuotaExceededError或ContextLengthExceededError
+        调度器的排队已满或排队超时时在产出首个片段前抛出AdmissionRejectedError
+        取消令牌被取消时立即断开上游连接并抛出RequestCancelledError
+        所有候选提供商均失败（重试用尽或不可重试）时抛出对应类别的ProviderError
+        """
+        task_type, routed_request = self._prepare_stream(task_type, prompt, messages, temperature, max_tokens,
+                                                         user_id, cancel_token)
+        if self.scheduler is None:
+            yield from self._stream_routed(task_type, prompt, routed_request)
+            return
+        # 流式响应在整个读取过程中占用并发名额
+        with self.scheduler.slot(task_type, cancel_token):
+            yield from self._stream_routed(task_type, prompt, routed_request)
+
+    def _prepare_stream(self, task_type: str, prompt: str, messages: List[Dict[str, Any]] = None,
+                        temperature: float = None, max_tokens: int = None, user_id: str = None,
+                        cancel_token: CancellationToken = None) -> Tuple[str, Dict[str, Any]]:
+        """选择任务类型、裁剪上下文、路由并检查预算，返回最终的任务类型和已路由的请求"""
+        if cancel_token is not None:
+            cancel_token.check()
+        task_type = self.select_task_type(task_type, prompt, messages)
+        task_type, messages = self.fit_context(task_type, prompt, messages, max_tokens)
+        routed_request = self.route_request(task_type, prompt, messages, temperature, max_tokens, user_id,
+                                            cancel_token)
+        self.check_quota(task_type, user_id)
+        return task_type, routed_request
+
+    def _stream_in_slot(self, task_type: str, prompt: str, routed_request: Dict[str, Any],
+                        priority_class: str, claim: threading.Lock) -> Iterator[str]:
+        """在已获得的并发名额内流式发送请求，结束时释放名额（claim已被调用方取走时不再执行）"""
+        if not claim.acquire(blocking=False):
+            return
+        try:
+            yield from self._stream_routed(task_type, prompt, routed_request)
+        finally:
+            self.scheduler.release(priority_class)
+
+    def _stream_routed(self, task_type: str, prompt: str, routed_request: Dict[str, Any]) -> Iterator[str]:
+        """流式发送已路由的请求"""
+        provider_config = routed_request["provider"]
+        request_data = routed_request["request"]
+        
+        # 特殊处理Claude Code
+        if provider_config.get("name") == "claudeCode":
+            if self.claude_code_api:
+                api_key = provider_config.get("api_key", "")
+                if api_key and api_key != "sk-xxx":
+                    self.claude_code_api.set_api_key(api_key)
+                timeouts = self._timeouts_for(routed_request)
+                yield from self._observe_stream(routed_request, timeouts, self.claude_code_api.stream_message(
+                    prompt=request_data["prompt"],
+                    model=request_data["model"],
+                    max_tokens=request_data["max_tokens"],
+                    temperature=request_data["temperature"],
+                    cancel_token=routed_request.get("cancel_token"),
+                    timeout=30 if timeouts is None else timeouts.first_byte
+                ))
+            elif self.mock_responses:
+                yield f"[Claude Code模拟响应] {prompt}"
+            else:
+                raise ProviderError("Claude Code集成不可用", "claudeCode")
+            return
+        
+        # 跳过熔断器已打开的提供商，健康探测不可用的候选排在最后；启用对冲时，主提供商首个片段过慢则向下一个备选发送对冲请求
+        candidates = self._by_health([routed_request] + routed_request.get("fallbacks", []))
+        available = self._available_candidates(candidates) or candidates[:1]
+        if self.usage_tracker is not None:
+            available = self._within_quota(available)
+        if self.hedging is not None and self.hedging.enabled_for(task_type):
+            self.hedging.record_request(task_type)
+            if len(available) > 1:
+                delay = self.hedging.delay_for(task_type, self._latency_key(available[0]) + ":ttfb")
+                if delay is not None:
+                    started = False
+                    try:
+                        for chunk in self.hedging.stream(
+                            task_type,
+                            lambda token: self._stream_candidate(task_type, dict(available[0], cancel_token=token)),
+                            lambda token: self._stream_candidate(task_type, dict(available[1], cancel_token=token)),
+                            delay,
+                            routed_request.get("cancel_token")
+                        ):
+                            started = True
+                            yield chunk
+                        return
+                    except ProviderError:
+                        if started or len(available) == 2:
+                            raise
+                    # 对冲的双方都在产出片段前失败，继续尝试其余的备选提供商
+                    available = available[2:]
+        # 尚未产出任何片段时失败（重试用尽或不可重试）则切换到下一个备选提供商
+        for index, candidate in enumerate(available):
+            started = False
+            try:
+                for chunk in self._stream_candidate(task_type, candidate):
+                    started = True
+                    yield chunk
+                return
+            except ProviderError:
+                if started or index == len(available) - 1:
+                    raise
+
+    def _stream_candidate(self, task_type: str, candidate: Dict[str, Any]) -> Iterator[str]:
+        """
+        经熔断器流式读取单个候选提供商：熔断器不允许请求时抛出OverloadedError（调用方切换到下一个备选），
+        结束时与_try_candidates一样结算熔断器（读取完成为成功，失败计入熔断，无效请求或被取消、提前关闭只归还探测名额）
+        """
+        provider_name = candidate["provider"].get("name", "openai")
+        breaker = self._breaker_for(provider_name)
+        if breaker is not None and not breaker.allow_request():
+            raise OverloadedError(f"{provider_name} 的熔断器已打开", provider_name)
+        outcome = None
+        try:
+            yield from self._stream_from_provider(task_type, candidate)
+            outcome = {}
+        except ProviderError as e:
+            outcome = {"error": str(e), "error_type": e.error_type}
+            raise
+        finally:
+            if breaker is not None:
+                self._settle_breaker(breaker, outcome)
+
+    def _within_quota(self, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """过滤掉提供商或模型预算已用尽的候选，全部用尽时抛出QuotaExceededError"""
+        available = []
+        quota_error = None
+        for candidate in candidates:
+            try:
+                self._check_provider_quota(candidate)
+                available.append(candidate)
+            except QuotaExceededError as e:
+                quota_error = e
+        if not available:
+            raise quota_error
+        return available
+
+    def _stream_from_provider(self, task_type: str, routed_request: Dict[str, Any]) -> Iterator[str]:
+        """
+        从单个候选提供商流式读取响应，并记录首个片段的延迟
+        产出首个片段前的超时、限流和过载按重试引擎重试，失败时抛出ProviderError
+        首字节超时和总超时按该提供商,模型在同一提示长度区间的延迟百分位推算
+        """
+        provider_config = routed_request["provider"]
+        request_data = routed_request["request"]
+        provider_instance = routed_request.get("provider_instance")
+        if provider_instance:
+            model = request_data["model"]
+            messages = request_data["messages"]
+            options = {"temperature": request_data["temperature"], "max_tokens": request_data["max_tokens"]}
+            cancel_token = routed_request.get("cancel_token")
+            if cancel_token is not None:
+                options["cancel_token"] = cancel_token
+            timeouts = self._timeouts_for(routed_request)
+            if timeouts is not None:
+                options["timeouts"] = timeouts
+            attempt = lambda: self._observe_stream(
+                routed_request, timeouts, provider_instance.stream_request(model, messages, **options)
+            )
+            if self.rate_limiter is None:
+                stream = attempt
+            else:
+                stream = lambda: self.rate_limiter.stream(
+                    provider_config.get("name", "openai"), model,
+                    attempt,
+                    estimated_tokens=estimate_tokens(messages) + request_data["max_tokens"],
+                    cancel_token=cancel_token
+                )
+            if self.retry_engine is None:
+                chunks = stream()
+            else:
+                chunks = self.retry_engine.stream(self._latency_key(routed_request), stream, cancel_token)
+            start = time.perf_counter()
+            first_chunk = True
+            output_tokens = 0
+            try:
+                for chunk in chunks:
+                    if first_chunk:
+                        first_chunk = False
+                        self.latency_tracker.record(self._latency_key(routed_request) + ":ttfb",
+                                                    time.perf_counter() - start)
+                    output_tokens += text_tokens(chunk)
+                    yield chunk
+                # 流式接口不返回用量，按估算值记录
+                self._record_usage(task_type, routed_request, estimate_tokens(messages), output_tokens)
+            except RequestCancelledError:
+                # 取消前已生成的部分同样计入用量
+                self._record_usage(task_type, routed_request, estimate_tokens(messages), output_tokens)
+                raise
+            except ProviderError:
+                # 中途失败时已生成的部分计入用量
+                if output_tokens:
+                    self._record_usage(task_type, routed_request, estimate_tokens(messages), output_tokens)
+                raise
+        elif self.mock_responses:
+            yield f"这是针对任务类型 '{task_type}' 的模拟响应"
+        else:
+            raise ProviderError(f"不支持的提供商: {provider_config.get('name', 'openai')}",
+                                provider_config.get("name", "openai"))
+
+    async def astream_request(self, task_type: str, prompt: str, **options) -> AsyncIterator[str]:
+        """
+        异步流式请求，逐段产出响应文本（options同stream_request的messages、temperature、max_tokens、cancel_token等）
+        阻塞的流式读取在共享线程池中进行，每个文本片段到达后立即交给事件循环
+        调用方提前停止读取（如客户端断开）或任务被取消时一并取消请求，线程池中的读取随即断开上游连接
+        启用调度器时在事件循环上排队等待并发名额，排队的流式请求不占用线程池的线程
+        """
+        cancel_token = options.setdefault("cancel_token", CancellationToken())
+        finished = False
+        priority_class = None
+        claim = threading.Lock()
+        try:
+            if self.scheduler is None:
+                chunks = self.stream_request(task_type, prompt, **options)
+            else:
+                task_type, routed_request = await run_blocking(self._prepare_stream, task_type, prompt, **options)
+                priority_class = await self.scheduler.acquire_async(task_type, cancel_token)
+                chunks = self._stream_in_slot(task_type, prompt, routed_request, priority_class, claim)
+            async for chunk in iterate_blocking(chunks):
+                yield chunk
+            finished = True
+        finally:
+            if not finished:
+                cancel_token.cancel("调用方已停止读取")
+            if priority_class is not None and claim.acquire(blocking=False):
+                # 流尚未开始读取，名额由这里释放
+                self.scheduler.release(priority_class)
@@ -0,0 +1,314 @@
+import json
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
+from core.rate_limiter import estimate_tokens, text_tokens
+from integrations.api_providers.response import ModelResponse
+
+# 协议转换层：在OpenAI Chat Completions、Anthropic Messages和Gemini generateContent三种格式之间转换请求、响应和流式事件
+# - 内部统一使用OpenAI风格的消息列表 [{"role": "system"|"user"|"assistant", "content": str}]，即ModelRouter的请求格式
+# - 流式编码器逐个文本片段产出对应格式的SSE事件，不缓存完整响应，转换不增加首字延迟
+# - 只转换文本内容：工具结果按文本转换，图片和工具调用块被忽略
+
+# 统一结束类别（ModelResponse.finish_type）在各格式中的结束原因，上游未返回时按stop
+OPENAI_FINISH_REASONS = {"stop": "stop", "length": "length", "tool_calls": "tool_calls",
+                         "content_filter": "content_filter"}
+ANTHROPIC_STOP_REASONS = {"stop": "end_turn", "length": "max_tokens", "tool_calls": "tool_use",
+                          "content_filter": "refusal"}
+GEMINI_FINISH_REASONS = {"stop": "STOP", "length": "MAX_TOKENS", "tool_calls": "STOP", "content_filter": "SAFETY"}
+
+# Anthropic定义的错误类型，其他类型（如upstream_error、timeout_error）按状态码映射
+ANTHROPIC_ERROR_TYPES = {"invalid_request_error", "authentication_error", "permission_error", "not_found_error",
+                         "request_too_large", "rate_limit_error", "api_error", "overloaded_error"}
+
+def content_text(content: Any) -> str:
+    """
+    获取消息内容的文本
+    content可以是字符串、OpenAI的多段内容列表、Anthropic的内容块列表或Gemini的parts列表
+    """
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        texts = []
+        for part in content:
+            if isinstance(part, str):
+                texts.append(part)
+            elif isinstance(part, dict):
+                if part.get("type") == "tool_result":
+                    # Anthropic工具结果：内容本身可以是字符串或内容块列表
+                    texts.append(content_text(part.get("content")))
+                elif "text" in part and part.get("type", "text") == "text":
+                    texts.append(str(part["text"]))
+        return "".join(texts)
+    return str(content)
+
+def _request(model: Optional[str], messages: List[Dict[str, str]], temperature: Optional[float],
+             max_tokens: Optional[int], stream: bool, user: Optional[str] = None) -> Dict[str, Any]:
+    """构造内部请求（user为发起请求的终端用户，用于用量统计）"""
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": bool(stream),
+        "user": str(user) if user else None
+    }
+
+def from_openai_request(body: Dict[str, Any]) -> Dict[str, Any]:
+    """将OpenAI Chat Completions请求转换为内部请求"""
+    messages = [
+        {"role": message.get("role", "user"), "content": content_text(message.get("content"))}
+        for message in body.get("messages") or [] if isinstance(message, dict)
+    ]
+    return _request(body.get("model"), messages, body.get("temperature"),
+                    body.get("max_tokens") or body.get("max_completion_tokens"), body.get("stream"), body.get("user"))
+
+def from_anthropic_request(body: Dict[str, Any]) -> Dict[str, Any]:
+    """将Anthropic Messages请求转换为内部请求（system字段转换为首条system消息）"""
+    messages = []
+    system = content_text(body.get("system"))
+    if system:
+        messages.append({"role": "system", "content": system})
+    for message in body.get("messages") or []:
+        if isinstance(message, dict):
+            messages.append({"role": message.get("role", "user"), "content": content_text(message.get("content"))})
+    metadata = body.get("metadata") if isinstance(body.get("metadata"), dict) else {}
+    return _request(body.get("model"), messages, body.get("temperature"), body.get("max_tokens"), body.get("stream"),
+                    metadata.get("user_id"))
+
+def from_gemini_request(body: Dict[str, Any], model: Optional[str] = None, stream: bool = False) -> Dict[str, Any]:
+    """将Gemini generateContent请求转换为内部请求（model角色转换为assistant）"""
+    messages = []
+    system = content_text((body.get("systemInstruction") or body.get("system_instruction") or {}).get("parts"))
+    if system:
+        messages.append({"role": "system", "content": system})
+    for content in body.get("contents") or []:
+        if isinstance(content, dict):
+            role = "assistant" if content.get("role") == "model" else "user"
+            messages.append({"role": role, "content": content_text(content.get("parts"))})
+    config = body.get("generationConfig") or {}
+    return _request(model, messages, config.get("temperature"), config.get("maxOutputTokens"), stream)
+
+def last_user_text(messages: List[Dict[str, str]]) -> str:
+    """获取最后一条用户消息的文本（作为路由的提示文本）"""
+    for message in reversed(messages):
+        if message["role"] == "user":
+            return message["content"]
+    return messages[-1]["content"] if messages else ""
+
+def extract_text(response: Dict[str, Any]) -> str:
+    """获取响应中生成的文本（提供商响应已归一化为ModelResponse，其他字典按格式解析）"""
+    return ModelResponse.parse(response).text
+
+def usage_tokens(response: Dict[str, Any], messages: List[Dict[str, str]], text: str) -> Tuple[int, int]:
+    """
+    获取响应的输入和输出token数，上游未返回用量时按估算值
+    """
+    response = ModelResponse.parse(response)
+    input_tokens, output_tokens = response.input_tokens, response.output_tokens
+    if input_tokens is None and output_tokens is None:
+        return estimate_tokens(messages), text_tokens(text)
+    return input_tokens or 0, output_tokens or 0
+
+def finish_type(response: Dict[str, Any]) -> str:
+    """获取响应的统一结束类别，上游未返回结束原因时为stop"""
+    return ModelResponse.parse(response).finish_type or "stop"
+
+def anthropic_error_type(status_code: int, error_type: str) -> str:
+    """把错误类型映射为Anthropic的错误类型（429为rate_limit_error，503、529为overloaded_error，其余为api_error）"""
+    if error_type in ANTHROPIC_ERROR_TYPES:
+        return error_type
+    if status_code == 429:
+        return "rate_limit_error"
+    if status_code in (503, 529):
+        return "overloaded_error"
+    return "api_error"
+
+def to_openai_response(response: Dict[str, Any], model: str, messages: List[Dict[str, str]],
+                       response_id: Optional[str] = None) -> Dict[str, Any]:
+    """将提供商响应转换为OpenAI的chat.completion响应"""
+    text = extract_text(response)
+    prompt_tokens, completion_tokens = usage_tokens(response, messages, text)
+    return {
+        "id": response_id or f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": response.get("model") or model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": OPENAI_FINISH_REASONS[finish_type(response)]
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+def to_anthropic_response(response: Dict[str, Any], model: str, messages: List[Dict[str, str]],
+                          response_id: Optional[str] = None) -> Dict[str, Any]:
+    """将提供商响应转换为Anthropic的message响应"""
+    text = extract_text(response)
+    input_tokens, output_tokens = usage_tokens(response, messages, text)
+    return {
+        "id": response_id or f"msg_{uuid.uuid4().hex}",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": ANTHROPIC_STOP_REASONS[finish_type(response)],
+        "stop_sequence": None,
+        "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}
+    }
+
+def to_gemini_response(response: Dict[str, Any], model: str, messages: List[Dict[str, str]],
+                       response_id: Optional[str] = None) -> Dict[str, Any]:
+    """将提供商响应转换为Gemini的generateContent响应"""
+    text = extract_text(response)
+    prompt_tokens, completion_tokens = usage_tokens(response, messages, text)
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": GEMINI_FINISH_REASONS[finish_type(response)],
+            "index": 0
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": completion_tokens,
+            "totalTokenCount": prompt_tokens + completion_tokens
+        },
+        "modelVersion": model,
+        "responseId": response_id or uuid.uuid4().hex
+    }
+
+def sse_event(data: Any, event: Optional[str] = None) -> str:
+    """编码一个SSE事件"""
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    return (f"event: {event}\n" if event else "") + f"data: {payload}\n\n"
+
+class StreamEncoder:
+    def __init__(self, model: str, prompt_tokens: int = 0, response_id: Optional[str] = None):
+        """
+        流式事件编码器基类
+        - start()在首个文本片段之前调用，delta()每收到一个文本片段调用一次，finish()在流结束时调用
+          （finish_type为统一结束类别，上游未提供时为stop）
+        - 上游失败时以error()代替finish()结束流
+        - 每次调用立即返回对应的SSE事件文本，不缓存已生成的内容（只累计估算的输出token数）
+        """
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.response_id = response_id or uuid.uuid4().hex
+        self.created = int(time.time())
+        self.output_tokens = 0
+    
+    def start(self) -> str:
+        return ""
+    
+    def delta(self, text: str) -> str:
+        raise NotImplementedError
+    
+    def finish(self, finish_type: str = "stop") -> str:
+        return ""
+    
+    def error(self, status_code: int, error_type: str, message: str) -> str:
+        return ""
+    
+    def _count(self, text: str):
+        self.output_tokens += text_tokens(text)
+
+class OpenAIStreamEncoder(StreamEncoder):
+    """编码为OpenAI的chat.completion.chunk事件，以 [DONE] 结束"""
+    
+    def __init__(self, model: str, prompt_tokens: int = 0, response_id: Optional[str] = None):
+        super().__init__(model, prompt_tokens, response_id or f"chatcmpl-{uuid.uuid4().hex}")
+    
+    def _chunk(self, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        return sse_event({
+            "id": self.response_id,
+            "object": "chat.completion.chunk",
+            "created": self.created,
+            "model": self.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        })
+    
+    def start(self) -> str:
+        return self._chunk({"role": "assistant", "content": ""})
+    
+    def delta(self, text: str) -> str:
+        self._count(text)
+        return self._chunk({"content": text})
+    
+    def finish(self, finish_type: str = "stop") -> str:
+        return self._chunk({}, OPENAI_FINISH_REASONS.get(finish_type, "stop")) + sse_event("[DONE]")
+    
+    def error(self, status_code: int, error_type: str, message: str) -> str:
+        return sse_event({"error": {"message": message, "type": error_type, "param": None, "code": status_code}})
+
+class AnthropicStreamEncoder(StreamEncoder):
+    """编码为Anthropic Messages的流式事件（message_start、content_block_delta、message_stop等）"""
+    
+    def __init__(self, model: str, prompt_tokens: int = 0, response_id: Optional[str] = None):
+        super().__init__(model, prompt_tokens, response_id or f"msg_{uuid.uuid4().hex}")
+    
+    def start(self) -> str:
+        return (
+            sse_event({"type": "message_start", "message": {
+                "id": self.response_id,
+                "type": "message",
+                "role": "assistant",
+                "model": self.model,
+                "content": [],
+                "stop_reason": None,
+                "stop_sequence": None,
+                "usage": {"input_tokens": self.prompt_tokens, "output_tokens": 0}
+            }}, "message_start")
+            + sse_event({"type": "content_block_start", "index": 0,
+                         "content_block": {"type": "text", "text": ""}}, "content_block_start")
+            + sse_event({"type": "ping"}, "ping")
+        )
+    
+    def delta(self, text: str) -> str:
+        self._count(text)
+        return sse_event({"type": "content_block_delta", "index": 0,
+                          "delta": {"type": "text_delta", "text": text}}, "content_block_delta")
+    
+    def finish(self, finish_type: str = "stop") -> str:
+        stop_reason = ANTHROPIC_STOP_REASONS.get(finish_type, "end_turn")
+        return (
+            sse_event({"type": "content_block_stop", "index": 0}, "content_block_stop")
+            + sse_event({"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                         "usage": {"output_tokens": self.output_tokens}}, "message_delta")
+            + sse_event({"type": "message_stop"}, "message_stop")
+        )
+    
+    def error(self, status_code: int, error_type: str, message: str) -> str:
+        return sse_event({"type": "error", "error": {"type": anthropic_error_type(status_code, error_type),
+                                                     "message": message}}, "error")
+
+class GeminiStreamEncoder(StreamEncoder):
+    """编码为Gemini streamGenerateContent（alt=sse）的事件，最后一个事件带finishReason和用量"""
+    
+    def _event(self, text: str, finish_reason: Optional[str] = None) -> str:
+        candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        event = {"candidates": [candidate], "modelVersion": self.model, "responseId": self.response_id}
+        if finish_reason is not None:
+            candidate["finishReason"] = finish_reason
+            event["usageMetadata"] = {
+                "promptTokenCount": self.prompt_tokens,
+                "candidatesTokenCount": self.output_tokens,
+                "totalTokenCount": self.prompt_tokens + self.output_tokens
+            }
+        return sse_event(event)
+    
+    def delta(self, text: str) -> str:
+        self._count(text)
+        return self._event(text)
+    
+    def finish(self, finish_type: str = "stop") -> str:
+        return self._event("", GEMINI_FINISH_REASONS.get(finish_type, "STOP"))
+    
+    def error(self, status_code: int, error_type: str, message: str) -> str:
+        return sse_event({"error": {"code": status_code, "message": message, "status": "UNAVAILABLE"}})
@@ -0,0 +1,332 @@
+import random
+import threading
+import time
+from typing import Dict, Any, Callable, Iterator, Optional
+from integrations.api_providers.cancellation import RequestCancelledError
+from integrations.api_providers.errors import RateLimitError
+from integrations.api_providers.response import ModelResponse
+from core.adaptive_timeout import size_bucket
+from core.token_estimator import estimate_tokens, text_tokens
+
+def response_tokens(response: Dict[str, Any]) -> Optional[int]:
+    """从响应中读取实际消耗的token数（支持OpenAI、Anthropic、Gemini、Ollama格式），无法获取时返回None"""
+    if isinstance(response, ModelResponse):
+        # 用量已在归一化时解析
+        return response.total_tokens
+    usage = response.get("usage") or {}
+    if "total_tokens" in usage:
+        return int(usage["total_tokens"])
+    if "input_tokens" in usage or "output_tokens" in usage:
+        return int(usage.get("input_tokens", 0)) + int(usage.get("output_tokens", 0))
+    metadata = response.get("usageMetadata") or {}
+    if "totalTokenCount" in metadata:
+        return int(metadata["totalTokenCount"])
+    if "prompt_eval_count" in response or "eval_count" in response:
+        return int(response.get("prompt_eval_count", 0)) + int(response.get("eval_count", 0))
+    return None
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        令牌桶
+        - 按每分钟速率匀速补充令牌，最多累积capacity个（默认为一分钟的量）
+        - 预留时立即扣除令牌，不足部分记为欠额，调用方按返回的秒数等待，后来者排在其后
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity or per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        """按经过的时间补充令牌（调用方需持有锁）"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def reserve(self, amount: float) -> float:
+        """预留令牌，返回需要等待的秒数"""
+        with self._lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+    
+    def adjust(self, amount: float):
+        """按实际用量修正预留：正数补扣，负数退还"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+    
+    def available(self) -> float:
+        """当前可用令牌数（欠额时为负数）"""
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+class AIMDLimiter:
+    def __init__(self, initial: int = 16, min_limit: int = 1, max_limit: int = 128,
+                 backoff: float = 0.5, latency_tolerance: float = 3.0, decrease_interval: float = 1.0):
+        """
+        加性增、乘性减（AIMD）的自适应并发限制
+        - 请求成功且延迟正常时，每个请求使上限增加1/上限（约每轮增加1）
+        - 收到429时上限乘以backoff；延迟超过同一区间基线的latency_tolerance倍时温和下调
+        - 延迟基线按调用方给出的区间（如流式首字节、非流式每token耗时和请求大小）分别维护，
+          长时间生成不会与短请求比较而被误判为拥塞
+        - decrease_interval秒内只下调一次，避免同一批在途请求的429把上限连续砍到底
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self.baselines = {}
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+    
+    def acquire(self, cancel_token=None):
+        """
+        等待直到在途请求数低于当前上限（传入取消令牌时，请求被取消或超过截止时间则放弃等待并抛出异常）
+        等待由释放名额或取消令牌唤醒，最长等到截止时间，不轮询
+        """
+        with self._condition:
+            unregister = None
+            try:
+                while self.in_flight >= max(self.min_limit, int(self.limit)):
+                    if cancel_token is None:
+                        self._condition.wait()
+                        continue
+                    cancel_token.check()
+                    if unregister is None:
+                        unregister = cancel_token.on_cancel(self._wake)
+                    self._condition.wait(cancel_token.remaining())
+            finally:
+                if unregister is not None:
+                    unregister()
+            self.in_flight += 1
+    
+    def _wake(self):
+        """唤醒等待名额的线程（请求被取消时调用）"""
+        with self._condition:
+            self._condition.notify_all()
+    
+    def _decrease(self, factor: float):
+        """乘性下调上限（调用方需持有锁）"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_interval:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+        self.decreases += 1
+    
+    def release(self, latency: Optional[float] = None, rate_limited: bool = False, bucket: str = ""):
+        """
+        释放并发名额并根据结果调整上限
+        
+        Args:
+            latency: 延迟信号（秒），为None时不调整上限
+            rate_limited: 是否收到429
+            bucket: 延迟信号所属的区间，只与同一区间的基线比较
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self._decrease(self.backoff)
+            elif latency is not None:
+                baseline = self.baselines.get(bucket)
+                if baseline is None or latency < baseline:
+                    baseline = latency
+                else:
+                    # 基线向上缓慢跟随，避免一次偶然的低延迟永久压低基线
+                    baseline += (latency - baseline) * 0.01
+                self.baselines[bucket] = baseline
+                if self.latency_tolerance and latency > baseline * self.latency_tolerance:
+                    self._decrease((1 + self.backoff) / 2)
+                else:
+                    self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+class ProviderLimits:
+    def __init__(self, rpm: float = 0, tpm: float = 0, initial_concurrency: int = 16,
+                 min_concurrency: int = 1, max_concurrency: int = 128,
+                 backoff: float = 0.5, latency_tolerance: float = 3.0):
+        """
+        单个提供商（或提供商下某个模型）的限流状态
+        rpm/tpm为0表示不限制
+        """
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = AIMDLimiter(
+            initial=initial_concurrency,
+            min_limit=min_concurrency,
+            max_limit=max_concurrency,
+            backoff=backoff,
+            latency_tolerance=latency_tolerance
+        )
+        self.rate_limited = 0
+        self.waited = 0.0
+    
+    def acquire(self, estimated_tokens: int = 0, cancel_token=None):
+        """
+        按请求数和token数预留令牌，等待后占用一个并发名额
+        传入取消令牌时，等待期间请求被取消或等待会越过截止时间则退还预留的令牌并抛出RequestCancelledError
+        """
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.reserve(1)
+        if self.tokens is not None and estimated_tokens:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        try:
+            if wait > 0:
+                self.waited += wait
+                if cancel_token is None:
+                    time.sleep(wait)
+                else:
+                    cancel_token.sleep(wait)
+            self.concurrency.acquire(cancel_token)
+        except RequestCancelledError:
+            if self.requests is not None:
+                self.requests.adjust(-1)
+            if self.tokens is not None and estimated_tokens:
+                self.tokens.adjust(-estimated_tokens)
+            raise
+    
+    def release(self, latency: Optional[float] = None, rate_limited: bool = False, bucket: str = ""):
+        """释放并发名额（bucket为延迟信号所属的区间）"""
+        if rate_limited:
+            self.rate_limited += 1
+        self.concurrency.release(latency=latency, rate_limited=rate_limited, bucket=bucket)
+    
+    def record_tokens(self, delta: int):
+        """按实际token用量修正预留（正数补扣，负数退还）"""
+        if self.tokens is not None and delta:
+            self.tokens.adjust(delta)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取限流统计"""
+        return {
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "decreases": self.concurrency.decreases,
+            "rate_limited": self.rate_limited,
+            "waited_seconds": round(self.waited, 3),
+            "requests_available": self.requests.available() if self.requests else None,
+            "tokens_available": self.tokens.available() if self.tokens else None
+        }
+
+class RateLimiter:
+    def __init__(self, default: Optional[Dict[str, Any]] = None, limits: Optional[Dict[str, Dict[str, Any]]] = None,
+                 max_retries: int = 3, base_backoff: float = 1.0, max_backoff: float = 30.0):
+        """
+        按提供商和模型的自适应限流器
+        - 每个"提供商,模型"组合有独立的请求数令牌桶、token令牌桶和AIMD并发限制
+        - limits中可按"提供商"或"提供商,模型"覆盖默认参数（后者优先）
+        - 收到429时按Retry-After（没有时按指数退避加抖动）等待后重试
+        """
+        self.default = default or {}
+        self.limits = limits or {}
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._states = {}
+        self._lock = threading.Lock()
+    
+    def limits_for(self, provider: str, model: str) -> ProviderLimits:
+        """获取提供商和模型对应的限流状态（首次使用时创建）"""
+        key = f"{provider},{model}"
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                options = dict(self.default)
+                options.update(self.limits.get(provider, {}))
+                options.update(self.limits.get(key, {}))
+                state = ProviderLimits(**options)
+                self._states[key] = state
+            return state
+    
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """计算重试前的等待秒数"""
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return min(self.max_backoff, self.base_backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+    
+    @staticmethod
+    def _sleep(seconds: float, cancel_token=None):
+        """重试前等待（传入取消令牌时，被取消或剩余时间不足时抛出RequestCancelledError）"""
+        if cancel_token is None:
+            time.sleep(seconds)
+        else:
+            cancel_token.sleep(seconds)
+    
+    def call(self, provider: str, model: str, func: Callable[[], Dict[str, Any]],
+             estimated_tokens: int = 0, cancel_token=None) -> Dict[str, Any]:
+        """
+        在限流下执行一次请求，收到429时自动退避重试
+        以每token的耗时作为延迟信号，按请求的token数区间分别比较（生成越长总耗时越长，不代表拥塞）
+        传入取消令牌时，排队和退避等待都不会越过其截止时间
+        
+        Raises:
+            RateLimitError: 重试次数用尽后仍被限流
+            RequestCancelledError: 等待期间请求被取消或剩余时间不足以退避重试
+        """
+        limits = self.limits_for(provider, model)
+        for attempt in range(self.max_retries + 1):
+            limits.acquire(estimated_tokens, cancel_token)
+            start = time.perf_counter()
+            try:
+                response = func()
+            except RateLimitError as e:
+                limits.release(rate_limited=True)
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep(self._backoff(attempt, e.retry_after), cancel_token)
+                continue
+            except BaseException:
+                limits.release()
+                raise
+            latency = time.perf_counter() - start
+            actual_tokens = response_tokens(response) if isinstance(response, dict) else None
+            tokens = actual_tokens or estimated_tokens
+            if tokens:
+                limits.release(latency=latency / tokens, bucket=f"total|{size_bucket(tokens)}")
+            else:
+                limits.release(latency=latency, bucket="total")
+            if actual_tokens is not None:
+                limits.record_tokens(actual_tokens - estimated_tokens)
+            return response
+    
+    def stream(self, provider: str, model: str, func: Callable[[], Iterator[str]],
+               estimated_tokens: int = 0, cancel_token=None) -> Iterator[str]:
+        """
+        在限流下执行流式请求，以首个片段的到达时间作为延迟信号（按估算的token数区间分别比较）
+        只有在尚未产出任何片段时收到429才会重试
+        """
+        limits = self.limits_for(provider, model)
+        for attempt in range(self.max_retries + 1):
+            limits.acquire(estimated_tokens, cancel_token)
+            start = time.perf_counter()
+            first_chunk_latency = None
+            try:
+                for chunk in func():
+                    if first_chunk_latency is None:
+                        first_chunk_latency = time.perf_counter() - start
+                    yield chunk
+            except RateLimitError as e:
+                limits.release(rate_limited=True)
+                if first_chunk_latency is not None or attempt >= self.max_retries:
+                    raise
+                self._sleep(self._backoff(attempt, e.retry_after), cancel_token)
+                continue
+            except BaseException:
+                limits.release()
+                raise
+            limits.release(latency=first_chunk_latency, bucket=f"first_byte|{size_bucket(estimated_tokens)}")
+            return
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有提供商和模型的限流统计"""
+        with self._lock:
+            states = dict(self._states)
+        return {key: state.stats() for key, state in states.items()}
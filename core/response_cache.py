@@ -0,0 +1,161 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 3600,
+                 ttls: Optional[Dict[str, float]] = None, disk_path: Optional[str] = None):
+        """
+        精确匹配响应缓存
+        - 内存LRU层：按最近使用顺序淘汰
+        - 可选磁盘层：SQLite文件（默认位于~/.ccli/下），进程重启后仍可命中
+        - 按任务类型配置TTL，TTL为0表示该任务类型不缓存
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.disk_path = os.path.expanduser(disk_path) if disk_path else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize_messages(messages: List[Dict[str, str]]) -> List[List[str]]:
+        """规范化消息：统一角色大小写、换行符并去除首尾空白"""
+        return [
+            [str(msg.get("role", "user")).strip().lower(),
+             str(msg.get("content", "")).replace("\r\n", "\n").strip()]
+            for msg in messages
+        ]
+
+    @classmethod
+    def make_key(cls, provider: str, model: str, messages: List[Dict[str, str]],
+                 temperature: float, max_tokens: int) -> str:
+        """根据提供商、模型、规范化消息、温度和最大token数生成缓存键"""
+        payload = json.dumps(
+            [provider, model, cls.normalize_messages(messages), round(float(temperature), 4), int(max_tokens)],
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, task_type: str) -> float:
+        """获取任务类型对应的TTL（秒）"""
+        return self.ttls.get(task_type, self.default_ttl)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查询缓存，先查内存层再查磁盘层"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(response)
+                del self._entries[key]
+
+        response = self._disk_get(key, now)
+        with self._lock:
+            if response is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        return response
+
+    def set(self, key: str, response: Dict[str, Any], task_type: str = "default"):
+        """写入缓存（内存层与磁盘层）"""
+        ttl = self.ttl_for(task_type)
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._store_memory(key, expires_at, copy.deepcopy(response))
+        self._disk_set(key, expires_at, response)
+
+    def _store_memory(self, key: str, expires_at: float, response: Dict[str, Any]):
+        """写入内存层并按LRU淘汰（调用方需持有锁）"""
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_disk(self):
+        """获取磁盘层连接（首次使用时创建，sqlite3在此时才导入）"""
+        if self.disk_path and self._disk is None:
+            import sqlite3
+            os.makedirs(os.path.dirname(self.disk_path) or ".", exist_ok=True)
+            self._disk = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, response TEXT)"
+            )
+            self._disk.commit()
+        return self._disk
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        """从磁盘层读取，命中后回填内存层"""
+        if not self.disk_path:
+            return None
+        import sqlite3
+        with self._lock:
+            try:
+                row = self._get_disk().execute(
+                    "SELECT expires_at, response FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"响应缓存磁盘读取失败: {e}")
+                return None
+            if row is None or row[0] <= now:
+                return None
+            response = json.loads(row[1])
+            self._store_memory(key, row[0], copy.deepcopy(response))
+        return response
+
+    def _disk_set(self, key: str, expires_at: float, response: Dict[str, Any]):
+        """写入磁盘层"""
+        if not self.disk_path:
+            return
+        import sqlite3
+        with self._lock:
+            try:
+                disk = self._get_disk()
+                disk.execute(
+                    "INSERT OR REPLACE INTO responses (key, expires_at, response) VALUES (?, ?, ?)",
+                    (key, expires_at, json.dumps(response, ensure_ascii=False))
+                )
+                disk.commit()
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                print(f"响应缓存磁盘写入失败: {e}")
+
+    def clear(self):
+        """清空内存层与磁盘层"""
+        with self._lock:
+            self._entries.clear()
+            if self.disk_path and os.path.exists(self.disk_path):
+                self._get_disk().execute("DELETE FROM responses")
+                self._disk.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0
+            }
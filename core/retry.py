@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Iterable, Iterator, Optional
+from integrations.api_providers.errors import ProviderError
+
+# 默认重试的错误类别：超时、限流和过载；认证失败和无效请求重试也不会成功，立即返回
+DEFAULT_RETRY_ON = ("timeout", "rate_limited", "overloaded")
+
+class RetryBudget:
+    def __init__(self, ratio: float = 0.2, min_retries_per_second: float = 1.0, window: float = 10.0):
+        """
+        单条路由的重试预算
+        - 最近window秒内的重试次数不超过同期请求数的ratio倍，另有min_retries_per_second * window次保底（低流量时也能重试）
+        - 上游整体故障时每个请求都会失败，预算把重试带来的额外流量限制在ratio以内，重试不会放大故障
+        """
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.window = window
+        # 按整秒分桶的 [秒, 请求数, 重试数]
+        self._buckets = deque()
+        self._lock = threading.Lock()
+    
+    def _bucket(self, now: float) -> list:
+        """获取当前秒的计数桶并丢弃窗口外的桶（调用方需持有锁）"""
+        second = int(now)
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        return self._buckets[-1]
+    
+    def record_request(self):
+        """记录一次首次请求（不含重试）"""
+        with self._lock:
+            self._bucket(time.time())[1] += 1
+    
+    def try_withdraw(self) -> bool:
+        """预算内时记录一次重试并返回True，预算已用尽时返回False"""
+        with self._lock:
+            bucket = self._bucket(time.time())
+            requests = sum(item[1] for item in self._buckets)
+            retries = sum(item[2] for item in self._buckets)
+            if retries + 1 > requests * self.ratio + self.min_retries_per_second * self.window:
+                return False
+            bucket[2] += 1
+            return True
+    
+    def stats(self) -> Dict[str, int]:
+        """窗口内的请求数和重试数"""
+        with self._lock:
+            self._bucket(time.time())
+            return {
+                "requests": sum(item[1] for item in self._buckets),
+                "retries": sum(item[2] for item in self._buckets)
+            }
+
+class RetryEngine:
+    def __init__(self, max_attempts: int = 3, base_backoff: float = 0.5, max_backoff: float = 20.0,
+                 retry_on: Optional[Iterable[str]] = None, budget: Optional[Dict[str, Any]] = None):
+        """
+        路由层的重试引擎
+        - 只重试retry_on中的错误类别（默认为超时、限流和过载），每个请求最多尝试max_attempts次
+        - 退避为指数退避加全抖动：在0到min(max_backoff, base_backoff * 2^重试次数)之间随机等待，避免重试同步到达；
+          提供商返回Retry-After时按其等待，超过max_backoff时不再重试
+        - 每条路由（提供商,模型）有独立的重试预算（budget为RetryBudget的参数），用尽时直接返回错误
+        - 传入取消令牌时，剩余时间不足以退避时不再重试
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retry_on = set(DEFAULT_RETRY_ON if retry_on is None else retry_on)
+        self.budget_options = budget or {}
+        self._budgets = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+    
+    def budget_for(self, route: str) -> RetryBudget:
+        """获取路由的重试预算（首次使用时创建）"""
+        with self._lock:
+            budget = self._budgets.get(route)
+            if budget is None:
+                budget = self._budgets[route] = RetryBudget(**self.budget_options)
+                self._counts[route] = {"requests": 0, "retries": 0, "budget_exhausted": 0, "errors": {}}
+            return budget
+    
+    def _count(self, route: str, field: str, error_type: Optional[str] = None):
+        """更新路由的统计"""
+        with self._lock:
+            counts = self._counts[route]
+            if error_type is None:
+                counts[field] += 1
+            else:
+                counts["errors"][error_type] = counts["errors"].get(error_type, 0) + 1
+    
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第attempt次重试（从0开始）前的等待秒数"""
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+    
+    def _retry_delay(self, route: str, error: ProviderError, attempt: int, cancel_token=None) -> Optional[float]:
+        """判断失败的请求能否重试，可以时返回等待秒数，否则返回None"""
+        self._count(route, "errors", error.error_type)
+        if error.error_type not in self.retry_on or attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt, error.retry_after)
+        if delay > self.max_backoff:
+            return None
+        if cancel_token is not None:
+            remaining = cancel_token.remaining()
+            if remaining is not None and delay >= remaining:
+                return None
+        if not self.budget_for(route).try_withdraw():
+            self._count(route, "budget_exhausted")
+            return None
+        self._count(route, "retries")
+        return delay
+    
+    @staticmethod
+    def _sleep(seconds: float, cancel_token=None):
+        """退避等待（传入取消令牌时被取消则抛出RequestCancelledError）"""
+        if cancel_token is None:
+            time.sleep(seconds)
+        else:
+            cancel_token.sleep(seconds)
+    
+    def call(self, route: str, func: Callable[[], Any], cancel_token=None) -> Any:
+        """
+        执行请求，可重试的ProviderError按退避等待后重试
+        
+        Raises:
+            ProviderError: 不可重试、重试次数或预算用尽后的最后一个错误
+            RequestCancelledError: 退避期间请求被取消
+        """
+        self.budget_for(route).record_request()
+        self._count(route, "requests")
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except ProviderError as e:
+                delay = self._retry_delay(route, e, attempt, cancel_token)
+                if delay is None:
+                    raise
+            self._sleep(delay, cancel_token)
+            attempt += 1
+    
+    def stream(self, route: str, func: Callable[[], Iterator[str]], cancel_token=None) -> Iterator[str]:
+        """执行流式请求，只有在尚未产出任何片段时失败才会重试（已产出的内容无法撤回）"""
+        self.budget_for(route).record_request()
+        self._count(route, "requests")
+        attempt = 0
+        while True:
+            started = False
+            try:
+                for chunk in func():
+                    started = True
+                    yield chunk
+                return
+            except ProviderError as e:
+                if started:
+                    self._count(route, "errors", e.error_type)
+                    raise
+                delay = self._retry_delay(route, e, attempt, cancel_token)
+                if delay is None:
+                    raise
+            self._sleep(delay, cancel_token)
+            attempt += 1
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各路由的请求数、重试数、预算用尽次数、按类别的错误数和当前窗口内的预算使用情况"""
+        with self._lock:
+            routes = {route: dict(counts, errors=dict(counts["errors"])) for route, counts in self._counts.items()}
+            budgets = dict(self._budgets)
+        for route, counts in routes.items():
+            counts["window"] = budgets[route].stats()
+        return routes
@@ -0,0 +1,163 @@
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+class _Arm:
+    """单个候选（provider,model）的按时间衰减的统计量"""
+    
+    __slots__ = ("weight", "reward", "errors", "latency", "cost", "updated")
+    
+    def __init__(self):
+        self.weight = 0.0
+        self.reward = 0.0
+        self.errors = 0.0
+        self.latency = 0.0
+        self.cost = 0.0
+        self.updated = time.monotonic()
+    
+    def decay(self, half_life: float, now: float):
+        """按经过的时间衰减历史观测，使统计跟随提供商速度的变化"""
+        factor = 0.5 ** ((now - self.updated) / half_life) if half_life > 0 else 1.0
+        self.weight *= factor
+        self.reward *= factor
+        self.errors *= factor
+        self.latency *= factor
+        self.cost *= factor
+        self.updated = now
+
+class RoutePolicy:
+    STRATEGIES = ("static", "thompson", "ucb")
+    
+    def __init__(self, strategy: str = "static", latency_weight: float = 0.5, cost_weight: float = 0.2,
+                 latency_ceiling: float = 30.0, cost_ceiling: float = 0.05, half_life: float = 1800,
+                 ucb_c: float = 1.0, prices: Optional[Dict[str, float]] = None, max_decisions: int = 200):
+        """
+        自适应路由策略（多臂老虎机）
+        - 在同一路由的候选提供商之间，根据观测到的延迟、错误率和token成本选择最优候选
+        - 单次请求的回报：失败为0，成功为 1 - latency_weight*归一化延迟 - cost_weight*归一化成本
+        - thompson：从每个候选回报的Beta后验中采样，取最大者
+        - ucb：取 平均回报 + ucb_c*置信上界 最大者
+        - static：始终按配置顺序，不做选择
+        - 统计按half_life秒的半衰期衰减，适应提供商速度随时段的变化
+        - prices为每千token的价格，键为 "provider,model" 或 "provider"
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"未知的路由策略: {strategy}")
+        self.strategy = strategy
+        self.latency_weight = latency_weight
+        self.cost_weight = cost_weight
+        self.latency_ceiling = latency_ceiling
+        self.cost_ceiling = cost_ceiling
+        self.half_life = half_life
+        self.ucb_c = ucb_c
+        self.prices = prices or {}
+        self._arms = {}
+        self._decisions = deque(maxlen=max_decisions)
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        """是否进行自适应选择"""
+        return self.strategy != "static"
+    
+    def _arm(self, task_type: str, key: str, now: float) -> _Arm:
+        """获取任务类型下候选的统计量并完成衰减（调用方需持有锁）"""
+        arm = self._arms.get((task_type, key))
+        if arm is None:
+            arm = self._arms[(task_type, key)] = _Arm()
+        arm.decay(self.half_life, now)
+        return arm
+    
+    def price_for(self, key: str) -> float:
+        """获取候选每千token的价格"""
+        return self.prices.get(key, self.prices.get(key.split(",", 1)[0], 0.0))
+    
+    def _score(self, arm: _Arm, total_weight: float) -> float:
+        """计算候选的选择分数（调用方需持有锁）"""
+        if self.strategy == "thompson":
+            return random.betavariate(1.0 + arm.reward, 1.0 + max(0.0, arm.weight - arm.reward))
+        if arm.weight < 1e-9:
+            return float("inf")
+        mean = arm.reward / arm.weight
+        return mean + self.ucb_c * math.sqrt(2 * math.log(max(total_weight, 1.0) + 1) / arm.weight)
+    
+    def choose(self, task_type: str, keys: List[str]) -> int:
+        """
+        在候选中选择一个，返回其下标，并记录决策
+        
+        Args:
+            task_type: 任务类型
+            keys: 候选列表（"provider,model"），按配置顺序排列
+        """
+        if not self.enabled or len(keys) < 2:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            arms = [self._arm(task_type, key, now) for key in keys]
+            total_weight = sum(arm.weight for arm in arms)
+            scores = [self._score(arm, total_weight) for arm in arms]
+            index = max(range(len(keys)), key=lambda i: scores[i])
+            self._decisions.append({
+                "time": time.time(),
+                "task_type": task_type,
+                "strategy": self.strategy,
+                "chosen": keys[index],
+                "scores": {key: (round(score, 4) if math.isfinite(score) else None) for key, score in zip(keys, scores)}
+            })
+        return index
+    
+    def reward_for(self, success: bool, latency: float, cost: float) -> float:
+        """按延迟和成本目标计算单次请求的回报（0~1）"""
+        if not success:
+            return 0.0
+        latency_penalty = min(1.0, latency / self.latency_ceiling) if self.latency_ceiling > 0 else 0.0
+        cost_penalty = min(1.0, cost / self.cost_ceiling) if self.cost_ceiling > 0 else 0.0
+        return max(0.0, 1.0 - self.latency_weight * latency_penalty - self.cost_weight * cost_penalty)
+    
+    def update(self, task_type: str, key: str, success: bool, latency: float, tokens: int = 0):
+        """
+        记录一次请求结果
+        
+        Args:
+            task_type: 任务类型
+            key: 候选（"provider,model"）
+            success: 请求是否成功
+            latency: 请求延迟（秒）
+            tokens: 消耗的token数，用于按价格计算成本
+        """
+        if not self.enabled:
+            return
+        cost = self.price_for(key) * tokens / 1000.0
+        reward = self.reward_for(success, latency, cost)
+        with self._lock:
+            arm = self._arm(task_type, key, time.monotonic())
+            arm.weight += 1.0
+            arm.reward += reward
+            arm.errors += 0.0 if success else 1.0
+            arm.latency += latency
+            arm.cost += cost
+    
+    def decisions(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """获取最近的路由决策（最新的在最后）"""
+        with self._lock:
+            return list(self._decisions)[-limit:]
+    
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """获取各任务类型下每个候选的衰减后统计：样本权重、平均回报、错误率、平均延迟和成本"""
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for (task_type, key), arm in self._arms.items():
+                arm.decay(self.half_life, now)
+                weight = arm.weight
+                result.setdefault(task_type, {})[key] = {
+                    "weight": round(weight, 3),
+                    "mean_reward": round(arm.reward / weight, 4) if weight else None,
+                    "error_rate": round(arm.errors / weight, 4) if weight else None,
+                    "mean_latency": round(arm.latency / weight, 4) if weight else None,
+                    "mean_cost": round(arm.cost / weight, 6) if weight else None
+                }
+        return result
@@ -0,0 +1,120 @@
+import os
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, Callable, Mapping, NamedTuple, Optional, Tuple
+
+class RouteEntry(NamedTuple):
+    """预解析的路由条目"""
+    provider_name: str
+    model: Optional[str]
+    config: Mapping[str, Any]
+    instance: Any
+
+class RouteTable:
+    def __init__(self, routes: Mapping[str, Tuple[RouteEntry, ...]], default: Tuple[RouteEntry, ...], version: int = 0):
+        """
+        编译后的只读路由表
+        - 每个任务类型对应一个预解析的候选元组，查找为一次字典访问，不分配新对象
+        - 创建后不再修改，配置变化时整体替换
+        """
+        self.routes = MappingProxyType(dict(routes))
+        self.default = default
+        self.version = version
+    
+    def candidates(self, task_type: str) -> Tuple[RouteEntry, ...]:
+        """获取任务类型的候选条目，未配置的任务类型使用default路由"""
+        return self.routes.get(task_type, self.default)
+
+def compile_route_table(providers: Dict[str, Dict[str, Any]], routes: Dict[str, Any],
+                        provider_instances: Dict[str, Any], version: int = 0) -> RouteTable:
+    """
+    将Providers和Router配置编译为路由表
+    
+    Args:
+        providers: 提供商配置
+        routes: 路由配置，值为 "provider,model" 字符串或按顺序排列的备选列表
+        provider_instances: 提供商实例，条目直接引用对应实例
+        version: 路由表版本号
+    """
+    by_name = {}
+    for provider in providers.values():
+        by_name.setdefault(provider.get("name"), provider)
+    
+    def make_entry(provider: Mapping[str, Any], model: Optional[str]) -> RouteEntry:
+        config = dict(provider)
+        if model is not None:
+            config["model"] = model
+        name = config.get("name", "openai")
+        return RouteEntry(name, model, MappingProxyType(config), provider_instances.get(name))
+    
+    def resolve(route_entry: str) -> Optional[RouteEntry]:
+        parts = route_entry.split(",", 1)
+        provider = by_name.get(parts[0].strip())
+        if provider is None:
+            return None
+        return make_entry(provider, parts[1].strip() if len(parts) > 1 else None)
+    
+    # 没有找到路由或指定的提供商时使用第一个提供商
+    first_provider = next(iter(providers.values()), {})
+    fallback = (make_entry(first_provider, None),)
+    
+    compiled = {}
+    for task_type, route in routes.items():
+        entries = [route] if isinstance(route, str) else list(route or [])
+        candidates = tuple(entry for entry in map(resolve, entries) if entry is not None)
+        compiled[task_type] = candidates or fallback
+    return RouteTable(compiled, compiled.get("default", fallback), version)
+
+class ConfigWatcher:
+    def __init__(self, path: str, callback: Callable[[], None], interval: float = 1.0):
+        """
+        配置文件监视器
+        - 后台线程按interval秒轮询文件的修改时间和大小，变化时调用callback
+        - 不依赖平台相关的文件通知接口
+        """
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = None
+    
+    def _read_signature(self):
+        """读取文件的修改时间和大小，文件不存在时返回None"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def check(self) -> bool:
+        """检查一次文件是否变化，变化时调用callback并返回True"""
+        signature = self._read_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            self.callback()
+        except Exception as e:
+            print(f"配置热加载失败: {e}")
+        return True
+    
+    def _run(self):
+        """轮询循环"""
+        while not self._stop.wait(self.interval):
+            self.check()
+    
+    def start(self):
+        """开始监视（以当前文件状态为基准）"""
+        if self._thread is not None:
+            return
+        self._signature = self._read_signature()
+        self._thread = threading.Thread(target=self._run, name="ccli-config-watcher", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止监视"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
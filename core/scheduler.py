@@ -0,0 +1,278 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, Optional
+
+# 默认的优先级类别：interactive为交互式对话，background为批量任务、夜间摘要和代理等后台请求
+# weight为加权公平排队的权重，max_queue和max_wait为准入控制（排队数上限和最长排队秒数），
+# yields为true的类别在交互式负载较高时让出并发名额
+DEFAULT_CLASSES = {
+    "interactive": {"weight": 8, "max_queue": 1000, "max_wait": 30.0, "yields": False},
+    "background": {"weight": 1, "max_queue": 10000, "max_wait": 600.0, "yields": True}
+}
+
+# 任务类型到优先级类别的默认映射，未列出的任务类型属于default_class
+DEFAULT_TASK_CLASSES = {"background": "background"}
+
+class AdmissionRejectedError(Exception):
+    """调度器拒绝了请求（排队已满或排队超时）"""
+    
+    def __init__(self, priority_class: str, reason: str):
+        super().__init__(f"{priority_class} 类请求被拒绝: {reason}")
+        self.priority_class = priority_class
+        self.reason = reason
+
+class _Waiter:
+    __slots__ = ("tag", "granted", "event", "wake")
+    
+    def __init__(self, tag: float, wake: Optional[Callable[[], None]] = None):
+        self.tag = tag
+        self.granted = False
+        self.event = threading.Event()
+        # 获得名额时的通知方式：线程等待事件，异步等待由事件循环唤醒
+        self.wake = wake or self.event.set
+
+class _PriorityClass:
+    def __init__(self, name: str, weight: float = 1.0, max_queue: int = 1000, max_wait: float = 30.0,
+                 yields: bool = False):
+        self.name = name
+        self.weight = float(weight)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.yields = yields
+        self.queue = deque()
+        self.in_flight = 0
+        self.last_tag = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waits = deque(maxlen=1000)
+
+class PriorityScheduler:
+    def __init__(self, max_concurrency: int = 64, classes: Optional[Dict[str, Dict[str, Any]]] = None,
+                 task_classes: Optional[Dict[str, str]] = None, default_class: str = "interactive",
+                 yield_threshold: float = 0.75, max_async_waiters: int = 512):
+        """
+        按优先级类别调度发往提供商的请求
+        - 所有请求共享max_concurrency个并发名额，名额用尽时按类别排队
+        - 名额释放后按加权公平排队（WFQ）选择下一个请求：每个请求的虚拟完成时间为
+          max(当前虚拟时间, 同类上一个请求的完成时间) + 1/权重，取各类队首中最小者
+        - 交互式类别的在途加排队请求数达到max_concurrency * yield_threshold时，yields为true的类别
+          （默认为background）暂停获得新名额，让出容量以保证交互式请求的延迟
+        - 准入控制：名额已用尽且类别的排队数达到max_queue时立即拒绝，排队超过max_wait秒时放弃，
+          均抛出AdmissionRejectedError
+        - acquire_async在事件循环上排队（不占用线程），异步排队的请求数达到max_async_waiters时立即拒绝
+        """
+        self.max_concurrency = max_concurrency
+        self.yield_threshold = yield_threshold
+        self.default_class = default_class
+        self.task_classes = dict(DEFAULT_TASK_CLASSES, **(task_classes or {}))
+        self.classes = {}
+        for name, options in dict(DEFAULT_CLASSES, **(classes or {})).items():
+            defaults = DEFAULT_CLASSES.get(name, DEFAULT_CLASSES["interactive"])
+            self.classes[name] = _PriorityClass(name, **dict(defaults, **options))
+        if default_class not in self.classes:
+            self.classes[default_class] = _PriorityClass(default_class, **DEFAULT_CLASSES["interactive"])
+        self.max_async_waiters = max_async_waiters
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self._async_waiters = 0
+        self._lock = threading.Lock()
+    
+    def class_for(self, task_type: str) -> str:
+        """获取任务类型所属的优先级类别"""
+        name = self.task_classes.get(task_type, self.default_class)
+        return name if name in self.classes else self.default_class
+    
+    def _interactive_pressure(self) -> bool:
+        """不让出名额的类别的负载是否已达到阈值（调用方需持有锁）"""
+        load = sum(cls.in_flight + len(cls.queue) for cls in self.classes.values() if not cls.yields)
+        return load >= self.max_concurrency * self.yield_threshold
+    
+    def _grant(self):
+        """把空闲名额按虚拟完成时间分配给各类别的队首请求（调用方需持有锁）"""
+        while self.in_flight < self.max_concurrency:
+            pressure = None
+            chosen = None
+            for cls in self.classes.values():
+                if not cls.queue:
+                    continue
+                if cls.yields:
+                    if pressure is None:
+                        pressure = self._interactive_pressure()
+                    if pressure:
+                        continue
+                if chosen is None or cls.queue[0].tag < chosen.queue[0].tag:
+                    chosen = cls
+            if chosen is None:
+                return
+            waiter = chosen.queue.popleft()
+            self.virtual_time = max(self.virtual_time, waiter.tag)
+            waiter.granted = True
+            chosen.in_flight += 1
+            self.in_flight += 1
+            waiter.wake()
+    
+    def check_admission(self, task_type: str):
+        """检查请求是否会因排队已满被拒绝（不占用名额），用于在流式响应开始前返回错误"""
+        cls = self.classes[self.class_for(task_type)]
+        with self._lock:
+            if len(cls.queue) >= cls.max_queue and self.in_flight >= self.max_concurrency:
+                cls.rejected += 1
+                raise AdmissionRejectedError(cls.name, f"排队请求数已达上限 {cls.max_queue}")
+    
+    def acquire(self, task_type: str, cancel_token=None) -> str:
+        """
+        等待获得一个并发名额
+        
+        Args:
+            task_type: 任务类型
+            cancel_token: 取消令牌（可选），排队时间不超过其剩余时间，被取消时立即离开队列
+        
+        Returns:
+            请求所属的优先级类别（释放名额时传给release）
+        
+        Raises:
+            AdmissionRejectedError: 排队已满或排队超时
+            RequestCancelledError: 排队期间请求被取消或超过截止时间
+        """
+        cls = self.classes[self.class_for(task_type)]
+        max_wait = cls.max_wait if cancel_token is None else cancel_token.timeout(cls.max_wait)
+        start = time.monotonic()
+        with self._lock:
+            waiter = self._enqueue(cls)
+        
+        if not waiter.granted:
+            unregister = cancel_token.on_cancel(waiter.event.set) if cancel_token is not None else None
+            waiter.event.wait(max_wait)
+            if unregister is not None:
+                unregister()
+            with self._lock:
+                if not waiter.granted:
+                    self._give_up(cls, waiter, cancel_token)
+        return self._admitted(cls, start)
+    
+    async def acquire_async(self, task_type: str, cancel_token=None) -> str:
+        """
+        在事件循环上等待获得一个并发名额（参数、返回值和异常同acquire），排队期间不占用线程池的线程
+        
+        Raises:
+            AdmissionRejectedError: 排队已满、异步排队的请求数已达max_async_waiters或排队超时
+            RequestCancelledError: 排队期间请求被取消或超过截止时间
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        
+        def wake():
+            try:
+                loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+            except RuntimeError:
+                # 事件循环已关闭，没有需要唤醒的等待方
+                pass
+        
+        cls = self.classes[self.class_for(task_type)]
+        max_wait = cls.max_wait if cancel_token is None else cancel_token.timeout(cls.max_wait)
+        start = time.monotonic()
+        with self._lock:
+            if self._async_waiters >= self.max_async_waiters and self.in_flight >= self.max_concurrency:
+                cls.rejected += 1
+                raise AdmissionRejectedError(cls.name, f"异步排队请求数已达上限 {self.max_async_waiters}")
+            waiter = self._enqueue(cls, wake)
+            if not waiter.granted:
+                self._async_waiters += 1
+        
+        if not waiter.granted:
+            unregister = cancel_token.on_cancel(wake) if cancel_token is not None else None
+            try:
+                await asyncio.wait_for(granted, max_wait)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # 等待的任务被取消：离开队列，已获得的名额立即释放
+                with self._lock:
+                    release = waiter.granted
+                    if not release:
+                        cls.queue.remove(waiter)
+                        self._grant()
+                if release:
+                    self.release(cls.name)
+                raise
+            finally:
+                if unregister is not None:
+                    unregister()
+                with self._lock:
+                    self._async_waiters -= 1
+            with self._lock:
+                if not waiter.granted:
+                    self._give_up(cls, waiter, cancel_token)
+        return self._admitted(cls, start)
+    
+    def _enqueue(self, cls: _PriorityClass, wake: Optional[Callable[[], None]] = None) -> _Waiter:
+        """检查排队上限后加入类别的队列，有空闲名额时立即分配（调用方需持有锁）"""
+        if len(cls.queue) >= cls.max_queue and self.in_flight >= self.max_concurrency:
+            cls.rejected += 1
+            raise AdmissionRejectedError(cls.name, f"排队请求数已达上限 {cls.max_queue}")
+        tag = max(self.virtual_time, cls.last_tag) + 1.0 / cls.weight
+        cls.last_tag = tag
+        waiter = _Waiter(tag, wake)
+        cls.queue.append(waiter)
+        self._grant()
+        return waiter
+    
+    def _give_up(self, cls: _PriorityClass, waiter: _Waiter, cancel_token=None):
+        """排队结束仍未获得名额时离开队列并抛出异常（调用方需持有锁）"""
+        cls.queue.remove(waiter)
+        self._grant()
+        if cancel_token is not None:
+            cancel_token.check()
+        cls.timed_out += 1
+        raise AdmissionRejectedError(cls.name, f"排队超过 {cls.max_wait} 秒")
+    
+    def _admitted(self, cls: _PriorityClass, start: float) -> str:
+        """记录获得名额的请求及其排队时间"""
+        with self._lock:
+            cls.admitted += 1
+            cls.waits.append(time.monotonic() - start)
+        return cls.name
+    
+    def release(self, priority_class: str):
+        """释放并发名额并分配给下一个排队的请求"""
+        with self._lock:
+            self.classes[priority_class].in_flight -= 1
+            self.in_flight -= 1
+            self._grant()
+    
+    @contextmanager
+    def slot(self, task_type: str, cancel_token=None) -> Iterator[str]:
+        """在并发名额内执行（with语句），结束时释放名额"""
+        priority_class = self.acquire(task_type, cancel_token)
+        try:
+            yield priority_class
+        finally:
+            self.release(priority_class)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取调度统计：各类别的在途数、排队数、准入/拒绝/超时次数和排队等待的p50、p95（秒）"""
+        with self._lock:
+            classes = {}
+            for name, cls in self.classes.items():
+                waits = sorted(cls.waits)
+                classes[name] = {
+                    "weight": cls.weight,
+                    "in_flight": cls.in_flight,
+                    "queued": len(cls.queue),
+                    "admitted": cls.admitted,
+                    "rejected": cls.rejected,
+                    "timed_out": cls.timed_out,
+                    "wait_p50": round(waits[len(waits) // 2], 4) if waits else None,
+                    "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else None
+                }
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "async_waiters": self._async_waiters,
+                "yielding": self._interactive_pressure(),
+                "classes": classes
+            }
@@ -0,0 +1,165 @@
+import copy
+import hashlib
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Any, Optional, Tuple
+
+# NumPy为可选依赖，未安装时语义缓存不可用
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+_WORD_PATTERN = re.compile(r"[a-z0-9_]+")
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 512):
+        """
+        本地哈希向量化器
+        - 英文按单词、中文按单字，并结合字符二元组和三元组提取特征，通过特征哈希映射到固定维度
+        - 无需网络和模型文件，适合作为默认的嵌入实现
+        """
+        self.dim = dim
+
+    def _features(self, text: str):
+        """提取文本特征"""
+        text = text.lower()
+        features = _WORD_PATTERN.findall(text)
+        compact = "".join(text.split())
+        features.extend(char for char in compact if ord(char) > 127)
+        for n in (2, 3):
+            features.extend(compact[i:i + n] for i in range(len(compact) - n + 1))
+        return features or [compact]
+
+    def embed(self, text: str):
+        """将文本转换为L2归一化的向量"""
+        indices = [zlib.crc32(feature.encode("utf-8")) % self.dim for feature in self._features(text)]
+        vector = np.bincount(indices, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+class OllamaEmbedder:
+    def __init__(self, base_url: str = "http://localhost:11434/api", model: str = "nomic-embed-text"):
+        """
+        基于本地Ollama嵌入接口的向量化器
+        """
+        self.base_url = base_url
+        self.model = model
+
+    def embed(self, text: str):
+        """调用Ollama /embeddings接口获取L2归一化的向量"""
+        from integrations.api_providers.transport import get_shared_transport
+        response = get_shared_transport().post(
+            f"{self.base_url}/embeddings",
+            json={"model": self.model, "prompt": text},
+            timeout=10
+        )
+        response.raise_for_status()
+        vector = np.asarray(response.json()["embedding"], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+class SemanticCache:
+    def __init__(self, embedder=None, capacity: int = 2048, default_threshold: float = 0.92,
+                 thresholds: Optional[Dict[str, float]] = None, ttl: float = 3600):
+        """
+        语义响应缓存
+        - 所有缓存向量保存在一个连续的NumPy矩阵中（容量固定，写满后覆盖最旧的条目）
+        - 查询时以一次矩阵-向量乘法计算与全部条目的余弦相似度，不逐条循环
+        - 相似度达到任务类型对应的阈值即视为命中
+        """
+        if not NUMPY_AVAILABLE:
+            raise ImportError("语义缓存需要安装numpy")
+        self.embedder = embedder or HashingEmbedder()
+        self.capacity = capacity
+        self.default_threshold = default_threshold
+        self.thresholds = thresholds or {}
+        self.ttl = ttl
+        self._matrix = None
+        self._scopes = np.zeros(capacity, dtype=np.int64)
+        self._expires = np.zeros(capacity, dtype=np.float64)
+        self._responses = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def scope_id(scope: str) -> int:
+        """将作用域字符串（提供商、模型等）映射为整数，便于向量化比较"""
+        return int.from_bytes(hashlib.sha1(scope.encode("utf-8")).digest()[:8], "little", signed=True)
+
+    def threshold_for(self, task_type: str) -> float:
+        """获取任务类型对应的相似度阈值"""
+        return self.thresholds.get(task_type, self.default_threshold)
+
+    def embed(self, text: str):
+        """使用配置的向量化器嵌入文本"""
+        return self.embedder.embed(text)
+
+    def lookup(self, scope: str, vector, task_type: str = "default") -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        查找语义相似的缓存响应
+
+        Args:
+            scope: 作用域（同一作用域内的条目才会互相命中）
+            vector: 查询文本的归一化向量
+            task_type: 任务类型，用于选择阈值
+
+        Returns:
+            (缓存的响应, 相似度)，未命中时返回None
+        """
+        with self._lock:
+            if self._size == 0 or self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None
+            size = self._size
+            similarities = self._matrix[:size] @ vector
+            valid = (self._scopes[:size] == self.scope_id(scope)) & (self._expires[:size] > time.time())
+            similarities = np.where(valid, similarities, -1.0)
+            index = int(np.argmax(similarities))
+            similarity = float(similarities[index])
+            if similarity < self.threshold_for(task_type):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(self._responses[index]), similarity
+
+    def store(self, scope: str, vector, response: Dict[str, Any]):
+        """写入缓存条目，容量写满后覆盖最旧的条目"""
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                # 首次写入（或向量维度变化）时按维度分配连续矩阵
+                self._matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+                self._size = 0
+                self._next = 0
+            index = self._next
+            self._matrix[index] = vector
+            self._scopes[index] = self.scope_id(scope)
+            self._expires[index] = time.time() + self.ttl
+            self._responses[index] = copy.deepcopy(response)
+            self._next = (index + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._size = 0
+            self._next = 0
+            self._responses = [None] * self.capacity
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
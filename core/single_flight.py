@@ -0,0 +1,63 @@
+import copy
+import threading
+from typing import Any, Callable, Dict
+
+class SingleFlight:
+    def __init__(self):
+        """
+        在途请求合并（single-flight）
+        - 相同键的并发调用只执行一次，其余调用等待并共享同一结果
+        - 结果返回后立即移除在途记录，之后的调用会重新执行
+        """
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+    
+    def do(self, key: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        执行或合并一次调用
+        
+        Args:
+            key: 请求键，相同键的在途调用会被合并
+            func: 实际执行的函数
+            *args, **kwargs: 传给func的参数
+        
+        Returns:
+            func的返回值（合并的调用方得到结果的副本）
+        """
+        # concurrent.futures会连带导入logging，在首次请求时才导入以缩短启动时间
+        from concurrent.futures import Future
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            return copy.deepcopy(future.result())
+        
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+    
+    def stats(self) -> Dict[str, int]:
+        """获取合并统计"""
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls)
+            }
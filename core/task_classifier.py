@@ -0,0 +1,256 @@
+import itertools
+import math
+import re
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# 调用方传入该任务类型时由分类器自动选择
+AUTO_TASK_TYPE = "auto"
+
+# 关键词/正则规则：每命中一条为对应任务类型加rule_weight分
+RULES = {
+    "coding": [
+        r"```",
+        r"\b(def|class|function|import|return|const|let|var|void|public|async|await|lambda)\b",
+        r"\b(python|java|javascript|typescript|golang|rust|c\+\+|sql|regex|html|css|bash|shell)\b",
+        r"\b(bug|debug|compile|refactor|unit ?test|stack ?trace|traceback|exception)\b",
+        r"(代码|函数|报错|异常|编译|重构|单元测试|正则|脚本|接口|调试|算法实现|类型错误)"
+    ],
+    "think": [
+        r"\b(why|analy[sz]e|prove|reason(ing)?|trade-?offs?|compare|step by step|architecture|strategy|pros and cons)\b",
+        r"(为什么|分析|推理|证明|权衡|比较|优缺点|利弊|架构|设计方案|策略|规划|深入|评估|论证)"
+    ],
+    "background": [
+        r"^\s*(translate|summari[sz]e|rewrite|rephrase|format|proofread|tl;?dr|extract|list)\b",
+        r"^\s*(翻译|总结|摘要|改写|润色|格式化|纠正|提取|列出|概括)",
+        r"^\s*(hi|hello|hey|thanks|thank you|你好|谢谢|早上好)\W*$"
+    ]
+}
+
+# 内置的训练样本，用于训练朴素贝叶斯模型；可通过TaskClassifier.examples配置补充
+SEED_EXAMPLES = {
+    "coding": [
+        "写一个Python函数计算斐波那契数列",
+        "这段代码报错 TypeError 怎么修复",
+        "用JavaScript实现防抖函数",
+        "帮我重构这个类，拆分成更小的方法",
+        "给这个函数写单元测试",
+        "write a python script to parse a csv file",
+        "fix this bug in my react component",
+        "how do I reverse a linked list in java",
+        "写一个SQL查询统计每个用户的订单数",
+        "implement binary search in rust"
+    ],
+    "think": [
+        "分析微服务和单体架构的优缺点",
+        "为什么快速排序的平均复杂度是 n log n",
+        "设计一个高可用的分布式缓存方案",
+        "比较三种数据库的适用场景并给出建议",
+        "请一步步推理这道逻辑题",
+        "评估这个商业计划的风险",
+        "explain why the sky is blue step by step",
+        "compare the trade-offs between consistency and availability",
+        "design a strategy to scale our system to a million users",
+        "prove that the square root of two is irrational"
+    ],
+    "background": [
+        "把这句话翻译成英文",
+        "总结一下这段文字",
+        "帮我润色这封邮件",
+        "把下面的列表格式化成表格",
+        "你好",
+        "谢谢",
+        "translate this sentence to french",
+        "summarize this paragraph in one line",
+        "fix the spelling in this text",
+        "extract all email addresses from this text"
+    ],
+    "default": [
+        "今天天气怎么样",
+        "推荐几本好看的小说",
+        "介绍一下长城的历史",
+        "周末去哪里玩比较好",
+        "什么是光合作用",
+        "what is the capital of australia",
+        "tell me a joke",
+        "recommend a good movie for tonight",
+        "who wrote pride and prejudice",
+        "给我讲一个故事"
+    ]
+}
+
+_WORD_PATTERN = re.compile(r"[a-z0-9_+#]+")
+_CJK_PATTERN = re.compile(r"[一-鿿]+")
+
+def features(text: str) -> List[str]:
+    """提取特征：英文单词和中文字符二元组（单字的中文片段取单字）"""
+    text = text.lower()
+    tokens = _WORD_PATTERN.findall(text)
+    for run in _CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+class TaskClassifier:
+    def __init__(self, examples: Optional[Dict[str, List[str]]] = None, rule_weight: float = 0.6,
+                 min_confidence: float = 0.4, max_chars: int = 500, max_decisions: int = 500):
+        """
+        本地任务类型分类器
+        - 规则：RULES中的关键词和正则，每命中一条加rule_weight分
+        - 模型：字符二元组和单词特征上的多项式朴素贝叶斯，由内置样本和配置的样本训练，给出各任务类型的后验概率
+        - 两者相加后取最高分，置信度低于min_confidence时使用default；只看提示的前max_chars个字符，单次分类远低于1毫秒
+        - 记录每次决策（耗时、得分、估算节省的成本），调用方反馈正确的任务类型后统计准确率并在线更新模型
+        """
+        self.rule_weight = rule_weight
+        self.min_confidence = min_confidence
+        self.max_chars = max_chars
+        self.rules = {task_type: [re.compile(pattern, re.IGNORECASE | re.MULTILINE) for pattern in patterns]
+                      for task_type, patterns in RULES.items()}
+        self._counts = {}
+        self._totals = {}
+        self._documents = {}
+        self._vocabulary = set()
+        self._model = None
+        self._decisions = deque(maxlen=max_decisions)
+        self._ids = itertools.count(1)
+        self._feedback = {"labelled": 0, "correct": 0}
+        self._lock = threading.Lock()
+        for task_type, texts in SEED_EXAMPLES.items():
+            self.train(task_type, texts)
+        for task_type, texts in (examples or {}).items():
+            self.train(task_type, texts)
+    
+    def train(self, task_type: str, texts: Iterable[str]):
+        """用标注样本更新模型"""
+        with self._lock:
+            counts = self._counts.setdefault(task_type, {})
+            for text in texts:
+                tokens = features(text[:self.max_chars])
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                    self._vocabulary.add(token)
+                self._totals[task_type] = self._totals.get(task_type, 0) + len(tokens)
+                self._documents[task_type] = self._documents.get(task_type, 0) + 1
+            self._model = None
+    
+    def _get_model(self) -> Dict[str, Tuple[float, Dict[str, float], float]]:
+        """
+        预先计算的对数概率表：任务类型 -> (先验对数概率, 特征对数概率, 未见过特征的对数概率)
+        训练后重新计算，分类时只做查表和加法（调用方需持有锁）
+        """
+        if self._model is None:
+            vocabulary = len(self._vocabulary) + 1
+            documents = sum(self._documents.values())
+            self._model = {}
+            for task_type, counts in self._counts.items():
+                denominator = self._totals[task_type] + vocabulary
+                self._model[task_type] = (
+                    math.log(self._documents[task_type] / documents),
+                    {token: math.log((count + 1) / denominator) for token, count in counts.items()},
+                    math.log(1 / denominator)
+                )
+        return self._model
+    
+    def _posteriors(self, tokens: List[str]) -> Dict[str, float]:
+        """朴素贝叶斯后验概率（调用方需持有锁）"""
+        token_counts = Counter(tokens).items()
+        scores = {}
+        for task_type, (prior, log_probs, unseen) in self._get_model().items():
+            scores[task_type] = prior + sum(log_probs.get(token, unseen) * count for token, count in token_counts)
+        top = max(scores.values())
+        exp = {task_type: math.exp(score - top) for task_type, score in scores.items()}
+        total = sum(exp.values())
+        return {task_type: value / total for task_type, value in exp.items()}
+    
+    def scores(self, text: str) -> Dict[str, float]:
+        """各任务类型的得分（模型后验概率加规则分）"""
+        text = text[:self.max_chars]
+        tokens = features(text)
+        with self._lock:
+            scores = self._posteriors(tokens)
+        for task_type, patterns in self.rules.items():
+            hits = sum(1 for pattern in patterns if pattern.search(text))
+            if hits:
+                scores[task_type] = scores.get(task_type, 0.0) + self.rule_weight * hits
+        return scores
+    
+    def classify(self, text: str, allowed: Optional[Iterable[str]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        为提示选择任务类型并记录决策
+        
+        Args:
+            text: 提示文本
+            allowed: 可选的任务类型（已配置路由的任务类型），得分最高者不在其中时依次取下一个
+        
+        Returns:
+            (任务类型, 决策记录)
+        """
+        start = time.perf_counter()
+        scores = self.scores(text)
+        allowed = set(allowed) if allowed is not None else None
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        total = sum(scores.values())
+        task_type, confidence = "default", 0.0
+        for candidate, score in ranked:
+            if allowed is None or candidate in allowed:
+                task_type, confidence = candidate, (score / total if total else 0.0)
+                break
+        if confidence < self.min_confidence:
+            task_type = "default"
+        decision = {
+            "id": next(self._ids),
+            "time": time.time(),
+            "task_type": task_type,
+            "confidence": round(confidence, 4),
+            "scores": {name: round(score, 4) for name, score in ranked},
+            "micros": round((time.perf_counter() - start) * 1e6, 1),
+            "estimated_savings": 0.0
+        }
+        with self._lock:
+            self._decisions.append(decision)
+        return task_type, decision
+    
+    def record_feedback(self, decision_id: int, task_type: str, text: Optional[str] = None) -> bool:
+        """
+        记录某次决策的正确任务类型（用于统计准确率），提供text时同时用该样本更新模型
+        
+        Returns:
+            是否找到该决策
+        """
+        with self._lock:
+            decision = next((item for item in self._decisions if item["id"] == decision_id), None)
+            if decision is None:
+                return False
+            if "correct_task_type" not in decision:
+                self._feedback["labelled"] += 1
+                self._feedback["correct"] += int(decision["task_type"] == task_type)
+            decision["correct_task_type"] = task_type
+        if text:
+            self.train(task_type, [text])
+        return True
+    
+    def decisions(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """获取最近的分类决策（最新的在最后）"""
+        with self._lock:
+            return list(self._decisions)[-limit:]
+    
+    def stats(self) -> Dict[str, Any]:
+        """分类统计：各任务类型的次数、平均耗时、已反馈决策的准确率和估算节省的成本"""
+        with self._lock:
+            decisions = list(self._decisions)
+            labelled, correct = self._feedback["labelled"], self._feedback["correct"]
+        counts = {}
+        for decision in decisions:
+            counts[decision["task_type"]] = counts.get(decision["task_type"], 0) + 1
+        return {
+            "decisions": len(decisions),
+            "task_types": counts,
+            "mean_micros": round(sum(d["micros"] for d in decisions) / len(decisions), 1) if decisions else None,
+            "labelled": labelled,
+            "accuracy": round(correct / labelled, 4) if labelled else None,
+            "estimated_savings": round(sum(d["estimated_savings"] for d in decisions), 6)
+        }
@@ -0,0 +1,96 @@
+from typing import Dict, Any, Iterable, List, Mapping, Optional
+
+# 本地token估算：不访问网络，不加载分词器
+# ASCII约4个字符一个token，非ASCII字符（如中文）约一个字符一个token，每条消息另加4个token的格式开销
+# 非ASCII字符数由str.encode在C层统计（长度差），比逐字符判断快数十倍，批量估算时逐条调用即可
+
+MESSAGE_OVERHEAD = 4
+
+# 常见模型的上下文窗口（token），按最长前缀匹配，可通过ContextWindow.windows配置覆盖或补充
+DEFAULT_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "claude": 200000,
+    "deepseek": 64000,
+    "gemini-pro": 32760,
+    "gemini-1.5-flash": 1000000,
+    "gemini-1.5-pro": 2000000,
+    "llama3": 8192,
+    "codellama": 16384
+}
+
+class ContextLengthExceededError(Exception):
+    """请求超出了所有可用路由的上下文窗口"""
+    
+    def __init__(self, model: str, tokens: int, window: int):
+        super().__init__(f"请求约需 {tokens} 个token（含最大生成长度），超出模型 {model} 的上下文窗口 {window}")
+        self.model = model
+        self.tokens = tokens
+        self.window = window
+
+def text_token_count(text: str) -> int:
+    """估算一段文本的token数（不含消息开销）"""
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return non_ascii + (len(text) - non_ascii) // 4
+
+def estimate_batch(texts: Iterable[Any]) -> List[int]:
+    """批量估算多段文本的token数（不含消息开销）"""
+    return [text_token_count(text if isinstance(text, str) else str(text)) for text in texts]
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """估算消息列表的token数"""
+    counts = estimate_batch(msg.get("content", "") for msg in messages)
+    return sum(counts) + MESSAGE_OVERHEAD * len(counts)
+
+def text_tokens(text: str) -> int:
+    """估算一段生成文本的token数"""
+    return text_token_count(text)
+
+def trim_messages(messages: List[Dict[str, Any]], budget: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    从最早的对话轮次开始丢弃消息，直到估算的token数不超过budget
+    system消息和最后一条消息始终保留，保留这些消息仍然超出时返回None
+    """
+    counts = [count + MESSAGE_OVERHEAD for count in estimate_batch(msg.get("content", "") for msg in messages)]
+    total = sum(counts)
+    keep = [True] * len(messages)
+    for index, message in enumerate(messages[:-1]):
+        if total <= budget:
+            break
+        if message.get("role") != "system":
+            keep[index] = False
+            total -= counts[index]
+    if total > budget:
+        return None
+    return [message for message, kept in zip(messages, keep) if kept]
+
+class ContextWindows:
+    def __init__(self, windows: Optional[Mapping[str, int]] = None):
+        """
+        模型上下文窗口表
+        - 先精确匹配模型名，再按最长前缀匹配（如 "claude" 匹配所有Claude模型）
+        - OpenRouter风格的 "openai/gpt-4" 按 "/" 之后的模型名匹配
+        """
+        self.windows = dict(DEFAULT_CONTEXT_WINDOWS, **(windows or {}))
+        self._prefixes = sorted(self.windows, key=len, reverse=True)
+        self._resolved = {}
+    
+    def window_for(self, model: Optional[str]) -> Optional[int]:
+        """获取模型的上下文窗口，未知模型返回None"""
+        if not model:
+            return None
+        if model not in self._resolved:
+            self._resolved[model] = self._match(model)
+        return self._resolved[model]
+    
+    def _match(self, model: str) -> Optional[int]:
+        name = model.rsplit("/", 1)[-1]
+        for candidate in (model, name):
+            if candidate in self.windows:
+                return self.windows[candidate]
+        for prefix in self._prefixes:
+            if name.startswith(prefix):
+                return self.windows[prefix]
+        return None
@@ -0,0 +1,326 @@
+import os
+import threading
+import time
+import weakref
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# 预算的统计范围："total"，或 "provider:<提供商>"、"model:<模型>"、"task_type:<任务类型>"、"user:<用户ID>"
+# 预算的限额：daily_tokens、monthly_tokens、daily_requests、monthly_requests
+LIMITS = {
+    "daily_tokens": ("day", "tokens"),
+    "monthly_tokens": ("month", "tokens"),
+    "daily_requests": ("day", "requests"),
+    "monthly_requests": ("month", "requests")
+}
+
+GROUP_BY = ("provider", "model", "task_type", "user")
+
+class QuotaExceededError(Exception):
+    """请求所属范围的用量已达到预算限额"""
+    
+    def __init__(self, scope: str, limit_name: str, limit: int, used: int):
+        super().__init__(f"{scope} 已达到用量预算 {limit_name}={limit}（已使用 {used}）")
+        self.scope = scope
+        self.limit_name = limit_name
+        self.limit = limit
+        self.used = used
+
+def _periods(now: Optional[float] = None) -> Tuple[str, str]:
+    """当前的统计周期（本地时间的日期和月份）"""
+    day = time.strftime("%Y-%m-%d", time.localtime(now))
+    return day, day[:7]
+
+class _ShardHolder:
+    """线程的计数分片（保存在线程局部变量中，线程结束后随之被回收）"""
+    __slots__ = ("shard", "__weakref__")
+    
+    def __init__(self):
+        self.shard = {}
+
+class UsageTracker:
+    def __init__(self, store_path: Optional[str] = None, flush_interval: float = 30.0,
+                 budgets: Optional[Dict[str, Dict[str, int]]] = None):
+        """
+        token用量统计与预算
+        - 每个线程只写自己的计数分片，记录用量时不加锁；读取时汇总所有分片
+        - 线程结束后其分片并入已结束线程的合计，分片数不随创建过的线程数增长
+        - 按 (日期, 提供商, 模型, 任务类型, 用户) 累计请求数和输入/输出token数，每flush_interval秒把增量写入本地SQLite
+        - 配置了预算的范围另有按日和按月的计数，请求发出前检查，已达限额时抛出QuotaExceededError
+        - 其他进程（网关、守护进程、CLI）写入本地存储的用量每flush_interval秒重新读取一次并计入预算
+        
+        Args:
+            store_path: SQLite文件路径，为None时只在内存中统计
+            flush_interval: 写入本地存储的间隔（秒）
+            budgets: 预算范围到限额的映射（如 {"user:001": {"daily_tokens": 100000}}）
+        """
+        self.store_path = os.path.expanduser(store_path) if store_path else None
+        self.flush_interval = flush_interval
+        self.budgets = {scope: dict(limits) for scope, limits in (budgets or {}).items()}
+        self._local = threading.local()
+        self._retired = {}
+        self._shards = [self._retired]
+        self._shards_lock = threading.Lock()
+        self._flushed = {}
+        self._base = None
+        self._base_read = 0.0
+        self._store = None
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+    
+    def _shard(self) -> Dict[tuple, List[int]]:
+        """当前线程的计数分片（线程首次记录时创建并登记）"""
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            holder = self._local.holder = _ShardHolder()
+            with self._shards_lock:
+                self._shards.append(holder.shard)
+            weakref.finalize(holder, UsageTracker._retire, weakref.ref(self), holder.shard)
+        return holder.shard
+    
+    @staticmethod
+    def _retire(tracker_ref: "weakref.ref", shard: Dict[tuple, List[int]]):
+        """把已结束线程的分片并入合计并移除"""
+        tracker = tracker_ref()
+        if tracker is None:
+            return
+        with tracker._shards_lock:
+            for key, counter in shard.items():
+                UsageTracker._accumulate(tracker._retired, key, counter)
+            tracker._shards = [item for item in tracker._shards if item is not shard]
+    
+    @staticmethod
+    def _accumulate(totals: Dict[tuple, List[int]], key: tuple, counter: List[int]):
+        total = totals.setdefault(key, [0, 0, 0])
+        total[0] += counter[0]
+        total[1] += counter[1]
+        total[2] += counter[2]
+    
+    @staticmethod
+    def _add(shard: Dict[tuple, List[int]], key: tuple, input_tokens: int, output_tokens: int):
+        counter = shard.get(key)
+        if counter is None:
+            shard[key] = [1, input_tokens, output_tokens]
+        else:
+            counter[0] += 1
+            counter[1] += input_tokens
+            counter[2] += output_tokens
+    
+    def _total(self, key: tuple) -> List[int]:
+        """汇总所有线程分片中某个键的计数（持有分片锁，避免与分片合并同时进行而重复计数）"""
+        total = [0, 0, 0]
+        with self._shards_lock:
+            for shard in self._shards:
+                counter = shard.get(key)
+                if counter is not None:
+                    total[0] += counter[0]
+                    total[1] += counter[1]
+                    total[2] += counter[2]
+        return total
+    
+    @property
+    def per_user(self) -> bool:
+        """是否配置了按用户的预算"""
+        return any(scope.startswith("user:") for scope in self.budgets)
+    
+    @staticmethod
+    def scopes(provider: str, model: str, task_type: str, user: Optional[str] = None) -> List[str]:
+        """请求所属的预算范围"""
+        scopes = ["total", f"provider:{provider}", f"model:{model}", f"task_type:{task_type}"]
+        if user:
+            scopes.append(f"user:{user}")
+        return scopes
+    
+    def record(self, provider: str, model: str, task_type: str, user: Optional[str],
+               input_tokens: int, output_tokens: int):
+        """记录一次请求的用量"""
+        day, month = _periods()
+        shard = self._shard()
+        self._add(shard, (day, provider, model, task_type, user or ""), input_tokens, output_tokens)
+        if self.budgets:
+            for scope in self.scopes(provider, model, task_type, user):
+                if scope in self.budgets:
+                    self._add(shard, (scope, day), input_tokens, output_tokens)
+                    self._add(shard, (scope, month), input_tokens, output_tokens)
+        if self.store_path and self._flusher is None:
+            self._start_flusher()
+    
+    def used(self, scope: str, period: str = "day") -> Dict[str, int]:
+        """获取预算范围在当前日或月已使用的请求数和token数（含其他进程写入本地存储的用量）"""
+        day, month = _periods()
+        key = (scope, day if period == "day" else month)
+        requests, input_tokens, output_tokens = self._total(key)
+        base = self._get_base().get(key, (0, 0))
+        return {"requests": requests + base[0], "tokens": input_tokens + output_tokens + base[1]}
+    
+    def check(self, scopes: Iterable[str]):
+        """检查各范围的预算，任一限额已用尽时抛出QuotaExceededError"""
+        if not self.budgets:
+            return
+        for scope in scopes:
+            limits = self.budgets.get(scope)
+            if not limits:
+                continue
+            for limit_name, limit in limits.items():
+                period, field = LIMITS[limit_name]
+                used = self.used(scope, period)[field]
+                if used >= limit:
+                    raise QuotaExceededError(scope, limit_name, limit, used)
+    
+    def budget_status(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """各预算范围的限额和已使用量"""
+        status = {}
+        for scope, limits in self.budgets.items():
+            status[scope] = {}
+            for limit_name, limit in limits.items():
+                period, field = LIMITS[limit_name]
+                status[scope][limit_name] = {"limit": limit, "used": self.used(scope, period)[field]}
+        return status
+    
+    def _snapshot(self) -> Dict[tuple, List[int]]:
+        """汇总所有分片中的明细计数（自进程启动以来）"""
+        totals = {}
+        with self._shards_lock:
+            for shard in self._shards:
+                for key, counter in list(shard.items()):
+                    if len(key) == 5:
+                        self._accumulate(totals, key, counter)
+        return totals
+    
+    def _get_store(self):
+        """获取本地存储连接（首次使用时创建，sqlite3在此时才导入）"""
+        if self.store_path and self._store is None:
+            import sqlite3
+            os.makedirs(os.path.dirname(self.store_path) or ".", exist_ok=True)
+            self._store = sqlite3.connect(self.store_path, check_same_thread=False)
+            self._store.execute(
+                "CREATE TABLE IF NOT EXISTS usage (day TEXT, provider TEXT, model TEXT, task_type TEXT, user TEXT, "
+                "requests INTEGER, input_tokens INTEGER, output_tokens INTEGER, "
+                "PRIMARY KEY (day, provider, model, task_type, user))"
+            )
+            self._store.commit()
+        return self._store
+    
+    def _get_base(self) -> Dict[tuple, Tuple[int, int]]:
+        """
+        本地存储中当月由其他进程（及本进程启动前）写入的预算范围用量，距上次读取超过flush_interval秒时重新读取
+        本进程的用量始终从内存分片读取，读取存储时减去本进程已写入的部分，不重复计入
+        """
+        now = time.monotonic()
+        if self._base is None or now - self._base_read >= self.flush_interval:
+            self._base_read = now
+            base = {}
+            if self.store_path and self.budgets and os.path.exists(self.store_path):
+                import sqlite3
+                month = _periods()[1]
+                rows = []
+                with self._lock:
+                    try:
+                        records = self._get_store().execute(
+                            "SELECT day, provider, model, task_type, user, requests, input_tokens + output_tokens "
+                            "FROM usage WHERE day LIKE ?", (month + "%",)
+                        ).fetchall()
+                    except sqlite3.Error as e:
+                        print(f"用量存储读取失败: {e}")
+                        records = []
+                    for record in records:
+                        own = self._flushed.get(record[:5], (0, 0, 0))
+                        rows.append(record[:5] + (record[5] - own[0], record[6] - own[1] - own[2]))
+                for day, provider, model, task_type, user, requests, tokens in rows:
+                    for scope in self.scopes(provider, model, task_type, user):
+                        if scope in self.budgets:
+                            for key in ((scope, day), (scope, month)):
+                                used = base.get(key, (0, 0))
+                                base[key] = (used[0] + requests, used[1] + tokens)
+            self._base = base
+        return self._base
+    
+    def flush(self):
+        """把上次写入以来的用量增量写入本地存储"""
+        if not self.store_path:
+            return
+        import sqlite3
+        with self._lock:
+            totals = self._snapshot()
+            deltas = []
+            for key, total in totals.items():
+                flushed = self._flushed.get(key, (0, 0, 0))
+                delta = [total[i] - flushed[i] for i in range(3)]
+                if any(delta):
+                    deltas.append(key + tuple(delta))
+            if not deltas:
+                return
+            try:
+                store = self._get_store()
+                store.executemany(
+                    "INSERT INTO usage (day, provider, model, task_type, user, requests, input_tokens, output_tokens) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (day, provider, model, task_type, user) DO UPDATE SET "
+                    "requests = requests + excluded.requests, input_tokens = input_tokens + excluded.input_tokens, "
+                    "output_tokens = output_tokens + excluded.output_tokens",
+                    deltas
+                )
+                store.commit()
+            except sqlite3.Error as e:
+                print(f"用量存储写入失败: {e}")
+                return
+            for key, total in totals.items():
+                self._flushed[key] = tuple(total)
+    
+    def _start_flusher(self):
+        """启动定期写入本地存储的后台线程（进程退出时再写入一次）"""
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="ccli-usage-flush", daemon=True)
+            self._flusher.start()
+        import atexit
+        atexit.register(self.flush)
+    
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+    
+    def close(self):
+        """停止后台线程并写入剩余的用量"""
+        self._stop.set()
+        self.flush()
+    
+    def report(self, period: str = "day", group_by: str = "provider") -> List[Dict[str, Any]]:
+        """
+        用量报告（含本地存储和尚未写入的用量）
+        
+        Args:
+            period: 统计周期，day为今天，month为本月
+            group_by: 分组字段（provider、model、task_type、user）
+        """
+        if group_by not in GROUP_BY:
+            raise ValueError(f"不支持的分组字段: {group_by}")
+        day, month = _periods()
+        prefix = day if period == "day" else month
+        index = GROUP_BY.index(group_by) + 1
+        self.flush()
+        rows = {}
+        
+        def add(key, requests, input_tokens, output_tokens):
+            row = rows.setdefault(key[index], [0, 0, 0])
+            row[0] += requests
+            row[1] += input_tokens
+            row[2] += output_tokens
+        
+        if self.store_path and os.path.exists(self.store_path):
+            with self._lock:
+                records = self._get_store().execute(
+                    "SELECT day, provider, model, task_type, user, requests, input_tokens, output_tokens "
+                    "FROM usage WHERE day LIKE ?", (prefix + "%",)
+                ).fetchall()
+            for record in records:
+                add(record[:5], *record[5:])
+        else:
+            for key, total in self._snapshot().items():
+                if key[0].startswith(prefix):
+                    add(key, *total)
+        return sorted((
+            {group_by: name, "requests": row[0], "input_tokens": row[1], "output_tokens": row[2],
+             "total_tokens": row[1] + row[2]}
+            for name, row in rows.items()
+        ), key=lambda row: row["total_tokens"], reverse=True)
@@ -1,15 +1,37 @@
-from .base import BaseAPIProvider, OpenAIProvider, AnthropicProvider
-from .openrouter import OpenRouterProvider
-from .deepseek import DeepSeekProvider
-from .ollama import OllamaProvider
-from .gemini import GeminiProvider
-
-__all__ = [
-    "BaseAPIProvider",
-    "OpenAIProvider",
-    "AnthropicProvider",
-    "OpenRouterProvider",
-    "DeepSeekProvider",
-    "OllamaProvider",
-    "GeminiProvider"
-]
\ No newline at end of file
+import importlib
+
+# 导出的名称 -> 所在模块，通过模块级__getattr__（PEP 562）在首次访问时才导入
+_EXPORTS = {
+    "BaseAPIProvider": ".base",
+    "OpenAIProvider": ".base",
+    "AnthropicProvider": ".base",
+    "OpenRouterProvider": ".openrouter",
+    "DeepSeekProvider": ".deepseek",
+    "OllamaProvider": ".ollama",
+    "GeminiProvider": ".gemini",
+    "ProviderError": ".errors",
+    "RateLimitError": ".errors",
+    "ProviderTimeoutError": ".errors",
+    "OverloadedError": ".errors",
+    "AuthenticationError": ".errors",
+    "BadRequestError": ".errors",
+    "CancellationToken": ".cancellation",
+    "RequestCancelledError": ".cancellation",
+    "DeadlineExceededError": ".cancellation",
+    "ModelResponse": ".response",
+    "create_provider": ".registry",
+    "register_provider": ".registry"
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
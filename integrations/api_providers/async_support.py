@@ -0,0 +1,80 @@
+import functools
+import threading
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterator, Optional
+
+# asyncio和concurrent.futures在首次使用时才导入，避免拖慢不需要异步的命令行启动
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor
+
+# 默认的异步工作线程数，足以让单个Web worker同时挂起数百个提供商调用
+DEFAULT_MAX_WORKERS = 256
+
+_executor: Optional["ThreadPoolExecutor"] = None
+_executor_lock = threading.Lock()
+_max_workers = DEFAULT_MAX_WORKERS
+
+
+def get_executor() -> "ThreadPoolExecutor":
+    """获取共享的阻塞调用线程池（首次使用时创建）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _executor = ThreadPoolExecutor(
+                    max_workers=_max_workers,
+                    thread_name_prefix="ccli-io"
+                )
+    return _executor
+
+
+def configure_executor(max_workers: int):
+    """
+    调整共享线程池的大小
+
+    Args:
+        max_workers: 最大并发阻塞调用数
+    """
+    global _executor, _max_workers
+    with _executor_lock:
+        _max_workers = max(1, int(max_workers))
+        old_executor, _executor = _executor, None
+    if old_executor is not None:
+        # 不等待正在执行的调用，旧线程在完成后自行退出
+        old_executor.shutdown(wait=False)
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在共享线程池中执行阻塞函数，不阻塞事件循环"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+async def iterate_blocking(iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    """
+    在共享线程池中逐项消费阻塞迭代器，将其转换为异步迭代器
+
+    Args:
+        iterator: 同步迭代器（例如提供商的流式生成器）
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    sentinel = object()
+    try:
+        while True:
+            item = await loop.run_in_executor(executor, next, iterator, sentinel)
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            try:
+                close()
+            except ValueError:
+                # 生成器仍在线程池中执行，等其自然结束
+                pass
@@ -1,31 +1,175 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Iterator
+from .async_support import iterate_blocking, run_blocking
+from .cancellation import RequestCancelledError
+from .errors import (
+    AuthenticationError, ProviderError, RateLimitError, classify_error, error_for_status, parse_retry_after
+)
+from .response import ModelResponse
+from .transport import HTTPTransport, get_shared_transport, configure_shared_transport, iter_sse_events
 
 class BaseAPIProvider(ABC):
     """API提供商基类"""
     
+    # 提供商名称和响应格式，send_request的结果按该格式归一化为ModelResponse
+    name = None
+    response_format = "openai"
+    
+    # 请求失败或未配置API密钥时是否返回模拟响应（仅用于演示和离线开发，需显式开启），
+    # 默认抛出对应类别的ProviderError，调用方可以区分超时、限流等失败与真实回答
+    mock_fallback = False
+    
     def __init__(self, api_key: str, base_url: str):
         self.api_key = api_key
         self.base_url = base_url
     
+    @property
+    def transport(self) -> HTTPTransport:
+        """所有提供商共享的HTTP传输层（按主机复用连接池）"""
+        return get_shared_transport()
+    
+    @classmethod
+    def configure_transport(cls, **options) -> HTTPTransport:
+        """配置共享传输层的连接池大小和超时"""
+        return configure_shared_transport(**options)
+    
     @abstractmethod
     def get_models(self) -> List[str]:
         """获取可用模型列表"""
         pass
     
     @abstractmethod
-    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """发送请求到API"""
+    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
+        """发送请求到API，返回归一化的ModelResponse"""
         pass
     
     @abstractmethod
     def validate_config(self) -> bool:
         """验证配置是否有效"""
         pass
+    
+    def probe(self, timeout: float = 5.0) -> List[str]:
+        """
+        健康探测：向上游发送一个轻量请求（如列出模型），返回上游可用的模型列表（无法获取时为空列表）
+        失败时抛出对应类别的ProviderError；只由后台的健康探测器调用，不在请求路径上
+        默认实现只检查是否配置了API密钥，提供模型列表接口的提供商应覆盖此方法
+        """
+        if not self.api_key or self.api_key == "sk-xxx":
+            raise AuthenticationError(f"{self.__class__.__name__} 未配置API密钥", provider=self.name or "")
+        return []
+    
+    def _probe_models(self, url: str, headers: Dict[str, str], timeout: float, field: str = "data",
+                      key: str = "id", require_key: bool = True) -> List[str]:
+        """请求模型列表接口完成健康探测，返回响应中field列表各项的key字段"""
+        if require_key and (not self.api_key or self.api_key == "sk-xxx"):
+            raise AuthenticationError(f"{self.__class__.__name__} 未配置API密钥", provider=self.name or "")
+        try:
+            response = self.transport.get(url, headers=headers, timeout=timeout)
+            self._check_response(response)
+            items = response.json().get(field) or []
+        except ProviderError:
+            raise
+        except Exception as e:
+            raise classify_error(e, self.name or self.__class__.__name__) from e
+        return [item[key] for item in items if isinstance(item, dict) and item.get(key)]
+    
+    def _check_response(self, response):
+        """检查HTTP响应状态，失败状态码按类别转换为ProviderError（429为RateLimitError，交给路由层限流和重试处理）"""
+        if response.status_code < 400:
+            return
+        if response.status_code == 429:
+            message = f"{self.__class__.__name__} 请求过多 (429)"
+        else:
+            detail = (getattr(response, "text", "") or "")[:200]
+            message = f"{self.__class__.__name__} 返回错误 ({response.status_code}){': ' + detail if detail else ''}"
+        raise error_for_status(response.status_code, message, self.name or self.__class__.__name__,
+                               parse_retry_after(response.headers.get("Retry-After")))
+    
+    def _mock_response(self, model: str, reason: str = "") -> Dict[str, Any]:
+        """构造模拟响应（各提供商按自己的响应格式覆盖）"""
+        suffix = f"（API调用失败: {reason}）" if reason else ""
+        response = {"model": model, "response": f"这是来自{self.__class__.__name__}的模拟响应{suffix}"}
+        if reason:
+            response["error"] = reason
+        return response
+    
+    def _missing_api_key(self, model: str) -> ModelResponse:
+        """未配置API密钥：启用mock_fallback时返回模拟响应，否则抛出AuthenticationError"""
+        if self.mock_fallback:
+            return self._result(self._mock_response(model))
+        raise AuthenticationError(f"{self.__class__.__name__} 未配置API密钥", provider=self.name or "")
+    
+    def _request_failed(self, model: str, error: Exception) -> ModelResponse:
+        """请求失败：启用mock_fallback时返回带error字段的模拟响应，否则抛出对应类别的ProviderError"""
+        if self.mock_fallback:
+            return self._result(self._mock_response(model, str(error)))
+        provider_error = classify_error(error, self.name or self.__class__.__name__)
+        if provider_error is not error:
+            provider_error.__cause__ = error
+        raise provider_error
+    
+    @staticmethod
+    def _timeout(kwargs: Dict[str, Any], default: float = 30, stream: bool = False):
+        """
+        请求超时：传入取消令牌（cancel_token）时不超过其剩余时间，已取消或已过截止时间时抛出异常
+        路由传入自适应超时（timeouts）时返回(连接超时, 读取超时)：非流式请求的读取超时为总超时，
+        流式请求为首字节超时（同时限制片段之间的停顿），否则使用提供商的默认超时default
+        """
+        cancel_token = kwargs.get("cancel_token")
+        timeouts = kwargs.get("timeouts")
+        if timeouts is None:
+            return default if cancel_token is None else cancel_token.timeout(default)
+        read = timeouts.first_byte if stream else timeouts.total
+        if cancel_token is not None:
+            read = cancel_token.timeout(read)
+        return (min(timeouts.connect, read), read)
+    
+    def _result(self, payload: Dict[str, Any]) -> ModelResponse:
+        """按提供商的响应格式把原始响应归一化为ModelResponse"""
+        return ModelResponse.parse(payload, self.response_format, self.name)
+    
+    def extract_text(self, response: Dict[str, Any]) -> str:
+        """从响应或流式片段中提取文本（按提供商的响应格式解析）"""
+        return ModelResponse.parse(response, self.response_format).text
+    
+    def stream_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """
+        流式发送请求，逐段产出响应文本
+        默认实现等待完整响应后一次性产出，支持流式接口的提供商应覆盖此方法
+        """
+        text = self._result(self.send_request(model, messages, **kwargs)).text
+        if text:
+            yield text
+    
+    def _stream_chat_completions(self, url: str, headers: Dict[str, str], data: Dict[str, Any],
+                                 timeout=30, cancel_token=None) -> Iterator[str]:
+        """
+        以SSE方式调用OpenAI兼容的/chat/completions接口，逐段产出增量文本（令牌取消时立即断开连接）
+        timeout为秒数或(连接超时, 读取超时)，由调用方按_timeout计算
+        """
+        payload = dict(data, stream=True)
+        with self.transport.post(url, headers=headers, json=payload, timeout=timeout, stream=True) as response:
+            self._check_response(response)
+            for event in iter_sse_events(response, cancel_token):
+                for choice in event.get("choices", []):
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        yield content
+    
+    async def asend_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """异步发送请求，阻塞的HTTP调用在共享线程池中执行"""
+        return await run_blocking(self.send_request, model, messages, **kwargs)
+    
+    async def astream_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """异步流式请求，逐段产出响应文本"""
+        async for chunk in iterate_blocking(self.stream_request(model, messages, **kwargs)):
+            yield chunk
 
 class OpenAIProvider(BaseAPIProvider):
     """OpenAI API提供商"""
     
+    name = "openai"
+    
     def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1"):
         super().__init__(api_key, base_url)
         self.models = [
@@ -39,30 +183,90 @@ class OpenAIProvider(BaseAPIProvider):
         """获取可用模型列表"""
         return self.models
     
-    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """发送请求到OpenAI API"""
-        # 这里应该实现实际的API调用
-        # 为简化起见，我们返回模拟响应
-        return {
+    def _mock_response(self, model: str, reason: str = "") -> Dict[str, Any]:
+        """构造OpenAI格式的模拟响应"""
+        suffix = f"（API调用失败: {reason}）" if reason else ""
+        response = {
             "model": model,
             "choices": [
                 {
                     "message": {
                         "role": "assistant",
-                        "content": "这是来自OpenAI API的模拟响应"
+                        "content": f"这是来自OpenAI API的模拟响应{suffix}"
                     }
                 }
             ]
         }
+        if reason:
+            response["error"] = reason
+        return response
+    
+    def _build_request(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        """构造请求头和请求体"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": model,
+            "messages": messages,
+            "temperature": kwargs.get("temperature", 0.7),
+            "max_tokens": kwargs.get("max_tokens", 1000)
+        }
+        return headers, data
+    
+    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
+        """发送请求到OpenAI API"""
+        # 未配置API密钥时不发起请求
+        if not self.api_key or self.api_key == "sk-xxx":
+            return self._missing_api_key(model)
+        
+        headers, data = self._build_request(model, messages, **kwargs)
+        try:
+            response = self.transport.post(
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                json=data,
+                timeout=self._timeout(kwargs)
+            )
+            self._check_response(response)
+            return self._result(response.json())
+        except (RateLimitError, RequestCancelledError):
+            raise
+        except Exception as e:
+            return self._request_failed(model, e)
+    
+    def stream_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """以SSE方式流式请求OpenAI API"""
+        if not self.api_key or self.api_key == "sk-xxx":
+            yield from super().stream_request(model, messages, **kwargs)
+            return
+        
+        headers, data = self._build_request(model, messages, **kwargs)
+        try:
+            yield from self._stream_chat_completions(f"{self.base_url}/chat/completions", headers, data,
+                                                     timeout=self._timeout(kwargs, stream=True),
+                                                     cancel_token=kwargs.get("cancel_token"))
+        except (RateLimitError, RequestCancelledError):
+            raise
+        except Exception as e:
+            yield self._request_failed(model, e).text
     
     def validate_config(self) -> bool:
         """验证配置是否有效"""
         # 这里应该实现实际的验证逻辑
         return bool(self.api_key)
+    
+    def probe(self, timeout: float = 5.0) -> List[str]:
+        """健康探测：列出上游的模型"""
+        return self._probe_models(f"{self.base_url}/models", {"Authorization": f"Bearer {self.api_key}"}, timeout)
 
 class AnthropicProvider(BaseAPIProvider):
     """Anthropic API提供商"""
     
+    name = "anthropic"
+    response_format = "anthropic"
+    
     def __init__(self, api_key: str, base_url: str = "https://api.anthropic.com/v1"):
         super().__init__(api_key, base_url)
         self.models = [
@@ -75,21 +279,89 @@ class AnthropicProvider(BaseAPIProvider):
         """获取可用模型列表"""
         return self.models
     
-    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """发送请求到Anthropic API"""
-        # 这里应该实现实际的API调用
-        # 为简化起见，我们返回模拟响应
-        return {
+    def _mock_response(self, model: str, reason: str = "") -> Dict[str, Any]:
+        """构造Anthropic格式的模拟响应"""
+        suffix = f"（API调用失败: {reason}）" if reason else ""
+        response = {
             "model": model,
             "content": [
                 {
                     "type": "text",
-                    "text": "这是来自Anthropic API的模拟响应"
+                    "text": f"这是来自Anthropic API的模拟响应{suffix}"
                 }
             ]
         }
+        if reason:
+            response["error"] = reason
+        return response
+    
+    def _build_request(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        """构造请求头和请求体，system消息单独放入system字段"""
+        headers = {
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01",
+            "Content-Type": "application/json"
+        }
+        system_prompts = [msg["content"] for msg in messages if msg["role"] == "system"]
+        data = {
+            "model": model,
+            "messages": [msg for msg in messages if msg["role"] != "system"],
+            "temperature": kwargs.get("temperature", 0.7),
+            "max_tokens": kwargs.get("max_tokens", 1000)
+        }
+        if system_prompts:
+            data["system"] = "\n\n".join(system_prompts)
+        return headers, data
+    
+    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
+        """发送请求到Anthropic API"""
+        # 未配置API密钥时不发起请求
+        if not self.api_key or self.api_key == "sk-xxx":
+            return self._missing_api_key(model)
+        
+        headers, data = self._build_request(model, messages, **kwargs)
+        try:
+            response = self.transport.post(
+                f"{self.base_url}/messages",
+                headers=headers,
+                json=data,
+                timeout=self._timeout(kwargs)
+            )
+            self._check_response(response)
+            return self._result(response.json())
+        except (RateLimitError, RequestCancelledError):
+            raise
+        except Exception as e:
+            return self._request_failed(model, e)
+    
+    def stream_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """以SSE方式流式请求Anthropic API"""
+        if not self.api_key or self.api_key == "sk-xxx":
+            yield from super().stream_request(model, messages, **kwargs)
+            return
+        
+        headers, data = self._build_request(model, messages, **kwargs)
+        data["stream"] = True
+        try:
+            with self.transport.post(f"{self.base_url}/messages", headers=headers, json=data,
+                                     timeout=self._timeout(kwargs, stream=True), stream=True) as response:
+                self._check_response(response)
+                for event in iter_sse_events(response, kwargs.get("cancel_token")):
+                    if event.get("type") == "content_block_delta":
+                        text = event.get("delta", {}).get("text")
+                        if text:
+                            yield text
+        except (RateLimitError, RequestCancelledError):
+            raise
+        except Exception as e:
+            yield self._request_failed(model, e).text
     
     def validate_config(self) -> bool:
         """验证配置是否有效"""
         # 这里应该实现实际的验证逻辑
-        return bool(self.api_key)
\ No newline at end of file
+        return bool(self.api_key)
+    
+    def probe(self, timeout: float = 5.0) -> List[str]:
+        """健康探测：列出上游的模型"""
+        return self._probe_models(f"{self.base_url}/models",
+                                  {"x-api-key": self.api_key, "anthropic-version": "2023-06-01"}, timeout)
@@ -0,0 +1,116 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+class RequestCancelledError(Exception):
+    """请求已被调用方取消（如浏览器标签页关闭、用户按下Ctrl-C）"""
+    
+    def __init__(self, message: str = "请求已取消"):
+        super().__init__(message)
+
+class DeadlineExceededError(RequestCancelledError):
+    """请求的截止时间已过"""
+    
+    def __init__(self, message: str = "请求已超过截止时间"):
+        super().__init__(message)
+
+class CancellationToken:
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["CancellationToken"] = None):
+        """
+        请求的取消令牌与截止时间，从Web、CLI和网关层一路传给路由、提供商和子进程
+        - cancel()立即触发on_cancel注册的回调（关闭流式连接、终止子进程），各层在发起下一步前调用check()
+        - timeout秒后到达截止时间：各层的超时取剩余时间与自身默认值的较小者，重试和备选提供商不会越过截止时间
+        - 子令牌继承父令牌的截止时间（取较早者），父令牌取消时子令牌一并取消；
+          子令牌取消或detach()后从父令牌注销，长期存在的父令牌（如WebSocket连接）不会累积回调
+        
+        Args:
+            timeout: 距截止时间的秒数，为None时没有截止时间
+            parent: 父令牌
+        """
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self.reason = None
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._detach: Callable[[], None] = lambda: None
+        if parent is not None:
+            self._detach = parent.on_cancel(lambda: self.cancel(parent.reason))
+    
+    @property
+    def cancelled(self) -> bool:
+        """是否已取消或已过截止时间"""
+        return self._event.is_set() or (self.deadline is not None and time.monotonic() >= self.deadline)
+    
+    def cancel(self, reason: str = "请求已取消"):
+        """取消请求并执行已注册的回调（重复调用无效）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        self.detach()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"取消回调执行失败: {e}")
+    
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        注册取消时执行的回调（已取消时立即执行）
+        
+        Returns:
+            注销该回调的函数（请求正常结束后调用）
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+    
+    def detach(self):
+        """从父令牌注销（请求结束后调用），之后父令牌取消时不再取消该令牌"""
+        detach, self._detach = self._detach, lambda: None
+        detach()
+    
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+    
+    def remaining(self) -> Optional[float]:
+        """距截止时间的秒数（没有截止时间时为None，已过时为0）"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+    
+    def check(self):
+        """
+        已取消或已过截止时间时抛出异常
+        
+        Raises:
+            RequestCancelledError: 请求已被取消
+            DeadlineExceededError: 请求已超过截止时间
+        """
+        if self._event.is_set():
+            raise RequestCancelledError(self.reason)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceededError()
+    
+    def timeout(self, default: float) -> float:
+        """下一步操作的超时：剩余时间与default中的较小者（已取消或已过截止时间时抛出异常）"""
+        self.check()
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining)
+    
+    def sleep(self, seconds: float):
+        """等待seconds秒（如重试前的退避），期间被取消或等待会越过截止时间时抛出异常"""
+        remaining = self.remaining()
+        if remaining is not None and seconds >= remaining:
+            raise DeadlineExceededError(f"剩余 {remaining:.2f} 秒不足以等待 {seconds:.2f} 秒后重试")
+        self._event.wait(seconds)
+        self.check()
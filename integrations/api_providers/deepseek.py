@@ -1,11 +1,15 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 from .base import BaseAPIProvider
-import requests
+from .cancellation import RequestCancelledError
+from .errors import RateLimitError
+from .response import ModelResponse
 import json
 
 class DeepSeekProvider(BaseAPIProvider):
     """DeepSeek API提供商"""
     
+    name = "deepseek"
+    
     def __init__(self, api_key: str, base_url: str = "https://api.deepseek.com/v1"):
         super().__init__(api_key, base_url)
         self.models = [
@@ -17,23 +21,8 @@ class DeepSeekProvider(BaseAPIProvider):
         """获取可用模型列表"""
         return self.models
     
-    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """发送请求到DeepSeek API"""
-        # 如果没有提供API密钥，返回模拟响应
-        if not self.api_key or self.api_key == "sk-xxx":
-            return {
-                "model": model,
-                "choices": [
-                    {
-                        "message": {
-                            "role": "assistant",
-                            "content": f"这是来自DeepSeek API ({model}) 的模拟响应"
-                        }
-                    }
-                ]
-            }
-        
-        # 实际的API调用
+    def _build_request(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        """构造请求头和请求体"""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -45,30 +34,69 @@ class DeepSeekProvider(BaseAPIProvider):
             "temperature": kwargs.get("temperature", 0.7),
             "max_tokens": kwargs.get("max_tokens", 1000)
         }
+        return headers, data
+    
+    def _mock_response(self, model: str, reason: str = "") -> Dict[str, Any]:
+        """构造OpenAI兼容格式的模拟响应"""
+        suffix = f"（API调用失败: {reason}）" if reason else ""
+        response = {
+            "model": model,
+            "choices": [
+                {
+                    "message": {
+                        "role": "assistant",
+                        "content": f"这是来自DeepSeek API ({model}) 的模拟响应{suffix}"
+                    }
+                }
+            ]
+        }
+        if reason:
+            response["error"] = reason
+        return response
+    
+    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
+        """发送请求到DeepSeek API"""
+        # 未配置API密钥时不发起请求
+        if not self.api_key or self.api_key == "sk-xxx":
+            return self._missing_api_key(model)
+        
+        # 实际的API调用
+        headers, data = self._build_request(model, messages, **kwargs)
         
         try:
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/chat/completions",
                 headers=headers,
                 json=data,
-                timeout=30
+                timeout=self._timeout(kwargs)
             )
-            response.raise_for_status()
-            return response.json()
+            self._check_response(response)
+            return self._result(response.json())
+        except (RateLimitError, RequestCancelledError):
+            raise
         except Exception as e:
-            # 如果API调用失败，返回模拟响应
-            return {
-                "model": model,
-                "choices": [
-                    {
-                        "message": {
-                            "role": "assistant",
-                            "content": f"这是来自DeepSeek API ({model}) 的模拟响应（API调用失败: {str(e)}）"
-                        }
-                    }
-                ]
-            }
+            return self._request_failed(model, e)
+    
+    def stream_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """以SSE方式流式请求DeepSeek API"""
+        if not self.api_key or self.api_key == "sk-xxx":
+            yield from super().stream_request(model, messages, **kwargs)
+            return
+        
+        headers, data = self._build_request(model, messages, **kwargs)
+        try:
+            yield from self._stream_chat_completions(f"{self.base_url}/chat/completions", headers, data,
+                                                     timeout=self._timeout(kwargs, stream=True),
+                                                     cancel_token=kwargs.get("cancel_token"))
+        except (RateLimitError, RequestCancelledError):
+            raise
+        except Exception as e:
+            yield self._request_failed(model, e).text
     
     def validate_config(self) -> bool:
         """验证配置是否有效"""
-        return bool(self.api_key) and self.api_key != "sk-xxx"
\ No newline at end of file
+        return bool(self.api_key) and self.api_key != "sk-xxx"
+    
+    def probe(self, timeout: float = 5.0) -> List[str]:
+        """健康探测：列出上游的模型"""
+        return self._probe_models(f"{self.base_url}/models", {"Authorization": f"Bearer {self.api_key}"}, timeout)
\ No newline at end of file
@@ -0,0 +1,94 @@
+import time
+from typing import Optional
+
+class ProviderError(Exception):
+    """
+    API提供商调用错误基类
+    error_type为错误类别（timeout、rate_limited、overloaded、auth、bad_request，无法归类时为api_error），
+    retryable表示稍后重试同一请求是否可能成功
+    """
+    
+    error_type = "api_error"
+    retryable = False
+    
+    def __init__(self, message: str, provider: str = "", status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class ProviderTimeoutError(ProviderError):
+    """连接或读取提供商响应超时"""
+    
+    error_type = "timeout"
+    retryable = True
+
+class RateLimitError(ProviderError):
+    """提供商返回429（请求过多）"""
+    
+    error_type = "rate_limited"
+    retryable = True
+    
+    def __init__(self, message: str, provider: str = "", retry_after: Optional[float] = None):
+        super().__init__(message, provider=provider, status_code=429, retry_after=retry_after)
+
+class OverloadedError(ProviderError):
+    """提供商过载或暂不可用（5xx、529、连接失败）"""
+    
+    error_type = "overloaded"
+    retryable = True
+
+class AuthenticationError(ProviderError):
+    """API密钥缺失、无效或无权访问（401、403）"""
+    
+    error_type = "auth"
+
+class BadRequestError(ProviderError):
+    """请求本身无效（400、404、413、422等），重试不会成功"""
+    
+    error_type = "bad_request"
+
+def error_for_status(status_code: int, message: str, provider: str = "",
+                     retry_after: Optional[float] = None) -> ProviderError:
+    """按HTTP状态码构造对应类别的错误"""
+    if status_code == 429:
+        return RateLimitError(message, provider=provider, retry_after=retry_after)
+    if status_code in (401, 403):
+        return AuthenticationError(message, provider=provider, status_code=status_code)
+    if status_code in (408, 504):
+        return ProviderTimeoutError(message, provider=provider, status_code=status_code, retry_after=retry_after)
+    if status_code >= 500:
+        return OverloadedError(message, provider=provider, status_code=status_code, retry_after=retry_after)
+    if status_code >= 400:
+        return BadRequestError(message, provider=provider, status_code=status_code)
+    return ProviderError(message, provider=provider, status_code=status_code)
+
+def classify_error(error: BaseException, provider: str = "") -> ProviderError:
+    """把提供商调用中的任意异常转换为对应类别的ProviderError（已是ProviderError时原样返回）"""
+    if isinstance(error, ProviderError):
+        return error
+    import requests
+    message = f"{provider} 请求失败: {error}" if provider else str(error)
+    if isinstance(error, (requests.Timeout, TimeoutError)):
+        return ProviderTimeoutError(message, provider=provider)
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error_for_status(error.response.status_code, message, provider,
+                                parse_retry_after(error.response.headers.get("Retry-After")))
+    if isinstance(error, (requests.ConnectionError, ConnectionError)):
+        return OverloadedError(message, provider=provider)
+    return ProviderError(message, provider=provider)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头（秒数或HTTP日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -1,11 +1,17 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 from .base import BaseAPIProvider
-import requests
+from .cancellation import RequestCancelledError
+from .errors import RateLimitError
+from .response import ModelResponse
+from .transport import iter_sse_events
 import json
 
 class GeminiProvider(BaseAPIProvider):
     """Gemini API提供商"""
     
+    name = "gemini"
+    response_format = "gemini"
+    
     def __init__(self, api_key: str, base_url: str = "https://generativelanguage.googleapis.com/v1beta"):
         super().__init__(api_key, base_url)
         self.models = [
@@ -19,25 +25,8 @@ class GeminiProvider(BaseAPIProvider):
         """获取可用模型列表"""
         return self.models
     
-    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """发送请求到Gemini API"""
-        # 如果没有提供API密钥，返回模拟响应
-        if not self.api_key or self.api_key == "sk-xxx":
-            return {
-                "model": model,
-                "candidates": [
-                    {
-                        "content": {
-                            "parts": [
-                                {
-                                    "text": f"这是来自Gemini API ({model}) 的模拟响应"
-                                }
-                            ]
-                        }
-                    }
-                ]
-            }
-        
+    def _build_request(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        """构造请求头和请求体"""
         # 将OpenAI格式的消息转换为Gemini格式
         gemini_messages = []
         for msg in messages:
@@ -46,7 +35,6 @@ class GeminiProvider(BaseAPIProvider):
                 "parts": [{"text": msg["content"]}]
             })
         
-        # 实际的API调用
         headers = {
             "Content-Type": "application/json"
         }
@@ -58,33 +46,83 @@ class GeminiProvider(BaseAPIProvider):
                 "maxOutputTokens": kwargs.get("max_tokens", 1000)
             }
         }
+        return headers, data
+    
+    def _mock_response(self, model: str, reason: str = "") -> Dict[str, Any]:
+        """构造Gemini格式的模拟响应"""
+        suffix = f"（API调用失败: {reason}）" if reason else ""
+        response = {
+            "model": model,
+            "candidates": [
+                {
+                    "content": {
+                        "parts": [
+                            {
+                                "text": f"这是来自Gemini API ({model}) 的模拟响应{suffix}"
+                            }
+                        ]
+                    }
+                }
+            ]
+        }
+        if reason:
+            response["error"] = reason
+        return response
+    
+    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
+        """发送请求到Gemini API"""
+        # 未配置API密钥时不发起请求
+        if not self.api_key or self.api_key == "sk-xxx":
+            return self._missing_api_key(model)
+        
+        # 实际的API调用
+        headers, data = self._build_request(model, messages, **kwargs)
         
         try:
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/models/{model}:generateContent?key={self.api_key}",
                 headers=headers,
                 json=data,
-                timeout=30
+                timeout=self._timeout(kwargs)
             )
-            response.raise_for_status()
-            return response.json()
+            self._check_response(response)
+            return self._result(response.json())
+        except (RateLimitError, RequestCancelledError):
+            raise
         except Exception as e:
-            # 如果API调用失败，返回模拟响应
-            return {
-                "model": model,
-                "candidates": [
-                    {
-                        "content": {
-                            "parts": [
-                                {
-                                    "text": f"这是来自Gemini API ({model}) 的模拟响应（API调用失败: {str(e)}）"
-                                }
-                            ]
-                        }
-                    }
-                ]
-            }
+            return self._request_failed(model, e)
+    
+    def stream_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """通过streamGenerateContent接口（SSE）流式请求Gemini API"""
+        if not self.api_key or self.api_key == "sk-xxx":
+            yield from super().stream_request(model, messages, **kwargs)
+            return
+        
+        headers, data = self._build_request(model, messages, **kwargs)
+        try:
+            with self.transport.post(
+                f"{self.base_url}/models/{model}:streamGenerateContent?alt=sse&key={self.api_key}",
+                headers=headers,
+                json=data,
+                timeout=self._timeout(kwargs, stream=True),
+                stream=True
+            ) as response:
+                self._check_response(response)
+                for event in iter_sse_events(response, kwargs.get("cancel_token")):
+                    text = self.extract_text(event)
+                    if text:
+                        yield text
+        except (RateLimitError, RequestCancelledError):
+            raise
+        except Exception as e:
+            yield self._request_failed(model, e).text
     
     def validate_config(self) -> bool:
         """验证配置是否有效"""
-        return bool(self.api_key) and self.api_key != "sk-xxx"
\ No newline at end of file
+        return bool(self.api_key) and self.api_key != "sk-xxx"
+    
+    def probe(self, timeout: float = 5.0) -> List[str]:
+        """健康探测：列出上游的模型（去掉名称的 "models/" 前缀）"""
+        names = self._probe_models(f"{self.base_url}/models?key={self.api_key}", {}, timeout,
+                                   field="models", key="name")
+        return [name.split("/", 1)[-1] for name in names]
\ No newline at end of file
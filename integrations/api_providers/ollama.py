@@ -1,11 +1,17 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 from .base import BaseAPIProvider
-import requests
+from .cancellation import RequestCancelledError
+from .errors import RateLimitError
+from .response import ModelResponse
+from .transport import iter_ndjson
 import json
 
 class OllamaProvider(BaseAPIProvider):
     """Ollama API提供商（本地模型）"""
     
+    name = "ollama"
+    response_format = "ollama"
+    
     def __init__(self, api_key: str = "", base_url: str = "http://localhost:11434/api"):
         # Ollama通常不需要API密钥，因为是本地运行
         super().__init__(api_key, base_url)
@@ -19,54 +25,79 @@ class OllamaProvider(BaseAPIProvider):
         ]
     
     def get_models(self) -> List[str]:
-        """获取可用模型列表"""
-        # 尝试从Ollama API获取实际的模型列表
-        try:
-            response = requests.get(f"{self.base_url}/tags", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                return [model["name"] for model in data.get("models", [])]
-        except:
-            pass
-        # 如果无法获取实际模型列表，返回默认列表
+        """获取可用模型列表（健康探测成功后为本地实际已拉取的模型，不发起请求）"""
         return self.models
     
-    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """发送请求到Ollama API"""
-        # 实际的API调用
-        data = {
+    def _build_request(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs) -> Dict[str, Any]:
+        """构造请求体"""
+        return {
             "model": model,
             "messages": messages,
-            "stream": False,
+            "stream": stream,
             "options": {
                 "temperature": kwargs.get("temperature", 0.7),
                 "num_predict": kwargs.get("max_tokens", 1000)
             }
         }
+    
+    def _mock_response(self, model: str, reason: str = "") -> Dict[str, Any]:
+        """构造Ollama格式的模拟响应"""
+        suffix = f"（API调用失败: {reason}）" if reason else ""
+        response = {
+            "model": model,
+            "message": {
+                "role": "assistant",
+                "content": f"这是来自Ollama ({model}) 的模拟响应{suffix}"
+            }
+        }
+        if reason:
+            response["error"] = reason
+        return response
+    
+    def send_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
+        """发送请求到Ollama API"""
+        # 实际的API调用
+        data = self._build_request(model, messages, stream=False, **kwargs)
         
         try:
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/chat",
                 json=data,
-                timeout=60  # Ollama可能需要更长的超时时间
+                timeout=self._timeout(kwargs, 60)  # Ollama可能需要更长的超时时间
             )
-            response.raise_for_status()
-            return response.json()
+            self._check_response(response)
+            return self._result(response.json())
+        except (RateLimitError, RequestCancelledError):
+            raise
         except Exception as e:
-            # 如果API调用失败，返回模拟响应
-            return {
-                "model": model,
-                "message": {
-                    "role": "assistant",
-                    "content": f"这是来自Ollama ({model}) 的模拟响应（API调用失败: {str(e)}）"
-                }
-            }
+            return self._request_failed(model, e)
+    
+    def stream_request(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """以NDJSON方式流式请求Ollama API"""
+        data = self._build_request(model, messages, stream=True, **kwargs)
+        try:
+            with self.transport.post(f"{self.base_url}/chat", json=data, timeout=self._timeout(kwargs, 60, stream=True),
+                                     stream=True) as response:
+                self._check_response(response)
+                for chunk in iter_ndjson(response, kwargs.get("cancel_token")):
+                    text = self.extract_text(chunk)
+                    if text:
+                        yield text
+                    if chunk.get("done"):
+                        break
+        except (RateLimitError, RequestCancelledError):
+            raise
+        except Exception as e:
+            yield self._request_failed(model, e).text
     
     def validate_config(self) -> bool:
         """验证配置是否有效"""
-        # 检查Ollama服务是否可用
-        try:
-            response = requests.get(f"{self.base_url}/tags", timeout=5)
-            return response.status_code == 200
-        except:
-            return True  # 即使无法连接，也认为配置有效（因为Ollama可能稍后启动）
\ No newline at end of file
+        # Ollama不需要API密钥；服务是否可用由后台的健康探测器检查（Ollama可能稍后启动）
+        return True
+    
+    def probe(self, timeout: float = 5.0) -> List[str]:
+        """健康探测：列出本地已拉取的模型，成功时更新get_models返回的模型列表"""
+        names = self._probe_models(f"{self.base_url}/tags", {}, timeout, field="models", key="name", require_key=False)
+        if names:
+            self.models = names
+        return names
\ No newline at end of file
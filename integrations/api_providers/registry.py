@@ -0,0 +1,57 @@
+import importlib
+import threading
+from typing import Dict, Optional, Tuple
+
+# 提供商名称 -> (模块, 类名)，提供商模块在首次使用时才导入
+_PROVIDER_CLASSES: Dict[str, Tuple[str, str]] = {
+    "openai": ("integrations.api_providers.base", "OpenAIProvider"),
+    "anthropic": ("integrations.api_providers.base", "AnthropicProvider"),
+    "openrouter": ("integrations.api_providers.openrouter", "OpenRouterProvider"),
+    "deepseek": ("integrations.api_providers.deepseek", "DeepSeekProvider"),
+    "ollama": ("integrations.api_providers.ollama", "OllamaProvider"),
+    "gemini": ("integrations.api_providers.gemini", "GeminiProvider"),
+}
+_lock = threading.Lock()
+
+def register_provider(name: str, module: str, class_name: str):
+    """
+    注册提供商类
+    
+    Args:
+        name: 提供商名称（与配置中Providers的键一致）
+        module: 提供商类所在的模块路径
+        class_name: 提供商类名
+    """
+    with _lock:
+        _PROVIDER_CLASSES[name] = (module, class_name)
+
+def available_providers():
+    """获取已注册的提供商名称"""
+    with _lock:
+        return list(_PROVIDER_CLASSES)
+
+def get_provider_class(name: str) -> Optional[type]:
+    """获取提供商类（首次调用时导入其模块），未注册时返回None"""
+    with _lock:
+        target = _PROVIDER_CLASSES.get(name)
+    if target is None:
+        return None
+    module, class_name = target
+    return getattr(importlib.import_module(module), class_name)
+
+def create_provider(name: str, api_key: str, base_url: str, mock_fallback: bool = False):
+    """
+    创建提供商实例
+    
+    Args:
+        mock_fallback: 请求失败或未配置API密钥时是否返回模拟响应（默认抛出ProviderError）
+    
+    Returns:
+        提供商实例，未注册的提供商返回None
+    """
+    provider_class = get_provider_class(name)
+    if provider_class is None:
+        return None
+    provider = provider_class(api_key=api_key, base_url=base_url)
+    provider.mock_fallback = mock_fallback
+    return provider
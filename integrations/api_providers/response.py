@@ -0,0 +1,137 @@
+from typing import Dict, Any, Optional
+
+# 各格式的结束原因到统一结束类别的映射（按小写匹配，未列出的原因视为stop）
+FINISH_TYPES = {
+    "stop": "stop", "end_turn": "stop", "stop_sequence": "stop",
+    "length": "length", "max_tokens": "length",
+    "tool_calls": "tool_calls", "function_call": "tool_calls", "tool_use": "tool_calls",
+    "content_filter": "content_filter", "refusal": "content_filter", "safety": "content_filter",
+    "recitation": "content_filter", "blocklist": "content_filter", "prohibited_content": "content_filter",
+    "spii": "content_filter"
+}
+
+def _parts_text(parts) -> str:
+    """拼接内容块或parts中的文本"""
+    return "".join(part.get("text", "") for part in parts or () if isinstance(part, dict)
+                   and part.get("type", "text") == "text")
+
+class ModelResponse(dict):
+    """
+    归一化的模型响应
+    - 按提供商格式只解析一次，text、用量、结束原因和耗时为固定字段，之后的访问不再探测响应的键
+    - 本身是原始响应字典，按键访问、缓存、深拷贝和JSON序列化都与原来的字典响应一致
+    - input_tokens/output_tokens在上游未返回用量时为None
+    """
+
+    __slots__ = ("text", "provider", "finish_reason", "input_tokens", "output_tokens", "latency")
+
+    def __init__(self, payload: Optional[Dict[str, Any]] = None, text: str = "", provider: Optional[str] = None,
+                 finish_reason: Optional[str] = None, input_tokens: Optional[int] = None,
+                 output_tokens: Optional[int] = None, latency: Optional[float] = None):
+        super().__init__(payload or {})
+        self.text = text
+        self.provider = provider
+        self.finish_reason = finish_reason
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.latency = latency
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.get("model") or self.get("modelVersion")
+
+    @property
+    def error(self) -> Optional[str]:
+        """失败原因（请求成功时为None）"""
+        return self.get("error")
+
+    @property
+    def error_type(self) -> Optional[str]:
+        """失败类别（timeout、rate_limited、overloaded、auth、bad_request、api_error），请求成功或未分类时为None"""
+        return self.get("error_type")
+
+    @property
+    def finish_type(self) -> Optional[str]:
+        """统一的结束类别（stop、length、tool_calls、content_filter），上游未返回结束原因时为None"""
+        if not self.finish_reason:
+            return None
+        return FINISH_TYPES.get(str(self.finish_reason).lower(), "stop")
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.input_tokens is None and self.output_tokens is None:
+            return None
+        return (self.input_tokens or 0) + (self.output_tokens or 0)
+
+    @property
+    def raw(self) -> Dict[str, Any]:
+        """提供商返回的原始响应（普通字典副本）"""
+        return dict(self)
+
+    def __repr__(self):
+        return (f"ModelResponse(text={self.text!r}, provider={self.provider!r}, finish_reason={self.finish_reason!r}, "
+                f"input_tokens={self.input_tokens!r}, output_tokens={self.output_tokens!r}, error={self.error!r})")
+
+    @classmethod
+    def from_openai(cls, payload: Dict[str, Any], provider: Optional[str] = None) -> "ModelResponse":
+        """解析OpenAI兼容格式（OpenAI、DeepSeek、OpenRouter）"""
+        choice = (payload.get("choices") or [{}])[0]
+        usage = payload.get("usage") or {}
+        return cls(payload, (choice.get("message") or {}).get("content") or "", provider,
+                   choice.get("finish_reason"), usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+    @classmethod
+    def from_anthropic(cls, payload: Dict[str, Any], provider: Optional[str] = None) -> "ModelResponse":
+        """解析Anthropic Messages格式"""
+        usage = payload.get("usage") or {}
+        return cls(payload, _parts_text(payload.get("content")), provider,
+                   payload.get("stop_reason"), usage.get("input_tokens"), usage.get("output_tokens"))
+
+    @classmethod
+    def from_gemini(cls, payload: Dict[str, Any], provider: Optional[str] = None) -> "ModelResponse":
+        """解析Gemini generateContent格式"""
+        candidate = (payload.get("candidates") or [{}])[0]
+        usage = payload.get("usageMetadata") or {}
+        return cls(payload, _parts_text((candidate.get("content") or {}).get("parts")), provider,
+                   candidate.get("finishReason"), usage.get("promptTokenCount"), usage.get("candidatesTokenCount"))
+
+    @classmethod
+    def from_ollama(cls, payload: Dict[str, Any], provider: Optional[str] = None) -> "ModelResponse":
+        """解析Ollama /api/chat格式"""
+        return cls(payload, (payload.get("message") or {}).get("content") or "", provider,
+                   payload.get("done_reason"), payload.get("prompt_eval_count"), payload.get("eval_count"))
+
+    @classmethod
+    def from_text(cls, payload: Dict[str, Any], provider: Optional[str] = None) -> "ModelResponse":
+        """解析只带response文本字段的响应（模拟响应、Claude Code响应）"""
+        return cls(payload, str(payload.get("response") or ""), provider)
+
+    @classmethod
+    def parse(cls, payload: Dict[str, Any], response_format: Optional[str] = None,
+              provider: Optional[str] = None) -> "ModelResponse":
+        """
+        归一化响应
+
+        Args:
+            payload: 响应字典，已经是ModelResponse时直接返回
+            response_format: 响应格式（openai、anthropic、gemini、ollama、text），未指定时按响应的键判断
+            provider: 提供商名称
+        """
+        if isinstance(payload, ModelResponse):
+            return payload
+        if response_format is None:
+            response_format = cls.detect_format(payload)
+        return getattr(cls, f"from_{response_format}")(payload, provider)
+
+    @staticmethod
+    def detect_format(payload: Dict[str, Any]) -> str:
+        """按响应的键判断格式（只用于来源未知的响应，如磁盘缓存和测试替身）"""
+        if "choices" in payload:
+            return "openai"
+        if isinstance(payload.get("content"), list):
+            return "anthropic"
+        if "candidates" in payload:
+            return "gemini"
+        if isinstance(payload.get("message"), dict):
+            return "ollama"
+        return "text"
@@ -0,0 +1,260 @@
+import json
+import threading
+from typing import Dict, Any, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+# 默认连接池与超时配置
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+
+class HTTPTransport:
+    """
+    共享HTTP传输层
+    每个主机使用独立的会话与连接池，复用keep-alive连接，避免每次请求重新进行TCP/TLS握手
+    """
+
+    def __init__(self, pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT):
+        """
+        初始化传输层
+
+        Args:
+            pool_connections: 每个会话缓存的连接池数量
+            pool_maxsize: 每个主机连接池的最大连接数
+            connect_timeout: 默认连接超时（秒）
+            read_timeout: 默认读取超时（秒）
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._request_counts = {}
+
+    def _host_key(self, url: str) -> str:
+        """获取URL对应的主机键（scheme://host:port）"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get_session(self, url: str):
+        """获取URL所属主机的共享会话（首次使用时创建）"""
+        host = self._host_key(url)
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = self._create_session()
+                    self._sessions[host] = session
+        return session
+
+    def _create_session(self):
+        """创建带连接池的会话"""
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0,
+            pool_block=False
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _resolve_timeout(self, timeout) -> Tuple[float, float]:
+        """将超时参数统一为(连接超时, 读取超时)"""
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if isinstance(timeout, tuple):
+            return timeout
+        return (min(self.connect_timeout, timeout), timeout)
+
+    def request(self, method: str, url: str, timeout=None, **kwargs):
+        """
+        发送HTTP请求
+
+        Args:
+            method: HTTP方法
+            url: 请求地址
+            timeout: 超时时间，可以是秒数或(连接超时, 读取超时)
+            **kwargs: 传递给requests的其他参数
+
+        Returns:
+            requests.Response
+        """
+        host = self._host_key(url)
+        with self._lock:
+            self._request_counts[host] = self._request_counts.get(host, 0) + 1
+        session = self.get_session(url)
+        return session.request(method, url, timeout=self._resolve_timeout(timeout), **kwargs)
+
+    def get(self, url: str, **kwargs):
+        """发送GET请求"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        """发送POST请求"""
+        return self.request("POST", url, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        获取连接复用指标
+
+        Returns:
+            每个主机的请求数、新建连接数和复用连接数
+        """
+        hosts = {}
+        with self._lock:
+            sessions = dict(self._sessions)
+            request_counts = dict(self._request_counts)
+
+        for host, session in sessions.items():
+            connections = 0
+            pooled_requests = 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        connections += pool.num_connections
+                        pooled_requests += pool.num_requests
+            hosts[host] = {
+                "requests": request_counts.get(host, 0),
+                "connections_opened": connections,
+                "connections_reused": max(0, pooled_requests - connections)
+            }
+
+        total_requests = sum(item["requests"] for item in hosts.values())
+        total_reused = sum(item["connections_reused"] for item in hosts.values())
+        return {
+            "hosts": hosts,
+            "total_requests": total_requests,
+            "connections_opened": sum(item["connections_opened"] for item in hosts.values()),
+            "connections_reused": total_reused,
+            "reuse_ratio": total_reused / total_requests if total_requests else 0.0
+        }
+
+    def close(self):
+        """关闭所有会话及其连接"""
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+
+def iter_lines(response, cancel_token=None) -> Iterator[str]:
+    """
+    逐行读取流式响应
+    按字节分行后以UTF-8解码：SSE规定使用UTF-8，而requests对未声明charset的text/event-stream按ISO-8859-1解码，
+    中文等非ASCII内容会变成乱码（UTF-8的多字节字符不含换行字节，按行解码不会截断字符）
+
+    Args:
+        response: 以stream=True发出的requests.Response
+        cancel_token: 取消令牌（可选），取消时立即关闭连接，让上游停止生成
+
+    Raises:
+        RequestCancelledError: 读取过程中请求被取消或超过截止时间
+    """
+    lines = (line.decode("utf-8", errors="replace") for line in response.iter_lines(chunk_size=None))
+    if cancel_token is None:
+        yield from lines
+        return
+    from .cancellation import RequestCancelledError
+    unregister = cancel_token.on_cancel(response.close)
+    try:
+        for line in lines:
+            cancel_token.check()
+            yield line
+    except RequestCancelledError:
+        raise
+    except Exception:
+        # 取消时关闭连接会使正在进行的读取出错，此时抛出取消异常
+        cancel_token.check()
+        raise
+    finally:
+        unregister()
+
+
+def iter_sse_events(response, cancel_token=None) -> Iterator[Dict[str, Any]]:
+    """
+    逐个解析SSE（Server-Sent Events）响应中的JSON数据
+
+    Args:
+        response: 以stream=True发出的requests.Response
+        cancel_token: 取消令牌（可选）
+
+    Yields:
+        每个data字段解析后的字典，遇到[DONE]时结束
+    """
+    for line in iter_lines(response, cancel_token):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            yield json.loads(data)
+        except ValueError:
+            continue
+
+
+def iter_ndjson(response, cancel_token=None) -> Iterator[Dict[str, Any]]:
+    """
+    逐行解析NDJSON（每行一个JSON对象）响应
+
+    Args:
+        response: 以stream=True发出的requests.Response
+        cancel_token: 取消令牌（可选）
+
+    Yields:
+        每行解析后的字典
+    """
+    for line in iter_lines(response, cancel_token):
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+_shared_transport: Optional[HTTPTransport] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport() -> HTTPTransport:
+    """获取所有提供商共享的传输层"""
+    global _shared_transport
+    if _shared_transport is None:
+        with _shared_lock:
+            if _shared_transport is None:
+                _shared_transport = HTTPTransport()
+    return _shared_transport
+
+
+def configure_shared_transport(**options) -> HTTPTransport:
+    """
+    重新配置共享传输层
+
+    Args:
+        **options: pool_connections、pool_maxsize、connect_timeout、read_timeout
+
+    Returns:
+        新的共享传输层
+    """
+    global _shared_transport
+    with _shared_lock:
+        old_transport = _shared_transport
+        _shared_transport = HTTPTransport(**options)
+    if old_transport is not None:
+        old_transport.close()
+    return _shared_transport
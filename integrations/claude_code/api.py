@@ -1,8 +1,9 @@
-from typing import Dict, Any, List, Optional
-import requests
+from typing import Dict, Any, Iterator, List, Optional
 import json
 import os
 from pathlib import Path
+from integrations.api_providers.cancellation import RequestCancelledError
+from integrations.api_providers.transport import get_shared_transport, iter_sse_events
 
 class ClaudeCodeAPI:
     """Claude Code API集成类"""
@@ -31,7 +32,8 @@ class ClaudeCodeAPI:
         self.headers["X-API-Key"] = api_key
     
     def send_message(self, prompt: str, model: str = "claude-3-opus-20240229", 
-                     max_tokens: int = 1000, temperature: float = 0.7) -> Dict[str, Any]:
+                     max_tokens: int = 1000, temperature: float = 0.7, cancel_token=None,
+                     timeout: float = 30) -> Dict[str, Any]:
         """
         发送消息到Claude API
         
@@ -40,6 +42,8 @@ class ClaudeCodeAPI:
             model: 模型名称
             max_tokens: 最大token数
             temperature: 温度参数
+            cancel_token: 取消令牌（可选），超时不超过其剩余时间
+            timeout: 超时秒数（路由按延迟百分位传入自适应的总超时）
             
         Returns:
             API响应
@@ -65,11 +69,11 @@ class ClaudeCodeAPI:
         }
         
         try:
-            response = requests.post(
+            response = get_shared_transport().post(
                 url,
                 headers=self.headers,
                 json=data,
-                timeout=30
+                timeout=timeout if cancel_token is None else cancel_token.timeout(timeout)
             )
             
             if response.status_code == 200:
@@ -79,12 +83,69 @@ class ClaudeCodeAPI:
                     "error": f"API request failed with status {response.status_code}",
                     "message": response.text
                 }
+        except RequestCancelledError:
+            raise
         except Exception as e:
             return {
                 "error": "API request failed",
                 "message": str(e)
             }
     
+    def stream_message(self, prompt: str, model: str = "claude-3-opus-20240229",
+                       max_tokens: int = 1000, temperature: float = 0.7, cancel_token=None,
+                       timeout: float = 30) -> Iterator[str]:
+        """
+        以SSE方式流式发送消息到Claude API，逐段产出增量文本
+        
+        Args:
+            prompt: 提示文本
+            model: 模型名称
+            max_tokens: 最大token数
+            temperature: 温度参数
+            cancel_token: 取消令牌（可选），取消时立即断开连接
+            timeout: 首字节超时秒数，同时限制片段之间的停顿（路由按延迟百分位传入自适应的值）
+            
+        Yields:
+            响应文本片段
+        """
+        if not self.api_key:
+            yield "API key not configured: Please set your Claude API key"
+            return
+        
+        data = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        }
+        
+        try:
+            with get_shared_transport().post(
+                f"{self.base_url}/messages",
+                headers=self.headers,
+                json=data,
+                timeout=timeout if cancel_token is None else cancel_token.timeout(timeout),
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    yield f"API request failed with status {response.status_code}: {response.text}"
+                    return
+                for event in iter_sse_events(response, cancel_token):
+                    if event.get("type") == "content_block_delta":
+                        text = event.get("delta", {}).get("text")
+                        if text:
+                            yield text
+        except RequestCancelledError:
+            raise
+        except Exception as e:
+            yield f"API request failed: {str(e)}"
+    
     def analyze_code(self, code: str, language: str = "python") -> Dict[str, Any]:
         """
         分析代码
@@ -1,9 +1,11 @@
 import subprocess
 import json
 import os
+import signal
 import tempfile
 from pathlib import Path
 from typing import Dict, Any, List, Optional
+from integrations.api_providers.cancellation import RequestCancelledError
 
 class ClaudeCodeCLI:
     """Claude Code命令行工具集成类"""
@@ -37,16 +39,33 @@ class ClaudeCodeCLI:
         except (subprocess.TimeoutExpired, FileNotFoundError):
             return False
     
-    def send_prompt(self, prompt: str, headless: bool = True) -> Dict[str, Any]:
+    @staticmethod
+    def _kill(process: subprocess.Popen):
+        """终止子进程及其进程组"""
+        try:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+    
+    def send_prompt(self, prompt: str, headless: bool = True, cancel_token=None,
+                    timeout: float = 60) -> Dict[str, Any]:
         """
         发送提示给Claude Code
         
         Args:
             prompt: 提示文本
             headless: 是否使用无头模式
+            cancel_token: 取消令牌（可选），取消时立即终止子进程，超时不超过其剩余时间
+            timeout: 子进程的超时秒数
             
         Returns:
             Claude Code的响应
+        
+        Raises:
+            RequestCancelledError: 请求被取消或超过截止时间
         """
         try:
             cmd = [self.claude_path]
@@ -59,27 +78,48 @@ class ClaudeCodeCLI:
                     "message": "Please use headless mode (-p flag)"
                 }
             
-            result = subprocess.run(
+            if cancel_token is not None:
+                timeout = cancel_token.timeout(timeout)
+            # 在新的进程组中启动，终止时连同其子进程一起结束（否则子进程仍占用输出管道）
+            process = subprocess.Popen(
                 cmd,
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
-                timeout=60,
-                cwd=os.getcwd()
+                cwd=os.getcwd(),
+                start_new_session=os.name == "posix"
             )
+            unregister = cancel_token.on_cancel(lambda: self._kill(process)) if cancel_token is not None else None
+            try:
+                stdout, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self._kill(process)
+                process.communicate()
+                raise
+            finally:
+                if unregister is not None:
+                    unregister()
+            if cancel_token is not None and process.returncode != 0:
+                # 子进程因取消被终止；取消前已正常完成的结果照常返回
+                cancel_token.check()
             
             return {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "error": result.stderr,
-                "returncode": result.returncode
+                "success": process.returncode == 0,
+                "output": stdout,
+                "error": stderr,
+                "returncode": process.returncode
             }
         except subprocess.TimeoutExpired:
+            if cancel_token is not None:
+                cancel_token.check()
             return {
                 "success": False,
                 "output": "",
                 "error": "Command timed out",
                 "returncode": -1
             }
+        except RequestCancelledError:
+            raise
         except Exception as e:
             return {
                 "success": False,
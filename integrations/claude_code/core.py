@@ -67,18 +67,24 @@ class ClaudeCodeIntegration:
         from datetime import datetime
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    def send_prompt(self, prompt: str, task_type: str = "default") -> str:
+    def send_prompt(self, prompt: str, task_type: str = "default", cancel_token=None) -> str:
         """
         发送提示给Claude Code
         
         Args:
             prompt: 提示文本
             task_type: 任务类型
+            cancel_token: 取消令牌（可选）
             
         Returns:
             Claude Code的响应
+        
+        Raises:
+            RequestCancelledError: 请求已被取消或超过截止时间
         """
-        # 这里应该调用实际的Claude Code API或命令行工具
+        if cancel_token is not None:
+            cancel_token.check()
+        # 这里应该调用实际的Claude Code API或命令行工具（调用时传入cancel_token）
         # 目前返回模拟响应
         return f"Claude Code响应 ({task_type}): {prompt}"
     
@@ -0,0 +1,117 @@
+import unittest
+import sys
+import os
+import socket
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.adaptive_timeout import AdaptiveTimeouts, Timeouts
+from core.model_router import ModelRouter
+from integrations.api_providers import OllamaProvider, ProviderTimeoutError
+from integrations.api_providers.base import BaseAPIProvider
+from integrations.api_providers.cancellation import CancellationToken
+from tests.test_cancellation import ChunkedProvider
+
+class TestAdaptiveTimeout(unittest.TestCase):
+
+    def test_derivation(self):
+        """测试超时按提示长度区间的百分位推算，并限制在下限和上限之间"""
+        timeouts = AdaptiveTimeouts(min_samples=5, multiplier=2.0,
+                                    overrides={"ollama": {"total": {"ceiling": 1800.0}}})
+        self.assertIsNone(timeouts.timeouts_for("openai,gpt-4", 100))
+        self.assertEqual((timeouts.bucket(100), timeouts.bucket(3000), timeouts.bucket(10 ** 6)),
+                         ("<=512", "<=8192", ">32768"))
+        for _ in range(10):
+            timeouts.record("openai,gpt-4", 100, first_byte=0.3, total=1.0)
+            timeouts.record("openai,gpt-4", 20000, first_byte=20.0, total=100.0)
+            timeouts.record("ollama,llama3", 100, total=1000.0)
+
+        # 短提示：首字节和总超时取下限
+        self.assertEqual(timeouts.timeouts_for("openai,gpt-4", 100), Timeouts(5.0, 2.0, 5.0))
+        # 长提示：按该区间的百分位放宽
+        self.assertEqual(timeouts.timeouts_for("openai,gpt-4", 20000), Timeouts(5.0, 40.0, 200.0))
+        # 没有样本的区间使用该模型所有区间的样本
+        self.assertEqual(timeouts.timeouts_for("openai,gpt-4", 3000).total, 200.0)
+        # 只有非流式样本时首字节超时与总超时相同，覆盖的上限生效
+        self.assertEqual(timeouts.timeouts_for("ollama,llama3", 100), Timeouts(5.0, 1800.0, 1800.0))
+
+        # 超时按超时值记录样本，超时随之放宽
+        timeouts.record_timeout("openai,gpt-4", 100, "total", 5.0)
+        stats = timeouts.stats()["openai,gpt-4"]
+        self.assertEqual((stats["total"]["samples"], stats["total"]["timeouts_fired"]), (21, 1))
+        self.assertEqual(stats["timeouts"]["total"], 10.0)
+        print("自适应超时推算测试通过。")
+
+    def test_overlapping_overrides(self):
+        """测试提供商和"提供商,模型"覆盖同一项时后者优先"""
+        timeouts = AdaptiveTimeouts(min_samples=5, overrides={
+            "ollama": {"total": {"ceiling": 100.0, "floor": 10.0}},
+            "ollama,llama3": {"total": {"ceiling": 50.0}}
+        })
+        for _ in range(10):
+            timeouts.record("ollama,llama3", 100, total=1000.0)
+            timeouts.record("ollama,mistral", 100, total=1.0)
+        self.assertEqual(timeouts.timeouts_for("ollama,llama3", 100).total, 50.0)
+        self.assertEqual(timeouts.timeouts_for("ollama,mistral", 100).total, 10.0)
+        print("超时覆盖合并测试通过。")
+
+    def test_provider_timeout(self):
+        """测试提供商按自适应超时设置连接和读取超时，且不超过取消令牌的剩余时间"""
+        timeouts = Timeouts(connect=2.0, first_byte=3.0, total=20.0)
+        self.assertEqual(BaseAPIProvider._timeout({}, 60), 60)
+        self.assertEqual(BaseAPIProvider._timeout({"timeouts": timeouts}), (2.0, 20.0))
+        self.assertEqual(BaseAPIProvider._timeout({"timeouts": timeouts}, stream=True), (2.0, 3.0))
+        connect, read = BaseAPIProvider._timeout({"timeouts": timeouts, "cancel_token": CancellationToken(timeout=1)})
+        self.assertLessEqual((connect, read), (1.0, 1.0))
+        print("提供商超时测试通过。")
+
+    def test_hung_upstream_cut(self):
+        """测试上游建立连接后不返回任何数据时按首字节超时断开"""
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        try:
+            provider = OllamaProvider(base_url=f"http://127.0.0.1:{server.getsockname()[1]}/api")
+            start = time.monotonic()
+            with self.assertRaises(ProviderTimeoutError):
+                list(provider.stream_request("llama3", [{"role": "user", "content": "你好"}],
+                                             timeouts=Timeouts(connect=1.0, first_byte=0.2, total=30.0)))
+            self.assertLess(time.monotonic() - start, 5)
+        finally:
+            server.close()
+        print("卡住的上游连接断开测试通过。")
+
+    def test_router_stream_timeouts(self):
+        """测试路由按历史延迟切断超过总超时的流式响应，历史上同样较长的生成不受影响"""
+        router = ModelRouter("/nonexistent/config.json")
+        router.retry_engine = None
+        router.adaptive_timeouts = AdaptiveTimeouts(min_samples=3, limits={"first_byte": {"floor": 0.05},
+                                                                           "total": {"floor": 0.1}})
+        for _ in range(3):
+            router.adaptive_timeouts.record("openai,gpt-4", 10, first_byte=0.01, total=0.1)
+            router.adaptive_timeouts.record("deepseek,deepseek-chat", 10, first_byte=0.01, total=5.0)
+
+        fast = ChunkedProvider(chunks=50, delay=0.02)
+        router.set_provider_instance("openai", fast)
+        router.update_route("default", "openai", "gpt-4")
+        start = time.monotonic()
+        with self.assertRaises(ProviderTimeoutError):
+            list(router.stream_request("default", "你好"))
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertLess(fast.produced, 50)
+
+        slow = ChunkedProvider(chunks=20, delay=0.02)
+        router.set_provider_instance("deepseek", slow)
+        router.update_route("think", "deepseek", "deepseek-chat")
+        self.assertEqual(len(list(router.stream_request("think", "你好"))), 20)
+
+        stats = router.get_timeout_stats()["routes"]
+        self.assertEqual(stats["openai,gpt-4"]["total"]["timeouts_fired"], 1)
+        self.assertEqual(stats["deepseek,deepseek-chat"]["total"]["samples"], 4)
+        self.assertEqual(stats["deepseek,deepseek-chat"]["first_byte"]["samples"], 4)
+        print("路由流式超时测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,25 +1,93 @@
 import unittest
+import asyncio
 import sys
 import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # 将项目根目录添加到Python路径中，以便导入模块
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from integrations.api_providers import (
+    OpenAIProvider,
+    AnthropicProvider,
     OpenRouterProvider,
     DeepSeekProvider,
     OllamaProvider,
-    GeminiProvider
+    GeminiProvider,
+    AuthenticationError
 )
 
+class StreamingHandler(BaseHTTPRequestHandler):
+    """模拟各提供商流式接口的测试服务端"""
+    protocol_version = "HTTP/1.1"
+
+    def _send_stream(self, content_type, lines):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for line in lines:
+            data = line.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        words = ["你好", "，", "世界"]
+        if self.path.endswith("/chat/completions"):
+            events = [json.dumps({"choices": [{"delta": {"content": w}}]}) for w in words]
+            lines = [f"data: {event}\n\n" for event in events] + ["data: [DONE]\n\n"]
+            self._send_stream("text/event-stream", lines)
+        elif self.path.endswith("/messages"):
+            events = [{"type": "message_start"}]
+            events += [{"type": "content_block_delta", "delta": {"type": "text_delta", "text": w}} for w in words]
+            events += [{"type": "message_stop"}]
+            lines = [f"event: {e['type']}\ndata: {json.dumps(e)}\n\n" for e in events]
+            self._send_stream("text/event-stream", lines)
+        elif ":streamGenerateContent" in self.path:
+            events = [{"candidates": [{"content": {"parts": [{"text": w}]}}]} for w in words]
+            lines = [f"data: {json.dumps(e)}\n\n" for e in events]
+            self._send_stream("text/event-stream", lines)
+        elif self.path.endswith("/chat"):
+            chunks = [{"message": {"content": w}, "done": False} for w in words]
+            chunks.append({"message": {"content": ""}, "done": True})
+            self._send_stream("application/x-ndjson", [json.dumps(c) + "\n" for c in chunks])
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
 class TestAPIProviders(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StreamingHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
     def test_openrouter_provider(self):
         """测试OpenRouter提供商"""
         provider = OpenRouterProvider(api_key="sk-xxx")
         self.assertIn("openai/gpt-3.5-turbo", provider.get_models())
         
+        # 未配置API密钥且未开启模拟响应时抛出认证错误
+        with self.assertRaises(AuthenticationError):
+            provider.send_request("openai/gpt-3.5-turbo", [{"role": "user", "content": "Hello"}])
+        
         # 测试模拟响应
+        provider.mock_fallback = True
         response = provider.send_request("openai/gpt-3.5-turbo", [{"role": "user", "content": "Hello"}])
         self.assertIn("choices", response)
         print("OpenRouter提供商测试通过。")
@@ -29,7 +97,12 @@ class TestAPIProviders(unittest.TestCase):
         provider = DeepSeekProvider(api_key="sk-xxx")
         self.assertIn("deepseek-chat", provider.get_models())
         
+        # 未配置API密钥且未开启模拟响应时抛出认证错误
+        with self.assertRaises(AuthenticationError):
+            provider.send_request("deepseek-chat", [{"role": "user", "content": "Hello"}])
+        
         # 测试模拟响应
+        provider.mock_fallback = True
         response = provider.send_request("deepseek-chat", [{"role": "user", "content": "Hello"}])
         self.assertIn("choices", response)
         print("DeepSeek提供商测试通过。")
@@ -40,6 +113,7 @@ class TestAPIProviders(unittest.TestCase):
         self.assertIn("llama3", provider.get_models())
         
         # 测试模拟响应
+        provider.mock_fallback = True
         response = provider.send_request("llama3", [{"role": "user", "content": "Hello"}])
         self.assertTrue("message" in response or "choices" in response)
         print("Ollama提供商测试通过。")
@@ -49,10 +123,55 @@ class TestAPIProviders(unittest.TestCase):
         provider = GeminiProvider(api_key="sk-xxx")
         self.assertIn("gemini-pro", provider.get_models())
         
+        # 未配置API密钥且未开启模拟响应时抛出认证错误
+        with self.assertRaises(AuthenticationError):
+            provider.send_request("gemini-pro", [{"role": "user", "content": "Hello"}])
+        
         # 测试模拟响应
+        provider.mock_fallback = True
         response = provider.send_request("gemini-pro", [{"role": "user", "content": "Hello"}])
         self.assertTrue("candidates" in response or "choices" in response)
         print("Gemini提供商测试通过。")
 
+    def test_async_send_request(self):
+        """测试提供商的异步请求接口"""
+        provider = DeepSeekProvider(api_key="sk-xxx")
+        provider.mock_fallback = True
+        response = asyncio.run(provider.asend_request("deepseek-chat", [{"role": "user", "content": "Hello"}]))
+        self.assertIn("choices", response)
+
+        async def collect():
+            return [chunk async for chunk in provider.astream_request("deepseek-chat", [{"role": "user", "content": "Hello"}])]
+
+        chunks = asyncio.run(collect())
+        self.assertIn("DeepSeek", "".join(chunks))
+        print("提供商异步接口测试通过。")
+
+    def test_streaming_providers(self):
+        """测试各提供商按各自协议（SSE/NDJSON）增量产出文本"""
+        messages = [{"role": "user", "content": "Hello"}]
+        providers = [
+            (OpenAIProvider(api_key="test-key", base_url=self.base_url), "gpt-4"),
+            (DeepSeekProvider(api_key="test-key", base_url=self.base_url), "deepseek-chat"),
+            (OpenRouterProvider(api_key="test-key", base_url=self.base_url), "openai/gpt-4"),
+            (AnthropicProvider(api_key="test-key", base_url=self.base_url), "claude-3-haiku-20240307"),
+            (GeminiProvider(api_key="test-key", base_url=self.base_url), "gemini-pro"),
+            (OllamaProvider(base_url=self.base_url), "llama3"),
+        ]
+        for provider, model in providers:
+            chunks = list(provider.stream_request(model, messages))
+            self.assertEqual(chunks, ["你好", "，", "世界"], type(provider).__name__)
+        print("提供商流式接口测试通过。")
+
+    def test_async_streaming(self):
+        """测试异步流式接口逐段产出文本"""
+        provider = DeepSeekProvider(api_key="test-key", base_url=self.base_url)
+
+        async def collect():
+            return [chunk async for chunk in provider.astream_request("deepseek-chat", [{"role": "user", "content": "Hello"}])]
+
+        self.assertEqual(asyncio.run(collect()), ["你好", "，", "世界"])
+        print("提供商异步流式接口测试通过。")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
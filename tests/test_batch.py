@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from tests.test_model_router import SlowProvider
+
+class ConcurrencyProbeProvider(SlowProvider):
+    """记录最大并发数的测试提供商"""
+
+    def __init__(self, delay: float = 0.05):
+        super().__init__(delay=delay)
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def send_request(self, model, messages, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if messages[-1]["content"] == "失败":
+                raise RuntimeError("上游失败")
+            return super().send_request(model, messages, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.router = ModelRouter()
+        self.provider = ConcurrencyProbeProvider()
+        self.router.set_provider_instance("openai", self.provider)
+        self.router.batch_runner.provider_concurrency["openai"] = 3
+
+    def test_send_batch_ordered_and_deduplicated(self):
+        """测试批量结果按输入顺序返回，且批次内相同提示只请求一次"""
+        prompts = [f"问题{i % 10}" for i in range(20)]
+        results = self.router.send_batch("default", prompts, use_cache=False)
+
+        self.assertEqual([item["index"] for item in results], list(range(20)))
+        self.assertEqual([item["prompt"] for item in results], prompts)
+        self.assertEqual(self.provider.calls, 10)
+        self.assertEqual(sum(item["deduplicated"] for item in results), 10)
+        for item in results:
+            self.assertEqual(item["response"]["choices"][0]["message"]["content"], item["prompt"])
+            self.assertGreaterEqual(item["elapsed"], 0)
+            self.assertGreaterEqual(item["wait"], 0)
+        print("send_batch顺序与去重测试通过。")
+
+    def test_provider_concurrency_cap(self):
+        """测试单个提供商的并发数不超过配置上限"""
+        start = time.perf_counter()
+        results = list(self.router.iter_batch("default", [f"问题{i}" for i in range(12)], use_cache=False))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(sorted(item["index"] for item in results), list(range(12)))
+        self.assertLessEqual(self.provider.max_active, 3)
+        # 12个请求、并发3、每个0.05秒，至少需要4轮
+        self.assertGreaterEqual(elapsed, 0.2)
+        print("iter_batch提供商并发上限测试通过。")
+
+    def test_cap_follows_routed_provider(self):
+        """测试并发上限按实际发送到的提供商计算（主提供商失败后切换到备选）"""
+        from tests.test_circuit_breaker import FailingProvider
+        backup = ConcurrencyProbeProvider()
+        self.router.set_provider_instance("openai", FailingProvider(delay=0))
+        self.router.set_provider_instance("anthropic", backup)
+        self.router.update_route("default", "openai", "gpt-4", fallbacks=["anthropic,claude-3-haiku-20240307"])
+        self.router.batch_runner.provider_concurrency["anthropic"] = 2
+
+        results = self.router.send_batch("default", [f"问题{i}" for i in range(8)], use_cache=False)
+        self.assertEqual(backup.calls, 8)
+        self.assertLessEqual(backup.max_active, 2)
+        self.assertEqual({item["provider"] for item in results}, {"anthropic"})
+        print("send_batch按实际提供商限制并发测试通过。")
+
+    def test_item_errors_reported(self):
+        """测试单个条目失败不影响其他条目"""
+        results = self.router.send_batch("default", ["成功", "失败"], use_cache=False)
+        self.assertNotIn("error", results[0])
+        self.assertIsNone(results[1]["response"])
+        self.assertIn("上游失败", results[1]["error"])
+        print("send_batch条目错误测试通过。")
+
+    def test_early_stop_cancels_pending(self):
+        """测试提前停止迭代时取消尚未开始的请求，线程池在批次之间复用"""
+        self.router.batch_runner.max_workers = 2
+        self.router.batch_runner.provider_concurrency["openai"] = 2
+        items = self.router.iter_batch("default", [f"问题{i}" for i in range(20)], use_cache=False)
+        next(items)
+        items.close()
+        time.sleep(0.2)
+        self.assertLess(self.provider.calls, 20)
+        executor = self.router.batch_runner._get_executor()
+
+        results = self.router.send_batch("default", ["之后的批次"], use_cache=False)
+        self.assertNotIn("error", results[0])
+        self.assertIs(self.router.batch_runner._get_executor(), executor)
+        print("iter_batch提前停止测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import unittest
+import sys
+import os
+import stat
+import tempfile
+import threading
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from core.scheduler import PriorityScheduler
+from integrations.api_providers.cancellation import (
+    CancellationToken, DeadlineExceededError, RequestCancelledError
+)
+from integrations.claude_code.cli import ClaudeCodeCLI
+from integrations.claude_code.core import ClaudeCodeIntegration
+from tests.test_model_router import SlowProvider
+
+class ChunkedProvider(SlowProvider):
+    """逐段产出的流式提供商，每段之间检查取消令牌"""
+
+    def __init__(self, chunks: int = 50, delay: float = 0.02):
+        super().__init__(delay=delay)
+        self.chunks = chunks
+        self.produced = 0
+
+    def stream_request(self, model, messages, **kwargs):
+        cancel_token = kwargs.get("cancel_token")
+        for i in range(self.chunks):
+            if cancel_token is not None:
+                cancel_token.check()
+            self.produced += 1
+            yield f"{i} "
+            time.sleep(self.delay)
+
+class TestCancellation(unittest.TestCase):
+
+    def test_token(self):
+        """测试取消回调、截止时间和父子令牌"""
+        parent = CancellationToken(timeout=60)
+        child = CancellationToken(timeout=120, parent=parent)
+        self.assertEqual(child.deadline, parent.deadline)
+        called = []
+        unregister = child.on_cancel(lambda: called.append("first"))
+        child.on_cancel(lambda: called.append("second"))
+        unregister()
+        parent.cancel("测试取消")
+        self.assertEqual(called, ["second"])
+        with self.assertRaises(RequestCancelledError) as context:
+            child.check()
+        self.assertNotIsInstance(context.exception, DeadlineExceededError)
+
+        token = CancellationToken(timeout=0.05)
+        self.assertLessEqual(token.timeout(30), 0.05)
+        with self.assertRaises(DeadlineExceededError):
+            token.sleep(1)
+        time.sleep(0.06)
+        self.assertTrue(token.cancelled)
+        with self.assertRaises(DeadlineExceededError):
+            token.check()
+        print("取消令牌测试通过。")
+
+    def test_child_detached(self):
+        """测试子令牌取消或detach()后从父令牌注销，父令牌不再累积回调"""
+        parent = CancellationToken()
+        finished = [CancellationToken(parent=parent) for _ in range(100)]
+        for child in finished[:50]:
+            child.cancel()
+        for child in finished[50:]:
+            child.detach()
+        active = CancellationToken(parent=parent)
+        self.assertEqual(len(parent._callbacks), 1)
+        parent.cancel("连接已断开")
+        self.assertTrue(active.cancelled)
+        self.assertEqual(active.reason, "连接已断开")
+        self.assertFalse(finished[50].cancelled)
+        print("子令牌注销测试通过。")
+
+    def test_scheduler_leaves_queue(self):
+        """测试排队中的请求被取消时立即离开队列，不计为排队超时"""
+        scheduler = PriorityScheduler(max_concurrency=1)
+        holder = scheduler.acquire("default")
+        token = CancellationToken()
+        errors = []
+
+        def worker():
+            try:
+                scheduler.acquire("default", token)
+            except RequestCancelledError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        while scheduler.stats()["classes"]["interactive"]["queued"] < 1:
+            time.sleep(0.001)
+        start = time.monotonic()
+        token.cancel()
+        thread.join(1)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(len(errors), 1)
+        stats = scheduler.stats()["classes"]["interactive"]
+        self.assertEqual((stats["queued"], stats["timed_out"]), (0, 0))
+        scheduler.release(holder)
+        print("调度器取消测试通过。")
+
+    def test_router_cancelled(self):
+        """测试已取消或已超时的请求不再发往主提供商和备选提供商"""
+        router = ModelRouter("/nonexistent/config.json")
+        primary, fallback = SlowProvider(delay=0), SlowProvider(delay=0)
+        router.set_provider_instance("openai", primary)
+        router.set_provider_instance("deepseek", fallback)
+        router.update_route("default", "openai", "gpt-4", fallbacks=["deepseek,deepseek-chat"])
+
+        token = CancellationToken()
+        token.cancel()
+        with self.assertRaises(RequestCancelledError):
+            router.send_request("default", "你好", use_cache=False, cancel_token=token)
+        with self.assertRaises(DeadlineExceededError):
+            router.send_request("default", "你好", use_cache=False, cancel_token=CancellationToken(timeout=0))
+        self.assertEqual((primary.calls, fallback.calls), (0, 0))
+        self.assertEqual(router.send_request("default", "你好", use_cache=False,
+                                             cancel_token=CancellationToken(timeout=30))["choices"][0]["message"]["content"],
+                         "你好")
+        print("路由取消测试通过。")
+
+    def test_stream_cancelled(self):
+        """测试流式请求在中途取消后停止产出，提供商不再生成后续内容"""
+        router = ModelRouter("/nonexistent/config.json")
+        provider = ChunkedProvider(chunks=50, delay=0.01)
+        router.set_provider_instance("openai", provider)
+        router.update_route("default", "openai", "gpt-4")
+        token = CancellationToken()
+        received = []
+        with self.assertRaises(RequestCancelledError):
+            for chunk in router.stream_request("default", "你好", cancel_token=token):
+                received.append(chunk)
+                if len(received) == 3:
+                    token.cancel()
+        self.assertEqual(len(received), 3)
+        self.assertLessEqual(provider.produced, 4)
+        self.assertEqual(router.get_scheduler_stats()["in_flight"], 0)
+        print("流式请求取消测试通过。")
+
+    @unittest.skipIf(os.name != "posix", "需要可执行的shell脚本")
+    def test_subprocess_killed(self):
+        """测试取消时立即终止Claude Code子进程"""
+        with tempfile.TemporaryDirectory() as directory:
+            script = os.path.join(directory, "claude")
+            with open(script, "w") as f:
+                f.write("#!/bin/sh\nsleep 30\n")
+            os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+            cli = ClaudeCodeCLI(claude_path=script)
+            token = CancellationToken()
+            threading.Timer(0.1, token.cancel).start()
+            start = time.monotonic()
+            with self.assertRaises(RequestCancelledError):
+                cli.send_prompt("你好", cancel_token=token)
+            self.assertLess(time.monotonic() - start, 5)
+            with self.assertRaises(DeadlineExceededError):
+                cli.send_prompt("你好", cancel_token=CancellationToken(timeout=0.1))
+            # ClaudeCodeIntegration在请求已取消时不再返回响应
+            cancelled = CancellationToken()
+            cancelled.cancel()
+            with self.assertRaises(RequestCancelledError):
+                ClaudeCodeIntegration().send_prompt("你好", "claudeCode", cancel_token=cancelled)
+        print("子进程取消测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
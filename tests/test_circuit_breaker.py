@@ -0,0 +1,161 @@
+import unittest
+import sys
+import os
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.circuit_breaker import CircuitBreaker
+from core.model_router import ModelRouter
+from integrations.api_providers import BadRequestError, ProviderError
+from integrations.api_providers.cancellation import CancellationToken, RequestCancelledError
+from tests.test_model_router import SlowProvider
+
+class FailingProvider(SlowProvider):
+    """总是返回失败响应的测试提供商"""
+
+    def send_request(self, model, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {"model": model, "error": "连接超时", "choices": []}
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_state_transitions(self):
+        """测试熔断器在closed、open、half_open之间的状态转换"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertFalse(breaker.is_available())
+
+        time.sleep(0.15)
+        self.assertTrue(breaker.is_available())
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # 半开状态只放行一个探测请求
+        self.assertFalse(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.stats()["rejected"], 2)
+        print("CircuitBreaker状态转换测试通过。")
+
+    def test_router_fallback_chain(self):
+        """测试主提供商失败时沿备选列表切换，熔断后不再等待主提供商"""
+        router = ModelRouter()
+        failing = FailingProvider(delay=0.2)
+        backup = SlowProvider(delay=0)
+        router.set_provider_instance("openai", failing)
+        router.set_provider_instance("anthropic", backup)
+        router.update_route("default", "openai", "gpt-4", fallbacks=["anthropic,claude-3-haiku-20240307"])
+
+        for i in range(3):
+            response = router.send_request("default", f"备选测试{i}", use_cache=False)
+            self.assertNotIn("error", response)
+        self.assertEqual(failing.calls, 3)
+        self.assertEqual(router.get_circuit_breaker_stats()["openai"]["state"], CircuitBreaker.OPEN)
+
+        start = time.perf_counter()
+        response = router.send_request("default", "熔断后请求", use_cache=False)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(response["choices"][0]["message"]["content"], "熔断后请求")
+        self.assertEqual(failing.calls, 3)
+        self.assertLess(elapsed, 0.1)
+        self.assertEqual(backup.calls, 4)
+
+        chunks = list(router.stream_request("default", "流式备选"))
+        self.assertEqual("".join(chunks), "流式备选")
+        print("ModelRouter备选链与熔断测试通过。")
+
+    def test_half_open_probe_released(self):
+        """测试半开状态的探测请求为无效请求或被取消时归还探测名额，熔断器不会一直停留在半开状态"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.release()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+
+        class InvalidProvider(SlowProvider):
+            def send_request(self, model, messages, **kwargs):
+                self.calls += 1
+                raise BadRequestError("无效的请求", "openai")
+
+        class CancellingProvider(SlowProvider):
+            def send_request(self, model, messages, **kwargs):
+                self.calls += 1
+                kwargs["cancel_token"].cancel()
+                kwargs["cancel_token"].check()
+
+        router = ModelRouter("/nonexistent/config.json")
+        router.update_route("default", "openai", "gpt-4")
+        for provider in (InvalidProvider(delay=0), CancellingProvider(delay=0)):
+            breaker = router.circuit_breakers["openai"] = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+            breaker.record_failure()
+            time.sleep(0.02)
+            router.set_provider_instance("openai", provider)
+            try:
+                response = router.send_request("default", "探测", use_cache=False, cancel_token=CancellationToken())
+                self.assertEqual(response.error_type, "bad_request")
+            except RequestCancelledError:
+                self.assertIsInstance(provider, CancellingProvider)
+            self.assertEqual(provider.calls, 1)
+            self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertTrue(breaker.allow_request())
+        print("半开探测名额归还测试通过。")
+
+    def test_stream_settles_breaker(self):
+        """测试流式请求同样经熔断器发送并结算：失败计入熔断，读取完成关闭熔断器，提前关闭只归还探测名额"""
+        from integrations.api_providers import AuthenticationError
+        from tests.test_cancellation import ChunkedProvider
+        from tests.test_retry import FlakyProvider
+
+        router = ModelRouter("/nonexistent/config.json")
+        router.update_route("default", "openai", "gpt-4")
+        breaker = router.circuit_breakers["openai"] = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        flaky = FlakyProvider([AuthenticationError("密钥无效", "openai")] * 2)
+        router.set_provider_instance("openai", flaky)
+        for _ in range(2):
+            with self.assertRaises(AuthenticationError):
+                list(router.stream_request("default", "流式失败"))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(ProviderError):
+            list(router.stream_request("default", "熔断"))
+        self.assertEqual(flaky.calls, 2)
+
+        # 半开状态下提前关闭的流式请求只归还探测名额
+        time.sleep(0.06)
+        router.set_provider_instance("openai", ChunkedProvider(chunks=5, delay=0))
+        chunks = router.stream_request("default", "提前关闭")
+        next(chunks)
+        chunks.close()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(len(list(router.stream_request("default", "探测"))), 5)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        print("流式请求熔断结算测试通过。")
+
+    def test_all_providers_open(self):
+        """测试所有候选提供商均熔断时立即返回失败响应"""
+        router = ModelRouter()
+        router.set_provider_instance("openai", FailingProvider(delay=0))
+        for _ in range(3):
+            router.send_request("default", "全部失败", use_cache=False)
+
+        response = router.send_request("default", "全部失败", use_cache=False)
+        self.assertIn("error", response)
+        self.assertIn("熔断", response["error"])
+        print("ModelRouter全部熔断测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
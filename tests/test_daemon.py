@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+import json
+import socket
+import stat
+import tempfile
+import threading
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from integrations.api_providers.cancellation import RequestCancelledError
+from ui.cli.daemon import CCLIDaemon, DaemonClient, DaemonError, DaemonUnavailable
+from tests.test_model_router import SlowProvider
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "守护进程需要Unix套接字")
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.temp_dir.name, "ccli.sock")
+        self.router = ModelRouter(os.path.join(self.temp_dir.name, "config.json"))
+        self.provider = SlowProvider(delay=0)
+        self.router.set_provider_instance("openai", self.provider)
+        self.daemon = CCLIDaemon(self.socket_path, router=self.router)
+        self.daemon.start()
+        self.thread = threading.Thread(target=self.daemon.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = DaemonClient(self.socket_path)
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.thread.join(timeout=5)
+        self.temp_dir.cleanup()
+
+    def test_chat_uses_warm_router(self):
+        """测试多次chat请求共用守护进程中的同一个路由（第二次命中响应缓存）"""
+        first = self.client.call("chat", task="default", message="你好")
+        second = self.client.call("chat", task="default", message="你好")
+        self.assertEqual(first, second)
+        self.assertEqual(first["choices"][0]["message"]["content"], "你好")
+        self.assertEqual(self.provider.calls, 1)
+        self.assertEqual(self.client.call("ping")["requests"], 2)
+        print("守护进程chat请求测试通过。")
+
+    def test_stream_and_route(self):
+        """测试流式请求逐段返回，以及route请求返回路由信息"""
+        chunks = list(self.client.stream("chat", task="default", message="流式测试", stream=True))
+        self.assertEqual("".join(chunks), "流式测试")
+        info = self.client.call("route")
+        self.assertIn("openai", info["providers"])
+        self.assertIn("default", info["routes"])
+        print("守护进程流式与路由请求测试通过。")
+
+    def test_errors(self):
+        """测试未知操作返回错误，并且不影响同一守护进程的后续请求"""
+        with self.assertRaises(DaemonError):
+            self.client.call("unknown")
+        self.assertTrue(self.client.is_running())
+        with self.assertRaises(DaemonError):
+            CCLIDaemon(self.socket_path, router=self.router).start()
+        print("守护进程错误处理测试通过。")
+
+    def test_disconnect_cancels(self):
+        """测试套接字只对当前用户可读写，非流式请求处理期间客户端断开时立即取消请求"""
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+        cancelled = threading.Event()
+
+        class BlockingProvider(SlowProvider):
+            def send_request(self, model, messages, **kwargs):
+                self.calls += 1
+                try:
+                    kwargs["cancel_token"].sleep(5)
+                except RequestCancelledError:
+                    cancelled.set()
+                    raise
+
+        self.router.set_provider_instance("openai", BlockingProvider(delay=0))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        sock.sendall((json.dumps({"op": "chat", "task": "default", "message": "断开", "use_cache": False}) +
+                      "\n").encode("utf-8"))
+        time.sleep(0.1)
+        start = time.monotonic()
+        sock.close()
+        self.assertTrue(cancelled.wait(2))
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertTrue(self.client.is_running())
+        print("守护进程断开取消测试通过。")
+
+    def test_unavailable(self):
+        """测试守护进程未运行时客户端抛出DaemonUnavailable，调用方可回退到进程内执行"""
+        client = DaemonClient(os.path.join(self.temp_dir.name, "missing.sock"))
+        self.assertFalse(client.is_running())
+        with self.assertRaises(DaemonUnavailable):
+            client.call("route")
+        with self.assertRaises(DaemonUnavailable):
+            client.stream("chat", task="default", message="你好", stream=True)
+        print("守护进程不可用回退测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from tests.test_model_router import SlowProvider
+from tests.test_circuit_breaker import FailingProvider
+
+try:
+    from fastapi.testclient import TestClient
+    FASTAPI_AVAILABLE = True
+except ImportError:
+    FASTAPI_AVAILABLE = False
+
+@unittest.skipUnless(FASTAPI_AVAILABLE, "网关需要fastapi")
+class TestGateway(unittest.TestCase):
+
+    def setUp(self):
+        from ui.web.gateway import create_gateway
+        config = {
+            "Providers": {
+                "openai": {"name": "openai", "api_base_url": "https://api.openai.com/v1",
+                           "api_key": "sk-xxx", "models": ["gpt-4"]},
+                "deepseek": {"name": "deepseek", "api_base_url": "https://api.deepseek.com/v1",
+                             "api_key": "sk-xxx", "models": ["deepseek-coder"]}
+            },
+            "Router": {"default": "openai,gpt-4", "coding": "deepseek,deepseek-coder"},
+            "Gateway": {"model_aliases": {"gpt-4o": "coding"}}
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_path = os.path.join(temp_dir, "config.json")
+            with open(config_path, "w", encoding="utf-8") as f:
+                json.dump(config, f)
+            self.router = ModelRouter(config_path)
+        self.openai = SlowProvider(delay=0)
+        self.deepseek = SlowProvider(delay=0)
+        self.router.set_provider_instance("openai", self.openai)
+        self.router.set_provider_instance("deepseek", self.deepseek)
+        self.client = TestClient(create_gateway(self.router))
+
+    def test_chat_completion(self):
+        """测试非流式对话补全返回OpenAI格式，完整的对话历史被发送给模型"""
+        response = self.client.post("/v1/chat/completions", json={
+            "model": "default",
+            "messages": [
+                {"role": "system", "content": "你是助手"},
+                {"role": "user", "content": [{"type": "text", "text": "你好"}]}
+            ],
+            "temperature": 0
+        })
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["object"], "chat.completion")
+        self.assertEqual(body["choices"][0]["message"], {"role": "assistant", "content": "你好"})
+        self.assertGreater(body["usage"]["total_tokens"], 0)
+        self.assertEqual(self.openai.calls, 1)
+        print("网关非流式对话补全测试通过。")
+
+    def test_task_type_selection(self):
+        """测试任务类型由请求头、模型别名或同名模型选择"""
+        messages = [{"role": "user", "content": "写一个排序函数"}]
+        for headers, model in (({"X-CCLi-Task-Type": "coding"}, "gpt-3.5-turbo"), ({}, "gpt-4o"), ({}, "ccli/coding")):
+            response = self.client.post("/v1/chat/completions", headers=headers,
+                                        json={"model": model, "messages": messages, "stream": False})
+            self.assertEqual(response.headers["x-ccli-task-type"], "coding")
+        self.assertEqual(self.deepseek.calls, 1)
+        self.assertEqual(self.openai.calls, 0)
+
+        models = [model["id"] for model in self.client.get("/v1/models").json()["data"]]
+        self.assertEqual(models, ["default", "coding", "gpt-4o"])
+        print("网关任务类型选择测试通过。")
+
+    def test_streaming(self):
+        """测试流式对话补全按SSE返回chat.completion.chunk，并以[DONE]结束"""
+        with self.client.stream("POST", "/v1/chat/completions", json={
+            "model": "default", "stream": True, "messages": [{"role": "user", "content": "流式输出"}]
+        }) as response:
+            self.assertEqual(response.status_code, 200)
+            events = [line[len("data: "):] for line in response.iter_lines() if line.startswith("data: ")]
+        self.assertEqual(events[-1], "[DONE]")
+        chunks = [json.loads(event) for event in events[:-1]]
+        self.assertEqual(chunks[0]["choices"][0]["delta"]["role"], "assistant")
+        self.assertEqual("".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks), "流式输出")
+        self.assertEqual(chunks[-1]["choices"][0]["finish_reason"], "stop")
+        print("网关流式对话补全测试通过。")
+
+    def test_errors(self):
+        """测试无效请求、鉴权失败和上游失败返回OpenAI格式的错误"""
+        response = self.client.post("/v1/chat/completions", json={"model": "default"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("message", response.json()["error"])
+
+        self.client.app.state.gateway.api_keys = {"secret"}
+        response = self.client.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": "hi"}]})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post("/v1/chat/completions", headers={"Authorization": "Bearer secret"},
+                                    json={"messages": [{"role": "user", "content": "hi"}]})
+        self.assertEqual(response.status_code, 200)
+
+        self.router.set_provider_instance("openai", FailingProvider(delay=0))
+        response = self.client.post("/v1/chat/completions", headers={"Authorization": "Bearer secret"},
+                                    json={"messages": [{"role": "user", "content": "上游失败"}]})
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.json()["error"]["type"], "upstream_error")
+        print("网关错误处理测试通过。")
+
+    def test_quota_exceeded(self):
+        """测试用户预算用尽时返回429（流式请求在开始输出前检查）"""
+        from core.usage_tracker import UsageTracker
+        self.router.usage_tracker = UsageTracker(budgets={"user:alice": {"daily_requests": 0}})
+        response = self.client.post("/v1/chat/completions", json={
+            "user": "alice", "messages": [{"role": "user", "content": "hi"}]
+        })
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["error"]["type"], "insufficient_quota")
+        response = self.client.post("/v1/messages", json={
+            "model": "default", "max_tokens": 10, "stream": True, "metadata": {"user_id": "alice"},
+            "messages": [{"role": "user", "content": "hi"}]
+        })
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["error"]["type"], "rate_limit_error")
+        response = self.client.post("/v1/chat/completions", json={
+            "user": "bob", "messages": [{"role": "user", "content": "hi"}]
+        })
+        self.assertEqual(response.status_code, 200)
+        print("网关预算检查测试通过。")
+
+    def test_context_length_exceeded(self):
+        """测试超出上下文窗口且没有长上下文路由时返回400"""
+        response = self.client.post("/v1/chat/completions", json={
+            "model": "default", "stream": True, "messages": [{"role": "user", "content": "长" * 9000}]
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("上下文窗口", response.json()["error"]["message"])
+        self.assertEqual(self.openai.calls, 0)
+        print("网关上下文长度检查测试通过。")
+
+    def test_anthropic_messages(self):
+        """测试/v1/messages把Anthropic格式的请求路由到其他提供商，并返回Anthropic格式的响应"""
+        self.client.app.state.gateway.model_aliases["claude-3-5-sonnet-20241022"] = "coding"
+        request = {
+            "model": "claude-3-5-sonnet-20241022",
+            "max_tokens": 256,
+            "system": "你是编程助手",
+            "messages": [{"role": "user", "content": [{"type": "text", "text": "写一个排序函数"}]}]
+        }
+        response = self.client.post("/v1/messages", json=request)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["type"], "message")
+        self.assertEqual(body["content"], [{"type": "text", "text": "写一个排序函数"}])
+        self.assertEqual(body["model"], "claude-3-5-sonnet-20241022")
+        self.assertEqual(self.deepseek.calls, 1)
+
+        with self.client.stream("POST", "/v1/messages", json=dict(request, stream=True)) as response:
+            events = [line[len("event: "):] for line in response.iter_lines() if line.startswith("event: ")]
+        self.assertEqual(events[:3], ["message_start", "content_block_start", "ping"])
+        self.assertIn("content_block_delta", events)
+        self.assertEqual(events[-3:], ["content_block_stop", "message_delta", "message_stop"])
+
+        tokens = self.client.post("/v1/messages/count_tokens", json=request).json()
+        self.assertGreater(tokens["input_tokens"], 0)
+        response = self.client.post("/v1/messages", json={"model": "claude", "messages": []})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["type"], "error")
+        print("网关Anthropic Messages接口测试通过。")
+
+    def test_gemini_generate_content(self):
+        """测试Gemini格式的generateContent和streamGenerateContent接口"""
+        request = {"contents": [{"role": "user", "parts": [{"text": "你好"}]}]}
+        body = self.client.post("/v1beta/models/default:generateContent", json=request).json()
+        self.assertEqual(body["candidates"][0]["content"]["parts"][0]["text"], "你好")
+        with self.client.stream("POST", "/v1beta/models/default:streamGenerateContent?alt=sse", json=request) as response:
+            events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+        self.assertEqual(events[-1]["candidates"][0]["finishReason"], "STOP")
+        self.assertEqual(self.client.post("/v1beta/models/default:unknown", json=request).status_code, 404)
+        print("网关Gemini接口测试通过。")
+
+    def test_stream_is_incremental(self):
+        """测试流式转换逐段进行：上游产出第一个片段后，客户端立即收到对应事件，不等待完整响应"""
+        import asyncio
+        import threading
+        from core.protocol_translation import AnthropicStreamEncoder
+
+        first_event_sent = threading.Event()
+
+        def upstream():
+            yield "第一段"
+            # 在客户端收到第一段之前不继续产出（若网关缓存完整响应，这里会等待超时）
+            yield "第二段" if first_event_sent.wait(timeout=2) else "超时"
+
+        self.router._stream_routed = lambda task_type, prompt, routed_request: upstream()
+        gateway = self.client.app.state.gateway
+        internal = {"messages": [{"role": "user", "content": "你好"}], "temperature": None, "max_tokens": None}
+
+        async def consume():
+            texts = []
+            async for event in gateway._stream("default", internal, AnthropicStreamEncoder("claude")):
+                if "text_delta" in event:
+                    texts.append(json.loads(event.split("data: ", 1)[1])["delta"]["text"])
+                    first_event_sent.set()
+            return texts
+
+        self.assertEqual(asyncio.run(consume()), ["第一段", "第二段"])
+        print("网关流式逐段转换测试通过。")
+
+    def test_stream_rejected_after_start(self):
+        """测试流式响应开始后被调度器拒绝或预算用尽时，以目标格式的错误事件结束"""
+        from core.scheduler import AdmissionRejectedError
+        from core.usage_tracker import QuotaExceededError
+
+        cases = [(AdmissionRejectedError("interactive", "排队已满"), 503, "overloaded_error"),
+                 (QuotaExceededError("user:alice", "daily_requests", 1, 1), 429, "insufficient_quota")]
+        for error, status_code, error_type in cases:
+            def upstream():
+                raise error
+                yield
+            self.router._stream_routed = lambda task_type, prompt, routed_request: upstream()
+            with self.client.stream("POST", "/v1/chat/completions", json={
+                "model": "default", "stream": True, "messages": [{"role": "user", "content": "你好"}]
+            }) as response:
+                self.assertEqual(response.status_code, 200)
+                events = [line[6:] for line in response.iter_lines() if line.startswith("data: ")]
+            self.assertEqual(json.loads(events[-1])["error"], {"message": str(error), "type": error_type,
+                                                              "param": None, "code": status_code})
+        print("网关流式拒绝错误事件测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
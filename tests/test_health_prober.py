@@ -0,0 +1,182 @@
+import unittest
+import sys
+import os
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.health_prober import HealthProber
+from core.model_router import ModelRouter
+from integrations.api_providers import AuthenticationError, OllamaProvider, OverloadedError
+from tests.test_model_router import SlowProvider
+
+class ProbedProvider(SlowProvider):
+    """健康探测按预设结果返回模型列表或抛出错误的测试提供商"""
+
+    def __init__(self, results):
+        super().__init__(delay=0)
+        self.results = list(results)
+
+    def probe(self, timeout=5.0):
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+class TagsHandler(BaseHTTPRequestHandler):
+    """返回Ollama /tags响应的测试服务"""
+
+    def do_GET(self):
+        body = json.dumps({"models": [{"name": "llama3:latest"}, {"name": "qwen2.5-coder:7b"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestHealthProber(unittest.TestCase):
+
+    def test_status_transitions(self):
+        """测试连续失败后变为不可用、认证失败立即不可用，探测成功后恢复"""
+        providers = {
+            "openai": ProbedProvider([["gpt-4"], OverloadedError("过载"), OverloadedError("过载"), ["gpt-4"]]),
+            "deepseek": ProbedProvider([AuthenticationError("密钥无效")])
+        }
+        prober = HealthProber(lambda: providers, failure_threshold=2)
+        self.assertEqual(prober.status("openai"), "unknown")
+        self.assertTrue(prober.is_available("openai", "gpt-4"))
+
+        prober.check()
+        self.assertEqual((prober.status("openai"), prober.status("deepseek")), ("healthy", "unhealthy"))
+        self.assertFalse(prober.is_available("openai", "gpt-3.5-turbo"))
+        self.assertFalse(prober.is_available("deepseek"))
+        prober.check()
+        self.assertEqual(prober.status("openai"), "degraded")
+        prober.check()
+        stats = prober.stats()["openai"]
+        self.assertEqual((stats["status"], stats["consecutive_failures"], stats["error_type"]),
+                         ("unhealthy", 2, "overloaded"))
+        # 探测失败时保留上一次的模型列表
+        self.assertEqual(stats["models"], ["gpt-4"])
+        prober.check()
+        self.assertEqual(prober.status("openai"), "healthy")
+
+        # 从配置中移除的提供商不再保留状态
+        del providers["deepseek"]
+        prober.check()
+        self.assertNotIn("deepseek", prober.stats())
+        print("健康状态转换测试通过。")
+
+    def test_ollama_probe(self):
+        """测试Ollama的探测读取本地已拉取的模型，get_models和validate_config不再发起请求"""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), TagsHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            provider = OllamaProvider(base_url=f"http://127.0.0.1:{server.server_address[1]}/api")
+            self.assertIn("llama3", provider.get_models())
+            prober = HealthProber(lambda: {"ollama": provider})
+            prober.check()
+            self.assertEqual(prober.status("ollama"), "healthy")
+            self.assertEqual(provider.get_models(), ["llama3:latest", "qwen2.5-coder:7b"])
+            self.assertTrue(prober.is_available("ollama", "llama3"))
+            self.assertFalse(prober.is_available("ollama", "mistral"))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # 服务未启动时探测失败，validate_config仍不发起请求
+        provider = OllamaProvider(base_url="http://127.0.0.1:9/api")
+        self.assertTrue(provider.validate_config())
+        prober = HealthProber(lambda: {"ollama": provider}, failure_threshold=1)
+        prober.check()
+        self.assertEqual(prober.stats()["ollama"]["error_type"], "overloaded")
+        self.assertEqual(prober.status("ollama"), "unhealthy")
+        print("Ollama健康探测测试通过。")
+
+    def test_router_uses_health(self):
+        """测试路由把不可用的提供商排到备选之后，并在统计中返回健康状态"""
+        router = ModelRouter("/nonexistent/config.json")
+        primary = ProbedProvider([OverloadedError("不可用")])
+        fallback = ProbedProvider([["deepseek-chat"]])
+        router.set_provider_instance("openai", primary)
+        router.set_provider_instance("deepseek", fallback)
+        router.update_route("default", "openai", "gpt-4", fallbacks=["deepseek,deepseek-chat"])
+        router.health_prober = HealthProber(lambda: {"openai": primary, "deepseek": fallback}, failure_threshold=1)
+        router.health_prober.check()
+
+        response = router.send_request("default", "你好", use_cache=False)
+        self.assertEqual(response["choices"][0]["message"]["content"], "你好")
+        self.assertEqual((primary.calls, fallback.calls), (0, 1))
+        router.mock_responses = True
+        self.assertEqual(list(router.stream_request("default", "流式")), ["流式"])
+        self.assertEqual(primary.calls, 0)
+
+        stats = router.get_health_stats()
+        self.assertFalse(stats["running"])
+        self.assertEqual(stats["providers"]["openai"]["status"], "unhealthy")
+        self.assertEqual(stats["providers"]["deepseek"]["models"], ["deepseek-chat"])
+        print("路由健康状态测试通过。")
+
+    def test_background_thread(self):
+        """测试后台线程启动后立即探测，并能及时停止"""
+        provider = ProbedProvider([["gpt-4"]])
+        prober = HealthProber(lambda: {"openai": provider}, interval=60)
+        prober.start()
+        try:
+            deadline = time.monotonic() + 2
+            while prober.status("openai") == "unknown" and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(prober.status("openai"), "healthy")
+            self.assertTrue(prober.running)
+        finally:
+            start = time.monotonic()
+            prober.stop()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse(prober.running)
+        print("后台健康探测测试通过。")
+
+    def test_restart_waits_for_slow_probe(self):
+        """测试停止时探测仍未结束，重新启动会等待上一个探测线程退出，不会同时运行两个探测线程"""
+        entered = threading.Event()
+        release = threading.Event()
+        active = []
+        peak = []
+
+        class HangingProvider(SlowProvider):
+            def probe(self, timeout=5.0):
+                active.append(1)
+                peak.append(len(active))
+                entered.set()
+                release.wait(5)
+                active.pop()
+                return ["gpt-4"]
+
+        prober = HealthProber(lambda: {"openai": HangingProvider(delay=0)}, interval=60, timeout=0.05)
+        prober.start()
+        self.assertTrue(entered.wait(2))
+        prober.stop()
+        self.assertFalse(prober.running)
+        self.assertTrue(prober._thread.is_alive())
+
+        threading.Timer(0.1, release.set).start()
+        prober.start()
+        try:
+            deadline = time.monotonic() + 2
+            while len(peak) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(peak, [1, 1])
+            self.assertTrue(prober.running)
+        finally:
+            prober.stop()
+        print("探测线程重启测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.hedging import HedgingPolicy
+from core.latency_tracker import LatencyTracker
+from core.model_router import ModelRouter
+from integrations.api_providers import AuthenticationError
+from integrations.api_providers.cancellation import CancellationToken, RequestCancelledError
+from tests.test_model_router import SlowProvider
+from tests.test_retry import FlakyProvider
+
+class LabeledProvider(SlowProvider):
+    """响应中带有标签的测试提供商"""
+
+    def __init__(self, label: str, delay: float):
+        super().__init__(delay=delay)
+        self.label = label
+        self.tokens = []
+        self.threads = []
+
+    def send_request(self, model, messages, **kwargs):
+        self.tokens.append(kwargs.get("cancel_token"))
+        self.threads.append(threading.current_thread().name)
+        response = super().send_request(model, messages, **kwargs)
+        response["choices"][0]["message"]["content"] = self.label
+        return response
+
+class TestHedging(unittest.TestCase):
+
+    def setUp(self):
+        self.router = ModelRouter()
+        self.primary = LabeledProvider("主", delay=1.0)
+        self.backup = LabeledProvider("备", delay=0.01)
+        self.router.set_provider_instance("openai", self.primary)
+        self.router.set_provider_instance("anthropic", self.backup)
+        self.router.update_route("default", "openai", "gpt-4", fallbacks=["anthropic,claude-3-haiku-20240307"])
+        for _ in range(5):
+            self.router.latency_tracker.record("openai,gpt-4", 0.05)
+            self.router.latency_tracker.record("openai,gpt-4:ttfb", 0.05)
+
+    def _enable_hedging(self, max_extra_ratio: float):
+        self.router.hedging = HedgingPolicy(
+            self.router.latency_tracker,
+            task_types={"default": {"percentile": 95, "max_extra_ratio": max_extra_ratio}},
+            min_samples=5
+        )
+
+    def test_latency_tracker_percentile(self):
+        """测试延迟百分位计算和样本数下限"""
+        tracker = LatencyTracker(window=100)
+        for i in range(1, 101):
+            tracker.record("key", i / 100)
+        self.assertEqual(tracker.percentile("key", 50), 0.5)
+        self.assertEqual(tracker.percentile("key", 99), 0.99)
+        self.assertIsNone(tracker.percentile("key", 50, min_samples=200))
+        self.assertIsNone(tracker.percentile("missing", 50))
+        print("LatencyTracker百分位测试通过。")
+
+    def test_hedged_request_wins(self):
+        """测试主提供商超过历史p95仍未返回时，对冲请求先返回"""
+        self._enable_hedging(max_extra_ratio=1.0)
+        start = time.perf_counter()
+        response = self.router.send_request("default", "对冲测试", use_cache=False)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(response["choices"][0]["message"]["content"], "备")
+        self.assertLess(elapsed, 0.5)
+        stats = self.router.get_hedging_stats()["task_types"]["default"]
+        self.assertEqual(stats["hedged"], 1)
+        self.assertEqual(stats["hedge_wins"], 1)
+        # 两方都在共享的阻塞调用线程池中执行，胜出后落后的一方被取消
+        self.assertTrue(all(name.startswith("ccli-io") for name in self.primary.threads + self.backup.threads))
+        self.assertTrue(self.primary.tokens[0].cancelled)
+        print("对冲请求胜出测试通过。")
+
+    def test_hedged_call_cancelled(self):
+        """测试调用方取消时对冲的两方都被取消"""
+        policy = HedgingPolicy(LatencyTracker(), task_types={"default": {"max_extra_ratio": 1.0}})
+        policy.record_request("default")
+        parent = CancellationToken()
+        threading.Timer(0.1, parent.cancel).start()
+        leg = lambda token: token.sleep(5) or {"choices": []}
+        start = time.perf_counter()
+        with self.assertRaises(RequestCancelledError):
+            policy.call("default", leg, leg, 0.01, parent)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(policy.stats()["default"]["hedged"], 1)
+        print("对冲请求取消测试通过。")
+
+    def test_hedging_cost_cap(self):
+        """测试对冲比例上限为0时不发送对冲请求"""
+        self._enable_hedging(max_extra_ratio=0)
+        self.primary.delay = 0.2
+        response = self.router.send_request("default", "成本上限测试", use_cache=False)
+        self.assertEqual(response["choices"][0]["message"]["content"], "主")
+        self.assertEqual(self.backup.calls, 0)
+        print("对冲成本上限测试通过。")
+
+    def test_hedging_disabled_by_default(self):
+        """测试未配置Hedging时不对冲"""
+        self.assertIsNone(self.router.hedging)
+        self.assertEqual(self.router.get_hedging_stats(), {"enabled": False})
+        print("对冲默认关闭测试通过。")
+
+    def test_hedged_stream(self):
+        """测试流式请求首个片段过慢时由对冲请求产出"""
+        self._enable_hedging(max_extra_ratio=1.0)
+        start = time.perf_counter()
+        chunks = list(self.router.stream_request("default", "流式对冲"))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual("".join(chunks), "备")
+        self.assertLess(elapsed, 0.5)
+        print("流式对冲测试通过。")
+
+    def test_hedged_stream_failover(self):
+        """测试流式主请求在首个片段前失败时立即启动备选，双方都失败时继续尝试其余的备选提供商"""
+        self._enable_hedging(max_extra_ratio=0)
+        for _ in range(20):
+            self.router.latency_tracker.record("openai,gpt-4:ttfb", 5.0)
+        self.router.set_provider_instance("openai", FlakyProvider([AuthenticationError("密钥无效")]))
+        start = time.perf_counter()
+        self.assertEqual("".join(self.router.stream_request("default", "备选")), "备")
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(self.backup.calls, 1)
+
+        third = SlowProvider(delay=0)
+        self.router.set_provider_instance("anthropic", FlakyProvider([AuthenticationError("密钥无效")]))
+        self.router.set_provider_instance("openai", FlakyProvider([AuthenticationError("密钥无效")]))
+        self.router.set_provider_instance("deepseek", third)
+        self.router.update_route("default", "openai", "gpt-4", fallbacks=["anthropic,claude-3-haiku-20240307",
+                                                                         "deepseek,deepseek-chat"])
+        self.assertEqual("".join(self.router.stream_request("default", "其余备选")), "其余备选")
+        self.assertEqual(third.calls, 1)
+        print("流式对冲失败切换测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import sys
+import os
+import copy
+import json
+import pickle
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from integrations.api_providers import AnthropicProvider, GeminiProvider, OllamaProvider, OpenAIProvider
+from integrations.api_providers.response import ModelResponse
+from core.model_router import ModelRouter
+from core.rate_limiter import response_tokens
+
+class TestModelResponse(unittest.TestCase):
+
+    def test_parse_formats(self):
+        """测试各提供商格式解析为相同的文本、用量和结束原因"""
+        payloads = {
+            "openai": {"model": "gpt-4", "choices": [{"message": {"content": "答案"}, "finish_reason": "stop"}],
+                       "usage": {"prompt_tokens": 5, "completion_tokens": 2}},
+            "anthropic": {"model": "claude", "content": [{"type": "text", "text": "答"}, {"type": "tool_use"},
+                                                          {"type": "text", "text": "案"}],
+                          "stop_reason": "stop", "usage": {"input_tokens": 5, "output_tokens": 2}},
+            "gemini": {"candidates": [{"content": {"parts": [{"text": "答案"}]}, "finishReason": "stop"}],
+                       "usageMetadata": {"promptTokenCount": 5, "candidatesTokenCount": 2}},
+            "ollama": {"model": "llama3", "message": {"role": "assistant", "content": "答案"},
+                       "done_reason": "stop", "prompt_eval_count": 5, "eval_count": 2}
+        }
+        for response_format, payload in payloads.items():
+            for parsed in (ModelResponse.parse(payload, response_format, "p"), ModelResponse.parse(payload)):
+                self.assertEqual(parsed.text, "答案", response_format)
+                self.assertEqual((parsed.input_tokens, parsed.output_tokens, parsed.total_tokens), (5, 2, 7))
+                self.assertEqual(parsed.finish_reason, "stop")
+                self.assertEqual(parsed.raw, payload)
+        self.assertEqual(ModelResponse.parse(payloads["openai"], provider="openai").provider, "openai")
+
+        mock = ModelResponse.parse({"model": "m", "response": "模拟", "error": "超时"})
+        self.assertEqual((mock.text, mock.error, mock.total_tokens), ("模拟", "超时", None))
+        self.assertIs(ModelResponse.parse(mock), mock)
+        print("响应格式解析测试通过。")
+
+    def test_dict_compatibility(self):
+        """测试ModelResponse可按字典访问、深拷贝、JSON序列化和pickle，且不带实例字典"""
+        response = ModelResponse.from_openai({"model": "gpt-4", "choices": [{"message": {"content": "你好"}}]}, "openai")
+        response.latency = 0.25
+        self.assertFalse(hasattr(response, "__dict__"))
+        self.assertEqual(response["choices"][0]["message"]["content"], "你好")
+        self.assertEqual(json.loads(json.dumps(response))["model"], "gpt-4")
+        for clone in (copy.deepcopy(response), pickle.loads(pickle.dumps(response))):
+            self.assertIsInstance(clone, ModelResponse)
+            self.assertEqual((clone.text, clone.provider, clone.latency), ("你好", "openai", 0.25))
+        self.assertEqual(response_tokens(response), None)
+        print("字典兼容性测试通过。")
+
+    def test_providers_return_model_response(self):
+        """测试各提供商的send_request返回归一化的ModelResponse"""
+        messages = [{"role": "user", "content": "Hello"}]
+        providers = [
+            (OpenAIProvider(api_key=""), "gpt-4", "openai"),
+            (AnthropicProvider(api_key=""), "claude-3-haiku-20240307", "anthropic"),
+            (GeminiProvider(api_key=""), "gemini-pro", "gemini"),
+            (OllamaProvider(base_url="http://127.0.0.1:9/api"), "llama3", "ollama")
+        ]
+        for provider, model, name in providers:
+            provider.mock_fallback = True
+            response = provider.send_request(model, messages)
+            self.assertIsInstance(response, ModelResponse)
+            self.assertEqual(response.provider, name)
+            self.assertIn("模拟响应", response.text)
+        print("提供商归一化响应测试通过。")
+
+    def test_router_returns_model_response(self):
+        """测试路由的模拟响应、缓存命中响应均为ModelResponse，并记录耗时"""
+        router = ModelRouter("/nonexistent/config.json")
+        router.mock_responses = True
+        first = router.send_request("default", "你好")
+        self.assertIsInstance(first, ModelResponse)
+        self.assertEqual(first.provider, "openai")
+        self.assertIsNotNone(first.latency)
+        self.assertTrue(first.text)
+        cached = router.send_request("default", "你好")
+        self.assertIsInstance(cached, ModelResponse)
+        self.assertEqual(cached.text, first.text)
+        print("路由归一化响应测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,36 @@
 import unittest
+import asyncio
 import sys
 import os
+import time
 
 # 将项目根目录添加到Python路径中，以便导入模块
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core.model_router import ModelRouter
+from integrations.api_providers import BaseAPIProvider
+
+class SlowProvider(BaseAPIProvider):
+    """用于测试的慢速提供商"""
+
+    def __init__(self, delay: float = 0.2):
+        super().__init__(api_key="test", base_url="http://localhost")
+        self.delay = delay
+        self.calls = 0
+
+    def get_models(self):
+        return ["slow-model"]
+
+    def send_request(self, model, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {
+            "model": model,
+            "choices": [{"message": {"role": "assistant", "content": messages[-1]["content"]}}]
+        }
+
+    def validate_config(self):
+        return True
 
 class TestModelRouter(unittest.TestCase):
 
@@ -61,5 +86,97 @@ class TestModelRouter(unittest.TestCase):
         self.assertIn("model", response)
         print("ModelRouter.send_request 测试通过。")
 
+    def test_asend_request(self):
+        """测试asend_request方法能否异步返回响应"""
+        router = ModelRouter()
+        response = asyncio.run(router.asend_request("default", "请解释机器学习的概念"))
+
+        self.assertIsInstance(response, dict)
+        self.assertIn("model", response)
+        print("ModelRouter.asend_request 测试通过。")
+
+    def test_asend_request_concurrency(self):
+        """测试多个异步请求能否同时在途而不互相阻塞"""
+        router = ModelRouter()
+        router.set_provider_instance("openai", SlowProvider(delay=0.2))
+
+        async def run_all():
+            return await asyncio.gather(*[
+                router.asend_request("default", f"问题{i}") for i in range(20)
+            ])
+
+        start = time.perf_counter()
+        responses = asyncio.run(run_all())
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(responses), 20)
+        # 串行执行需要4秒，并发执行应接近单次调用耗时
+        self.assertLess(elapsed, 1.5)
+        print("ModelRouter异步并发测试通过。")
+
+    def test_response_cache(self):
+        """测试相同请求命中响应缓存，以及绕过缓存的开关"""
+        router = ModelRouter()
+        slow_provider = SlowProvider(delay=0)
+        router.set_provider_instance("openai", slow_provider)
+
+        first = router.send_request("default", "缓存测试")
+        second = router.send_request("default", "  缓存测试 ")
+        self.assertEqual(first, second)
+        self.assertEqual(slow_provider.calls, 1)
+
+        router.send_request("default", "缓存测试", use_cache=False)
+        self.assertEqual(slow_provider.calls, 2)
+
+        stats = router.get_cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        print("ModelRouter响应缓存测试通过。")
+
+    def test_request_coalescing(self):
+        """测试相同的并发请求只发起一次上游调用"""
+        router = ModelRouter()
+        slow_provider = SlowProvider(delay=0.3)
+        router.set_provider_instance("openai", slow_provider)
+
+        async def run_all():
+            return await asyncio.gather(*[
+                router.asend_request("default", "合并测试", use_cache=False) for _ in range(10)
+            ])
+
+        responses = asyncio.run(run_all())
+        self.assertEqual(len(responses), 10)
+        self.assertTrue(all(response == responses[0] for response in responses))
+        self.assertEqual(slow_provider.calls, 1)
+
+        stats = router.get_coalescing_stats()
+        self.assertEqual(stats["coalesced"], 9)
+        self.assertEqual(stats["in_flight"], 0)
+        print("ModelRouter请求合并测试通过。")
+
+    def test_stream_request(self):
+        """测试stream_request方法能否逐段产出文本（显式开启模拟响应）"""
+        router = ModelRouter()
+        router.mock_responses = True
+        chunks = list(router.stream_request("coding", "写一个快速排序"))
+        self.assertIn("DeepSeek", "".join(chunks))
+
+        claude_chunks = list(router.stream_request("claudeCode", "分析代码"))
+        self.assertGreater(len(claude_chunks), 0)
+        print("ModelRouter.stream_request 测试通过。")
+
+    def test_astream_request(self):
+        """测试astream_request方法能否逐段产出文本（显式开启模拟响应）"""
+        router = ModelRouter()
+        router.mock_responses = True
+
+        async def collect():
+            return [chunk async for chunk in router.astream_request("default", "你好")]
+
+        chunks = asyncio.run(collect())
+        self.assertGreater(len(chunks), 0)
+        self.assertTrue(all(isinstance(chunk, str) for chunk in chunks))
+        print("ModelRouter.astream_request 测试通过。")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,169 @@
+import unittest
+import sys
+import os
+import json
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.protocol_translation import (
+    AnthropicStreamEncoder,
+    GeminiStreamEncoder,
+    OpenAIStreamEncoder,
+    extract_text,
+    from_anthropic_request,
+    from_gemini_request,
+    from_openai_request,
+    to_anthropic_response,
+    to_gemini_response,
+    to_openai_response
+)
+
+def parse_sse(text):
+    """把SSE文本解析为 (event, data) 列表"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        event = None
+        data = None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = line[len("data: "):]
+        events.append((event, data if data == "[DONE]" else json.loads(data)))
+    return events
+
+class TestProtocolTranslation(unittest.TestCase):
+
+    def test_request_decoding(self):
+        """测试三种格式的请求都转换为相同的内部消息列表"""
+        expected = [
+            {"role": "system", "content": "你是助手"},
+            {"role": "user", "content": "你好"},
+            {"role": "assistant", "content": "你好！"},
+            {"role": "user", "content": "工具输出：42"}
+        ]
+        openai = from_openai_request({"model": "gpt-4", "max_tokens": 100, "messages": [
+            {"role": "system", "content": "你是助手"},
+            {"role": "user", "content": [{"type": "text", "text": "你好"}]},
+            {"role": "assistant", "content": "你好！"},
+            {"role": "user", "content": "工具输出：42"}
+        ]})
+        anthropic = from_anthropic_request({"model": "claude", "max_tokens": 100, "stream": True,
+                                            "system": [{"type": "text", "text": "你是助手"}], "messages": [
+            {"role": "user", "content": "你好"},
+            {"role": "assistant", "content": [{"type": "text", "text": "你好！"}]},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t1",
+                                          "content": [{"type": "text", "text": "工具输出：42"}]},
+                                         {"type": "image", "source": {}}]}
+        ]})
+        gemini = from_gemini_request({
+            "systemInstruction": {"parts": [{"text": "你是助手"}]},
+            "contents": [
+                {"role": "user", "parts": [{"text": "你好"}]},
+                {"role": "model", "parts": [{"text": "你好！"}]},
+                {"role": "user", "parts": [{"text": "工具输出："}, {"text": "42"}]}
+            ],
+            "generationConfig": {"maxOutputTokens": 100}
+        }, model="gemini-pro")
+        for internal in (openai, anthropic, gemini):
+            self.assertEqual(internal["messages"], expected)
+            self.assertEqual(internal["max_tokens"], 100)
+        self.assertTrue(anthropic["stream"])
+        self.assertFalse(gemini["stream"])
+        print("协议请求转换测试通过。")
+
+    def test_response_encoding(self):
+        """测试任意提供商格式的响应都能转换为三种目标格式，并保留上游用量"""
+        messages = [{"role": "user", "content": "你好"}]
+        upstream = [
+            {"model": "gpt-4", "choices": [{"message": {"role": "assistant", "content": "答案"}}],
+             "usage": {"prompt_tokens": 5, "completion_tokens": 2}},
+            {"content": [{"type": "text", "text": "答案"}], "usage": {"input_tokens": 5, "output_tokens": 2}},
+            {"candidates": [{"content": {"parts": [{"text": "答"}, {"text": "案"}]}}],
+             "usageMetadata": {"promptTokenCount": 5, "candidatesTokenCount": 2}},
+            {"message": {"role": "assistant", "content": "答案"}, "prompt_eval_count": 5, "eval_count": 2}
+        ]
+        for response in upstream:
+            self.assertEqual(extract_text(response), "答案")
+            openai = to_openai_response(response, "default", messages)
+            self.assertEqual(openai["choices"][0]["message"]["content"], "答案")
+            self.assertEqual(openai["usage"]["total_tokens"], 7)
+            anthropic = to_anthropic_response(response, "claude", messages)
+            self.assertEqual(anthropic["content"], [{"type": "text", "text": "答案"}])
+            self.assertEqual(anthropic["usage"], {"input_tokens": 5, "output_tokens": 2})
+            gemini = to_gemini_response(response, "gemini-pro", messages)
+            self.assertEqual(gemini["candidates"][0]["content"]["parts"][0]["text"], "答案")
+        # 上游没有用量时按估算值填写
+        self.assertGreater(to_anthropic_response({"response": "模拟"}, "claude", messages)["usage"]["input_tokens"], 0)
+        print("协议响应转换测试通过。")
+
+    def test_finish_reason_mapping(self):
+        """测试上游的结束原因按目标格式转换（length、max_tokens、MAX_TOKENS互相对应），未返回时为正常结束"""
+        messages = [{"role": "user", "content": "你好"}]
+        truncated = [
+            {"choices": [{"message": {"content": "答"}, "finish_reason": "length"}]},
+            {"content": [{"type": "text", "text": "答"}], "stop_reason": "max_tokens"},
+            {"candidates": [{"content": {"parts": [{"text": "答"}]}, "finishReason": "MAX_TOKENS"}]},
+            {"message": {"content": "答"}, "done_reason": "length"}
+        ]
+        for response in truncated:
+            self.assertEqual(to_openai_response(response, "default", messages)["choices"][0]["finish_reason"], "length")
+            self.assertEqual(to_anthropic_response(response, "claude", messages)["stop_reason"], "max_tokens")
+            self.assertEqual(to_gemini_response(response, "gemini-pro", messages)["candidates"][0]["finishReason"],
+                             "MAX_TOKENS")
+        filtered = {"candidates": [{"content": {"parts": [{"text": ""}]}, "finishReason": "SAFETY"}]}
+        self.assertEqual(to_openai_response(filtered, "default", messages)["choices"][0]["finish_reason"],
+                         "content_filter")
+        self.assertEqual(to_anthropic_response({"response": "模拟"}, "claude", messages)["stop_reason"], "end_turn")
+
+        events = parse_sse(AnthropicStreamEncoder("claude").finish("length"))
+        self.assertEqual(events[1][1]["delta"]["stop_reason"], "max_tokens")
+        events = parse_sse(GeminiStreamEncoder("gemini-pro").finish("length"))
+        self.assertEqual(events[0][1]["candidates"][0]["finishReason"], "MAX_TOKENS")
+        print("结束原因转换测试通过。")
+
+    def test_anthropic_error_types(self):
+        """测试Anthropic流式错误事件只使用Anthropic定义的错误类型"""
+        encoder = AnthropicStreamEncoder("claude")
+        cases = [(502, "upstream_error", "api_error"), (504, "timeout_error", "api_error"),
+                 (503, "overloaded_error", "overloaded_error"), (429, "insufficient_quota", "rate_limit_error"),
+                 (400, "invalid_request_error", "invalid_request_error")]
+        for status_code, error_type, expected in cases:
+            event, data = parse_sse(encoder.error(status_code, error_type, "失败"))[0]
+            self.assertEqual((event, data["error"]["type"]), ("error", expected))
+        print("Anthropic错误类型映射测试通过。")
+
+    def test_anthropic_stream(self):
+        """测试Anthropic流式事件的顺序，每个文本片段立即编码为一个content_block_delta"""
+        encoder = AnthropicStreamEncoder("claude", prompt_tokens=12)
+        start = parse_sse(encoder.start())
+        self.assertEqual([event for event, _ in start], ["message_start", "content_block_start", "ping"])
+        self.assertEqual(start[0][1]["message"]["usage"]["input_tokens"], 12)
+
+        delta = parse_sse(encoder.delta("你好"))
+        self.assertEqual(delta, [("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                          "delta": {"type": "text_delta", "text": "你好"}})])
+        finish = parse_sse(encoder.finish())
+        self.assertEqual([event for event, _ in finish], ["content_block_stop", "message_delta", "message_stop"])
+        self.assertEqual(finish[1][1]["delta"]["stop_reason"], "end_turn")
+        self.assertEqual(finish[1][1]["usage"]["output_tokens"], 2)
+        print("Anthropic流式编码测试通过。")
+
+    def test_openai_and_gemini_streams(self):
+        """测试OpenAI和Gemini流式编码"""
+        encoder = OpenAIStreamEncoder("default")
+        events = parse_sse(encoder.start() + encoder.delta("a") + encoder.delta("b") + encoder.finish())
+        self.assertEqual(events[-1], (None, "[DONE]"))
+        self.assertEqual("".join(data["choices"][0]["delta"].get("content", "") for _, data in events[:-1]), "ab")
+        self.assertEqual(events[-2][1]["choices"][0]["finish_reason"], "stop")
+
+        encoder = GeminiStreamEncoder("gemini-pro", prompt_tokens=3)
+        events = parse_sse(encoder.start() + encoder.delta("答") + encoder.finish())
+        self.assertEqual(events[0][1]["candidates"][0]["content"]["parts"][0]["text"], "答")
+        self.assertEqual(events[-1][1]["candidates"][0]["finishReason"], "STOP")
+        self.assertEqual(events[-1][1]["usageMetadata"]["promptTokenCount"], 3)
+        print("OpenAI与Gemini流式编码测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+import unittest
+import sys
+import os
+import threading
+import time
+from unittest.mock import patch
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from core.rate_limiter import TokenBucket, AIMDLimiter, RateLimiter, estimate_tokens, response_tokens
+from integrations.api_providers import OpenAIProvider, OverloadedError, RateLimitError
+from tests.test_model_router import SlowProvider
+
+class RateLimitedProvider(SlowProvider):
+    """前几次请求返回429的测试提供商"""
+
+    def __init__(self, failures: int):
+        super().__init__(delay=0)
+        self.failures = failures
+
+    def send_request(self, model, messages, **kwargs):
+        if self.failures > 0:
+            self.failures -= 1
+            self.calls += 1
+            raise RateLimitError("请求过多", retry_after=0)
+        return super().send_request(model, messages, **kwargs)
+
+class FakeResponse:
+    """模拟HTTP响应"""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_token_bucket(self):
+        """测试令牌桶的预留等待时间和用量修正"""
+        bucket = TokenBucket(per_minute=60, capacity=2)
+        self.assertEqual(bucket.reserve(1), 0.0)
+        self.assertEqual(bucket.reserve(1), 0.0)
+        # 令牌耗尽后每秒补充1个，第三个请求需要等待约1秒
+        self.assertAlmostEqual(bucket.reserve(1), 1.0, delta=0.05)
+        bucket.adjust(-2)
+        self.assertGreaterEqual(bucket.available(), 0.9)
+        print("TokenBucket测试通过。")
+
+    def test_aimd_limiter(self):
+        """测试AIMD并发上限在成功时加性增加、在429时乘性下降"""
+        limiter = AIMDLimiter(initial=4, max_limit=8, decrease_interval=0)
+        for _ in range(8):
+            limiter.acquire()
+            limiter.release(latency=0.1)
+        self.assertGreater(limiter.limit, 5)
+
+        limiter.acquire()
+        limiter.release(rate_limited=True)
+        self.assertLess(limiter.limit, 3)
+
+        limiter.acquire()
+        limiter.release(latency=1.0)
+        self.assertEqual(limiter.decreases, 2)
+        print("AIMDLimiter测试通过。")
+
+    def test_aimd_caps_in_flight(self):
+        """测试在途请求数不超过当前并发上限"""
+        limiter = AIMDLimiter(initial=2, max_limit=2)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def worker():
+            limiter.acquire()
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+            limiter.release(latency=0.05)
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 2)
+        print("AIMDLimiter并发上限测试通过。")
+
+    def test_aimd_wait_cancelled(self):
+        """测试带取消令牌等待名额时不轮询：由释放名额或取消令牌唤醒，最长等到截止时间"""
+        from integrations.api_providers.cancellation import (CancellationToken, DeadlineExceededError,
+                                                             RequestCancelledError)
+        limiter = AIMDLimiter(initial=1, max_limit=1)
+        limiter.acquire()
+        waits = []
+        wait = limiter._condition.wait
+        limiter._condition.wait = lambda timeout=None: waits.append(timeout) or wait(timeout)
+
+        token = CancellationToken(timeout=60)
+        threading.Timer(0.2, token.cancel).start()
+        start = time.monotonic()
+        with self.assertRaises(RequestCancelledError):
+            limiter.acquire(token)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(len(waits), 1)
+        self.assertGreater(waits[0], 59)
+
+        with self.assertRaises(DeadlineExceededError):
+            limiter.acquire(CancellationToken(timeout=0.3))
+        self.assertLessEqual(len(waits), 3)
+
+        threading.Timer(0.1, limiter.release).start()
+        limiter.acquire(CancellationToken(timeout=60))
+        self.assertEqual(limiter.in_flight, 1)
+        print("AIMDLimiter取消等待测试通过。")
+
+    def test_call_retries_on_rate_limit(self):
+        """测试收到429时退避重试，重试用尽后抛出RateLimitError"""
+        limiter = RateLimiter(max_retries=2)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RateLimitError("请求过多", retry_after=0)
+            return {"usage": {"total_tokens": 10}}
+
+        self.assertEqual(limiter.call("openai", "gpt-4", flaky), {"usage": {"total_tokens": 10}})
+        self.assertEqual(limiter.stats()["openai,gpt-4"]["rate_limited"], 2)
+
+        def always_limited():
+            raise RateLimitError("请求过多", retry_after=0)
+
+        with self.assertRaises(RateLimitError):
+            limiter.call("openai", "gpt-4", always_limited)
+        print("RateLimiter重试测试通过。")
+
+    def test_long_generation_not_congestion(self):
+        """测试非流式请求按每token耗时和token数区间比较延迟，长时间生成不会被当作拥塞而下调并发上限"""
+        limiter = RateLimiter(default={"initial_concurrency": 4})
+        clock = [0.0]
+
+        def generate(tokens, seconds):
+            def send():
+                clock[0] += seconds
+                return {"usage": {"total_tokens": tokens}}
+            return send
+
+        with patch("core.rate_limiter.time.perf_counter", lambda: clock[0]):
+            for _ in range(5):
+                limiter.call("openai", "gpt-4", generate(20, 0.6))
+                limiter.call("openai", "gpt-4", generate(1500, 30.0))
+            stats = limiter.stats()["openai,gpt-4"]
+            self.assertEqual(stats["decreases"], 0)
+            self.assertGreater(stats["concurrency_limit"], 4)
+
+            # 同样大小的请求明显变慢时仍下调
+            limiter.call("openai", "gpt-4", generate(20, 3.0))
+        self.assertEqual(limiter.stats()["openai,gpt-4"]["decreases"], 1)
+        print("长时间生成延迟信号测试通过。")
+
+    def test_limits_override(self):
+        """测试按提供商和提供商,模型覆盖默认限流参数"""
+        limiter = RateLimiter(
+            default={"initial_concurrency": 4},
+            limits={"ollama": {"initial_concurrency": 2}, "ollama,llama3": {"rpm": 30}}
+        )
+        state = limiter.limits_for("ollama", "llama3")
+        self.assertEqual(state.concurrency.limit, 2)
+        self.assertEqual(state.requests.rate, 0.5)
+        self.assertEqual(limiter.limits_for("openai", "gpt-4").concurrency.limit, 4)
+        print("RateLimiter配置覆盖测试通过。")
+
+    def test_token_helpers(self):
+        """测试token估算和响应用量解析"""
+        self.assertGreater(estimate_tokens([{"role": "user", "content": "你好，世界"}]), 4)
+        self.assertEqual(response_tokens({"usage": {"input_tokens": 3, "output_tokens": 4}}), 7)
+        self.assertEqual(response_tokens({"usageMetadata": {"totalTokenCount": 9}}), 9)
+        self.assertEqual(response_tokens({"prompt_eval_count": 2, "eval_count": 5}), 7)
+        self.assertIsNone(response_tokens({"choices": []}))
+        print("token辅助函数测试通过。")
+
+    def test_provider_raises_on_429(self):
+        """测试提供商把429转换为RateLimitError并解析Retry-After"""
+        provider = OpenAIProvider(api_key="test")
+        with self.assertRaises(RateLimitError) as context:
+            provider._check_response(FakeResponse(429, {"Retry-After": "2"}))
+        self.assertEqual(context.exception.retry_after, 2.0)
+        with self.assertRaises(OverloadedError):
+            provider._check_response(FakeResponse(500))
+        print("提供商429转换测试通过。")
+
+    def test_router_retries_rate_limited_provider(self):
+        """测试路由层在429后自动重试并成功"""
+        router = ModelRouter()
+        router.rate_limiter.base_backoff = 0
+        provider = RateLimitedProvider(failures=2)
+        router.set_provider_instance("openai", provider)
+
+        response = router.send_request("default", "限流测试", use_cache=False)
+        self.assertNotIn("error", response)
+        self.assertEqual(provider.calls, 3)
+        stats = router.get_rate_limit_stats()
+        self.assertEqual(stats["limits"]["openai,gpt-3.5-turbo"]["rate_limited"], 2)
+        print("ModelRouter限流重试测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.response_cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+
+    def _key(self, content="你好", temperature=0.7):
+        return ResponseCache.make_key("openai", "gpt-4", [{"role": "user", "content": content}], temperature, 1000)
+
+    def test_key_normalization(self):
+        """测试缓存键对空白和换行符的规范化"""
+        self.assertEqual(self._key("你好\r\n世界 "), self._key("  你好\n世界"))
+        self.assertNotEqual(self._key("你好"), self._key("你好", temperature=0.2))
+        print("ResponseCache键规范化测试通过。")
+
+    def test_hit_and_miss_counters(self):
+        """测试命中与未命中计数"""
+        cache = ResponseCache()
+        key = self._key()
+        self.assertIsNone(cache.get(key))
+        cache.set(key, {"model": "gpt-4", "response": "ok"})
+        self.assertEqual(cache.get(key)["response"], "ok")
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        print("ResponseCache计数测试通过。")
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        cache = ResponseCache(max_entries=2)
+        keys = [self._key(str(i)) for i in range(3)]
+        cache.set(keys[0], {"i": 0})
+        cache.set(keys[1], {"i": 1})
+        cache.get(keys[0])
+        cache.set(keys[2], {"i": 2})
+
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        print("ResponseCache LRU淘汰测试通过。")
+
+    def test_ttl_per_task_type(self):
+        """测试按任务类型的TTL与禁用缓存"""
+        cache = ResponseCache(default_ttl=60, ttls={"think": 0.05, "background": 0})
+        cache.set("think-key", {"r": 1}, task_type="think")
+        cache.set("background-key", {"r": 2}, task_type="background")
+        self.assertIsNotNone(cache.get("think-key"))
+        self.assertIsNone(cache.get("background-key"))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("think-key"))
+        print("ResponseCache TTL测试通过。")
+
+    def test_disk_tier(self):
+        """测试磁盘层在新实例中仍能命中"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "cache.db")
+            ResponseCache(disk_path=path).set(self._key(), {"response": "持久化"})
+
+            cache = ResponseCache(disk_path=path)
+            self.assertEqual(cache.get(self._key())["response"], "持久化")
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+        print("ResponseCache磁盘层测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
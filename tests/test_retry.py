@@ -0,0 +1,163 @@
+import unittest
+import sys
+import os
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+
+from core.model_router import ModelRouter
+from core.retry import RetryBudget, RetryEngine
+from integrations.api_providers import (
+    AuthenticationError, BadRequestError, OllamaProvider, OverloadedError, ProviderTimeoutError, RateLimitError
+)
+from integrations.api_providers.errors import classify_error, error_for_status
+from tests.test_model_router import SlowProvider
+
+class FlakyProvider(SlowProvider):
+    """前几次请求抛出指定错误的测试提供商"""
+
+    def __init__(self, errors):
+        super().__init__(delay=0)
+        self.errors = list(errors)
+
+    def send_request(self, model, messages, **kwargs):
+        if self.errors:
+            self.calls += 1
+            raise self.errors.pop(0)
+        return super().send_request(model, messages, **kwargs)
+
+    def stream_request(self, model, messages, **kwargs):
+        if self.errors:
+            self.calls += 1
+            raise self.errors.pop(0)
+        yield from super().stream_request(model, messages, **kwargs)
+
+class TestRetry(unittest.TestCase):
+
+    def test_error_taxonomy(self):
+        """测试HTTP状态码和网络异常被归类为对应的错误类别"""
+        cases = {429: RateLimitError, 401: AuthenticationError, 403: AuthenticationError, 400: BadRequestError,
+                 404: BadRequestError, 500: OverloadedError, 529: OverloadedError, 504: ProviderTimeoutError}
+        for status_code, error_class in cases.items():
+            self.assertIsInstance(error_for_status(status_code, "失败"), error_class, status_code)
+        self.assertIsInstance(classify_error(requests.ReadTimeout("超时")), ProviderTimeoutError)
+        self.assertIsInstance(classify_error(requests.ConnectionError("拒绝连接")), OverloadedError)
+        self.assertEqual(classify_error(ValueError("无效的JSON")).error_type, "api_error")
+        self.assertFalse(AuthenticationError("密钥无效").retryable)
+
+        # 连接失败的提供商不再返回模拟响应，而是抛出对应类别的错误
+        provider = OllamaProvider(base_url="http://127.0.0.1:9/api")
+        with self.assertRaises(OverloadedError):
+            provider.send_request("llama3", [{"role": "user", "content": "你好"}])
+        print("错误分类测试通过。")
+
+    def test_retry_engine(self):
+        """测试只重试可重试的错误，并遵循Retry-After和退避上限"""
+        engine = RetryEngine(max_attempts=3, base_backoff=0.001, max_backoff=1.0)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OverloadedError("过载")
+            return "ok"
+
+        self.assertEqual(engine.call("openai,gpt-4", flaky), "ok")
+        self.assertEqual(len(attempts), 3)
+
+        def unauthorized():
+            attempts.append(1)
+            raise AuthenticationError("密钥无效")
+
+        attempts.clear()
+        with self.assertRaises(AuthenticationError):
+            engine.call("openai,gpt-4", unauthorized)
+        self.assertEqual(len(attempts), 1)
+
+        def long_retry_after():
+            attempts.append(1)
+            raise RateLimitError("请求过多", retry_after=60)
+
+        attempts.clear()
+        with self.assertRaises(RateLimitError):
+            engine.call("openai,gpt-4", long_retry_after)
+        self.assertEqual(len(attempts), 1)
+
+        stats = engine.stats()["openai,gpt-4"]
+        self.assertEqual((stats["requests"], stats["retries"]), (3, 2))
+        self.assertEqual(stats["errors"], {"overloaded": 2, "auth": 1, "rate_limited": 1})
+        for attempt in range(10):
+            self.assertLessEqual(engine.backoff(attempt), 1.0)
+        print("重试引擎测试通过。")
+
+    def test_retry_budget(self):
+        """测试上游整体故障时重试次数不超过预算"""
+        budget = RetryBudget(ratio=0.1, min_retries_per_second=0.2, window=10)
+        self.assertTrue(budget.try_withdraw())
+        self.assertTrue(budget.try_withdraw())
+        self.assertFalse(budget.try_withdraw())
+        for _ in range(10):
+            budget.record_request()
+        self.assertTrue(budget.try_withdraw())
+        self.assertFalse(budget.try_withdraw())
+
+        engine = RetryEngine(max_attempts=5, base_backoff=0, budget={"ratio": 0.1, "min_retries_per_second": 0.5})
+        calls = []
+
+        def outage():
+            calls.append(1)
+            raise OverloadedError("不可用")
+
+        for _ in range(20):
+            with self.assertRaises(OverloadedError):
+                engine.call("deepseek,deepseek-chat", outage)
+        # 20个请求最多重试 20 * 0.1 + 0.5 * 10 = 7 次
+        self.assertEqual(len(calls), 27)
+        self.assertGreater(engine.stats()["deepseek,deepseek-chat"]["budget_exhausted"], 0)
+        print("重试预算测试通过。")
+
+    def test_router_retries_and_classifies(self):
+        """测试路由重试过载的提供商，不重试认证失败并返回带error_type的失败响应"""
+        router = ModelRouter("/nonexistent/config.json")
+        router.retry_engine.base_backoff = 0
+        flaky = FlakyProvider([OverloadedError("过载"), ProviderTimeoutError("超时")])
+        router.set_provider_instance("openai", flaky)
+        router.update_route("default", "openai", "gpt-4")
+        response = router.send_request("default", "重试测试", use_cache=False)
+        self.assertNotIn("error", response)
+        self.assertEqual(flaky.calls, 3)
+        self.assertEqual(router.get_retry_stats()["routes"]["openai,gpt-4"]["retries"], 2)
+
+        unauthorized = FlakyProvider([AuthenticationError("密钥无效")] * 5)
+        router.set_provider_instance("deepseek", unauthorized)
+        router.update_route("think", "deepseek", "deepseek-chat")
+        response = router.send_request("think", "认证测试", use_cache=False)
+        self.assertEqual((response.error_type, unauthorized.calls), ("auth", 1))
+        self.assertNotIn("模拟", response.text)
+
+        # 流式请求在产出首个片段前失败时切换到备选提供商
+        router.update_route("think", "deepseek", "deepseek-chat", fallbacks=["openai,gpt-4"])
+        self.assertEqual(list(router.stream_request("think", "流式备选")), ["流式备选"])
+        router.update_route("think", "deepseek", "deepseek-chat")
+        with self.assertRaises(AuthenticationError):
+            list(router.stream_request("think", "流式失败"))
+        print("路由重试与错误分类测试通过。")
+
+    def test_mock_responses_opt_in(self):
+        """测试未开启MockResponses时未配置密钥的提供商返回认证失败，开启后返回模拟响应"""
+        router = ModelRouter("/nonexistent/config.json")
+        response = router.send_request("default", "你好", use_cache=False)
+        self.assertEqual(response.error_type, "auth")
+
+        router = ModelRouter("/nonexistent/config.json")
+        router.mock_responses = True
+        response = router.send_request("default", "你好", use_cache=False)
+        self.assertIsNone(response.error)
+        self.assertIn("模拟响应", response.text)
+        print("模拟响应开关测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import sys
+import os
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from core.route_policy import RoutePolicy
+from tests.test_model_router import SlowProvider
+
+class TestRoutePolicy(unittest.TestCase):
+
+    def test_reward(self):
+        """测试回报按失败、延迟和成本计算"""
+        policy = RoutePolicy(strategy="ucb", latency_weight=0.5, cost_weight=0.5,
+                             latency_ceiling=10, cost_ceiling=1.0)
+        self.assertEqual(policy.reward_for(False, 0.1, 0), 0.0)
+        self.assertEqual(policy.reward_for(True, 0, 0), 1.0)
+        self.assertAlmostEqual(policy.reward_for(True, 5, 0.5), 0.5)
+        self.assertEqual(policy.reward_for(True, 100, 100), 0.0)
+        print("RoutePolicy回报计算测试通过。")
+
+    def test_static_keeps_order(self):
+        """测试static策略始终选择第一个候选且不记录决策"""
+        policy = RoutePolicy()
+        self.assertEqual(policy.choose("default", ["a,m", "b,m"]), 0)
+        self.assertEqual(policy.decisions(), [])
+        print("RoutePolicy static策略测试通过。")
+
+    def test_prefers_better_candidate(self):
+        """测试thompson和ucb策略在观测后偏向回报更高的候选"""
+        for strategy in ("thompson", "ucb"):
+            policy = RoutePolicy(strategy=strategy, latency_ceiling=1.0, latency_weight=1.0)
+            keys = ["slow,m", "fast,m"]
+            for _ in range(30):
+                policy.update("default", "slow,m", True, 0.9)
+                policy.update("default", "fast,m", True, 0.1)
+            picks = [policy.choose("default", keys) for _ in range(50)]
+            self.assertGreater(picks.count(1), 40)
+            self.assertEqual(policy.decisions(limit=1)[0]["strategy"], strategy)
+        print("RoutePolicy候选偏好测试通过。")
+
+    def test_price_lookup(self):
+        """测试价格按 provider,model 优先、provider 其次查找"""
+        policy = RoutePolicy(prices={"openai,gpt-4": 0.03, "openai": 0.002})
+        self.assertEqual(policy.price_for("openai,gpt-4"), 0.03)
+        self.assertEqual(policy.price_for("openai,gpt-3.5-turbo"), 0.002)
+        self.assertEqual(policy.price_for("ollama,llama3"), 0.0)
+        print("RoutePolicy价格查找测试通过。")
+
+    def test_router_learns_from_errors(self):
+        """测试路由器根据观测结果避开持续失败的候选"""
+        router = ModelRouter()
+        router.route_policy = RoutePolicy(strategy="thompson")
+        router.config["CircuitBreaker"] = {"enabled": False}
+
+        class BrokenProvider(SlowProvider):
+            def send_request(self, model, messages, **kwargs):
+                self.calls += 1
+                return {"model": model, "error": "服务不可用"}
+
+        broken = BrokenProvider(delay=0)
+        healthy = SlowProvider(delay=0)
+        router.set_provider_instance("openai", broken)
+        router.set_provider_instance("anthropic", healthy)
+        router.update_route("default", "openai", "gpt-4", fallbacks=["anthropic,claude-3-haiku-20240307"])
+
+        for i in range(40):
+            response = router.send_request("default", f"学习测试{i}", use_cache=False)
+            self.assertNotIn("error", response)
+
+        decisions = router.get_route_decisions(limit=10)
+        self.assertEqual(len(decisions), 10)
+        self.assertGreaterEqual(sum(d["chosen"] == "anthropic,claude-3-haiku-20240307" for d in decisions), 8)
+        stats = router.get_route_policy_stats()["candidates"]["default"]
+        self.assertEqual(stats["openai,gpt-4"]["mean_reward"], 0.0)
+        print("ModelRouter自适应路由测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
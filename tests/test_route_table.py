@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from core.route_table import compile_route_table
+
+PROVIDERS = {
+    "openai": {"name": "openai", "api_base_url": "https://api.openai.com/v1", "api_key": "sk-xxx", "models": ["gpt-4"]},
+    "deepseek": {"name": "deepseek", "api_base_url": "https://api.deepseek.com/v1", "api_key": "sk-xxx",
+                 "models": ["deepseek-coder"]}
+}
+
+class TestRouteTable(unittest.TestCase):
+
+    def test_compile(self):
+        """测试路由配置被编译为预解析的只读条目"""
+        instance = object()
+        table = compile_route_table(PROVIDERS, {
+            "default": "openai,gpt-4",
+            "coding": ["missing,model", "deepseek,deepseek-coder", "openai,gpt-4"],
+            "broken": "missing,model"
+        }, {"openai": instance})
+
+        coding = table.candidates("coding")
+        self.assertEqual([entry.provider_name for entry in coding], ["deepseek", "openai"])
+        self.assertEqual(coding[0].model, "deepseek-coder")
+        self.assertEqual(coding[0].config["model"], "deepseek-coder")
+        self.assertIs(coding[1].instance, instance)
+        # 查找不分配新对象，每次返回同一个元组
+        self.assertIs(table.candidates("coding"), coding)
+        # 未配置的任务类型使用default，无法解析的路由回退到第一个提供商
+        self.assertIs(table.candidates("unknown"), table.candidates("default"))
+        self.assertEqual(table.candidates("broken")[0].provider_name, "openai")
+        self.assertIsNone(table.candidates("broken")[0].model)
+        with self.assertRaises(TypeError):
+            coding[0].config["model"] = "other"
+        print("路由表编译测试通过。")
+
+    def test_hot_reload(self):
+        """测试配置文件修改后路由表被自动重新编译并替换"""
+        config = {
+            "Providers": PROVIDERS,
+            "Router": {"default": "openai,gpt-4"},
+            "HotReload": {"enabled": True, "interval": 0.05}
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_path = os.path.join(temp_dir, "config.json")
+            with open(config_path, "w", encoding="utf-8") as f:
+                json.dump(config, f)
+            router = ModelRouter(config_path)
+            try:
+                self.assertEqual(router.get_provider_for_task("default")["name"], "openai")
+                # 提供商实例在首次使用时创建
+                self.assertNotIn("openai", router.provider_instances)
+                openai_instance = router.get_provider_instance("openai")
+                self.assertIs(router.route_request("default", "hi")["provider_instance"], openai_instance)
+                version = router.route_table.version
+
+                config["Router"]["default"] = ["deepseek,deepseek-coder", "openai,gpt-4"]
+                with open(config_path, "w", encoding="utf-8") as f:
+                    json.dump(config, f, indent=2)
+                deadline = time.time() + 3
+                while router.route_table.version == version and time.time() < deadline:
+                    time.sleep(0.02)
+
+                self.assertEqual(router.get_provider_for_task("default")["name"], "deepseek")
+                self.assertEqual(len(router.get_route_candidates("default")), 2)
+                # 配置未变化的提供商沿用原有实例
+                self.assertIs(router.provider_instances["openai"], openai_instance)
+
+                # 无效的配置不会替换当前路由表
+                with open(config_path, "w", encoding="utf-8") as f:
+                    f.write("{无效的JSON")
+                self.assertFalse(router.reload_config())
+                self.assertEqual(router.get_provider_for_task("default")["name"], "deepseek")
+            finally:
+                router.stop_watching_config()
+        print("路由表热加载测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from core.scheduler import AdmissionRejectedError, PriorityScheduler
+from tests.test_model_router import SlowProvider
+
+class TestScheduler(unittest.TestCase):
+
+    def _queue_and_release(self, scheduler, task_types):
+        """占满名额后按顺序排队，逐个释放名额并返回获得名额的顺序"""
+        holder = scheduler.acquire("default")
+        order = []
+        lock = threading.Lock()
+
+        def worker(task_type):
+            priority_class = scheduler.acquire(task_type)
+            with lock:
+                order.append(task_type)
+            scheduler.release(priority_class)
+
+        threads = []
+        for task_type in task_types:
+            thread = threading.Thread(target=worker, args=(task_type,))
+            thread.start()
+            threads.append(thread)
+            while sum(c["queued"] for c in scheduler.stats()["classes"].values()) < len(threads):
+                time.sleep(0.001)
+        scheduler.release(holder)
+        for thread in threads:
+            thread.join()
+        return order
+
+    def test_weighted_fair_queuing(self):
+        """测试排队请求按权重分配名额：交互式请求优先，后台请求不会被饿死"""
+        scheduler = PriorityScheduler(max_concurrency=1, yield_threshold=100)
+        order = self._queue_and_release(scheduler, ["background"] * 3 + ["default"] * 9)
+        self.assertEqual(order[:8], ["default"] * 8)
+        self.assertIn("background", order[8:10])
+        self.assertEqual(order.count("background"), 3)
+        print("加权公平排队测试通过。")
+
+    def test_background_yields(self):
+        """测试交互式负载达到阈值时后台请求让出名额"""
+        scheduler = PriorityScheduler(max_concurrency=2, yield_threshold=0.5)
+        interactive = scheduler.acquire("coding")
+        self.assertTrue(scheduler.stats()["yielding"])
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(scheduler.acquire("background")))
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(acquired, [])
+        scheduler.release(interactive)
+        thread.join(1)
+        self.assertEqual(acquired, ["background"])
+        print("后台请求让出测试通过。")
+
+    def test_admission_control(self):
+        """测试排队已满时立即拒绝，排队超时时放弃"""
+        scheduler = PriorityScheduler(max_concurrency=1, classes={
+            "interactive": {"max_queue": 0, "max_wait": 0.05},
+            "background": {"max_queue": 1, "max_wait": 0.05}
+        })
+        scheduler.acquire("default")
+        with self.assertRaises(AdmissionRejectedError):
+            scheduler.check_admission("default")
+        with self.assertRaises(AdmissionRejectedError) as context:
+            scheduler.acquire("background")
+        self.assertIn("0.05", context.exception.reason)
+        stats = scheduler.stats()["classes"]
+        self.assertEqual((stats["interactive"]["rejected"], stats["background"]["timed_out"]), (1, 1))
+        self.assertEqual(stats["background"]["queued"], 0)
+        print("准入控制测试通过。")
+
+    def test_async_admission(self):
+        """测试在事件循环上排队：不占用线程，异步排队数有上限，被取消时离开队列"""
+        import asyncio
+        scheduler = PriorityScheduler(max_concurrency=1, max_async_waiters=2)
+        holder = scheduler.acquire("default")
+
+        async def run():
+            threads = threading.active_count()
+            waiters = [asyncio.ensure_future(scheduler.acquire_async("default")) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            self.assertEqual(scheduler.stats()["async_waiters"], 2)
+            self.assertEqual(threading.active_count(), threads)
+            with self.assertRaises(AdmissionRejectedError):
+                await waiters[2]
+            waiters[0].cancel()
+            await asyncio.gather(waiters[0], return_exceptions=True)
+            self.assertEqual(scheduler.stats()["classes"]["interactive"]["queued"], 1)
+            scheduler.release(holder)
+            scheduler.release(await asyncio.wait_for(waiters[1], 1))
+
+        asyncio.run(run())
+        stats = scheduler.stats()
+        self.assertEqual((stats["in_flight"], stats["async_waiters"]), (0, 0))
+        print("异步排队准入测试通过。")
+
+    def test_router_scheduling(self):
+        """测试路由的普通请求和流式请求都在调度器名额内发送"""
+        router = ModelRouter("/nonexistent/config.json")
+        router.set_provider_instance("openai", SlowProvider(delay=0.05))
+        router.update_route("default", "openai", "gpt-4")
+        router.scheduler = PriorityScheduler(max_concurrency=1)
+        threads = [threading.Thread(target=router.send_request, args=("default", f"请求{i}"),
+                                    kwargs={"use_cache": False}) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(list(router.stream_request("default", "流式")), ["流式"])
+        stats = router.get_scheduler_stats()
+        self.assertEqual((stats["in_flight"], stats["classes"]["interactive"]["admitted"]), (0, 4))
+        self.assertGreater(stats["classes"]["interactive"]["wait_p95"], 0.04)
+
+        # 异步流式请求在事件循环上排队，提前停止读取或未开始读取时都释放名额
+        import asyncio
+
+        async def consume(stop_early):
+            async for chunk in router.astream_request("default", "异步流式"):
+                if stop_early:
+                    break
+                return chunk
+
+        self.assertEqual(asyncio.run(consume(False)), "异步流式")
+        asyncio.run(consume(True))
+        self.assertEqual(router.get_scheduler_stats()["in_flight"], 0)
+        print("路由调度测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.semantic_cache import NUMPY_AVAILABLE
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "语义缓存需要numpy")
+class TestSemanticCache(unittest.TestCase):
+
+    def setUp(self):
+        from core.semantic_cache import SemanticCache, HashingEmbedder
+        self.embedder = HashingEmbedder(dim=512)
+        self.cache = SemanticCache(embedder=self.embedder, capacity=8, default_threshold=0.75,
+                                   thresholds={"coding": 0.99})
+
+    def _store(self, text, scope="openai|gpt-4"):
+        self.cache.store(scope, self.cache.embed(text), {"response": text})
+
+    def test_paraphrase_hit(self):
+        """测试近似改写的提示能命中缓存"""
+        self._store("请解释机器学习的概念")
+        hit = self.cache.lookup("openai|gpt-4", self.cache.embed("请解释一下机器学习的概念"))
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit[0]["response"], "请解释机器学习的概念")
+        self.assertGreater(hit[1], 0.75)
+        print("SemanticCache改写命中测试通过。")
+
+    def test_unrelated_miss(self):
+        """测试无关提示不会命中缓存"""
+        self._store("请解释机器学习的概念")
+        self.assertIsNone(self.cache.lookup("openai|gpt-4", self.cache.embed("用Python写一个快速排序算法")))
+        print("SemanticCache无关提示未命中测试通过。")
+
+    def test_scope_and_threshold(self):
+        """测试作用域隔离和按任务类型的阈值"""
+        self._store("请解释机器学习的概念")
+        vector = self.cache.embed("请解释一下机器学习的概念")
+        self.assertIsNone(self.cache.lookup("deepseek|deepseek-chat", vector))
+        self.assertIsNone(self.cache.lookup("openai|gpt-4", vector, task_type="coding"))
+        print("SemanticCache作用域与阈值测试通过。")
+
+    def test_ring_overwrite_and_ttl(self):
+        """测试容量写满后覆盖最旧的条目，以及过期条目不再命中"""
+        for i in range(10):
+            self._store(f"第{i}个问题：关于主题{i}的详细说明")
+        self.assertEqual(self.cache.stats()["entries"], 8)
+        self.assertIsNone(self.cache.lookup("openai|gpt-4", self.cache.embed("第0个问题：关于主题0的详细说明"), task_type="coding"))
+
+        self.cache.ttl = 0.01
+        self._store("即将过期的条目")
+        time.sleep(0.05)
+        self.assertIsNone(self.cache.lookup("openai|gpt-4", self.cache.embed("即将过期的条目")))
+        print("SemanticCache覆盖与过期测试通过。")
+
+    def test_router_semantic_cache(self):
+        """测试ModelRouter启用语义缓存后，改写的提示不再请求模型"""
+        import json
+        import tempfile
+        from core.model_router import ModelRouter
+        from tests.test_model_router import SlowProvider
+
+        config = {
+            "Providers": {"openai": {"name": "openai", "api_base_url": "https://api.openai.com/v1",
+                                     "api_key": "sk-xxx", "models": ["gpt-4"]}},
+            "Router": {"default": "openai,gpt-4"},
+            "SemanticCache": {"enabled": True, "threshold": 0.75}
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_path = os.path.join(temp_dir, "config.json")
+            with open(config_path, "w", encoding="utf-8") as f:
+                json.dump(config, f)
+            router = ModelRouter(config_path)
+
+        provider = SlowProvider(delay=0)
+        router.set_provider_instance("openai", provider)
+        router.send_request("default", "请解释机器学习的概念")
+        router.send_request("default", "请解释一下机器学习的概念")
+        self.assertEqual(provider.calls, 1)
+        self.assertEqual(router.get_cache_stats()["semantic"]["hits"], 1)
+        print("ModelRouter语义缓存测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.single_flight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+
+    def _run_concurrently(self, flight, key, func, count):
+        """并发执行count次相同键的调用"""
+        results = [None] * count
+        errors = [None] * count
+
+        def worker(index):
+            try:
+                results[index] = flight.do(key, func)
+            except Exception as e:
+                errors[index] = e
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_calls_share_result(self):
+        """测试相同键的并发调用只执行一次，且调用方得到独立副本"""
+        flight = SingleFlight()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"content": "共享结果"}
+
+        results, errors = self._run_concurrently(flight, "key", fetch, 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [None] * 8)
+        self.assertTrue(all(result == {"content": "共享结果"} for result in results))
+        self.assertEqual(len({id(result) for result in results}), 8)
+        self.assertEqual(flight.stats(), {"executed": 1, "coalesced": 7, "in_flight": 0})
+        print("SingleFlight并发合并测试通过。")
+
+    def test_exception_propagates(self):
+        """测试执行失败时所有等待方都收到异常，且之后的调用会重新执行"""
+        flight = SingleFlight()
+
+        def fail():
+            time.sleep(0.2)
+            raise RuntimeError("上游失败")
+
+        results, errors = self._run_concurrently(flight, "key", fail, 4)
+        self.assertTrue(all(isinstance(error, RuntimeError) for error in errors))
+
+        self.assertEqual(flight.do("key", lambda: "重新执行"), "重新执行")
+        self.assertEqual(flight.stats()["executed"], 2)
+        print("SingleFlight异常传播测试通过。")
+
+    def test_different_keys_not_coalesced(self):
+        """测试不同键的调用互不合并"""
+        flight = SingleFlight()
+        self.assertEqual(flight.do("a", lambda: 1), 1)
+        self.assertEqual(flight.do("b", lambda: 2), 2)
+        self.assertEqual(flight.stats()["coalesced"], 0)
+        print("SingleFlight不同键测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
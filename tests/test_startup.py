@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import json
+import subprocess
+
+# 将项目根目录添加到Python路径中，以便导入模块
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+# 在独立的解释器中导入路由并创建ModelRouter，报告耗时和已导入的模块
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from core.model_router import ModelRouter
+router = ModelRouter(sys.argv[1])
+router.get_provider_for_task("coding")
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+# 启动时不应导入的模块：提供商实现、Claude Code集成和较重的标准库模块
+LAZY_MODULES = [
+    "requests",
+    "asyncio",
+    "sqlite3",
+    "numpy",
+    "concurrent.futures",
+    "integrations.claude_code",
+    "integrations.api_providers.openrouter",
+    "integrations.api_providers.deepseek",
+    "integrations.api_providers.ollama",
+    "integrations.api_providers.gemini",
+    "core.batch",
+    "core.hedging"
+]
+
+# 启动预算（秒），远高于实测值，为较慢的CI机器留出余量
+STARTUP_BUDGET = 0.5
+
+class TestStartup(unittest.TestCase):
+
+    def _measure(self):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, os.path.join(PROJECT_ROOT, "nonexistent-config.json")],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=30
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_lazy_imports(self):
+        """测试创建ModelRouter时不导入提供商实现和Claude Code集成"""
+        modules = set(self._measure()["modules"])
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, modules)
+        print("启动延迟导入测试通过。")
+
+    def test_startup_budget(self):
+        """测试导入路由并创建ModelRouter的耗时在启动预算内"""
+        elapsed = min(self._measure()["elapsed"] for _ in range(3))
+        self.assertLess(elapsed, STARTUP_BUDGET)
+        print(f"启动预算测试通过（{elapsed * 1000:.1f}ms）。")
+
+    def test_provider_created_on_first_use(self):
+        """测试提供商实例在首次路由到它时创建，之后复用同一实例"""
+        from core.model_router import ModelRouter
+        router = ModelRouter(os.path.join(PROJECT_ROOT, "nonexistent-config.json"))
+        self.assertEqual(router.provider_instances, {})
+
+        routed = router.route_request("coding", "写一个排序函数")
+        instance = routed["provider_instance"]
+        self.assertEqual(type(instance).__name__, "DeepSeekProvider")
+        self.assertEqual(list(router.provider_instances), ["deepseek"])
+        self.assertIs(router.route_request("coding", "另一个问题")["provider_instance"], instance)
+        print("提供商首次使用时创建测试通过。")
+
+    def test_lazy_package_exports(self):
+        """测试api_providers包按需导入导出的类"""
+        import integrations.api_providers as api_providers
+        from integrations.api_providers.gemini import GeminiProvider
+        self.assertIs(api_providers.GeminiProvider, GeminiProvider)
+        self.assertIn("OllamaProvider", dir(api_providers))
+        with self.assertRaises(AttributeError):
+            api_providers.UnknownProvider
+        print("api_providers按需导出测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
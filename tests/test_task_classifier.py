@@ -0,0 +1,80 @@
+import unittest
+import sys
+import os
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from core.task_classifier import TaskClassifier
+from tests.test_model_router import SlowProvider
+
+class TestTaskClassifier(unittest.TestCase):
+
+    def test_classify(self):
+        """测试明显的编程、推理、后台和闲聊提示被分到对应的任务类型"""
+        classifier = TaskClassifier()
+        cases = {
+            "写一个Python函数解析JSON文件": "coding",
+            "```\ndef f(x): return x\n```\n这段为什么报错": "coding",
+            "分析一下这两种架构方案的优缺点": "think",
+            "compare the trade-offs of microservices and monoliths": "think",
+            "把这段话翻译成英文：今天很开心": "background",
+            "summarize the following article": "background",
+            "推荐一部好看的电影": "default"
+        }
+        for text, expected in cases.items():
+            self.assertEqual(classifier.classify(text)[0], expected, text)
+        self.assertEqual(classifier.classify("写一个Python函数", allowed=["default", "think"])[0], "default")
+        print("任务类型分类测试通过。")
+
+    def test_latency(self):
+        """测试单次分类（含最长输入）远低于1毫秒"""
+        classifier = TaskClassifier()
+        for text in ("写一个Python函数", "分析" * 2000, "word " * 2000):
+            for _ in range(20):
+                classifier.classify(text)
+        self.assertLess(classifier.stats()["mean_micros"], 1000)
+        print("分类耗时测试通过。")
+
+    def test_feedback(self):
+        """测试反馈正确的任务类型后统计准确率，并用样本在线更新模型"""
+        classifier = TaskClassifier(min_confidence=0.0)
+        text = "给我的猫起个名字"
+        task_type, decision = classifier.classify(text)
+        self.assertNotEqual(task_type, "background")
+        self.assertTrue(classifier.record_feedback(decision["id"], "background", text))
+        self.assertFalse(classifier.record_feedback(10 ** 6, "background"))
+        stats = classifier.stats()
+        self.assertEqual((stats["labelled"], stats["accuracy"]), (1, 0.0))
+        for _ in range(3):
+            classifier.train("background", [text])
+        self.assertEqual(classifier.classify(text)[0], "background")
+        print("分类反馈测试通过。")
+
+    def test_router_auto(self):
+        """测试任务类型为auto时路由按分类结果选择提供商，并记录估算节省的成本"""
+        router = ModelRouter("/nonexistent/config.json")
+        default, coding = SlowProvider(delay=0), SlowProvider(delay=0)
+        router.set_provider_instance("openai", default)
+        router.set_provider_instance("deepseek", coding)
+        router.update_route("default", "openai", "gpt-4")
+        router.update_route("coding", "deepseek", "deepseek-coder")
+        router.route_policy.prices = {"openai,gpt-4": 0.03, "deepseek": 0.001}
+
+        router.send_request("auto", "写一个Python函数计算阶乘", use_cache=False)
+        self.assertEqual((default.calls, coding.calls), (0, 1))
+        self.assertEqual(list(router.stream_request("auto", "今天天气怎么样")), ["今天天气怎么样"])
+        self.assertEqual(default.calls, 1)
+
+        stats = router.get_classifier_stats()
+        self.assertEqual(stats["task_types"], {"coding": 1, "default": 1})
+        self.assertGreater(stats["estimated_savings"], 0)
+        self.assertEqual(router.select_task_type("think", "写一个Python函数"), "think")
+        router.config["TaskClassifier"] = {"enabled": False}
+        router._task_classifier = None
+        self.assertEqual(router.select_task_type("auto", "写一个Python函数"), "default")
+        print("auto任务类型路由测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
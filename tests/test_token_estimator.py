@@ -0,0 +1,89 @@
+import unittest
+import sys
+import os
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from core.token_estimator import (
+    ContextLengthExceededError,
+    ContextWindows,
+    estimate_batch,
+    estimate_tokens,
+    trim_messages
+)
+from tests.test_model_router import SlowProvider
+
+class TestTokenEstimator(unittest.TestCase):
+
+    def test_estimates(self):
+        """测试ASCII约4个字符一个token、非ASCII字符一个字符一个token"""
+        self.assertEqual(estimate_batch(["abcdefgh", "你好世界", "ab你好", 12345678]), [2, 4, 2, 2])
+        self.assertEqual(estimate_tokens([{"role": "user", "content": "abcdefgh"}, {"content": "你好"}]), 12)
+        self.assertEqual(estimate_tokens([]), 0)
+        print("token估算测试通过。")
+
+    def test_context_windows(self):
+        """测试上下文窗口按精确名、最长前缀和OpenRouter模型名匹配"""
+        windows = ContextWindows({"my-model": 4096})
+        self.assertEqual(windows.window_for("gpt-4"), 8192)
+        self.assertEqual(windows.window_for("gpt-4-turbo-preview"), 128000)
+        self.assertEqual(windows.window_for("claude-3-haiku-20240307"), 200000)
+        self.assertEqual(windows.window_for("openai/gpt-3.5-turbo"), 16385)
+        self.assertEqual(windows.window_for("my-model"), 4096)
+        self.assertIsNone(windows.window_for("unknown-model"))
+        self.assertIsNone(windows.window_for(None))
+        print("上下文窗口匹配测试通过。")
+
+    def test_trim_messages(self):
+        """测试裁剪时丢弃最早的对话轮次，保留system消息和最后一条消息"""
+        messages = [
+            {"role": "system", "content": "系统"},
+            {"role": "user", "content": "一" * 100},
+            {"role": "assistant", "content": "二" * 100},
+            {"role": "user", "content": "三" * 10}
+        ]
+        trimmed = trim_messages(messages, 130)
+        self.assertEqual([message["content"][0] for message in trimmed], ["系", "二", "三"])
+        trimmed = trim_messages(messages, 30)
+        self.assertEqual([message["content"][0] for message in trimmed], ["系", "三"])
+        self.assertIsNone(trim_messages(messages, 10))
+        self.assertIs(trim_messages(messages, 1000)[1], messages[1])
+        print("消息裁剪测试通过。")
+
+    def test_router_redirect_and_reject(self):
+        """测试超出上下文窗口的请求改用长上下文路由，长上下文也放不下时裁剪或拒绝"""
+        router = ModelRouter("/nonexistent/config.json")
+        default = SlowProvider(delay=0)
+        long_context = SlowProvider(delay=0)
+        router.set_provider_instance("openai", default)
+        router.set_provider_instance("gemini", long_context)
+        router.update_route("default", "openai", "gpt-4")
+
+        router.send_request("default", "短提示", use_cache=False)
+        self.assertEqual((default.calls, long_context.calls), (1, 0))
+        long_prompt = "长" * 9000
+        self.assertEqual(router.fit_context("default", long_prompt), ("longContext", None))
+        response = router.send_request("default", long_prompt, use_cache=False)
+        self.assertEqual(response.text, long_prompt)
+        self.assertEqual((default.calls, long_context.calls), (1, 1))
+        self.assertEqual(list(router.stream_request("default", long_prompt)), [long_prompt])
+        self.assertEqual(long_context.calls, 2)
+
+        router.context_windows = ContextWindows({"gemini-1.5-pro": 10000})
+        history = [{"role": "user", "content": "旧" * 6000}, {"role": "assistant", "content": "好"},
+                   {"role": "user", "content": "新" * 3000}]
+        task_type, trimmed = router.fit_context("default", "", history)
+        self.assertEqual((task_type, [message["content"][0] for message in trimmed]), ("longContext", ["好", "新"]))
+        with self.assertRaises(ContextLengthExceededError) as context:
+            router.send_request("default", "长" * 20000, use_cache=False)
+        self.assertEqual(context.exception.window, 10000)
+
+        router.config["ContextWindow"] = {"overflow": "reject"}
+        with self.assertRaises(ContextLengthExceededError):
+            router.fit_context("default", "", history)
+        print("上下文长度路由测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from integrations.api_providers.transport import HTTPTransport, iter_sse_events
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """支持keep-alive的测试服务端"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.path == "/sse":
+            self._send_sse()
+            return
+        payload = json.dumps({"echo": json.loads(body or b"{}")}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_sse(self):
+        """返回未声明charset的SSE响应，数据为UTF-8编码的中文，并在多字节字符中间分段发送"""
+        events = b"".join(
+            b"data: " + json.dumps({"text": text}, ensure_ascii=False).encode("utf-8") + b"\n\n"
+            for text in ("你好，", "世界 ✓")
+        ) + b"data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(events)))
+        self.end_headers()
+        split = events.index("好".encode("utf-8")) + 1
+        for part in (events[:split], events[split:]):
+            self.wfile.write(part)
+            self.wfile.flush()
+            time.sleep(0.01)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestHTTPTransport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_session_per_host(self):
+        """测试同一主机复用同一会话，不同主机使用独立会话"""
+        transport = HTTPTransport()
+        session_a = transport.get_session("https://api.deepseek.com/v1/chat/completions")
+        session_b = transport.get_session("https://api.deepseek.com/v1/models")
+        session_c = transport.get_session("https://openrouter.ai/api/v1/chat/completions")
+
+        self.assertIs(session_a, session_b)
+        self.assertIsNot(session_a, session_c)
+        transport.close()
+        print("HTTPTransport按主机会话测试通过。")
+
+    def test_connection_reuse(self):
+        """测试keep-alive连接被复用并记录在指标中"""
+        transport = HTTPTransport(pool_maxsize=4)
+        for i in range(5):
+            response = transport.post(f"{self.base_url}/chat", json={"i": i}, timeout=5)
+            self.assertEqual(response.json()["echo"]["i"], i)
+
+        metrics = transport.get_metrics()
+        host_metrics = metrics["hosts"][self.base_url]
+        self.assertEqual(host_metrics["requests"], 5)
+        self.assertEqual(host_metrics["connections_opened"], 1)
+        self.assertEqual(host_metrics["connections_reused"], 4)
+        self.assertGreater(metrics["reuse_ratio"], 0.5)
+        transport.close()
+        print("HTTPTransport连接复用测试通过。")
+
+    def test_sse_utf8(self):
+        """测试未声明charset的SSE响应按UTF-8解码"""
+        transport = HTTPTransport()
+        response = transport.post(f"{self.base_url}/sse", json={}, stream=True, timeout=5)
+        self.assertEqual([event["text"] for event in iter_sse_events(response)], ["你好，", "世界 ✓"])
+        transport.close()
+        print("SSE UTF-8解码测试通过。")
+
+    def test_timeout_resolution(self):
+        """测试超时参数的解析"""
+        transport = HTTPTransport(connect_timeout=3, read_timeout=20)
+        self.assertEqual(transport._resolve_timeout(None), (3, 20))
+        self.assertEqual(transport._resolve_timeout(60), (3, 60))
+        self.assertEqual(transport._resolve_timeout((1, 2)), (1, 2))
+        print("HTTPTransport超时解析测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
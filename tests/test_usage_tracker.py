@@ -0,0 +1,150 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.model_router import ModelRouter
+from core.usage_tracker import QuotaExceededError, UsageTracker
+from tests.test_model_router import SlowProvider
+
+class TestUsageTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.temp_dir, "usage.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_concurrent_recording(self):
+        """测试多个线程并发记录时各自写入分片，汇总结果准确"""
+        tracker = UsageTracker(budgets={"provider:openai": {"daily_requests": 10 ** 6}})
+
+        def worker():
+            for _ in range(1000):
+                tracker.record("openai", "gpt-4", "default", "001", 3, 2)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(tracker.used("provider:openai"), {"requests": 8000, "tokens": 40000})
+        report = tracker.report(group_by="model")
+        self.assertEqual(report, [{"model": "gpt-4", "requests": 8000, "input_tokens": 24000,
+                                   "output_tokens": 16000, "total_tokens": 40000}])
+        print("并发用量记录测试通过。")
+
+    def test_finished_threads_folded(self):
+        """测试线程结束后其分片并入合计，分片数不随线程数增长，汇总结果不变"""
+        tracker = UsageTracker(budgets={"total": {"daily_tokens": 10 ** 6}})
+        for _ in range(200):
+            thread = threading.Thread(target=tracker.record, args=("openai", "gpt-4", "default", None, 3, 2))
+            thread.start()
+            thread.join()
+        self.assertLessEqual(len(tracker._shards), 2)
+        self.assertEqual(tracker.used("total"), {"requests": 200, "tokens": 1000})
+        self.assertEqual(tracker.report()[0]["requests"], 200)
+        print("结束线程分片合并测试通过。")
+
+    def test_budgets_and_store(self):
+        """测试预算检查，以及写入本地存储的用量在新进程中仍计入预算"""
+        budgets = {"user:001": {"daily_tokens": 100}, "task_type:think": {"monthly_requests": 2}}
+        tracker = UsageTracker(self.store_path, budgets=budgets)
+        tracker.check(["total", "user:001", "task_type:think"])
+        tracker.record("openai", "gpt-4", "think", "001", 60, 50)
+        with self.assertRaises(QuotaExceededError) as context:
+            tracker.check(["task_type:think", "user:001"])
+        self.assertEqual((context.exception.scope, context.exception.used), ("user:001", 110))
+        tracker.check(["user:002", "task_type:think"])
+        tracker.close()
+        tracker.close()
+
+        restarted = UsageTracker(self.store_path, budgets=budgets)
+        self.assertEqual(restarted.used("user:001"), {"requests": 1, "tokens": 110})
+        restarted.record("deepseek", "deepseek-chat", "think", "002", 1, 1)
+        with self.assertRaises(QuotaExceededError):
+            restarted.check(["task_type:think"])
+        restarted.close()
+        report = {row["provider"]: row["requests"] for row in restarted.report("month", "provider")}
+        self.assertEqual(report, {"openai": 1, "deepseek": 1})
+        self.assertEqual(restarted.budget_status()["task_type:think"]["monthly_requests"], {"limit": 2, "used": 2})
+        print("用量预算与本地存储测试通过。")
+
+    def test_budget_shared_across_processes(self):
+        """测试其他进程写入本地存储的用量按flush_interval重新读取并计入预算，本进程的用量不重复计入"""
+        budgets = {"total": {"daily_tokens": 100}}
+        gateway = UsageTracker(self.store_path, flush_interval=0.05, budgets=budgets)
+        daemon = UsageTracker(self.store_path, flush_interval=0.05, budgets=budgets)
+        daemon.check(["total"])
+        gateway.record("openai", "gpt-4", "default", None, 30, 30)
+        gateway.flush()
+        daemon.record("openai", "gpt-4", "default", None, 20, 20)
+        daemon.flush()
+        time.sleep(0.06)
+        self.assertEqual(daemon.used("total"), {"requests": 2, "tokens": 100})
+        self.assertEqual(gateway.used("total"), {"requests": 2, "tokens": 100})
+        with self.assertRaises(QuotaExceededError):
+            daemon.check(["total"])
+        gateway.close()
+        daemon.close()
+        print("多进程共享预算测试通过。")
+
+    def test_router_enforcement(self):
+        """测试路由发出请求前检查预算，提供商预算用尽时切换到备选提供商"""
+        router = ModelRouter("/nonexistent/config.json")
+        router.usage_tracker = UsageTracker(budgets={
+            "user:alice": {"daily_requests": 1},
+            "provider:openai": {"daily_requests": 2}
+        })
+        primary = SlowProvider(delay=0)
+        backup = SlowProvider(delay=0)
+        router.set_provider_instance("openai", primary)
+        router.set_provider_instance("anthropic", backup)
+        router.update_route("default", "openai", "gpt-4", fallbacks=["anthropic,claude-3-haiku-20240307"])
+
+        router.send_request("default", "第一次", use_cache=False, user_id="alice")
+        with self.assertRaises(QuotaExceededError):
+            router.send_request("default", "第二次", use_cache=False, user_id="alice")
+        self.assertEqual(primary.calls, 1)
+
+        for i in range(3):
+            response = router.send_request("default", f"请求{i}", use_cache=False, user_id="bob")
+            self.assertEqual(response.text, f"请求{i}")
+        self.assertEqual((primary.calls, backup.calls), (2, 2))
+        usage = {row["provider"]: row["requests"] for row in router.get_usage_stats()["usage"]}
+        self.assertEqual(usage, {"openai": 2, "anthropic": 2})
+        self.assertEqual(list(router.stream_request("default", "流式", user_id="bob")), ["流式"])
+        usage = {row["provider"]: row["requests"] for row in router.get_usage_stats()["usage"]}
+        self.assertEqual(usage, {"openai": 2, "anthropic": 3})
+        print("路由预算检查测试通过。")
+
+    def test_coalescing_per_user(self):
+        """测试配置了用户预算时只合并同一用户的并发请求，各用户的用量分别计入"""
+        router = ModelRouter("/nonexistent/config.json")
+        router.usage_tracker = UsageTracker(budgets={"user:alice": {"daily_requests": 10},
+                                                     "user:bob": {"daily_requests": 10}})
+        provider = SlowProvider(delay=0.2)
+        router.set_provider_instance("openai", provider)
+        router.update_route("default", "openai", "gpt-4")
+
+        threads = [threading.Thread(target=router.send_request, args=("default", "相同的提示"),
+                                    kwargs={"use_cache": False, "user_id": user})
+                   for user in ("alice", "alice", "bob")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(provider.calls, 2)
+        self.assertEqual(router.usage_tracker.used("user:alice")["requests"], 1)
+        self.assertEqual(router.usage_tracker.used("user:bob")["requests"], 1)
+        print("按用户合并请求测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
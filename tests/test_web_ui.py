@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+import json
+import asyncio
+
+# 将项目根目录添加到Python路径中，以便导入模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from integrations.api_providers import AuthenticationError
+
+try:
+    from fastapi import WebSocketDisconnect
+    FASTAPI_AVAILABLE = True
+except ImportError:
+    FASTAPI_AVAILABLE = False
+
+class FakeWebSocket:
+    """按顺序返回预设消息的测试WebSocket，消息用完后模拟连接断开"""
+
+    def __init__(self, messages):
+        self.messages = [json.dumps(message) for message in messages]
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        if not self.messages:
+            raise WebSocketDisconnect()
+        return self.messages.pop(0)
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+@unittest.skipUnless(FASTAPI_AVAILABLE, "Web界面需要fastapi")
+class TestWebUI(unittest.TestCase):
+
+    def test_chat_error_keeps_connection(self):
+        """测试请求失败时发送带错误类别的error消息，连接继续处理后续消息，断开后移出活跃连接"""
+        from ui.web import main
+
+        calls = []
+
+        async def astream_request(task_type, prompt, cancel_token=None):
+            calls.append(prompt)
+            if len(calls) == 1:
+                raise AuthenticationError("密钥无效", "openai")
+            yield prompt
+
+        websocket = FakeWebSocket([
+            {"type": "chat", "content": "第一条"},
+            "无效消息",
+            {"type": "chat", "content": "第二条"}
+        ])
+        original = main.model_router.astream_request
+        main.model_router.astream_request = astream_request
+        try:
+            asyncio.run(main.websocket_endpoint(websocket))
+        finally:
+            main.model_router.astream_request = original
+
+        errors = [message for message in websocket.sent if message["type"] == "error"]
+        self.assertEqual([error["error_type"] for error in errors], ["auth", "internal_error"])
+        self.assertEqual(calls, ["第一条", "第二条"])
+        self.assertIn({"type": "chat_end", "content": "第二条"}, websocket.sent)
+        self.assertNotIn(websocket, main.active_connections)
+        print("WebSocket消息错误处理测试通过。")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -103,19 +103,7 @@ def chat_command(args):
     response = router.send_request(args.task, args.message)
     
     print(f"AI响应:")
-    if "content" in response:
-        # Anthropic格式
-        for content_item in response["content"]:
-            if content_item["type"] == "text":
-                print(content_item["text"])
-    elif "choices" in response:
-        # OpenAI格式
-        for choice in response["choices"]:
-            if "message" in choice:
-                print(choice["message"]["content"])
-    else:
-        # 模拟响应
-        print(response.get("response", "无法解析响应"))
+    print(response.text)
 
 def profile_command(args):
     """处理用户画像命令"""
@@ -138,6 +126,7 @@ def route_command(args):
     
     print("\n路由规则:")
     for task_type, route in router.routes.items():
+        route = route if isinstance(route, str) else " -> ".join(route)
         print(f"  {task_type}: {route}")
 
 def web_command(args):
@@ -10,22 +10,43 @@ import argparse
 import sys
 import os
 import subprocess
+import time
 
 # 添加项目根目录到Python路径
-project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
 
 def main():
     parser = argparse.ArgumentParser(description="CCLi - Claude Code CLI with Model Routing")
     parser.add_argument("command", nargs="?", default="help", 
-                        choices=["help", "chat", "profile", "route", "web", "test", "claude"],
+                        choices=["help", "chat", "profile", "route", "web", "test", "claude", "daemon", "usage"],
                         help="要执行的命令")
     parser.add_argument("--task", "-t", default="claudeCode",
-                        help="任务类型 (default, background, think, longContext, coding, claudeCode)")
+                        help="任务类型 (default, background, think, longContext, coding, claudeCode, auto)")
     parser.add_argument("--message", "-m", default="",
                         help="要发送的消息")
     parser.add_argument("--user-id", "-u", default="001",
                         help="用户ID")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="等待完整响应后再输出（默认逐段流式输出）")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="绕过响应缓存，直接请求模型")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="chat、claude命令：请求的截止时间（秒），超时后取消请求")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="不使用守护进程，在当前进程内处理请求")
+    parser.add_argument("--socket", default=None,
+                        help="守护进程的Unix套接字路径（默认 ~/.ccli/ccli.sock）")
+    parser.add_argument("--detach", action="store_true",
+                        help="daemon命令：在后台启动守护进程")
+    parser.add_argument("--status", action="store_true",
+                        help="daemon命令：查看守护进程状态")
+    parser.add_argument("--stop", action="store_true",
+                        help="daemon命令：停止守护进程")
+    parser.add_argument("--period", default="day", choices=["day", "month"],
+                        help="usage命令：统计周期（今天或本月）")
+    parser.add_argument("--group-by", default="provider", choices=["provider", "model", "task_type", "user"],
+                        help="usage命令：分组字段")
 
     args = parser.parse_args()
 
@@ -43,6 +64,17 @@ def main():
         test_command(args)
     elif args.command == "claude":
         claude_command(args)
+    elif args.command == "daemon":
+        daemon_command(args)
+    elif args.command == "usage":
+        usage_command(args)
+
+def daemon_client(args):
+    """获取守护进程客户端，--no-daemon时返回None（在当前进程内处理）"""
+    if args.no_daemon:
+        return None
+    from ui.cli.daemon import DaemonClient
+    return DaemonClient(args.socket)
 
 def print_help():
     """打印帮助信息"""
@@ -60,11 +92,22 @@ CCLi - Claude Code CLI with Model Routing 帮助信息
   route         查看模型路由信息
   web           启动Web UI界面
   test          运行项目测试
+  daemon        启动常驻守护进程，chat/route/claude命令自动通过它执行
+  usage         查看token用量和预算
 
 选项:
-  -t, --task TASK       任务类型 (default, background, think, longContext, coding, claudeCode)
+  -t, --task TASK       任务类型 (default, background, think, longContext, coding, claudeCode, auto)
   -m, --message MESSAGE 要发送的消息
   -u, --user-id USER_ID 用户ID
+  --no-stream           等待完整响应后再输出
+  --no-cache            绕过响应缓存
+  --timeout SECONDS     请求的截止时间（chat、claude命令）
+  --no-daemon           不使用守护进程
+  --socket PATH         守护进程的Unix套接字路径
+  --detach              在后台启动守护进程（daemon命令）
+  --status, --stop      查看或停止守护进程（daemon命令）
+  --period PERIOD       用量统计周期：day或month（usage命令）
+  --group-by FIELD      用量分组：provider、model、task_type或user（usage命令）
 
 示例:
   ccli chat -m "你好，世界！"
@@ -72,6 +115,8 @@ CCLi - Claude Code CLI with Model Routing 帮助信息
   ccli claude -m "分析当前代码库结构"
   ccli profile
   ccli route
+  ccli daemon --detach
+  ccli usage --period month --group-by task_type
   ccli web
   ccli test
 """
@@ -83,37 +128,61 @@ def chat_command(args):
         print("错误: 请提供要发送的消息")
         return
     
+    from integrations.api_providers.cancellation import CancellationToken, RequestCancelledError
+    # 按下Ctrl-C或超过--timeout时取消请求：当前进程内直接取消令牌，交给守护进程时断开连接由守护进程取消
+    cancel_token = CancellationToken(timeout=args.timeout)
+    chunks = None
     try:
-        # 导入模型路由模块
-        from core.model_router import ModelRouter
         print(f"正在将请求路由到 {args.task} 任务类型的模型...")
-        router = ModelRouter()
-        response = router.send_request(args.task, args.message)
         
+        # 优先交给守护进程中已预热的路由处理，守护进程未运行时在当前进程内处理
+        from ui.cli.daemon import DaemonUnavailable
+        client = daemon_client(args)
+        try:
+            if client is None:
+                raise DaemonUnavailable("已禁用守护进程")
+            if not args.no_stream:
+                chunks = client.stream("chat", task=args.task, message=args.message, user=args.user_id, stream=True,
+                                       timeout=args.timeout)
+            else:
+                response = client.call("chat", task=args.task, message=args.message, user=args.user_id,
+                                       use_cache=not args.no_cache, timeout=args.timeout)
+        except DaemonUnavailable:
+            # 导入模型路由模块
+            from core.model_router import ModelRouter
+            router = ModelRouter()
+            if not args.no_stream:
+                chunks = router.stream_request(args.task, args.message, user_id=args.user_id,
+                                               cancel_token=cancel_token)
+            else:
+                response = router.send_request(args.task, args.message, use_cache=not args.no_cache,
+                                               user_id=args.user_id, cancel_token=cancel_token)
+        
+        if not args.no_stream:
+            # 逐段输出模型生成的文本
+            print(f"AI响应:")
+            for chunk in chunks:
+                print(chunk, end="", flush=True)
+            print()
+            return
+        
+        # 守护进程返回的是JSON字典，按响应格式归一化后取文本
+        from integrations.api_providers.response import ModelResponse
         print(f"AI响应:")
-        if "content" in response:
-            # Anthropic格式
-            for content_item in response["content"]:
-                if content_item["type"] == "text":
-                    print(content_item["text"])
-        elif "choices" in response:
-            # OpenAI格式
-            for choice in response["choices"]:
-                if "message" in choice:
-                    print(choice["message"]["content"])
-        else:
-            # 模拟响应或其他格式
-            print(response.get("response", str(response)))
+        print(ModelResponse.parse(response).text)
+    except KeyboardInterrupt:
+        cancel_token.cancel("用户按下Ctrl-C")
+        if chunks is not None:
+            chunks.close()
+        print("\n请求已取消")
+    except RequestCancelledError as e:
+        print(f"\n请求已取消: {e}")
     except Exception as e:
         print(f"聊天命令执行出错: {e}")
 
 def claude_command(args):
     """处理Claude Code命令（直接调用）"""
     try:
-        # 导入Claude Code集成模块
-        from integrations.claude_code import ClaudeCodeIntegration
-        claude = ClaudeCodeIntegration()
-        
         if not args.message:
             print("Claude Code功能:")
             print("  直接调用Claude Code进行代码分析、文档生成等操作")
@@ -121,7 +190,28 @@ def claude_command(args):
             return
         
         print("正在调用Claude Code...")
-        response = claude.send_prompt(args.message, args.task)
+        from integrations.api_providers.cancellation import CancellationToken, RequestCancelledError
+        # 与chat命令相同：按下Ctrl-C或超过--timeout时终止Claude Code子进程
+        cancel_token = CancellationToken(timeout=args.timeout)
+        from ui.cli.daemon import DaemonUnavailable
+        client = daemon_client(args)
+        try:
+            try:
+                if client is None:
+                    raise DaemonUnavailable("已禁用守护进程")
+                response = client.call("claude", task=args.task, message=args.message, timeout=args.timeout)
+            except DaemonUnavailable:
+                # 导入Claude Code集成模块
+                from integrations.claude_code import ClaudeCodeIntegration
+                claude = ClaudeCodeIntegration()
+                response = claude.send_prompt(args.message, args.task, cancel_token=cancel_token)
+        except KeyboardInterrupt:
+            cancel_token.cancel("用户按下Ctrl-C")
+            print("\n请求已取消")
+            return
+        except RequestCancelledError as e:
+            print(f"\n请求已取消: {e}")
+            return
         print(f"Claude Code响应:")
         print(response)
     except ImportError:
@@ -136,20 +226,99 @@ def profile_command(args):
 def route_command(args):
     """处理路由命令"""
     try:
-        from core.model_router import ModelRouter
         print("模型路由信息:")
-        router = ModelRouter()
+        from ui.cli.daemon import DaemonUnavailable
+        client = daemon_client(args)
+        try:
+            if client is None:
+                raise DaemonUnavailable("已禁用守护进程")
+            info = client.call("route")
+            providers, routes = info["providers"], info["routes"]
+        except DaemonUnavailable:
+            from core.model_router import ModelRouter
+            router = ModelRouter()
+            providers = {name: provider.get("api_base_url") for name, provider in router.providers.items()}
+            routes = router.routes
         
         print("提供商:")
-        for name, provider in router.providers.items():
-            print(f"  {name}: {provider.get('api_base_url')}")
+        for name, api_base_url in providers.items():
+            print(f"  {name}: {api_base_url}")
         
         print("\n路由规则:")
-        for task_type, route in router.routes.items():
+        for task_type, route in routes.items():
+            route = route if isinstance(route, str) else " -> ".join(route)
             print(f"  {task_type}: {route}")
     except Exception as e:
         print(f"路由命令执行出错: {e}")
 
+def usage_command(args):
+    """处理用量命令：按周期和分组字段报告token用量及各预算的使用情况"""
+    try:
+        # 守护进程运行时包含其内存中尚未写入本地存储的用量
+        from ui.cli.daemon import DaemonUnavailable
+        client = daemon_client(args)
+        try:
+            if client is None:
+                raise DaemonUnavailable("已禁用守护进程")
+            stats = client.call("usage", period=args.period, group_by=args.group_by)
+        except DaemonUnavailable:
+            from core.model_router import ModelRouter
+            stats = ModelRouter().get_usage_stats(args.period, args.group_by)
+        
+        if not stats["enabled"]:
+            print("用量统计未启用（Usage.enabled为false）")
+            return
+        print(f"{'今天' if args.period == 'day' else '本月'}的token用量（按{args.group_by}分组）:")
+        if not stats["usage"]:
+            print("  暂无用量")
+        for row in stats["usage"]:
+            print(f"  {row[args.group_by] or '-'}: {row['requests']}次请求, 输入{row['input_tokens']}, "
+                  f"输出{row['output_tokens']}, 合计{row['total_tokens']} tokens")
+        if stats["budgets"]:
+            print("\n预算:")
+            for scope, limits in stats["budgets"].items():
+                for limit_name, status in limits.items():
+                    print(f"  {scope} {limit_name}: {status['used']}/{status['limit']}")
+    except Exception as e:
+        print(f"用量命令执行出错: {e}")
+
+def daemon_command(args):
+    """处理守护进程命令：启动（前台或后台）、查看状态、停止"""
+    from ui.cli.daemon import CCLIDaemon, DaemonClient, DaemonError
+    client = DaemonClient(args.socket)
+    try:
+        if args.status:
+            status = client.call("ping")
+            print(f"守护进程运行中: {client.socket_path}")
+            print(f"  PID: {status['pid']}")
+            print(f"  运行时间: {status['uptime']:.0f}秒")
+            print(f"  已处理请求: {status['requests']}")
+        elif args.stop:
+            client.call("shutdown")
+            print("守护进程正在停止")
+        elif args.detach:
+            if client.is_running():
+                print(f"守护进程已在运行: {client.socket_path}")
+                return
+            command = [sys.executable, os.path.abspath(__file__), "daemon"]
+            if args.socket:
+                command += ["--socket", args.socket]
+            subprocess.Popen(command, cwd=project_root, start_new_session=True,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # 等待守护进程开始监听
+            for _ in range(50):
+                if client.is_running():
+                    print(f"守护进程已在后台启动: {client.socket_path}")
+                    return
+                time.sleep(0.1)
+            print("守护进程启动超时")
+        else:
+            CCLIDaemon(args.socket).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except DaemonError as e:
+        print(f"守护进程命令执行出错: {e}")
+
 def web_command(args):
     """处理Web UI命令"""
     print("正在启动Web UI...")
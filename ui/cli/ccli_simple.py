@@ -125,12 +125,10 @@ def main():
                     print("输入 'help' 查看支持的命令")
                     
             except KeyboardInterrupt:
-                print("
-再见!")
+                print("\n再见!")
                 break
             except EOFError:
-                print("
-再见!")
+                print("\n再见!")
                 break
                 
     except ImportError as e:
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CCLi 守护进程
+常驻一个已预热的ModelRouter（提供商实例、连接池、缓存），
+命令行通过本地Unix套接字把chat/route/claude请求交给它处理，省去每次启动时的初始化
+
+协议为JSON行：每个请求一行 {"op": ..., ...}，
+普通请求返回一行 {"ok": true, "result": ...}，
+流式请求先逐行返回 {"chunk": "..."}，最后返回 {"ok": true}，
+失败时返回 {"ok": false, "error": "..."}
+"""
+
+import json
+import os
+import select
+import socket
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator
+
+# 套接字路径可通过CCLI_SOCKET环境变量覆盖
+DEFAULT_SOCKET_PATH = os.environ.get("CCLI_SOCKET", os.path.expanduser("~/.ccli/ccli.sock"))
+
+# 连接守护进程的超时（秒），超时视为守护进程未运行
+CONNECT_TIMEOUT = 1.0
+
+class DaemonError(Exception):
+    """守护进程返回的错误"""
+
+class DaemonUnavailable(DaemonError):
+    """无法连接守护进程（未运行或平台不支持Unix套接字）"""
+
+class DaemonClient:
+    def __init__(self, socket_path: str = None, connect_timeout: float = CONNECT_TIMEOUT):
+        """
+        守护进程客户端
+        - 只依赖标准库的socket和json，命令行通过它转发请求时无需导入路由模块
+        - 连接失败时抛出DaemonUnavailable，调用方据此回退到进程内执行
+        """
+        self.socket_path = socket_path or DEFAULT_SOCKET_PATH
+        self.connect_timeout = connect_timeout
+    
+    def _connect(self) -> socket.socket:
+        """连接守护进程，连接成功后不再限制读取超时（模型响应可能较慢）"""
+        if not hasattr(socket, "AF_UNIX"):
+            raise DaemonUnavailable("当前平台不支持Unix套接字")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(f"无法连接守护进程: {e}")
+        sock.settimeout(None)
+        return sock
+    
+    def _messages(self, op: str, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """在已建立的连接上发送一个请求，并逐行读取守护进程的响应"""
+        sock = self._connect()
+        try:
+            with sock, sock.makefile("r", encoding="utf-8") as reader:
+                sock.sendall((json.dumps(dict(params, op=op), ensure_ascii=False) + "\n").encode("utf-8"))
+                for line in reader:
+                    message = json.loads(line)
+                    if "ok" in message and not message["ok"]:
+                        raise DaemonError(message.get("error", "守护进程返回未知错误"))
+                    yield message
+                    if "ok" in message:
+                        return
+        except (OSError, ValueError) as e:
+            raise DaemonError(f"与守护进程的连接中断: {e}")
+        raise DaemonError("守护进程提前关闭了连接")
+    
+    def call(self, op: str, **params) -> Any:
+        """
+        发送请求并返回结果
+        
+        Raises:
+            DaemonUnavailable: 守护进程未运行
+            DaemonError: 守护进程处理请求失败
+        """
+        for message in self._messages(op, params):
+            if "ok" in message:
+                return message.get("result")
+    
+    def stream(self, op: str, **params) -> Iterator[str]:
+        """
+        发送流式请求，返回逐段产出文本的迭代器
+        在返回前完成连接，守护进程未运行时立即抛出DaemonUnavailable，调用方可在输出任何内容前回退
+        """
+        messages = self._messages(op, params)
+        first = next(messages)
+        
+        def chunks():
+            message = first
+            while True:
+                if "chunk" in message:
+                    yield message["chunk"]
+                if "ok" in message:
+                    return
+                message = next(messages)
+        
+        return chunks()
+    
+    def is_running(self) -> bool:
+        """检查守护进程是否在运行"""
+        try:
+            self.call("ping")
+            return True
+        except DaemonError:
+            return False
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """处理一个客户端连接，同一连接上可以依次发送多个请求"""
+    
+    def _send(self, message: Dict[str, Any]):
+        self.wfile.write((json.dumps(message, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        self.wfile.flush()
+    
+    @contextmanager
+    def _watching(self, cancel_token):
+        """
+        处理请求期间在另一个线程中监视连接：客户端断开（如按下Ctrl-C）时立即取消请求，
+        不必等到写回结果或下一个片段时才发现连接已断开
+        """
+        wake_reader, wake_writer = socket.socketpair()
+        watcher = threading.Thread(target=self._watch_disconnect, args=(cancel_token, wake_reader),
+                                   name="ccli-daemon-watch", daemon=True)
+        watcher.start()
+        try:
+            yield
+        finally:
+            # 关闭写端唤醒监视线程
+            wake_writer.close()
+            watcher.join()
+            wake_reader.close()
+    
+    def _watch_disconnect(self, cancel_token, wake: socket.socket):
+        """等待连接可读或被唤醒；连接读到EOF或出错时取消请求（客户端发来的下一个请求不会被读取）"""
+        readable, _, _ = select.select([self.connection, wake], [], [])
+        if wake in readable or self.connection not in readable:
+            return
+        try:
+            data = self.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            data = b""
+        if not data:
+            cancel_token.cancel("客户端已断开连接")
+    
+    def handle(self):
+        from integrations.api_providers.cancellation import CancellationToken
+        daemon = self.server.ccli_daemon
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                self._send({"ok": False, "error": "无效的JSON请求"})
+                continue
+            if request.get("op") != "ping":
+                daemon.record_request()
+            cancel_token = CancellationToken(timeout=request.get("timeout"))
+            try:
+                with self._watching(cancel_token):
+                    if request.get("op") == "chat" and request.get("stream"):
+                        for chunk in daemon.router.stream_request(request.get("task", "default"),
+                                                                  request.get("message", ""),
+                                                                  user_id=request.get("user"), cancel_token=cancel_token):
+                            self._send({"chunk": chunk})
+                        self._send({"ok": True})
+                    else:
+                        self._send({"ok": True, "result": daemon.handle(request, cancel_token)})
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端已断开（如按下Ctrl-C），取消仍在进行的请求
+                cancel_token.cancel("客户端已断开连接")
+                return
+            except Exception as e:
+                self._send({"ok": False, "error": str(e)})
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class CCLIDaemon:
+    def __init__(self, socket_path: str = None, router=None, config_path: str = None):
+        """
+        CCLi 守护进程
+        
+        Args:
+            socket_path: Unix套接字路径
+            router: 常驻的ModelRouter，默认按config_path创建（配置文件修改后由路由的热加载生效）
+            config_path: 配置文件路径
+        """
+        self.socket_path = socket_path or DEFAULT_SOCKET_PATH
+        if router is None:
+            from core.model_router import ModelRouter
+            router = ModelRouter(config_path)
+        self.router = router
+        self.server = None
+        self.started_at = None
+        self.requests = 0
+        self._lock = threading.Lock()
+    
+    def warm_up(self):
+        """预先创建所有已配置提供商的实例，首个请求不再承担初始化开销"""
+        for provider_name in list(self.router.providers):
+            self.router.get_provider_instance(provider_name)
+    
+    def record_request(self):
+        """记录一次已处理的请求（不含ping）"""
+        with self._lock:
+            self.requests += 1
+    
+    def handle(self, request: Dict[str, Any], cancel_token=None) -> Any:
+        """处理一个非流式请求并返回结果（chat、claude请求的timeout字段为截止时间秒数）"""
+        op = request.get("op")
+        if op == "ping":
+            return {"pid": os.getpid(), "uptime": time.time() - self.started_at, "requests": self.requests}
+        if op == "chat":
+            return self.router.send_request(request.get("task", "default"), request.get("message", ""),
+                                            use_cache=request.get("use_cache", True), user_id=request.get("user"),
+                                            cancel_token=cancel_token)
+        if op == "route":
+            return {
+                "providers": {name: provider.get("api_base_url") for name, provider in self.router.providers.items()},
+                "routes": dict(self.router.routes)
+            }
+        if op == "claude":
+            claude = self.router.claude_code_integration
+            if claude is None:
+                raise DaemonError("Claude Code集成不可用")
+            return claude.send_prompt(request.get("message", ""), request.get("task", "default"),
+                                      cancel_token=cancel_token)
+        if op == "stats":
+            return {
+                "cache": self.router.get_cache_stats(),
+                "coalescing": self.router.get_coalescing_stats(),
+                "transport": self.router.get_transport_metrics(),
+                "classifier": self.router.get_classifier_stats(),
+                "scheduler": self.router.get_scheduler_stats(),
+                "retry": self.router.get_retry_stats(),
+                "timeouts": self.router.get_timeout_stats(),
+                "health": self.router.get_health_stats()
+            }
+        if op == "usage":
+            return self.router.get_usage_stats(request.get("period", "day"), request.get("group_by", "provider"))
+        if op == "shutdown":
+            threading.Thread(target=self.stop, daemon=True).start()
+            return {"stopping": True}
+        raise DaemonError(f"未知的操作: {op}")
+    
+    def start(self):
+        """
+        绑定Unix套接字（清理上次遗留的套接字文件），套接字只对当前用户可读写
+        绑定时临时设置umask，套接字文件创建时即为0600，不存在其他用户可以连接的时间窗口
+        """
+        if os.path.exists(self.socket_path):
+            if DaemonClient(self.socket_path).is_running():
+                raise DaemonError(f"守护进程已在运行: {self.socket_path}")
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", mode=0o700, exist_ok=True)
+        umask = os.umask(0o177)
+        try:
+            self.server = _UnixServer(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        self.server.ccli_daemon = self
+        self.started_at = time.time()
+    
+    def serve_forever(self):
+        """启动并处理请求，直到收到shutdown请求或被中断"""
+        if self.server is None:
+            self.start()
+        self.warm_up()
+        self.router.start_health_probe()
+        print(f"CCLi守护进程已启动: {self.socket_path}（PID {os.getpid()}）")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.router.stop_health_probe()
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            print("CCLi守护进程已停止")
+    
+    def stop(self):
+        """停止处理请求（serve_forever随后返回）"""
+        if self.server is not None:
+            self.server.shutdown()
@@ -3,6 +3,7 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import json
 import os
 import sys
@@ -12,6 +13,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspa
 
 from core.model_router import ModelRouter
 from integrations.claude_code import ClaudeCodeIntegration
+from integrations.api_providers.async_support import run_blocking
+from integrations.api_providers.cancellation import CancellationToken, RequestCancelledError
 
 app = FastAPI(title="CCLi Web UI", description="Claude Code CLI with Model Routing Web Interface")
 
@@ -151,6 +154,7 @@ async def get_home(request: Request):
                     </select>
                     <input type="text" id="message-input" placeholder="输入您的消息...">
                     <button id="send-btn" onclick="sendMessage()">发送</button>
+                    <button id="cancel-btn" onclick="cancelRequest()">停止</button>
                 </div>
                 
                 <div id="output">
@@ -161,6 +165,7 @@ async def get_home(request: Request):
 
             <script>
                 let ws = new WebSocket("ws://localhost:8000/ws");
+                let streamingElement = null;
                 
                 ws.onmessage = function(event) {
                     const output = document.getElementById('output');
@@ -169,6 +174,22 @@ async def get_home(request: Request):
                     if (data.type === 'response') {
                         output.innerHTML += '<p><strong>' + data.mode + '响应:</strong></p>';
                         output.innerHTML += '<p>' + data.content + '</p>';
+                    } else if (data.type === 'response_start') {
+                        // 流式响应开始
+                        const header = document.createElement('p');
+                        header.innerHTML = '<strong>' + data.mode + '响应:</strong>';
+                        output.appendChild(header);
+                        streamingElement = document.createElement('p');
+                        output.appendChild(streamingElement);
+                    } else if (data.type === 'response_delta' && streamingElement) {
+                        // 追加增量文本
+                        streamingElement.textContent += data.content;
+                    } else if (data.type === 'response_end') {
+                        streamingElement = null;
+                    } else if (data.type === 'response_cancelled') {
+                        // 请求已取消，保留已收到的内容
+                        output.innerHTML += '<p><em>' + data.content + '</em></p>';
+                        streamingElement = null;
                     } else {
                         output.innerHTML += '<p>' + event.data + '</p>';
                     }
@@ -180,6 +201,12 @@ async def get_home(request: Request):
                     document.getElementById('output').innerHTML += '<p>WebSocket连接已建立</p>';
                 };
                 
+                function cancelRequest() {
+                    if (ws.readyState === WebSocket.OPEN) {
+                        ws.send(JSON.stringify({"type": "cancel"}));
+                    }
+                }
+                
                 function sendRoutingCommand(taskType, message) {
                     if (ws.readyState === WebSocket.OPEN) {
                         ws.send(JSON.stringify({
@@ -236,67 +263,33 @@ async def get_home(request: Request):
         """
         return HTMLResponse(content=html_content, status_code=200)
 
+# 路由请求的默认截止时间（秒），可由消息中的timeout字段指定
+REQUEST_TIMEOUT = 300.0
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket端点"""
+    """
+    WebSocket端点
+    消息按顺序处理，处理期间继续接收消息：收到 {"type": "cancel"} 或连接断开（如关闭标签页）时
+    立即取消正在进行的请求，上游连接随即断开，不再继续消耗token
+    """
     await manager.connect(websocket)
+    queue = asyncio.Queue()
+    current = {}
+    worker = asyncio.ensure_future(process_messages(websocket, queue, current))
     
     try:
         while True:
             data = await websocket.receive_text()
             message_data = json.loads(data)
             
-            if message_data["type"] == "routing_command":
-                # 处理路由命令
-                task_type = message_data.get("task_type", "default")
-                content = message_data["message"]
-                
-                try:
-                    response = model_router.send_request(task_type, content)
-                    ai_response = parse_model_response(response)
-                    
-                    await manager.send_personal_message(json.dumps({
-                        "type": "response",
-                        "mode": "路由模式",
-                        "content": ai_response
-                    }), websocket)
-                except Exception as e:
-                    await manager.send_personal_message(json.dumps({
-                        "type": "response",
-                        "mode": "路由模式",
-                        "content": f"错误: {str(e)}"
-                    }), websocket)
-                    
-            elif message_data["type"] == "claude_command":
-                # 处理Claude Code命令
-                command = message_data.get("command", "")
-                response = handle_claude_command(command)
-                
-                await manager.send_personal_message(json.dumps({
-                    "type": "response",
-                    "mode": "Claude Code模式",
-                    "content": response
-                }), websocket)
-                
-            elif message_data["type"] == "claude_message":
-                # 处理Claude Code消息
-                task_type = message_data.get("task_type", "claudeCode")
-                content = message_data["message"]
-                
-                try:
-                    response = claude_code_integration.send_prompt(content, task_type)
-                    
-                    await manager.send_personal_message(json.dumps({
-                        "type": "response",
-                        "mode": "Claude Code模式",
-                        "content": response
-                    }), websocket)
-                except Exception as e:
-                    await manager.send_personal_message(json.dumps({
-                        "type": "response",
-                        "mode": "Claude Code模式",
-                        "content": f"错误: {str(e)}"
-                    }), websocket)
+            if message_data["type"] == "cancel":
+                # 取消当前请求
+                cancel_token = current.get("cancel_token")
+                if cancel_token is not None:
+                    cancel_token.cancel("用户取消了请求")
+                continue
+            await queue.put(message_data)
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -306,27 +299,113 @@ async def websocket_endpoint(websocket: WebSocket):
             "type": "error",
             "content": str(e)
         }), websocket)
+    finally:
+        cancel_token = current.get("cancel_token")
+        if cancel_token is not None:
+            cancel_token.cancel("客户端已断开")
+        worker.cancel()
 
-def parse_model_response(response: dict) -> str:
-    """解析模型响应"""
-    if "choices" in response:
-        # OpenAI格式
-        return response["choices"][0]["message"]["content"]
-    elif "content" in response:
-        # Anthropic格式
-        return response["content"][0]["text"]
-    elif "candidates" in response:
-        # Gemini格式
-        return response["candidates"][0]["content"]["parts"][0]["text"]
-    elif "message" in response:
-        # Ollama格式
-        return response["message"]["content"]
-    elif "response" in response:
-        # 模拟响应或Claude Code响应
-        return response["response"]
-    else:
-        # 未知格式
-        return json.dumps(response, ensure_ascii=False, indent=2)
+async def process_messages(websocket: WebSocket, queue: asyncio.Queue, current: dict):
+    """按顺序处理WebSocket消息，当前请求的取消令牌保存在current中"""
+    while True:
+        message_data = await queue.get()
+        cancel_token = CancellationToken(timeout=message_data.get("timeout", REQUEST_TIMEOUT))
+        current["cancel_token"] = cancel_token
+        try:
+            await handle_message(websocket, message_data, cancel_token)
+        except Exception as e:
+            print(f"WebSocket错误: {e}")
+            await manager.send_personal_message(json.dumps({
+                "type": "error",
+                "content": str(e)
+            }), websocket)
+        finally:
+            current.pop("cancel_token", None)
+
+async def handle_message(websocket: WebSocket, message_data: dict, cancel_token: CancellationToken):
+    """处理一条WebSocket消息"""
+    if message_data["type"] == "routing_command":
+        # 处理路由命令
+        task_type = message_data.get("task_type", "default")
+        content = message_data["message"]
+        
+        try:
+            if message_data.get("stream", True):
+                # 流式推送模型响应
+                await manager.send_personal_message(json.dumps({
+                    "type": "response_start",
+                    "mode": "路由模式"
+                }), websocket)
+                async for chunk in model_router.astream_request(task_type, content, cancel_token=cancel_token):
+                    await manager.send_personal_message(json.dumps({
+                        "type": "response_delta",
+                        "mode": "路由模式",
+                        "content": chunk
+                    }), websocket)
+                await manager.send_personal_message(json.dumps({
+                    "type": "response_end",
+                    "mode": "路由模式"
+                }), websocket)
+            else:
+                response = await model_router.asend_request(task_type, content, cancel_token=cancel_token)
+                ai_response = response.text
+                
+                await manager.send_personal_message(json.dumps({
+                    "type": "response",
+                    "mode": "路由模式",
+                    "content": ai_response
+                }), websocket)
+        except RequestCancelledError as e:
+            await manager.send_personal_message(json.dumps({
+                "type": "response_cancelled",
+                "mode": "路由模式",
+                "content": str(e)
+            }), websocket)
+        except Exception as e:
+            await manager.send_personal_message(json.dumps({
+                "type": "response",
+                "mode": "路由模式",
+                "content": f"错误: {str(e)}"
+            }), websocket)
+            
+    elif message_data["type"] == "claude_command":
+        # 处理Claude Code命令
+        command = message_data.get("command", "")
+        response = handle_claude_command(command)
+        
+        await manager.send_personal_message(json.dumps({
+            "type": "response",
+            "mode": "Claude Code模式",
+            "content": response
+        }), websocket)
+        
+    elif message_data["type"] == "claude_message":
+        # 处理Claude Code消息
+        task_type = message_data.get("task_type", "claudeCode")
+        content = message_data["message"]
+        
+        try:
+            # Claude Code调用在共享线程池中运行，并传入请求的取消令牌
+            response = await run_blocking(claude_code_integration.send_prompt, content, task_type,
+                                          cancel_token=cancel_token)
+            
+            await manager.send_personal_message(json.dumps({
+                "type": "response",
+                "mode": "Claude Code模式",
+                "content": response
+            }), websocket)
+        except RequestCancelledError as e:
+            await manager.send_personal_message(json.dumps({
+                "type": "response_cancelled",
+                "mode": "Claude Code模式",
+                "content": str(e)
+            }), websocket)
+        except Exception as e:
+            await manager.send_personal_message(json.dumps({
+                "type": "response",
+                "mode": "Claude Code模式",
+                "content": f"错误: {str(e)}"
+            }), websocket)
 
 def handle_claude_command(command: str) -> str:
     """处理Claude Code命令"""
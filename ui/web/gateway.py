@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CCLi 网关
+把ModelRouter以OpenAI、Anthropic和Gemini兼容的HTTP接口提供给本地的各种工具，
+所有工具共用同一个常驻进程中的路由、缓存、连接池和限流器；
+请求和响应经core.protocol_translation转换，流式响应逐段转换，不等待完整响应
+
+接口:
+  POST /v1/chat/completions                     OpenAI对话补全（支持流式SSE）
+  POST /v1/messages                             Anthropic Messages（支持流式SSE）
+  POST /v1/messages/count_tokens                Anthropic token计数（估算值）
+  POST /v1beta/models/{model}:generateContent   Gemini（:streamGenerateContent为流式）
+  GET  /v1/models                               可用的模型（任务类型及其别名）
+
+每个请求有截止时间（X-CCLi-Timeout请求头的秒数，默认Gateway.request_timeout），
+客户端断开或超过截止时间时取消请求，正在进行的上游流式连接随即断开，不再继续消耗token
+
+任务类型的选择顺序：X-CCLi-Task-Type请求头 > Gateway.model_aliases中的模型别名 >
+与任务类型同名的模型（如 "coding"、"ccli/coding"）> default
+例如把 "claude-3-5-sonnet-20241022" 设为 "coding" 的别名，Claude风格的客户端即可改用DeepSeek或本地的Ollama模型
+
+启动:
+  python ui/web/gateway.py --port 8080 --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Callable, List, Optional
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from core.protocol_translation import (
+    AnthropicStreamEncoder,
+    GeminiStreamEncoder,
+    OpenAIStreamEncoder,
+    anthropic_error_type,
+    from_anthropic_request,
+    from_gemini_request,
+    from_openai_request,
+    last_user_text,
+    to_anthropic_response,
+    to_gemini_response,
+    to_openai_response
+)
+from core.rate_limiter import estimate_tokens
+from core.scheduler import AdmissionRejectedError
+from integrations.api_providers.cancellation import CancellationToken, DeadlineExceededError, RequestCancelledError
+from integrations.api_providers.errors import ProviderError
+from core.task_classifier import AUTO_TASK_TYPE
+from core.token_estimator import ContextLengthExceededError
+from core.usage_tracker import QuotaExceededError
+
+TASK_TYPE_HEADER = "x-ccli-task-type"
+TIMEOUT_HEADER = "x-ccli-timeout"
+
+# 非流式请求等待响应期间检查客户端是否断开的间隔（秒）
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# 所有候选提供商均失败时，按失败类别返回的状态码和错误类型（其余类别为502 upstream_error）
+UPSTREAM_ERRORS = {
+    "timeout": (504, "timeout_error"),
+    "rate_limited": (429, "rate_limit_error"),
+    "overloaded": (503, "overloaded_error"),
+    "bad_request": (400, "invalid_request_error")
+}
+
+def openai_error(status_code: int, message: str, error_type: str = "invalid_request_error") -> JSONResponse:
+    """返回OpenAI格式的错误响应"""
+    return JSONResponse(status_code=status_code, content={
+        "error": {"message": message, "type": error_type, "param": None, "code": None}
+    })
+
+def anthropic_error(status_code: int, message: str, error_type: str = "invalid_request_error") -> JSONResponse:
+    """返回Anthropic格式的错误响应"""
+    error_type = anthropic_error_type(status_code, error_type)
+    return JSONResponse(status_code=status_code, content={
+        "type": "error", "error": {"type": error_type, "message": message}
+    })
+
+def gemini_error(status_code: int, message: str, error_type: str = "invalid_request_error") -> JSONResponse:
+    """返回Gemini格式的错误响应"""
+    status = {400: "INVALID_ARGUMENT", 401: "UNAUTHENTICATED", 404: "NOT_FOUND",
+              429: "RESOURCE_EXHAUSTED", 499: "CANCELLED", 504: "DEADLINE_EXCEEDED"}.get(status_code, "UNAVAILABLE")
+    return JSONResponse(status_code=status_code, content={
+        "error": {"code": status_code, "message": message, "status": status}
+    })
+
+class Gateway:
+    def __init__(self, router, model_aliases: Optional[Dict[str, str]] = None,
+                 api_keys: Optional[List[str]] = None, default_task_type: str = "default",
+                 request_timeout: float = 300.0):
+        """
+        兼容OpenAI、Anthropic和Gemini接口的网关
+        
+        Args:
+            router: 常驻的ModelRouter
+            model_aliases: 模型别名到任务类型的映射（如 {"gpt-4": "think"}）
+            api_keys: 允许访问网关的密钥，为空时不校验
+            default_task_type: 无法从请求中确定任务类型时使用的任务类型
+            request_timeout: 请求的默认截止时间（秒），可由X-CCLi-Timeout请求头缩短或延长
+        """
+        self.router = router
+        self.model_aliases = model_aliases or {}
+        self.api_keys = set(api_keys or [])
+        self.default_task_type = default_task_type
+        self.request_timeout = request_timeout
+    
+    def resolve_task_type(self, model: Optional[str], header: Optional[str]) -> str:
+        """根据请求头或模型名确定任务类型（auto由路由的本地分类器按提示选择）"""
+        if header:
+            return header
+        if model:
+            if model in self.model_aliases:
+                return self.model_aliases[model]
+            name = model.split("/", 1)[1] if model.startswith("ccli/") else model
+            if name in self.router.routes or name == AUTO_TASK_TYPE:
+                return name
+        return self.default_task_type
+    
+    def cancel_token_for(self, request: Request) -> CancellationToken:
+        """按X-CCLi-Timeout请求头（无效或缺失时按request_timeout）创建请求的取消令牌"""
+        try:
+            timeout = float(request.headers.get(TIMEOUT_HEADER, self.request_timeout))
+        except ValueError:
+            timeout = self.request_timeout
+        return CancellationToken(timeout=timeout if timeout > 0 else self.request_timeout)
+    
+    def authorized(self, request: Request) -> bool:
+        """
+        校验密钥（未配置api_keys时允许所有请求）
+        支持OpenAI的Bearer令牌、Anthropic的x-api-key和Gemini的x-goog-api-key请求头或key参数
+        """
+        if not self.api_keys:
+            return True
+        authorization = request.headers.get("authorization", "")
+        candidates = (
+            authorization[7:] if authorization.startswith("Bearer ") else None,
+            request.headers.get("x-api-key"),
+            request.headers.get("x-goog-api-key"),
+            request.query_params.get("key")
+        )
+        return any(key in self.api_keys for key in candidates if key)
+    
+    async def list_models(self) -> Dict[str, Any]:
+        """列出可用的模型：每个任务类型和每个别名"""
+        created = int(time.time())
+        names = list(self.router.routes) + [alias for alias in self.model_aliases if alias not in self.router.routes]
+        return {
+            "object": "list",
+            "data": [{"id": name, "object": "model", "created": created, "owned_by": "ccli"} for name in names]
+        }
+    
+    async def _read_body(self, request: Request) -> Optional[Dict[str, Any]]:
+        """读取JSON请求体，无效时返回None"""
+        try:
+            body = await request.json()
+        except ValueError:
+            return None
+        return body if isinstance(body, dict) else None
+    
+    async def _stream(self, task_type: str, internal: Dict[str, Any], encoder,
+                      cancel_token: Optional[CancellationToken] = None):
+        """
+        把路由的文本片段逐段编码为目标格式的SSE事件
+        客户端断开时服务器停止读取本生成器，路由随即取消请求；超过截止时间时以已生成的内容结束
+        """
+        yield encoder.start()
+        try:
+            async for text in self.router.astream_request(task_type, last_user_text(internal["messages"]),
+                                                          messages=internal["messages"],
+                                                          temperature=internal["temperature"],
+                                                          max_tokens=internal["max_tokens"],
+                                                          user_id=internal.get("user"),
+                                                          cancel_token=cancel_token):
+                if text:
+                    yield encoder.delta(text)
+        except RequestCancelledError as e:
+            print(f"流式请求已取消: {e}")
+        # 响应头已发出，以目标格式的错误事件结束流（状态码和错误类型与非流式请求一致）
+        except ProviderError as e:
+            status_code, error_type = UPSTREAM_ERRORS.get(e.error_type, (502, "upstream_error"))
+            yield encoder.error(status_code, error_type, str(e))
+            return
+        except ContextLengthExceededError as e:
+            yield encoder.error(400, "invalid_request_error", str(e))
+            return
+        except QuotaExceededError as e:
+            # 预检之后预算被并发请求用尽，或所有候选提供商的预算均已用尽
+            yield encoder.error(429, "insufficient_quota", str(e))
+            return
+        except AdmissionRejectedError as e:
+            # 预检之后调度器排队已满或排队超时
+            yield encoder.error(503, "overloaded_error", str(e))
+            return
+        yield encoder.finish()
+    
+    async def _watch_disconnect(self, request: Request, cancel_token: CancellationToken):
+        """等待响应期间定期检查客户端是否断开，断开时取消请求"""
+        while not cancel_token.cancelled:
+            if await request.is_disconnected():
+                cancel_token.cancel("客户端已断开")
+                return
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+    
+    async def _complete(self, request: Request, internal: Optional[Dict[str, Any]], error: Callable,
+                        to_response: Callable, encoder_class: type):
+        """
+        按内部请求路由并以目标格式返回（非流式为JSON，流式为SSE）
+        
+        Args:
+            request: HTTP请求
+            internal: 由协议转换层得到的内部请求，请求体无效时为None
+            error: 目标格式的错误响应构造函数
+            to_response: 目标格式的响应转换函数
+            encoder_class: 目标格式的流式编码器
+        """
+        if not self.authorized(request):
+            return error(401, "无效的API密钥", "authentication_error")
+        if internal is None:
+            return error(400, "请求体不是有效的JSON对象")
+        messages = internal["messages"]
+        if not messages:
+            return error(400, "messages必须是非空的消息列表")
+        
+        model = internal["model"] or self.default_task_type
+        cancel_token = self.cancel_token_for(request)
+        task_type = self.resolve_task_type(model, request.headers.get(TASK_TYPE_HEADER))
+        task_type = self.router.select_task_type(task_type, last_user_text(messages), messages)
+        try:
+            # 流式响应开始后无法再返回错误状态码，上下文长度和预算在此之前检查
+            task_type, fitted = self.router.fit_context(task_type, last_user_text(messages), messages,
+                                                        internal["max_tokens"])
+            self.router.check_quota(task_type, internal.get("user"))
+            if self.router.scheduler is not None:
+                self.router.scheduler.check_admission(task_type)
+        except ContextLengthExceededError as e:
+            return error(400, str(e))
+        except QuotaExceededError as e:
+            return error(429, str(e), "insufficient_quota")
+        except AdmissionRejectedError as e:
+            return error(503, str(e), "overloaded_error")
+        if fitted is not messages:
+            internal = dict(internal, messages=fitted)
+            messages = fitted
+        headers = {"X-CCLi-Task-Type": task_type}
+        if internal["stream"]:
+            encoder = encoder_class(model, prompt_tokens=estimate_tokens(messages))
+            return StreamingResponse(self._stream(task_type, internal, encoder, cancel_token),
+                                     media_type="text/event-stream",
+                                     headers=dict(headers, **{"Cache-Control": "no-cache"}))
+        
+        watcher = asyncio.ensure_future(self._watch_disconnect(request, cancel_token))
+        try:
+            response = await self.router.asend_request(
+                task_type, last_user_text(messages), messages=messages,
+                temperature=internal["temperature"], max_tokens=internal["max_tokens"], user_id=internal.get("user"),
+                cancel_token=cancel_token
+            )
+        except DeadlineExceededError as e:
+            return error(504, str(e), "timeout_error")
+        except RequestCancelledError as e:
+            # 客户端已断开，响应不会被读取
+            return error(499, str(e), "cancelled")
+        except QuotaExceededError as e:
+            # 所有候选提供商的预算均已用尽
+            return error(429, str(e), "insufficient_quota")
+        except AdmissionRejectedError as e:
+            # 调度器排队已满或排队超时
+            return error(503, str(e), "overloaded_error")
+        finally:
+            watcher.cancel()
+        if "error" in response:
+            # 所有候选提供商均失败，按失败类别返回状态码
+            status_code, error_type = UPSTREAM_ERRORS.get(response.get("error_type"), (502, "upstream_error"))
+            return error(status_code, str(response["error"]), error_type)
+        return JSONResponse(to_response(response, model, messages), headers=headers)
+    
+    async def chat_completions(self, request: Request):
+        """处理 POST /v1/chat/completions（OpenAI格式）"""
+        body = await self._read_body(request)
+        internal = from_openai_request(body) if body is not None else None
+        return await self._complete(request, internal, openai_error, to_openai_response, OpenAIStreamEncoder)
+    
+    async def messages(self, request: Request):
+        """处理 POST /v1/messages（Anthropic格式）"""
+        body = await self._read_body(request)
+        internal = from_anthropic_request(body) if body is not None else None
+        return await self._complete(request, internal, anthropic_error, to_anthropic_response, AnthropicStreamEncoder)
+    
+    async def count_tokens(self, request: Request):
+        """处理 POST /v1/messages/count_tokens（Anthropic格式，返回估算值）"""
+        if not self.authorized(request):
+            return anthropic_error(401, "无效的API密钥", "authentication_error")
+        body = await self._read_body(request)
+        if body is None:
+            return anthropic_error(400, "请求体不是有效的JSON对象")
+        return {"input_tokens": estimate_tokens(from_anthropic_request(body)["messages"])}
+    
+    async def generate_content(self, target: str, request: Request):
+        """处理 POST /v1beta/models/{model}:generateContent 和 :streamGenerateContent（Gemini格式）"""
+        model, _, method = target.partition(":")
+        if method not in ("generateContent", "streamGenerateContent"):
+            return gemini_error(404, f"不支持的方法: {method}")
+        body = await self._read_body(request)
+        internal = from_gemini_request(body, model, stream=method == "streamGenerateContent") if body is not None else None
+        return await self._complete(request, internal, gemini_error, to_gemini_response, GeminiStreamEncoder)
+
+def create_gateway(router=None, config_path: str = None) -> FastAPI:
+    """
+    创建网关应用
+    
+    Args:
+        router: 使用的ModelRouter，默认按config_path创建
+        config_path: 配置文件路径（默认 ~/.ccli/config.json）
+    """
+    if router is None:
+        from core.model_router import ModelRouter
+        router = ModelRouter(config_path)
+    gateway_config = router.config.get("Gateway", {})
+    if gateway_config.get("executor_workers"):
+        # 同时挂起的提供商调用数受共享线程池大小限制
+        from integrations.api_providers.async_support import configure_executor
+        configure_executor(gateway_config["executor_workers"])
+    
+    gateway = Gateway(
+        router,
+        model_aliases=gateway_config.get("model_aliases", {}),
+        api_keys=gateway_config.get("api_keys", []),
+        default_task_type=gateway_config.get("default_task_type", "default"),
+        request_timeout=gateway_config.get("request_timeout", 300.0)
+    )
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # 服务运行期间在后台探测各提供商的健康状态
+        router.start_health_probe()
+        try:
+            yield
+        finally:
+            router.stop_health_probe()
+    
+    app = FastAPI(title="CCLi Gateway", description="OpenAI, Anthropic and Gemini compatible gateway for CCLi model routing",
+                  lifespan=lifespan)
+    app.state.gateway = gateway
+    app.add_api_route("/v1/chat/completions", gateway.chat_completions, methods=["POST"])
+    app.add_api_route("/v1/messages", gateway.messages, methods=["POST"])
+    app.add_api_route("/v1/messages/count_tokens", gateway.count_tokens, methods=["POST"])
+    app.add_api_route("/v1beta/models/{target}", gateway.generate_content, methods=["POST"])
+    app.add_api_route("/v1/models", gateway.list_models, methods=["GET"])
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="CCLi 网关（OpenAI、Anthropic、Gemini兼容接口）")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="工作进程数（每个进程各自持有一个路由，单个进程即可处理数千个并发连接）")
+    parser.add_argument("--backlog", type=int, default=4096, help="监听队列长度")
+    args = parser.parse_args()
+    
+    import uvicorn
+    # 工作进程通过工厂函数各自创建应用；uvloop和httptools已安装时uvicorn会自动使用
+    uvicorn.run(
+        "ui.web.gateway:create_gateway",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=args.backlog,
+        timeout_keep_alive=30,
+        access_log=False,
+        app_dir=project_root
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CCLi 网关压测
+用asyncio在保持连接（keep-alive）的HTTP/1.1连接上并发请求 /v1/chat/completions，
+报告吞吐量、延迟百分位、流式首个片段延迟和错误数，只依赖标准库
+
+示例:
+  python ui/web/gateway_loadtest.py --url http://127.0.0.1:8080 --concurrency 1000 --duration 30
+  python ui/web/gateway_loadtest.py --concurrency 200 --requests 5000 --stream --task coding
+  python ui/web/gateway_loadtest.py --unique 0.1   # 90%的请求重复，测量缓存和请求合并的效果
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
+
+def percentile(samples: List[float], p: float) -> Optional[float]:
+    """计算百分位数（毫秒），无样本时返回None"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return round(ordered[index] * 1000, 1)
+
+class LoadTest:
+    def __init__(self, url: str, concurrency: int, total: Optional[int], duration: Optional[float],
+                 stream: bool, task: str, unique: float, prompt_pool: int):
+        """
+        网关压测
+        
+        Args:
+            url: 网关地址
+            concurrency: 并发连接数
+            total: 请求总数（与duration二选一）
+            duration: 压测时长（秒）
+            stream: 是否使用流式请求
+            task: 任务类型（通过X-CCLi-Task-Type请求头指定）
+            unique: 不重复提示的比例，其余请求从prompt_pool个提示中随机选取
+            prompt_pool: 重复提示的数量
+        """
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.path = (parts.path.rstrip("/") or "") + "/v1/chat/completions"
+        self.concurrency = concurrency
+        self.total = total
+        self.duration = duration
+        self.stream = stream
+        self.task = task
+        self.unique = unique
+        self.prompt_pool = prompt_pool
+        self.latencies = []
+        self.first_bytes = []
+        self.errors = {}
+        self.sent = 0
+    
+    def _next_prompt(self) -> str:
+        if random.random() < self.unique:
+            return f"压测请求 {self.sent} {random.random()}"
+        return f"压测请求 #{random.randrange(self.prompt_pool)}"
+    
+    def _request_bytes(self, prompt: str) -> bytes:
+        body = json.dumps({
+            "model": self.task,
+            "stream": self.stream,
+            "messages": [{"role": "user", "content": prompt}]
+        }, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"X-CCLi-Task-Type: {self.task}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        )
+        return head.encode("ascii") + body
+    
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader, start: float):
+        """读取一个HTTP响应（支持Content-Length和chunked），返回状态码和首个正文字节的时间"""
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("连接已关闭")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        first_byte = None
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                if size == 0:
+                    await reader.readline()
+                    break
+                await reader.readexactly(size + 2)
+        else:
+            await reader.readexactly(int(headers.get("content-length", 0)))
+            first_byte = time.perf_counter() - start
+        return status, first_byte, headers.get("connection", "").lower() == "close"
+    
+    def _has_budget(self, deadline: Optional[float]) -> bool:
+        if self.total is not None:
+            return self.sent < self.total
+        return time.perf_counter() < deadline
+    
+    async def _worker(self, deadline: Optional[float]):
+        reader = writer = None
+        while self._has_budget(deadline):
+            self.sent += 1
+            start = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write(self._request_bytes(self._next_prompt()))
+                await writer.drain()
+                status, first_byte, close = await self._read_response(reader, start)
+                if status != 200:
+                    self.errors[f"HTTP {status}"] = self.errors.get(f"HTTP {status}", 0) + 1
+                    continue
+                self.latencies.append(time.perf_counter() - start)
+                if self.stream and first_byte is not None:
+                    self.first_bytes.append(first_byte)
+                if close:
+                    writer.close()
+                    writer = None
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError) as e:
+                name = type(e).__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+                if writer is not None:
+                    writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+    
+    async def run(self) -> Dict[str, Any]:
+        """执行压测并返回统计结果"""
+        deadline = time.perf_counter() + self.duration if self.total is None else None
+        start = time.perf_counter()
+        await asyncio.gather(*(self._worker(deadline) for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - start
+        return {
+            "concurrency": self.concurrency,
+            "stream": self.stream,
+            "completed": len(self.latencies),
+            "errors": self.errors,
+            "elapsed": round(elapsed, 2),
+            "requests_per_second": round(len(self.latencies) / elapsed, 1) if elapsed else None,
+            "latency_ms": {
+                "p50": percentile(self.latencies, 50),
+                "p95": percentile(self.latencies, 95),
+                "p99": percentile(self.latencies, 99)
+            },
+            "first_byte_ms": {
+                "p50": percentile(self.first_bytes, 50),
+                "p95": percentile(self.first_bytes, 95),
+                "p99": percentile(self.first_bytes, 99)
+            } if self.stream else None
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="CCLi 网关压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="网关地址")
+    parser.add_argument("--concurrency", "-c", type=int, default=100, help="并发连接数")
+    parser.add_argument("--requests", "-n", type=int, default=None, help="请求总数")
+    parser.add_argument("--duration", "-d", type=float, default=10.0, help="压测时长（秒，未指定--requests时使用）")
+    parser.add_argument("--stream", action="store_true", help="使用流式请求")
+    parser.add_argument("--task", "-t", default="default", help="任务类型")
+    parser.add_argument("--unique", type=float, default=1.0, help="不重复提示的比例（0~1）")
+    parser.add_argument("--prompt-pool", type=int, default=50, help="重复提示的数量")
+    args = parser.parse_args()
+    
+    load_test = LoadTest(args.url, args.concurrency, args.requests, args.duration,
+                         args.stream, args.task, args.unique, args.prompt_pool)
+    print(json.dumps(asyncio.run(load_test.run()), indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 import json
 import os
 import sys
@@ -13,8 +14,22 @@ from core.model_router import ModelRouter
 from core.personal_profile import PersonalProfile
 from core.event_logger import EventLogger
 from core.knowledge_graph import KnowledgeGraph
+from core.scheduler import AdmissionRejectedError
+from core.token_estimator import ContextLengthExceededError
+from core.usage_tracker import QuotaExceededError
+from integrations.api_providers import ProviderError
+from integrations.api_providers.cancellation import CancellationToken, RequestCancelledError
 
-app = FastAPI(title="CCLi Web UI", description="Claude Code CLI Web Interface")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """服务运行期间在后台探测各提供商的健康状态（/api/routes读取探测结果）"""
+    model_router.start_health_probe()
+    try:
+        yield
+    finally:
+        model_router.stop_health_probe()
+
+app = FastAPI(title="CCLi Web UI", description="Claude Code CLI Web Interface", lifespan=lifespan)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -201,6 +216,8 @@ async def get():
             <script>
                 let currentTaskType = "default";
                 let ws = null;
+                let streamingMessage = null;
+                let streamingText = "";
                 
                 // 连接到WebSocket
                 function connectWebSocket() {
@@ -214,6 +231,22 @@ async def get():
                         const data = JSON.parse(event.data);
                         if (data.type === "chat") {
                             addMessageToChat(data.content, "ai");
+                        } else if (data.type === "chat_start") {
+                            // 流式响应开始，创建空的AI消息
+                            streamingText = "";
+                            streamingMessage = addMessageToChat("", "ai");
+                        } else if (data.type === "chat_delta" && streamingMessage) {
+                            // 追加增量文本
+                            streamingText += data.content;
+                            streamingMessage.innerHTML = streamingText.replace(/\\n/g, "<br>");
+                            const chatHistory = document.getElementById("chat-history");
+                            chatHistory.scrollTop = chatHistory.scrollHeight;
+                        } else if (data.type === "chat_end") {
+                            streamingMessage = null;
+                        } else if (data.type === "error") {
+                            // 请求失败，结束正在输出的消息并显示错误
+                            streamingMessage = null;
+                            addMessageToChat("错误: " + data.content, "ai");
                         } else if (data.type === "profile") {
                             document.getElementById("user-profile").innerHTML = JSON.stringify(data.content, null, 2);
                         } else if (data.type === "knowledge") {
@@ -259,6 +292,7 @@ async def get():
                     messageDiv.innerHTML = message.replace(/\\n/g, "<br>");
                     chatHistory.appendChild(messageDiv);
                     chatHistory.scrollTop = chatHistory.scrollHeight;
+                    return messageDiv;
                 }
                 
                 // 处理回车键发送消息
@@ -278,73 +312,107 @@ async def get():
     """
     return HTMLResponse(content=html_content, status_code=200)
 
+def error_type(error: Exception) -> str:
+    """WebSocket错误消息中的错误类别"""
+    if isinstance(error, RequestCancelledError):
+        return "cancelled"
+    if isinstance(error, ProviderError):
+        return error.error_type
+    if isinstance(error, ContextLengthExceededError):
+        return "context_length_exceeded"
+    if isinstance(error, QuotaExceededError):
+        return "quota_exceeded"
+    if isinstance(error, AdmissionRejectedError):
+        return "overloaded"
+    return "internal_error"
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket端点"""
+    """
+    WebSocket端点
+    每条消息单独处理错误：请求失败时发送带error_type的error消息，连接继续接收后续消息
+    """
     await websocket.accept()
     active_connections.append(websocket)
+    # 连接断开时取消该连接上仍在进行的请求
+    connection_token = CancellationToken()
     
     try:
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
-            
-            if message_data["type"] == "chat":
-                # 处理聊天消息
-                task_type = message_data.get("task_type", "default")
-                content = message_data["content"]
-                
-                # 记录事件
-                event_logger.log_event(f"用户发送消息: {content}")
-                
-                # 发送请求到模型路由
-                response = model_router.send_request(task_type, content)
-                
-                # 解析响应
-                if "choices" in response:
-                    # OpenAI格式
-                    ai_response = response["choices"][0]["message"]["content"]
-                elif "content" in response:
-                    # Anthropic格式
-                    ai_response = response["content"][0]["text"]
-                elif "candidates" in response:
-                    # Gemini格式
-                    ai_response = response["candidates"][0]["content"]["parts"][0]["text"]
-                elif "message" in response:
-                    # Ollama格式
-                    ai_response = response["message"]["content"]
-                else:
-                    # 模拟响应
-                    ai_response = response.get("response", "无法解析响应")
-                
-                # 发送响应给客户端
+            try:
+                message_data = json.loads(data)
+                if message_data["type"] == "chat":
+                    # 每个请求使用连接令牌的子令牌，处理结束后从连接令牌注销
+                    cancel_token = CancellationToken(parent=connection_token)
+                    try:
+                        await handle_chat(websocket, message_data, cancel_token)
+                    finally:
+                        cancel_token.detach()
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                print(f"WebSocket消息处理错误: {e}")
                 await websocket.send_text(json.dumps({
-                    "type": "chat",
-                    "content": ai_response
-                }))
-                
-                # 更新用户画像
-                profile_summary = personal_profile.get_profile_summary()
-                await websocket.send_text(json.dumps({
-                    "type": "profile",
-                    "content": profile_summary
-                }))
-                
-                # 更新知识图谱
-                graph_summary = knowledge_graph.get_graph_summary()
-                await websocket.send_text(json.dumps({
-                    "type": "knowledge",
-                    "content": graph_summary
+                    "type": "error",
+                    "error_type": error_type(e),
+                    "content": str(e)
                 }))
                 
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
+        pass
     except Exception as e:
         print(f"WebSocket错误: {e}")
+    finally:
+        active_connections.remove(websocket)
+        connection_token.cancel("客户端已断开")
+
+async def handle_chat(websocket: WebSocket, message_data: dict, cancel_token: CancellationToken):
+    """处理聊天消息"""
+    task_type = message_data.get("task_type", "default")
+    content = message_data["content"]
+    
+    # 记录事件
+    event_logger.log_event(f"用户发送消息: {content}")
+    
+    if message_data.get("stream", True):
+        # 流式发送模型响应，文本片段到达后立即推送给浏览器
+        await websocket.send_text(json.dumps({"type": "chat_start"}))
+        chunks = []
+        async for chunk in model_router.astream_request(task_type, content, cancel_token=cancel_token):
+            chunks.append(chunk)
+            await websocket.send_text(json.dumps({
+                "type": "chat_delta",
+                "content": chunk
+            }))
         await websocket.send_text(json.dumps({
-            "type": "error",
-            "content": str(e)
+            "type": "chat_end",
+            "content": "".join(chunks)
         }))
+    else:
+        # 发送请求到模型路由
+        response = await model_router.asend_request(task_type, content, cancel_token=cancel_token)
+        ai_response = response.text
+        
+        # 发送响应给客户端
+        await websocket.send_text(json.dumps({
+            "type": "chat",
+            "content": ai_response
+        }))
+    
+    # 更新用户画像
+    profile_summary = personal_profile.get_profile_summary()
+    await websocket.send_text(json.dumps({
+        "type": "profile",
+        "content": profile_summary
+    }))
+    
+    # 更新知识图谱
+    graph_summary = knowledge_graph.get_graph_summary()
+    await websocket.send_text(json.dumps({
+        "type": "knowledge",
+        "content": graph_summary
+    }))
 
 @app.get("/api/profile")
 async def get_profile():
@@ -358,10 +426,19 @@ async def get_knowledge_graph():
 
 @app.get("/api/routes")
 async def get_routes():
-    """获取路由信息"""
+    """获取路由信息和后台健康探测保存的各提供商状态"""
     return {
         "providers": model_router.providers,
-        "routes": model_router.routes
+        "routes": model_router.routes,
+        "health": model_router.get_health_stats()
+    }
+
+@app.get("/api/routes/decisions")
+async def get_route_decisions(limit: int = 50):
+    """获取自适应路由策略最近的决策和各候选的统计"""
+    return {
+        "policy": model_router.get_route_policy_stats(),
+        "decisions": model_router.get_route_decisions(limit)
     }
 
 if __name__ == "__main__":